@@ -8,11 +8,12 @@ from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from core.admin_tools import admin_only
 from analytics.utm_tracker import get_campaign_stats
-import aiosqlite
-from core.config import DATABASE_FILE
+from analytics.rollups import get_retention_rollup, get_traffic_rollup
 
 logger = logging.getLogger(__name__)
 
+ROLLUPS_PENDING_TEXT = "⏳ Сводные таблицы еще строятся, попробуйте через пару минут."
+
 
 @admin_only
 async def traffic_sources_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -28,34 +29,12 @@ async def traffic_sources_stats(update: Update, context: ContextTypes.DEFAULT_TY
     text = "📊 <b>Источники трафика (30 дней)</b>\n\n"
 
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            db.row_factory = aiosqlite.Row
-
-            # Статистика по источникам
-            cursor = await db.execute("""
-                SELECT
-                    us.source,
-                    us.medium,
-                    COUNT(DISTINCT us.user_id) as total_users,
-                    COUNT(DISTINCT CASE
-                        WHEN c.conversion_type = 'trial_purchase' THEN c.user_id
-                    END) as trial_conversions,
-                    COUNT(DISTINCT CASE
-                        WHEN c.conversion_type = 'subscription_purchase' THEN c.user_id
-                    END) as paid_conversions,
-                    COALESCE(SUM(CASE
-                        WHEN c.conversion_type = 'subscription_purchase' THEN c.value_rub
-                        ELSE 0
-                    END), 0) as total_revenue
-                FROM user_sources us
-                LEFT JOIN conversions c ON us.user_id = c.user_id
-                WHERE us.created_at >= datetime('now', '-30 days')
-                GROUP BY us.source, us.medium
-                ORDER BY total_users DESC
-                LIMIT 10
-            """)
-
-            rows = await cursor.fetchall()
+        rollup = await get_traffic_rollup(days=30, limit=10)
+
+        if rollup is None:
+            text += ROLLUPS_PENDING_TEXT
+        else:
+            rows = rollup['rows']
 
             if rows:
                 text += "<b>Топ-10 источников:</b>\n\n"
@@ -80,6 +59,8 @@ async def traffic_sources_stats(update: Update, context: ContextTypes.DEFAULT_TY
                 text += "Данных пока нет.\n\n"
                 text += "<i>💡 UTM-метки появятся, когда пользователи начнут приходить по рекламным ссылкам.</i>"
 
+            text += f"\n<i>Обновлено: {rollup['refreshed_at']} UTC</i>"
+
     except Exception as e:
         logger.error(f"Error getting traffic sources stats: {e}")
         text += "❌ Ошибка при загрузке данных"
@@ -173,47 +154,12 @@ async def cohort_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = "📊 <b>Когортный анализ (Retention)</b>\n\n"
 
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            db.row_factory = aiosqlite.Row
-
-            # Cohort анализ: retention Day 1, 7, 30 по источникам
-            cursor = await db.execute("""
-                WITH user_activity AS (
-                    SELECT
-                        u.user_id,
-                        us.source,
-                        us.created_at as registration_date,
-                        MAX(CASE
-                            WHEN julianday(u.last_activity_date) - julianday(us.created_at) >= 1
-                            THEN 1 ELSE 0
-                        END) as active_day1,
-                        MAX(CASE
-                            WHEN julianday(u.last_activity_date) - julianday(us.created_at) >= 7
-                            THEN 1 ELSE 0
-                        END) as active_day7,
-                        MAX(CASE
-                            WHEN julianday(u.last_activity_date) - julianday(us.created_at) >= 30
-                            THEN 1 ELSE 0
-                        END) as active_day30
-                    FROM users u
-                    LEFT JOIN user_sources us ON u.user_id = us.user_id
-                    WHERE us.created_at >= datetime('now', '-60 days')
-                    GROUP BY u.user_id, us.source, us.created_at
-                )
-                SELECT
-                    source,
-                    COUNT(*) as total_users,
-                    SUM(active_day1) as retained_day1,
-                    SUM(active_day7) as retained_day7,
-                    SUM(active_day30) as retained_day30
-                FROM user_activity
-                WHERE source IS NOT NULL
-                GROUP BY source
-                ORDER BY total_users DESC
-                LIMIT 5
-            """)
-
-            rows = await cursor.fetchall()
+        rollup = await get_retention_rollup(days=60, limit=5)
+
+        if rollup is None:
+            text += ROLLUPS_PENDING_TEXT
+        else:
+            rows = rollup['rows']
 
             if rows:
                 text += "<b>Retention по источникам (60 дней):</b>\n\n"
@@ -236,6 +182,8 @@ async def cohort_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else:
                 text += "Данных для анализа пока недостаточно."
 
+            text += f"\n<i>Обновлено: {rollup['refreshed_at']} UTC</i>"
+
     except Exception as e:
         logger.error(f"Error in cohort analysis: {e}")
         text += "❌ Ошибка при загрузке данных"
@@ -0,0 +1,696 @@
+"""
+Предагрегированные таблицы для админской аналитики.
+
+Отчеты по воронке, когортам, источникам трафика и модулям раньше
+считались JOIN'ами по сырым таблицам (users, answered_questions,
+user_ai_limits, user_sources, conversions, attempts) на каждый клик
+администратора. Здесь эти метрики поддерживаются инкрементально:
+
+- analytics_user_facts — одна строка на пользователя с признаками
+  воронки (отвечал, проверял через ИИ, trial, оплата, источник);
+- analytics_daily_cohorts — пользователи по дню регистрации;
+- analytics_daily_sources — пользователи по дню прихода и UTM-источнику,
+  с конверсиями, доходом и retention day 1/7/30;
+- analytics_daily_modules, analytics_module_users/_totals — попытки
+  и уникальные пользователи по модулям.
+
+refresh_rollups() (job каждые ROLLUP_INTERVAL секунд) забирает из сырых
+таблиц только строки после сохраненных watermark'ов, обновляет факты
+и пересчитывает дневные строки лишь для затронутых дней. Отчеты читают
+несколько сотен готовых строк вместо полного сканирования.
+"""
+
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import aiosqlite
+
+from core.config import DATABASE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Период обновления сводных таблиц (секунды)
+ROLLUP_INTERVAL = 600
+
+# Сколько строк каждого журнала обрабатывается за одну транзакцию
+ROLLUP_BATCH_ROWS = 100_000
+
+# Модули, которые показываются в глобальной статистике
+GLOBAL_STATS_MODULES = ['task24', 'test_part', 'task19', 'task20', 'task25']
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_rollup_watermarks (
+    source TEXT PRIMARY KEY,
+    position TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS analytics_user_facts (
+    user_id INTEGER PRIMARY KEY,
+    registered INTEGER NOT NULL DEFAULT 0,
+    cohort_day TEXT,
+    last_activity_date TEXT,
+    tracked INTEGER NOT NULL DEFAULT 0,
+    source_day TEXT,
+    tracked_at TEXT,
+    source TEXT NOT NULL DEFAULT '',
+    medium TEXT NOT NULL DEFAULT '',
+    answered INTEGER NOT NULL DEFAULT 0,
+    ai_used INTEGER NOT NULL DEFAULT 0,
+    trial INTEGER NOT NULL DEFAULT 0,
+    paid INTEGER NOT NULL DEFAULT 0,
+    revenue_rub REAL NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_analytics_facts_cohort_day
+    ON analytics_user_facts(cohort_day);
+CREATE INDEX IF NOT EXISTS idx_analytics_facts_source_day
+    ON analytics_user_facts(source_day);
+CREATE INDEX IF NOT EXISTS idx_analytics_facts_activity
+    ON analytics_user_facts(last_activity_date, registered);
+
+CREATE TABLE IF NOT EXISTS analytics_daily_cohorts (
+    cohort_day TEXT PRIMARY KEY,
+    users INTEGER NOT NULL DEFAULT 0,
+    answered INTEGER NOT NULL DEFAULT 0,
+    ai_used INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS analytics_daily_sources (
+    source_day TEXT NOT NULL,
+    source TEXT NOT NULL,
+    medium TEXT NOT NULL,
+    users INTEGER NOT NULL DEFAULT 0,
+    trials INTEGER NOT NULL DEFAULT 0,
+    paid INTEGER NOT NULL DEFAULT 0,
+    revenue_rub REAL NOT NULL DEFAULT 0,
+    retained_day1 INTEGER NOT NULL DEFAULT 0,
+    retained_day7 INTEGER NOT NULL DEFAULT 0,
+    retained_day30 INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (source_day, source, medium)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_daily_modules (
+    day TEXT NOT NULL,
+    module TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    scored INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, module)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_module_users (
+    module TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (module, user_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS analytics_module_totals (
+    module TEXT PRIMARY KEY,
+    users INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Журналы с монотонным rowid/id (строки не удаляются): таблица -> колонка позиции
+ROWID_SOURCES = {
+    'user_sources': 'id',
+    'conversions': 'id',
+    'attempts': 'rowid',
+}
+
+# Таблицы, из которых строки удаляются (сброс прогресса, чистка старых
+# лимитов): SQLite переиспользует освободившиеся rowid, поэтому позиция —
+# время записи. Из них выставляется только флаг пользователя, так что
+# повторная обработка строк безвредна и окна могут перекрываться.
+# таблица -> (колонка времени, флаг в analytics_user_facts)
+TIME_SOURCES = {
+    'answered_questions': ('timestamp', 'answered'),
+    'user_ai_limits': ('check_date', 'ai_used'),
+}
+# Окно по времени начинается раньше watermark'а: строка могла быть
+# закоммичена позже более новой
+TIME_SOURCE_OVERLAP = '-5 minutes'
+
+# Ключ watermark'а, по которому определяется, что сводки уже построены
+REFRESHED_MARK = 'refreshed_at'
+
+
+# ============================================================
+# ВСПОМОГАТЕЛЬНЫЕ
+# ============================================================
+
+async def _existing_tables(db: aiosqlite.Connection) -> Set[str]:
+    cursor = await db.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def _load_watermarks(db: aiosqlite.Connection) -> Dict[str, str]:
+    cursor = await db.execute("SELECT source, position FROM analytics_rollup_watermarks")
+    return {row[0]: row[1] for row in await cursor.fetchall()}
+
+
+def _collect(rows: Iterable, *targets: Set[str]):
+    """Раскладывает значения RETURNING по множествам затронутых дней."""
+    for row in rows:
+        for value, target in zip(row, targets):
+            if value is not None:
+                target.add(value)
+
+
+async def _rollups_ready(db: aiosqlite.Connection) -> bool:
+    cursor = await db.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='analytics_rollup_watermarks'"
+    )
+    if not await cursor.fetchone():
+        return False
+    cursor = await db.execute(
+        "SELECT 1 FROM analytics_rollup_watermarks WHERE source = ?", (REFRESHED_MARK,)
+    )
+    return await cursor.fetchone() is not None
+
+
+async def _refreshed_at(db: aiosqlite.Connection) -> Optional[str]:
+    cursor = await db.execute(
+        "SELECT position FROM analytics_rollup_watermarks WHERE source = ?", (REFRESHED_MARK,)
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+# ============================================================
+# ОБНОВЛЕНИЕ
+# ============================================================
+
+async def refresh_rollups(database_file: str = DATABASE_FILE) -> Dict[str, int]:
+    """
+    Инкрементально обновляет сводные таблицы.
+
+    Строки сырых таблиц обрабатываются только после watermark'а
+    (id/rowid для журналов, время записи для answered_questions и
+    user_ai_limits, first_seen и дата активности для users).
+    Верхняя граница фиксируется в начале, поэтому строки, вставленные
+    во время обновления, попадут в следующий проход. Журналы читаются
+    порциями по ROLLUP_BATCH_ROWS: каждая порция вместе с пересчетом
+    затронутых дней и новыми watermark'ами — отдельная короткая
+    транзакция, чтобы первичное построение не блокировало запись бота.
+
+    Returns:
+        Сколько строк фактов обновлено из каждого источника.
+    """
+    totals: Counter = Counter()
+
+    async with aiosqlite.connect(database_file) as db:
+        await db.executescript(ROLLUP_SCHEMA)
+        tables = await _existing_tables(db)
+
+        # Снимок верхних границ до начала обработки
+        bounds: Dict[str, Any] = {}
+        for table, column in ROWID_SOURCES.items():
+            if table in tables:
+                cursor = await db.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+                bounds[table] = (await cursor.fetchone())[0]
+        for table, (column, _) in TIME_SOURCES.items():
+            if table in tables:
+                cursor = await db.execute(f"SELECT MAX({column}) FROM {table}")
+                bounds[table] = (await cursor.fetchone())[0]
+
+        include_users = True
+        while True:
+            marks = await _load_watermarks(db)
+            stats, pending = await _refresh_batch(db, tables, marks, bounds, include_users)
+            await db.commit()
+            totals.update(stats)
+            include_users = False
+            if not pending:
+                break
+
+    return dict(totals)
+
+
+async def _refresh_batch(
+    db: aiosqlite.Connection,
+    tables: Set[str],
+    marks: Dict[str, str],
+    bounds: Dict[str, Any],
+    include_users: bool
+):
+    """
+    Одна порция обновления (без commit).
+
+    Returns:
+        (статистика, остались ли необработанные строки до bounds)
+    """
+    stats: Counter = Counter()
+    cohort_days: Set[str] = set()
+    source_days: Set[str] = set()
+    new_marks: Dict[str, str] = {}
+
+    cursor = await db.execute("SELECT date('now'), datetime('now')")
+    today, now = await cursor.fetchone()
+
+    if include_users and 'users' in tables:
+        cursor = await db.execute("SELECT MAX(first_seen) FROM users")
+        max_first_seen = (await cursor.fetchone())[0]
+
+        # Первый проход захватывает и пользователей без first_seen
+        first_seen_mark = marks.get('users.first_seen')
+        if first_seen_mark is None:
+            where, params = "WHERE true", ()
+        else:
+            where, params = "WHERE first_seen >= ?", (first_seen_mark,)
+
+        cursor = await db.execute(f"""
+            INSERT INTO analytics_user_facts (user_id, registered, cohort_day, last_activity_date)
+            SELECT user_id, 1, COALESCE(date(first_seen), ''), last_activity_date
+            FROM users
+            {where}
+            ON CONFLICT(user_id) DO UPDATE SET
+                registered = 1,
+                cohort_day = COALESCE(cohort_day, excluded.cohort_day),
+                last_activity_date = excluded.last_activity_date
+            RETURNING cohort_day, source_day
+        """, params)
+        rows = await cursor.fetchall()
+        _collect(rows, cohort_days, source_days)
+        stats['users'] = len(rows)
+
+        # Активность меняет только retention источников
+        activity_mark = marks.get('users.last_activity_date')
+        if activity_mark is not None:
+            cursor = await db.execute("""
+                UPDATE analytics_user_facts
+                SET last_activity_date = u.last_activity_date
+                FROM users u
+                WHERE u.last_activity_date >= ?
+                  AND u.user_id = analytics_user_facts.user_id
+                  AND analytics_user_facts.last_activity_date IS NOT u.last_activity_date
+                RETURNING source_day
+            """, (activity_mark,))
+            rows = await cursor.fetchall()
+            _collect(rows, source_days)
+            stats['activity'] = len(rows)
+
+        new_marks['users.first_seen'] = max_first_seen or first_seen_mark or ''
+        new_marks['users.last_activity_date'] = today
+
+    windows = {}
+    pending = False
+    for table, column in ROWID_SOURCES.items():
+        if table not in bounds:
+            continue
+        start = int(marks.get(table, 0))
+        windows[table] = (start, min(bounds[table], start + ROLLUP_BATCH_ROWS))
+        new_marks[table] = str(windows[table][1])
+        pending = pending or windows[table][1] < bounds[table]
+
+    for table, (column, flag) in TIME_SOURCES.items():
+        bound = bounds.get(table)
+        if bound is None:
+            continue
+        mark_key = f'{table}.{column}'
+        start = marks.get(mark_key)
+        # Конец окна — ROLLUP_BATCH_ROWS-я строка после watermark'а (индекс по колонке)
+        cursor = await db.execute(
+            f"SELECT {column} FROM {table} WHERE {column} > ? ORDER BY {column} LIMIT 1 OFFSET ?",
+            (start or '', ROLLUP_BATCH_ROWS - 1)
+        )
+        row = await cursor.fetchone()
+        end = min(row[0], bound) if row else bound
+
+        if start is None:
+            # Первый проход захватывает и строки без времени
+            where, params = f"{column} <= ? OR {column} IS NULL", (end,)
+        else:
+            where, params = f"{column} >= datetime(?, ?) AND {column} <= ?", (start, TIME_SOURCE_OVERLAP, end)
+        cursor = await db.execute(f"""
+            INSERT INTO analytics_user_facts (user_id, {flag})
+            SELECT DISTINCT user_id, 1
+            FROM {table}
+            WHERE {where}
+            ON CONFLICT(user_id) DO UPDATE SET {flag} = 1 WHERE {flag} = 0
+            RETURNING cohort_day
+        """, params)
+        rows = await cursor.fetchall()
+        _collect(rows, cohort_days)
+        stats[table] = len(rows)
+        new_marks[mark_key] = end
+        pending = pending or end < bound
+
+    if 'user_sources' in windows:
+        cursor = await db.execute("""
+            INSERT INTO analytics_user_facts (user_id, tracked, source_day, tracked_at, source, medium)
+            SELECT user_id, 1, COALESCE(date(created_at), ''), created_at,
+                   COALESCE(source, ''), COALESCE(medium, '')
+            FROM user_sources
+            WHERE id > ? AND id <= ?
+            ON CONFLICT(user_id) DO UPDATE SET
+                tracked = 1,
+                source_day = excluded.source_day,
+                tracked_at = excluded.tracked_at,
+                source = excluded.source,
+                medium = excluded.medium
+            RETURNING source_day
+        """, windows['user_sources'])
+        rows = await cursor.fetchall()
+        _collect(rows, source_days)
+        stats['user_sources'] = len(rows)
+
+    if 'conversions' in windows:
+        cursor = await db.execute("""
+            INSERT INTO analytics_user_facts (user_id, trial, paid, revenue_rub)
+            SELECT user_id,
+                   MAX(conversion_type = 'trial_purchase'),
+                   MAX(conversion_type = 'subscription_purchase'),
+                   TOTAL(CASE WHEN conversion_type = 'subscription_purchase' THEN value_rub END)
+            FROM conversions
+            WHERE id > ? AND id <= ?
+            GROUP BY user_id
+            ON CONFLICT(user_id) DO UPDATE SET
+                trial = MAX(trial, excluded.trial),
+                paid = MAX(paid, excluded.paid),
+                revenue_rub = revenue_rub + excluded.revenue_rub
+            RETURNING source_day
+        """, windows['conversions'])
+        rows = await cursor.fetchall()
+        _collect(rows, source_days)
+        stats['conversions'] = len(rows)
+
+    if 'attempts' in windows:
+        await db.execute("""
+            INSERT INTO analytics_daily_modules (day, module, attempts, score_sum, scored)
+            SELECT COALESCE(date(created_at), ''), COALESCE(module_type, ''),
+                   COUNT(*), TOTAL(score), COUNT(score)
+            FROM attempts
+            WHERE rowid > ? AND rowid <= ?
+            GROUP BY 1, 2
+            ON CONFLICT(day, module) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                score_sum = score_sum + excluded.score_sum,
+                scored = scored + excluded.scored
+        """, windows['attempts'])
+
+        # Новые пары (модуль, пользователь) — в счетчик уникальных пользователей
+        cursor = await db.execute("""
+            INSERT OR IGNORE INTO analytics_module_users (module, user_id)
+            SELECT DISTINCT COALESCE(module_type, ''), user_id
+            FROM attempts
+            WHERE rowid > ? AND rowid <= ? AND user_id IS NOT NULL
+            RETURNING module
+        """, windows['attempts'])
+        new_users = Counter(row[0] for row in await cursor.fetchall())
+        await db.executemany("""
+            INSERT INTO analytics_module_totals (module, users) VALUES (?, ?)
+            ON CONFLICT(module) DO UPDATE SET users = users + excluded.users
+        """, list(new_users.items()))
+        stats['attempts'] = windows['attempts'][1] - windows['attempts'][0]
+
+    await _rebuild_cohort_days(db, cohort_days)
+    await _rebuild_source_days(db, source_days)
+
+    # Отчеты начинают читать сводки только после полного первичного построения
+    if not pending:
+        new_marks[REFRESHED_MARK] = now
+    await db.executemany("""
+        INSERT INTO analytics_rollup_watermarks (source, position, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source) DO UPDATE SET
+            position = excluded.position,
+            updated_at = excluded.updated_at
+    """, list(new_marks.items()))
+
+    stats['cohort_days'] = len(cohort_days)
+    stats['source_days'] = len(source_days)
+    return stats, pending
+
+
+async def _rebuild_cohort_days(db: aiosqlite.Connection, days: Set[str]):
+    """Пересчитывает строки analytics_daily_cohorts для затронутых дней."""
+    if not days:
+        return
+    days_json = json.dumps(sorted(days))
+    await db.execute(
+        "DELETE FROM analytics_daily_cohorts WHERE cohort_day IN (SELECT value FROM json_each(?))",
+        (days_json,)
+    )
+    await db.execute("""
+        INSERT INTO analytics_daily_cohorts (cohort_day, users, answered, ai_used)
+        SELECT cohort_day, COUNT(*), SUM(answered), SUM(ai_used)
+        FROM analytics_user_facts
+        WHERE cohort_day IN (SELECT value FROM json_each(?)) AND registered = 1
+        GROUP BY cohort_day
+    """, (days_json,))
+
+
+async def _rebuild_source_days(db: aiosqlite.Connection, days: Set[str]):
+    """Пересчитывает строки analytics_daily_sources для затронутых дней."""
+    if not days:
+        return
+    days_json = json.dumps(sorted(days))
+    await db.execute(
+        "DELETE FROM analytics_daily_sources WHERE source_day IN (SELECT value FROM json_each(?))",
+        (days_json,)
+    )
+    await db.execute("""
+        INSERT INTO analytics_daily_sources (
+            source_day, source, medium, users, trials, paid, revenue_rub,
+            retained_day1, retained_day7, retained_day30
+        )
+        SELECT source_day, source, medium,
+               COUNT(*), SUM(trial), SUM(paid), TOTAL(revenue_rub),
+               SUM(CASE WHEN julianday(last_activity_date) - julianday(tracked_at) >= 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN julianday(last_activity_date) - julianday(tracked_at) >= 7 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN julianday(last_activity_date) - julianday(tracked_at) >= 30 THEN 1 ELSE 0 END)
+        FROM analytics_user_facts
+        WHERE source_day IN (SELECT value FROM json_each(?)) AND tracked = 1
+        GROUP BY source_day, source, medium
+    """, (days_json,))
+
+
+# ============================================================
+# ЧТЕНИЕ
+# ============================================================
+
+async def _count_active_subscribers(db: aiosqlite.Connection, tables: Set[str]) -> Dict[str, int]:
+    """Активные подписчики по неделям регистрации (меняются без событий — считаем на лету)."""
+    if 'subscriptions' not in tables:
+        return {}
+    cursor = await db.execute("""
+        SELECT strftime('%Y-W%W', f.cohort_day), COUNT(DISTINCT s.user_id)
+        FROM subscriptions s
+        JOIN analytics_user_facts f ON f.user_id = s.user_id AND f.registered = 1
+        WHERE s.is_active = 1
+        GROUP BY 1
+    """)
+    return {row[0]: row[1] for row in await cursor.fetchall()}
+
+
+async def get_funnel_rollup(database_file: str = DATABASE_FILE) -> Optional[Dict[str, Any]]:
+    """
+    Воронка в формате core.db.get_funnel_stats().
+
+    Returns:
+        None, если сводные таблицы еще не построены.
+    """
+    async with aiosqlite.connect(database_file) as db:
+        if not await _rollups_ready(db):
+            return None
+
+        cursor = await db.execute("""
+            SELECT COALESCE(SUM(users), 0), COALESCE(SUM(answered), 0), COALESCE(SUM(ai_used), 0)
+            FROM analytics_daily_cohorts
+        """)
+        total, answered, ai_used = await cursor.fetchone()
+        subscribers = await _count_active_subscribers(db, await _existing_tables(db))
+
+    data = {
+        'total_users': total,
+        'answered_questions': answered,
+        'used_ai_check': ai_used,
+        'active_subscribers': sum(subscribers.values()),
+    }
+    if total > 0:
+        data['activation_rate'] = round(answered / total * 100, 2)
+        data['ai_usage_rate'] = round(ai_used / total * 100, 2)
+        data['paid_conversion_rate'] = round(data['active_subscribers'] / total * 100, 2)
+    return data
+
+
+async def get_cohort_rollup(weeks: int = 8, database_file: str = DATABASE_FILE) -> Optional[List[Dict[str, Any]]]:
+    """
+    Недельные когорты в формате core.db.get_cohort_stats().
+
+    Returns:
+        None, если сводные таблицы еще не построены.
+    """
+    async with aiosqlite.connect(database_file) as db:
+        if not await _rollups_ready(db):
+            return None
+
+        cursor = await db.execute("""
+            SELECT strftime('%Y-W%W', cohort_day) AS cohort_week,
+                   SUM(users), SUM(answered)
+            FROM analytics_daily_cohorts
+            WHERE cohort_day != ''
+            GROUP BY cohort_week
+            ORDER BY cohort_week DESC
+            LIMIT ?
+        """, (weeks,))
+        rows = await cursor.fetchall()
+        subscribers = await _count_active_subscribers(db, await _existing_tables(db))
+
+    cohorts = []
+    for week, users, answered in rows:
+        paying = subscribers.get(week, 0)
+        cohorts.append({
+            'cohort_week': week,
+            'users': users,
+            'answered_questions': answered,
+            'paying_now': paying,
+            'activation_rate': round(answered * 100.0 / users, 1),
+            'conversion_rate': round(paying * 100.0 / users, 1),
+        })
+    return cohorts
+
+
+async def get_traffic_rollup(
+    days: int = 30,
+    limit: int = 10,
+    database_file: str = DATABASE_FILE
+) -> Optional[Dict[str, Any]]:
+    """
+    Источники трафика за последние days дней (по дню прихода).
+
+    Returns:
+        {'rows': [...], 'refreshed_at': str} или None, если сводки не построены.
+    """
+    async with aiosqlite.connect(database_file) as db:
+        db.row_factory = aiosqlite.Row
+        if not await _rollups_ready(db):
+            return None
+
+        cursor = await db.execute("""
+            SELECT source, medium,
+                   SUM(users) AS total_users,
+                   SUM(trials) AS trial_conversions,
+                   SUM(paid) AS paid_conversions,
+                   TOTAL(revenue_rub) AS total_revenue
+            FROM analytics_daily_sources
+            WHERE source_day >= date('now', ?)
+            GROUP BY source, medium
+            ORDER BY total_users DESC
+            LIMIT ?
+        """, (f'-{days} days', limit))
+        rows = [dict(row) for row in await cursor.fetchall()]
+        return {'rows': rows, 'refreshed_at': await _refreshed_at(db)}
+
+
+async def get_retention_rollup(
+    days: int = 60,
+    limit: int = 5,
+    database_file: str = DATABASE_FILE
+) -> Optional[Dict[str, Any]]:
+    """
+    Retention day 1/7/30 по источникам для пришедших за days дней.
+
+    Returns:
+        {'rows': [...], 'refreshed_at': str} или None, если сводки не построены.
+    """
+    async with aiosqlite.connect(database_file) as db:
+        db.row_factory = aiosqlite.Row
+        if not await _rollups_ready(db):
+            return None
+
+        cursor = await db.execute("""
+            SELECT source,
+                   SUM(users) AS total_users,
+                   SUM(retained_day1) AS retained_day1,
+                   SUM(retained_day7) AS retained_day7,
+                   SUM(retained_day30) AS retained_day30
+            FROM analytics_daily_sources
+            WHERE source_day >= date('now', ?) AND source != ''
+            GROUP BY source
+            ORDER BY total_users DESC
+            LIMIT ?
+        """, (f'-{days} days', limit))
+        rows = [dict(row) for row in await cursor.fetchall()]
+        return {'rows': rows, 'refreshed_at': await _refreshed_at(db)}
+
+
+async def get_global_rollup(
+    modules: List[str] = GLOBAL_STATS_MODULES,
+    database_file: str = DATABASE_FILE
+) -> Optional[Dict[str, Any]]:
+    """
+    Глобальная статистика в формате AdminStats.get_global_stats().
+
+    Returns:
+        None, если сводные таблицы еще не построены.
+    """
+    async with aiosqlite.connect(database_file) as db:
+        if not await _rollups_ready(db):
+            return None
+
+        cursor = await db.execute("SELECT COALESCE(SUM(users), 0) FROM analytics_daily_cohorts")
+        total_users = (await cursor.fetchone())[0]
+
+        cursor = await db.execute("""
+            SELECT COUNT(*) FROM analytics_user_facts
+            WHERE last_activity_date > date('now', '-30 days') AND registered = 1
+        """)
+        active_users = (await cursor.fetchone())[0]
+
+        cursor = await db.execute("""
+            SELECT module, SUM(attempts), TOTAL(score_sum), SUM(scored)
+            FROM analytics_daily_modules
+            GROUP BY module
+        """)
+        totals = {row[0]: row[1:] for row in await cursor.fetchall()}
+
+        cursor = await db.execute("SELECT module, users FROM analytics_module_totals")
+        users_by_module = {row[0]: row[1] for row in await cursor.fetchall()}
+
+    by_module = {}
+    for module in modules:
+        attempts, score_sum, scored = totals.get(module, (0, 0.0, 0))
+        by_module[module] = {
+            'users': users_by_module.get(module, 0),
+            'attempts': attempts or 0,
+            'avg_score': score_sum / scored if scored else 0,
+        }
+
+    return {
+        'total_users': total_users,
+        'active_users': active_users,
+        'total_attempts': sum(row[0] for row in totals.values()),
+        'by_module': by_module,
+    }
+
+
+# ============================================================
+# ПЛАНИРОВЩИК
+# ============================================================
+
+async def refresh_rollups_job(context):
+    """Job: инкрементальное обновление сводных таблиц аналитики."""
+    try:
+        stats = await refresh_rollups()
+        logger.info(f"Analytics rollups refreshed: {stats}")
+    except Exception as e:
+        logger.error(f"Error refreshing analytics rollups: {e}", exc_info=True)
+
+
+def register_analytics_rollup_jobs(application):
+    """Регистрирует периодическое обновление сводных таблиц."""
+    if not application.job_queue:
+        logger.warning("JobQueue недоступен, сводные таблицы аналитики не будут обновляться")
+        return
+
+    application.job_queue.run_repeating(
+        refresh_rollups_job,
+        interval=ROLLUP_INTERVAL,
+        first=60,
+        name='analytics_rollups_refresh'
+    )
+    logger.info(f"Analytics rollups job registered (every {ROLLUP_INTERVAL}s)")
@@ -23,6 +23,7 @@ from api.schemas.flashcards import (
 )
 from flashcards import db as flashcard_db
 from flashcards.sm2 import review_card
+from flashcards.due_queue import record_review
 from flashcards.leaderboard import (
     add_xp, get_user_xp, get_user_rank, get_leaderboard, get_xp_level,
     XP_CARD_CORRECT, XP_CARD_WRONG,
@@ -36,11 +37,11 @@ router = APIRouter()
 @router.get("/decks", response_model=List[DeckWithStatsSchema])
 async def list_decks(user_id: int = Depends(get_current_user_id)):
     """Возвращает список всех колод с прогрессом пользователя."""
-    decks = await flashcard_db.get_all_decks()
+    decks, _ = await flashcard_db.get_decks_overview(user_id)
     result = []
 
     for deck in decks:
-        stats = await flashcard_db.get_deck_stats(user_id, deck['id'])
+        stats = deck['stats']
         result.append(DeckWithStatsSchema(
             id=deck['id'],
             title=deck['title'],
@@ -126,6 +127,7 @@ async def review_card_endpoint(
         next_review=result.next_review.isoformat(),
         is_correct=is_correct,
     )
+    record_review(user_id, card_id, p_deck_id, result.next_review.isoformat())
 
     # XP
     xp = XP_CARD_CORRECT if is_correct else XP_CARD_WRONG
@@ -430,9 +430,16 @@ class AdminStats:
     async def get_global_stats(app) -> Dict[str, Any]:
         """Получение глобальной статистики бота."""
         from core import db
+        from core.db_snapshot import get_snapshot_db
+        from analytics.rollups import get_global_rollup
         
         try:
-            conn = await db.get_db()
+            # Сводные таблицы (analytics.rollups) — если уже построены
+            rollup = await get_global_rollup(database_file=db.DATABASE_FILE)
+            if rollup is not None:
+                return rollup
+
+            conn = await get_snapshot_db()
             
             # Общее количество пользователей
             cursor = await conn.execute("SELECT COUNT(*) FROM users")
@@ -843,6 +850,105 @@ async def cmd_debug_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
+@admin_only
+async def cmd_session_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /session_stats - размер состояния сессий по модулям."""
+    from core.session_state import format_session_metrics, module_sizes
+
+    text = format_session_metrics()
+    own = module_sizes(context.user_data)
+    if own:
+        text += "\n\n<b>Ваша сессия:</b>\n" + "\n".join(
+            f"• {module}: {size / 1024:.1f} КБ" for module, size in sorted(own.items())
+        )
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+
+
+
+@admin_only
+async def cmd_dispatch_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /dispatch_stats - стоимость маршрутизации callback-запросов."""
+    from core.callback_dispatch import format_dispatch_stats
+
+    await update.message.reply_text(format_dispatch_stats(), parse_mode=ParseMode.HTML)
+
+
+@admin_only
+async def cmd_db_snapshot(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /db_snapshot [refresh] - актуальность снимка БД для отчетов."""
+    from core.db_snapshot import format_snapshot_status, refresh_snapshot, snapshot_enabled
+
+    if context.args and context.args[0] == 'refresh' and snapshot_enabled():
+        try:
+            await refresh_snapshot()
+        except Exception as e:
+            logger.error(f"Error refreshing analytics snapshot: {e}")
+
+    await update.message.reply_text(format_snapshot_status(), parse_mode=ParseMode.HTML)
+
+
+@admin_only
+async def cmd_latency(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /latency [handler|db|ai|telegram] - гистограммы задержек."""
+    from core.latency_metrics import format_latency_report
+    from core.telegram_transport import format_transport_report
+
+    family = context.args[0].lower() if context.args else None
+    text = format_latency_report(family)
+    if family in (None, 'telegram'):
+        text += "\n\n" + format_transport_report()
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+
+
+async def _run_profile(bot, chat_id: int, seconds: float, fmt: str):
+    """Фоновая задача /profile: профилирование и отправка файла."""
+    from core.profiler import ProfilerBusyError, profile_loop, render_profile
+
+    try:
+        result = await profile_loop(seconds)
+    except ProfilerBusyError:
+        await bot.send_message(chat_id, "⏳ Профилирование уже запущено, дождитесь результата.")
+        return
+    except Exception as e:
+        logger.error(f"Error profiling event loop: {e}", exc_info=True)
+        await bot.send_message(chat_id, f"❌ Ошибка профилирования: {e}")
+        return
+
+    data, suffix = render_profile(result, fmt)
+    await bot.send_document(
+        chat_id=chat_id,
+        document=io.BytesIO(data),
+        filename=f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{suffix}"
+    )
+    # Сводка отдельным сообщением: подпись к файлу ограничена 1024 символами
+    await bot.send_message(chat_id, result.summary(), parse_mode=ParseMode.HTML)
+
+
+@admin_only
+async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /profile [секунды] [speedscope] - сэмплирующий профиль event loop."""
+    from core.profiler import MAX_PROFILE_SECONDS, profiling_active
+
+    args = context.args or []
+    seconds = 30
+    if args and args[0].isdigit():
+        seconds = max(1, min(int(args[0]), MAX_PROFILE_SECONDS))
+    fmt = 'speedscope' if 'speedscope' in args else 'collapsed'
+
+    if profiling_active():
+        await update.message.reply_text("⏳ Профилирование уже запущено, дождитесь результата.")
+        return
+
+    await update.message.reply_text(
+        f"🔬 Профилирую event loop {seconds} с, файл ({fmt}) придет отдельным сообщением."
+    )
+    # Обновления обрабатываются последовательно: ждать профиль в обработчике нельзя
+    context.application.create_task(
+        _run_profile(context.bot, update.effective_chat.id, seconds, fmt),
+        update=update
+    )
+
+
 @admin_only
 async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Запуск рассылки."""
@@ -854,6 +960,7 @@ async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Получаем всех пользователей
     from core import db
+    from core.progress_reporter import ProgressReporter
     conn = await db.get_db()
     cursor = await conn.execute("SELECT user_id FROM users")
     users = await cursor.fetchall()
@@ -872,6 +979,7 @@ async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Ошибок: 0",
         parse_mode=ParseMode.HTML
     )
+    progress = ProgressReporter(progress_message, parse_mode=ParseMode.HTML)
     
     # Отправляем сообщения
     for i, (user_id,) in enumerate(users, 1):
@@ -899,19 +1007,14 @@ async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.error(f"Broadcast error for user {user_id}: {e}")
             failed += 1
         
-        # Обновляем прогресс каждые 10 сообщений
-        if i % 10 == 0 or i == total:
-            try:
-                await progress_message.edit_text(
-                    f"📨 <b>Рассылка в процессе</b>\n\n"
-                    f"Прогресс: {i}/{total}\n"
-                    f"✅ Отправлено: {sent}\n"
-                    f"❌ Ошибок: {failed}\n"
-                    f"🚫 Заблокировали: {blocked}",
-                    parse_mode=ParseMode.HTML
-                )
-            except:
-                pass
+        # Прогресс: в Telegram уходит не больше одной правки за интервал
+        progress.update(
+            f"📨 <b>Рассылка в процессе</b>\n\n"
+            f"Прогресс: {i}/{total}\n"
+            f"✅ Отправлено: {sent}\n"
+            f"❌ Ошибок: {failed}\n"
+            f"🚫 Заблокировали: {blocked}"
+        )
         
         # Задержка для избежания лимитов
         await asyncio.sleep(0.05)
@@ -921,7 +1024,7 @@ async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("✅ Готово", callback_data="admin:main")]
     ])
     
-    await progress_message.edit_text(
+    await progress.finish(
         f"📨 <b>Рассылка завершена!</b>\n\n"
         f"📊 Статистика:\n"
         f"• Всего пользователей: {total}\n"
@@ -929,8 +1032,7 @@ async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"• ❌ Ошибок: {failed}\n"
         f"• 🚫 Заблокировали бота: {blocked}\n\n"
         f"Успешность: {(sent/total*100):.1f}%",
-        reply_markup=kb,
-        parse_mode=ParseMode.HTML
+        reply_markup=kb
     )
     
     # Очищаем данные рассылки
@@ -965,10 +1067,10 @@ async def handle_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     # Получаем статистику
-    from core import db
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
     from payment.config import SUBSCRIPTION_MODE
     
-    conn = await db.get_db()
+    conn = await get_snapshot_db()
     
     # Общее количество пользователей
     cursor = await conn.execute("SELECT COUNT(*) FROM users")
@@ -1002,6 +1104,8 @@ async def handle_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Выберите действие:"
     )
     
+    text += snapshot_caption()
+
     kb = AdminKeyboards.users_menu()
     await query.edit_message_text(text, reply_markup=kb, parse_mode=ParseMode.HTML)
 
@@ -1019,8 +1123,8 @@ async def users_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     page = context.user_data.get('users_page', 0)
     per_page = 10
     
-    from core import db
-    conn = await db.get_db()
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
+    conn = await get_snapshot_db()
     
     # Получаем общее количество
     cursor = await conn.execute("SELECT COUNT(*) FROM users")
@@ -1047,6 +1151,8 @@ async def users_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text += f"• {name} ({username_str})\n"
         text += f"  ID: <code>{user_id}</code> | Активность: {last_active}\n\n"
     
+    text += snapshot_caption()
+
     # Кнопки навигации
     buttons = []
     nav_buttons = []
@@ -1077,10 +1183,10 @@ async def users_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.warning(f"Failed to answer callback query: {e}")
 
-    from core import db
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
     from payment.config import SUBSCRIPTION_MODE
     
-    conn = await db.get_db()
+    conn = await get_snapshot_db()
     
     if SUBSCRIPTION_MODE == 'modular':
         # Для модульной системы
@@ -1146,6 +1252,8 @@ async def users_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 text += f"  ID: <code>{user_id}</code>\n"
                 text += f"  План: {plan_id} | До: {expires}\n\n"
     
+    text += snapshot_caption()
+
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("⬅️ Назад", callback_data="admin:users")]
     ])
@@ -1782,12 +1890,12 @@ async def activity_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.warning(f"Failed to answer callback query: {e}")
 
-    from core import db
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
     
     text = "📈 <b>Статистика активности</b>\n\n"
     
     try:
-        conn = await db.get_db()
+        conn = await get_snapshot_db()
         
         cursor = await conn.execute("""
             SELECT 
@@ -1815,6 +1923,8 @@ async def activity_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при получении статистики активности: {e}")
         text += "❌ Ошибка при загрузке данных"
     
+    text += snapshot_caption()
+
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔄 Обновить", callback_data="admin:activity_stats")],
         [InlineKeyboardButton("⬅️ Назад", callback_data="admin:stats_menu")]
@@ -1832,12 +1942,12 @@ async def module_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.warning(f"Failed to answer callback query: {e}")
 
-    from core import db
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
     
     text = "📚 <b>Статистика по модулям</b>\n\n"
     
     try:
-        conn = await db.get_db()
+        conn = await get_snapshot_db()
         
         modules = [
             ('task24', '📝 Задание 24'),
@@ -1875,6 +1985,8 @@ async def module_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при получении статистики модулей: {e}")
         text += "❌ Ошибка при загрузке данных"
     
+    text += snapshot_caption()
+
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔄 Обновить", callback_data="admin:module_stats")],
         [InlineKeyboardButton("⬅️ Назад", callback_data="admin:stats_menu")]
@@ -1892,12 +2004,12 @@ async def top_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.warning(f"Failed to answer callback query: {e}")
 
-    from core import db
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
     
     text = "🏆 <b>Топ активных пользователей</b>\n\n"
     
     try:
-        conn = await db.get_db()
+        conn = await get_snapshot_db()
         
         cursor = await conn.execute("""
             SELECT 
@@ -1939,6 +2051,8 @@ async def top_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при получении топа пользователей: {e}")
         text += "❌ Ошибка при загрузке данных"
     
+    text += snapshot_caption()
+
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔄 Обновить", callback_data="admin:top_users")],
         [InlineKeyboardButton("⬅️ Назад", callback_data="admin:stats_menu")]
@@ -1956,13 +2070,13 @@ async def retention_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.warning(f"Failed to answer callback query: {e}")
 
-    from core import db
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
     from datetime import datetime, timedelta
 
     text = "📊 <b>Retention - Удержание пользователей</b>\n\n"
 
     try:
-        conn = await db.get_db()
+        conn = await get_snapshot_db()
 
         # Retention по дням (1, 7, 14, 30 дней)
         periods = [1, 7, 14, 30]
@@ -2019,6 +2133,8 @@ async def retention_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error getting retention stats: {e}")
         text += "❌ Ошибка при загрузке данных"
 
+    text += snapshot_caption()
+
     kb = InlineKeyboardMarkup([
         [
             InlineKeyboardButton("🔄 Обновить", callback_data="admin:retention_stats"),
@@ -2039,13 +2155,13 @@ async def conversion_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.warning(f"Failed to answer callback query: {e}")
 
-    from core import db
+    from core.db_snapshot import get_snapshot_db, snapshot_caption
     from payment.config import SUBSCRIPTION_MODE
 
     text = "🎯 <b>Воронка конверсии</b>\n\n"
 
     try:
-        conn = await db.get_db()
+        conn = await get_snapshot_db()
 
         # Всего пользователей
         cursor = await conn.execute("SELECT COUNT(*) FROM users")
@@ -2104,6 +2220,8 @@ async def conversion_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error getting conversion stats: {e}")
         text += "❌ Ошибка при загрузке данных"
 
+    text += snapshot_caption()
+
     kb = InlineKeyboardMarkup([
         [
             InlineKeyboardButton("🔄 Обновить", callback_data="admin:conversion_stats"),
@@ -5035,6 +5153,11 @@ def register_admin_handlers(app):
     app.add_handler(CallbackQueryHandler(filter_by_date, pattern="^admin:filter_date$"))
     app.add_handler(CallbackQueryHandler(apply_filter, pattern="^admin:filter_apply:"))
     app.add_handler(CommandHandler("debugdata", cmd_debug_data))
+    app.add_handler(CommandHandler("session_stats", cmd_session_stats))
+    app.add_handler(CommandHandler("dispatch_stats", cmd_dispatch_stats))
+    app.add_handler(CommandHandler("db_snapshot", cmd_db_snapshot))
+    app.add_handler(CommandHandler("latency", cmd_latency))
+    app.add_handler(CommandHandler("profile", cmd_profile))
     # Настройки - Цены подписок
     app.add_handler(CallbackQueryHandler(settings_prices, pattern="^admin:settings_prices$"))
     app.add_handler(CallbackQueryHandler(sales_stats, pattern="^admin:sales_stats$"))
@@ -18,6 +18,8 @@ from typing import Dict, Any, Optional, List, Union
 from dataclasses import dataclass
 from enum import Enum
 
+from core.latency_metrics import AI_LATENCY, timed
+
 logger = logging.getLogger(__name__)
 
 
@@ -310,6 +312,7 @@ class ClaudeService:
 
     # ---- Основной метод ----
 
+    @timed(AI_LATENCY, 'claude', 'get_completion')
     async def get_completion(
         self,
         prompt: str,
@@ -580,6 +583,7 @@ class YandexGPTService:
             return self.config.finetuned_model_uri
         return f"gpt://{self.config.folder_id}/{self.config.model.value}"
 
+    @timed(AI_LATENCY, 'yandexgpt', 'get_completion')
     async def get_completion(
         self,
         prompt: str,
@@ -5,7 +5,7 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from typing import Optional, Dict, Any
 from datetime import datetime, timezone
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, PicklePersistence, ContextTypes, PersistenceInput
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, PersistenceInput
 from telegram.constants import ParseMode
 import sys
 import os
@@ -14,6 +14,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core import config, db
+from core.sqlite_persistence import SQLitePersistence, migrate_from_pickle
 from payment import init_payment_module
 
 logger = logging.getLogger(__name__)
@@ -462,6 +463,27 @@ async def post_init(application: Application) -> None:
     except Exception as e:
         logger.error(f"Failed to initialize timezone manager: {e}")
 
+    # Очистка и метрики состояния сессий (context.user_data)
+    try:
+        from core.session_state import register_session_state_jobs
+        register_session_state_jobs(application)
+    except Exception as e:
+        logger.error(f"Failed to schedule session state sweep: {e}")
+
+    # Инкрементальное обновление сводных таблиц админской аналитики
+    try:
+        from analytics.rollups import register_analytics_rollup_jobs
+        register_analytics_rollup_jobs(application)
+    except Exception as e:
+        logger.error(f"Failed to schedule analytics rollups: {e}")
+
+    # Снимок БД только для чтения для отчетов и выгрузок
+    try:
+        from core.db_snapshot import register_snapshot_jobs
+        register_snapshot_jobs(application)
+    except Exception as e:
+        logger.error(f"Failed to schedule analytics snapshot: {e}")
+
     # Регистрация timezone handlers
     try:
         from core.timezone_handlers import register_timezone_handlers
@@ -503,7 +525,21 @@ async def post_init(application: Application) -> None:
                 logger.info(f"✅ Plugin {plugin.title} initialized")
             except Exception as e:
                 logger.error(f"Failed to initialize plugin {plugin.title}: {e}")
-            
+
+    # Индекс callback-обработчиков — после регистрации всех обработчиков
+    try:
+        from core.callback_dispatch import install_callback_index
+        install_callback_index(application)
+    except Exception as e:
+        logger.error(f"Failed to install callback index: {e}")
+
+    # Гистограммы задержек обработчиков — тоже после регистрации всех обработчиков
+    try:
+        from core.latency_metrics import instrument_handlers
+        instrument_handlers(application)
+    except Exception as e:
+        logger.error(f"Failed to instrument handlers: {e}")
+
     logger.info("Post-init завершен")
 
 async def post_shutdown(application: Application) -> None:
@@ -1129,26 +1165,62 @@ async def show_plugin_menu(update: Update, context):
         logger.error(f"Error showing plugin menu: {e}")
         await query.edit_message_text("❌ Ошибка при загрузке меню")
 
-def main():
-    """Главная функция запуска бота"""
-    # Настройка логирования
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO
-    )
-    
-    # Проверка наличия токена
-    if not hasattr(config, 'BOT_TOKEN') or not config.BOT_TOKEN:
-        logger.error("BOT_TOKEN не найден в конфигурации!")
+LEGACY_PICKLE_PERSISTENCE_FILE = "bot_persistence.pickle"
+
+
+def _migrate_legacy_persistence() -> None:
+    """
+    Переносит bot_persistence.pickle в SQLite, если БД persistence еще нет.
+
+    Без переноса бот стартовал бы с пустыми user_data и незаметно потерял
+    состояние пользователей. Если перенос не удался, старт прерывается,
+    а недописанная БД удаляется, чтобы следующий запуск повторил перенос.
+    """
+    db_path = config.PERSISTENCE_DATABASE_FILE
+    if not os.path.exists(LEGACY_PICKLE_PERSISTENCE_FILE) or os.path.exists(db_path):
         return
-    
-    # Создание приложения
+
+    logger.info(f"Найден {LEGACY_PICKLE_PERSISTENCE_FILE} без {db_path}: переносим данные в SQLite")
     try:
-        builder = Application.builder()
-        builder.token(config.BOT_TOKEN)
-        
-        persistence = PicklePersistence(
-            filepath="bot_persistence.pickle",
+        counts = asyncio.run(migrate_from_pickle(LEGACY_PICKLE_PERSISTENCE_FILE, db_path))
+    except Exception as e:
+        for path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(path):
+                os.unlink(path)
+        raise RuntimeError(
+            f"Не удалось перенести {LEGACY_PICKLE_PERSISTENCE_FILE} в {db_path}: {e}. "
+            f"Запустите python scripts/migrate_pickle_persistence.py вручную"
+        ) from e
+
+    logger.info(
+        f"Persistence перенесен в {db_path}: "
+        + ", ".join(f"{kind}={count}" for kind, count in counts.items())
+    )
+
+
+def build_application(
+    token: Optional[str] = None,
+    request=None,
+    get_updates_request=None,
+    persistence=None,
+    application_class=Application
+) -> Application:
+    """
+    Собирает Application бота: persistence, post_init/post_shutdown и HTTP-клиенты.
+
+    Параметры позволяют подменить транспорт Bot API и файлы persistence —
+    так нагрузочный стенд (scripts/load_test.py) запускает настоящее
+    приложение с фейковым Telegram.
+    """
+    builder = Application.builder().application_class(application_class)
+    builder.token(token or config.BOT_TOKEN)
+
+    if persistence is None:
+        _migrate_legacy_persistence()
+
+        # Каждый пользователь/чат — отдельная строка SQLite, пишутся только измененные
+        persistence = SQLitePersistence(
+            config.PERSISTENCE_DATABASE_FILE,
             # Сохраняем данные каждые 30 секунд и при завершении
             update_interval=30,
             # ИСПРАВЛЕНИЕ: Исключаем bot_data из сохранения, т.к. он содержит
@@ -1160,14 +1232,15 @@ def main():
                 callback_data=True   # Сохраняем callback_data
             )
         )
-        builder.persistence(persistence)
-        
-        # Настройка параметров
-        builder.post_init(post_init)
-        builder.post_shutdown(post_shutdown)
-        
-        # Дополнительные настройки
+    builder.persistence(persistence)
+
+    # Настройка параметров
+    builder.post_init(post_init)
+    builder.post_shutdown(post_shutdown)
+
+    if request is None:
         from telegram.request import HTTPXRequest
+        from core.telegram_transport import TelegramTransport
 
         # ИСПРАВЛЕНО: Увеличены timeout для предотвращения TimedOut ошибок
         # Особенно важно при медленном соединении или через прокси
@@ -1183,19 +1256,45 @@ def main():
         if hasattr(config, 'PROXY_URL') and config.PROXY_URL:
             request_kwargs['proxy'] = config.PROXY_URL
 
-        # Создаем HTTP клиент с настройками timeout и retry
-        http_request = HTTPXRequest(**request_kwargs)
-        builder.request(http_request)
+        # Создаем HTTP клиент с настройками timeout и retry: пул, HTTP/2,
+        # склейка правок и пауза по RetryAfter (см. core.telegram_transport)
+        request = TelegramTransport(
+            connection_pool_size=config.TELEGRAM_POOL_SIZE,
+            http2=config.TELEGRAM_HTTP2,
+            max_retry_after=config.TELEGRAM_MAX_RETRY_AFTER,
+            **request_kwargs
+        )
 
-        # Также настраиваем отдельный клиент для get_updates с более длительным timeout
-        # get_updates использует long polling и требует более длинный timeout
-        get_updates_request_kwargs = request_kwargs.copy()
-        get_updates_request_kwargs['read_timeout'] = 90.0  # 90 секунд для long polling
-        get_updates_http_request = HTTPXRequest(**get_updates_request_kwargs)
-        builder.get_updates_request(get_updates_http_request)
-        
-        # Создаем приложение
-        application = builder.build()
+        if get_updates_request is None:
+            # Также настраиваем отдельный клиент для get_updates с более длительным timeout
+            # get_updates использует long polling и требует более длинный timeout
+            get_updates_request_kwargs = request_kwargs.copy()
+            get_updates_request_kwargs['read_timeout'] = 90.0  # 90 секунд для long polling
+            get_updates_request = HTTPXRequest(**get_updates_request_kwargs)
+
+    builder.request(request)
+    if get_updates_request is not None:
+        builder.get_updates_request(get_updates_request)
+
+    return builder.build()
+
+
+def main():
+    """Главная функция запуска бота"""
+    # Настройка логирования
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    
+    # Проверка наличия токена
+    if not hasattr(config, 'BOT_TOKEN') or not config.BOT_TOKEN:
+        logger.error("BOT_TOKEN не найден в конфигурации!")
+        return
+    
+    # Создание приложения
+    try:
+        application = build_application()
         
         logger.info("Запуск бота...")
         
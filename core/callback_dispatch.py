@@ -0,0 +1,359 @@
+"""
+Индексированная маршрутизация callback-запросов.
+
+PTB проверяет callback_query в каждой группе обработчиков по очереди:
+для каждого CallbackQueryHandler выполняется re.match его pattern. При
+сотнях обработчиков почти все проверки заведомо неуспешны — у pattern
+другой литеральный префикс ("^admin:", "^t19_", ...).
+
+install_callback_index() после регистрации всех обработчиков заменяет
+в каждой группе подряд идущие CallbackQueryHandler одним
+IndexedCallbackGroup. Группа строит префиксное дерево по литеральным
+префиксам pattern и проверяет полным regex только тех участников, чей
+префикс совпал с callback_data (плюс участников без префикса). Порядок
+участников сохраняется, поэтому срабатывает тот же обработчик, что и
+при линейном переборе PTB.
+"""
+
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from telegram import Update
+from telegram.ext import BaseHandler, CallbackQueryHandler
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+logger = logging.getLogger(__name__)
+
+# Не объединяем в группу одиночные обработчики — индекс ничего не дает
+MIN_RUN_LENGTH = 2
+
+# Ограничение числа префиксов одного pattern (альтернативы вида (a|b|c)...)
+MAX_PREFIXES_PER_PATTERN = 32
+
+# Сколько последних callback-обновлений учитывается в метрике стоимости
+STATS_WINDOW = 1000
+
+
+# ============================================================
+# ЛИТЕРАЛЬНЫЕ ПРЕФИКСЫ
+# ============================================================
+
+def _items_prefixes(items) -> Tuple[Set[str], bool]:
+    """
+    Литеральные префиксы последовательности узлов sre_parse.
+
+    Returns:
+        (префиксы, complete) — complete=True, если вся последовательность
+        литеральна и после нее можно продолжать наращивать префикс.
+    """
+    prefixes = {''}
+
+    for op, av in items:
+        if op is sre_constants.AT and av is sre_constants.AT_BEGINNING:
+            continue
+
+        if op is sre_constants.LITERAL:
+            variants = {chr(av)}
+        elif op is sre_constants.IN and av and all(sub_op is sre_constants.LITERAL for sub_op, _ in av):
+            variants = {chr(sub_av) for _, sub_av in av}
+        elif op is sre_constants.SUBPATTERN:
+            _group, add_flags, _del_flags, sub_items = av
+            if add_flags & re.IGNORECASE:
+                return prefixes, False
+            variants, complete = _items_prefixes(sub_items)
+            if not complete:
+                return _extend(prefixes, variants), False
+        elif op is sre_constants.BRANCH:
+            variants, complete = set(), True
+            for alternative in av[1]:
+                alternative_prefixes, alternative_complete = _items_prefixes(alternative)
+                variants |= alternative_prefixes
+                complete = complete and alternative_complete
+            if not complete:
+                return _extend(prefixes, variants), False
+        else:
+            return prefixes, False
+
+        extended = _extend(prefixes, variants)
+        if extended is prefixes:
+            return prefixes, False
+        prefixes = extended
+
+    return prefixes, True
+
+
+def _extend(prefixes: Set[str], variants: Set[str]) -> Set[str]:
+    """Декартово произведение префиксов; при переполнении — исходные префиксы."""
+    if len(prefixes) * len(variants) > MAX_PREFIXES_PER_PATTERN:
+        return prefixes
+    return {prefix + variant for prefix in prefixes for variant in variants}
+
+
+def literal_prefixes(pattern: re.Pattern) -> Set[str]:
+    """
+    Множество литеральных префиксов, с одного из которых обязана
+    начинаться строка, чтобы pattern.match() мог совпасть.
+
+    {''} означает, что префикс не определен и проверять нужно всегда.
+    """
+    if pattern.flags & re.IGNORECASE:
+        return {''}
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return {''}
+
+    prefixes, _ = _items_prefixes(list(parsed))
+    return prefixes or {''}
+
+
+# ============================================================
+# ПРЕФИКСНОЕ ДЕРЕВО
+# ============================================================
+
+class PrefixTrie:
+    """Префиксное дерево: строка -> позиции обработчиков, чьи префиксы ее начинают."""
+
+    __slots__ = ('root',)
+
+    _HERE = ''  # ключ списка позиций в узле (символы — строки длины 1)
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def add(self, prefix: str, position: int):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(self._HERE, []).append(position)
+
+    def lookup(self, text: str) -> List[int]:
+        """Позиции всех префиксов, которыми начинается text."""
+        found = []
+        node = self.root
+        if self._HERE in node:
+            found.extend(node[self._HERE])
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            if self._HERE in node:
+                found.extend(node[self._HERE])
+        return found
+
+
+# ============================================================
+# МЕТРИКА СТОИМОСТИ МАРШРУТИЗАЦИИ
+# ============================================================
+
+class DispatchStats:
+    """
+    Сколько проверок check_update сделано на callback-обновление
+    в индексированных группах и сколько сделал бы линейный перебор.
+    """
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.window = window
+        self.recent: 'OrderedDict[int, List[int]]' = OrderedDict()
+        self.total_checked = 0
+        self.total_linear = 0
+        self.fallbacks = 0
+
+    def record(self, update: Update, checked: int, linear: int):
+        self.total_checked += checked
+        self.total_linear += linear
+
+        cost = self.recent.get(update.update_id)
+        if cost is None:
+            self.recent[update.update_id] = [checked, linear]
+            if len(self.recent) > self.window:
+                self.recent.popitem(last=False)
+        else:
+            cost[0] += checked
+            cost[1] += linear
+
+    def snapshot(self) -> Dict:
+        costs = list(self.recent.values())
+        checked = sorted(cost[0] for cost in costs)
+        linear = [cost[1] for cost in costs]
+        count = len(costs)
+        return {
+            'updates': count,
+            'avg_checked': sum(checked) / count if count else 0.0,
+            'p95_checked': checked[min(count - 1, int(count * 0.95))] if count else 0,
+            'max_checked': checked[-1] if count else 0,
+            'avg_linear': sum(linear) / count if count else 0.0,
+            'total_checked': self.total_checked,
+            'total_linear': self.total_linear,
+            'fallbacks': self.fallbacks,
+        }
+
+
+dispatch_stats = DispatchStats()
+
+
+# ============================================================
+# ИНДЕКСИРОВАННАЯ ГРУППА
+# ============================================================
+
+class IndexedCallbackGroup(BaseHandler):
+    """
+    Подряд идущие CallbackQueryHandler одной группы как один обработчик.
+
+    check_update возвращает (участник, результат его check_update) для
+    первого по порядку сработавшего участника; handle_update передает
+    обработку ему.
+    """
+
+    __slots__ = ('handlers', 'trie', 'always', 'stats')
+
+    def __init__(self, handlers: List[CallbackQueryHandler], stats: DispatchStats = dispatch_stats):
+        super().__init__(self._unused_callback, block=handlers[0].block)
+        self.handlers = list(handlers)
+        self.stats = stats
+        self.trie = PrefixTrie()
+        self.always: List[int] = []
+
+        for position, handler in enumerate(self.handlers):
+            pattern = handler.pattern
+            if pattern is None:
+                # Только game_pattern — на строковый callback_data всегда False
+                if handler.game_pattern is None:
+                    self.always.append(position)
+            elif isinstance(pattern, re.Pattern):
+                for prefix in literal_prefixes(pattern):
+                    if prefix:
+                        self.trie.add(prefix, position)
+                    else:
+                        self.always.append(position)
+            else:
+                # type или callable — проверяем всегда
+                self.always.append(position)
+
+    @staticmethod
+    async def _unused_callback(update, context):
+        raise RuntimeError("IndexedCallbackGroup передает обработку участнику")
+
+    def candidates(self, callback_data: str) -> List[int]:
+        """Позиции участников, которых нужно проверить, по порядку регистрации."""
+        return sorted(set(self.trie.lookup(callback_data)).union(self.always))
+
+    def check_update(self, update: object):
+        if not (isinstance(update, Update) and update.callback_query):
+            return None
+
+        callback_data = update.callback_query.data
+        if not (callback_data and isinstance(callback_data, str)):
+            # Игры, пустые и произвольные (arbitrary_callback_data) — как в PTB
+            self.stats.fallbacks += 1
+            for handler in self.handlers:
+                check = handler.check_update(update)
+                if not (check is None or check is False):
+                    return handler, check
+            return None
+
+        checked = 0
+        for position in self.candidates(callback_data):
+            handler = self.handlers[position]
+            checked += 1
+            check = handler.check_update(update)
+            if not (check is None or check is False):
+                self.stats.record(update, checked, position + 1)
+                return handler, check
+
+        self.stats.record(update, checked, len(self.handlers))
+        return None
+
+    async def handle_update(self, update, application, check_result, context):
+        handler, check = check_result
+        return await handler.handle_update(update, application, check, context)
+
+    def __repr__(self) -> str:
+        return f"IndexedCallbackGroup[{len(self.handlers)} handlers]"
+
+
+# ============================================================
+# УСТАНОВКА
+# ============================================================
+
+def _is_indexable(handler: BaseHandler) -> bool:
+    # Подклассы могут переопределять check_update — их не трогаем
+    return type(handler) is CallbackQueryHandler
+
+
+def install_callback_index(application, stats: DispatchStats = dispatch_stats) -> Dict:
+    """
+    Заменяет в application.handlers подряд идущие CallbackQueryHandler
+    (с одинаковым block) на IndexedCallbackGroup.
+
+    Вызывать после регистрации всех обработчиков. Обработчики,
+    добавленные позже, работают как обычно, просто без индекса.
+
+    Returns:
+        Сводка: сколько групп создано и сколько обработчиков проиндексировано.
+    """
+    summary = {'groups': 0, 'indexed': 0, 'unprefixed': 0, 'total_callback_handlers': 0}
+
+    for group, handlers in application.handlers.items():
+        rebuilt = []
+        run: List[CallbackQueryHandler] = []
+
+        def flush_run():
+            if len(run) >= MIN_RUN_LENGTH:
+                indexed = IndexedCallbackGroup(run, stats)
+                rebuilt.append(indexed)
+                summary['groups'] += 1
+                summary['indexed'] += len(run)
+                summary['unprefixed'] += len(indexed.always)
+            else:
+                rebuilt.extend(run)
+            run.clear()
+
+        for handler in handlers:
+            if isinstance(handler, CallbackQueryHandler):
+                summary['total_callback_handlers'] += 1
+            if _is_indexable(handler) and (not run or run[0].block == handler.block):
+                run.append(handler)
+                continue
+            flush_run()
+            if _is_indexable(handler):
+                run.append(handler)
+            else:
+                rebuilt.append(handler)
+        flush_run()
+
+        # Меняем содержимое списка на месте: PTB хранит ссылки на эти списки
+        handlers[:] = rebuilt
+
+    logger.info(
+        f"Callback index: {summary['indexed']} of {summary['total_callback_handlers']} "
+        f"callback handlers in {summary['groups']} indexed groups "
+        f"({summary['unprefixed']} without literal prefix)"
+    )
+    return summary
+
+
+def format_dispatch_stats(stats: DispatchStats = dispatch_stats) -> str:
+    """Текст отчета для администратора (HTML)."""
+    data = stats.snapshot()
+    if not data['updates']:
+        return "🧭 <b>Маршрутизация callback</b>\n\nДанных пока нет."
+
+    saved = 1 - data['total_checked'] / data['total_linear'] if data['total_linear'] else 0.0
+    return "\n".join([
+        "🧭 <b>Маршрутизация callback</b>\n",
+        f"Последних обновлений: {data['updates']}",
+        f"Проверок pattern на обновление: {data['avg_checked']:.1f} в среднем, "
+        f"p95 {data['p95_checked']}, макс. {data['max_checked']}",
+        f"Линейный перебор потребовал бы: {data['avg_linear']:.1f}",
+        f"Сэкономлено проверок: {saved:.0%}",
+        f"Без индекса (игры, нестроковые данные): {data['fallbacks']}",
+    ])
@@ -17,6 +17,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from telegram.constants import ParseMode
 from core.config import DATABASE_FILE
+from core.db_snapshot import connect_snapshot
 from core.hint_manager import HintManager
 from core.admin_tools import admin_only
 
@@ -599,8 +600,8 @@ async def cmd_hints_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
             hints = await hint_manager.get_active_hints(task_type, max_hints=20)
             header = f"📋 <b>Активные подсказки для {task_type}:</b>\n\n"
         else:
-            # Получаем все активные подсказки
-            async with aiosqlite.connect(DATABASE_FILE) as db:
+            # Получаем все активные подсказки (обзорный отчет — по снимку БД)
+            async with connect_snapshot() as db:
                 db.row_factory = aiosqlite.Row
                 cursor = await db.execute(
                     """
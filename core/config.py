@@ -19,7 +19,22 @@ REQUIRED_CHANNEL = os.getenv("REQUIRED_CHANNEL", "@obshestvonapalcah")  # Убе
 QUESTIONS_FILE = os.getenv("QUESTIONS_FILE", "data/questions.json")
 DATABASE_FILE = os.getenv("DATABASE_FILE", "quiz_async.db")
 STORAGE_DATABASE_FILE = os.getenv("STORAGE_DATABASE_FILE", "fsm_storage.db")
+# user_data/chat_data/диалоги бота (core.sqlite_persistence)
+PERSISTENCE_DATABASE_FILE = os.getenv("PERSISTENCE_DATABASE_FILE", "bot_persistence.db")
 REMINDER_INACTIVITY_DAYS = int(os.getenv("REMINDER_INACTIVITY_DAYS", 3))
+# Снимок БД только для чтения для отчетов и выгрузок (core.db_snapshot);
+# интервал в секундах, 0 — отчеты читают живую БД
+ANALYTICS_SNAPSHOT_FILE = os.getenv("ANALYTICS_SNAPSHOT_FILE", f"{DATABASE_FILE}.snapshot")
+ANALYTICS_SNAPSHOT_INTERVAL = int(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", 600))
+# Токен для GET /metrics (core.latency_metrics) и GET /debug/profile (core.profiler)
+# webhook-сервера; пока он не задан, оба эндпоинта отвечают 403
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Исходящие запросы к Bot API (core.telegram_transport): размер пула соединений,
+# HTTP/2 (нужен пакет h2 и прокси, пропускающий HTTP/2) и самая длинная пауза
+# RetryAfter в секундах, после которой запрос повторяется автоматически
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 32))
+TELEGRAM_HTTP2 = os.getenv("TELEGRAM_HTTP2", "True").lower() == "true"
+TELEGRAM_MAX_RETRY_AFTER = int(os.getenv("TELEGRAM_MAX_RETRY_AFTER", 30))
 
 # Дополнительные пути к БД (для совместимости)
 DATABASE_PATH = os.getenv('DATABASE_PATH', DATABASE_FILE)
@@ -57,7 +72,14 @@ __all__ = [
     'DATABASE_FILE',
     'DATABASE_PATH',
     'STORAGE_DATABASE_FILE',
+    'PERSISTENCE_DATABASE_FILE',
     'REMINDER_INACTIVITY_DAYS',
+    'ANALYTICS_SNAPSHOT_FILE',
+    'ANALYTICS_SNAPSHOT_INTERVAL',
+    'METRICS_TOKEN',
+    'TELEGRAM_POOL_SIZE',
+    'TELEGRAM_HTTP2',
+    'TELEGRAM_MAX_RETRY_AFTER',
     'TINKOFF_TERMINAL_KEY',
     'TINKOFF_SECRET_KEY',
     'WEBHOOK_BASE_URL',
@@ -30,8 +30,16 @@ async def get_db() -> aiosqlite.Connection:
     """Возвращает единственное соединение с БД."""
     global _db
     if _db is None:
+        from core.latency_metrics import instrument_db_connection
+
         _db = await aiosqlite.connect(DATABASE_FILE)
         _db.row_factory = aiosqlite.Row
+        # WAL: чтение (в том числе копирование снимка для отчетов,
+        # core.db_snapshot) не блокирует запись. Режим сохраняется в файле БД.
+        # Курсор закрывается сразу: незавершенный PRAGMA держит транзакцию
+        async with _db.execute("PRAGMA journal_mode=WAL"):
+            pass
+        instrument_db_connection(_db)
     return _db
 
 
@@ -390,7 +398,10 @@ async def init_db():
                 (f'idx_{TABLE_ANSWERED}_user_id', TABLE_ANSWERED, 'user_id'),
                 (f'idx_{TABLE_MISTAKES}_question_id', TABLE_MISTAKES, 'question_id'),
                 (f'idx_{TABLE_ANSWERED}_question_id', TABLE_ANSWERED, 'question_id'),
+                # Watermark сводных таблиц аналитики (analytics.rollups)
+                (f'idx_{TABLE_ANSWERED}_timestamp', TABLE_ANSWERED, 'timestamp'),
                 (f'idx_{TABLE_USERS}_last_activity_date', TABLE_USERS, 'last_activity_date'),
+                (f'idx_{TABLE_USERS}_first_seen', TABLE_USERS, 'first_seen'),
                 ('idx_user_ai_limits_date', 'user_ai_limits', 'check_date')
             ]
             
@@ -1766,7 +1777,15 @@ async def get_funnel_stats() -> Dict[str, Any]:
         Словарь со статистикой конверсий
     """
     try:
-        db = await get_db()
+        # Сводные таблицы (analytics.rollups) — если уже построены
+        from analytics.rollups import get_funnel_rollup
+        rollup = await get_funnel_rollup(DATABASE_FILE)
+        if rollup is not None:
+            return rollup
+
+        # Отчетный запрос — по снимку БД, если он есть (core.db_snapshot)
+        from core.db_snapshot import get_snapshot_db
+        db = await get_snapshot_db()
 
         # Проверяем существование view
         cursor = await db.execute(
@@ -1821,7 +1840,14 @@ async def get_cohort_stats(weeks: int = 8) -> List[Dict[str, Any]]:
         Список когорт с метриками
     """
     try:
-        db = await get_db()
+        from analytics.rollups import get_cohort_rollup
+        rollup = await get_cohort_rollup(weeks, DATABASE_FILE)
+        if rollup is not None:
+            return rollup
+
+        # Отчетный запрос — по снимку БД, если он есть (core.db_snapshot)
+        from core.db_snapshot import get_snapshot_db
+        db = await get_snapshot_db()
 
         cursor = await db.execute("""
             SELECT
@@ -0,0 +1,254 @@
+"""
+Снимок основной БД только для чтения — для отчетов и выгрузок.
+
+Тяжелые админские отчеты, аналитика учителя и экспорт обучающих данных
+раньше читали основную БД через то же соединение core.db.get_db(), что и
+живой трафик: длинный скан держал разделяемую блокировку и задерживал
+запись ответов пользователей.
+
+Job раз в ANALYTICS_SNAPSHOT_INTERVAL секунд копирует БД через SQLite
+online backup API во временный файл и атомарно подменяет им снимок
+(ANALYTICS_SNAPSHOT_FILE). Копирование выполняется одним шагом backup,
+то есть одной читающей транзакцией по основной БД. Основная БД работает
+в режиме WAL (включается в core.db.get_db()), поэтому такая транзакция
+не блокирует запись бота — коммиты идут в WAL, а копия остается
+согласованной. В режиме rollback journal шаг держал бы разделяемую
+блокировку на все время копирования. Отчеты читают снимок через
+get_snapshot_db() / connect_snapshot(); если снимка нет или он устарел
+больше чем на SNAPSHOT_MAX_AGE_FACTOR интервалов, запросы идут в живую БД.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import aiosqlite
+
+from core.config import ANALYTICS_SNAPSHOT_FILE, ANALYTICS_SNAPSHOT_INTERVAL, DATABASE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Снимок старше стольких интервалов обновления не используется
+SNAPSHOT_MAX_AGE_FACTOR = 3
+
+
+class SnapshotState:
+    """Состояние снимка и общего читающего соединения."""
+
+    def __init__(self):
+        self.generation = 0
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reader: Optional[aiosqlite.Connection] = None
+        self.reader_generation = -1
+        # Соединения к прошлым снимкам: могут еще использоваться в отчетах,
+        # закрываются при следующей подмене
+        self.retired: List[aiosqlite.Connection] = []
+
+
+_state = SnapshotState()
+
+
+# ============================================================
+# СОСТОЯНИЕ
+# ============================================================
+
+def snapshot_enabled() -> bool:
+    return ANALYTICS_SNAPSHOT_INTERVAL > 0
+
+
+def snapshot_age(path: Optional[str] = None) -> Optional[float]:
+    """Возраст снимка в секундах (по времени изменения файла) или None."""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(path or ANALYTICS_SNAPSHOT_FILE))
+    except OSError:
+        return None
+
+
+def snapshot_usable(path: Optional[str] = None) -> bool:
+    """Снимок включен, существует и не слишком устарел."""
+    if not snapshot_enabled():
+        return False
+    age = snapshot_age(path)
+    return age is not None and age <= ANALYTICS_SNAPSHOT_INTERVAL * SNAPSHOT_MAX_AGE_FACTOR
+
+
+def _snapshot_uri(path: str) -> str:
+    # immutable: снимок не меняется на месте (только подменяется), блокировки не нужны
+    return f"file:{os.path.abspath(path)}?mode=ro&immutable=1"
+
+
+def snapshot_info() -> Dict[str, Any]:
+    """Сводка для администратора."""
+    age = snapshot_age()
+    try:
+        size = os.path.getsize(ANALYTICS_SNAPSHOT_FILE)
+    except OSError:
+        size = None
+    return {
+        'enabled': snapshot_enabled(),
+        'path': ANALYTICS_SNAPSHOT_FILE,
+        'interval': ANALYTICS_SNAPSHOT_INTERVAL,
+        'age': age,
+        'usable': snapshot_usable(),
+        'size': size,
+        'last_duration': _state.last_duration,
+        'last_error': _state.last_error,
+    }
+
+
+def snapshot_caption() -> str:
+    """
+    Подпись об актуальности данных для отчетов (HTML).
+    Пустая строка, если отчет построен по живой БД.
+    """
+    if not snapshot_usable():
+        return ""
+    age = snapshot_age()
+    taken_at = datetime.fromtimestamp(os.path.getmtime(ANALYTICS_SNAPSHOT_FILE))
+    return f"\n<i>📸 Данные на {taken_at:%H:%M} ({int(age // 60)} мин назад)</i>"
+
+
+# ============================================================
+# ЧТЕНИЕ
+# ============================================================
+
+async def get_snapshot_db() -> aiosqlite.Connection:
+    """
+    Общее соединение только для чтения со снимком — аналог core.db.get_db()
+    для отчетов. Если снимок недоступен, возвращает соединение с живой БД.
+    """
+    if not snapshot_usable():
+        from core.db import get_db
+        return await get_db()
+
+    if _state.reader is None or _state.reader_generation != _state.generation:
+        reader = await aiosqlite.connect(_snapshot_uri(ANALYTICS_SNAPSHOT_FILE), uri=True)
+        reader.row_factory = aiosqlite.Row
+
+        for old in _state.retired:
+            await old.close()
+        _state.retired = [_state.reader] if _state.reader is not None else []
+        _state.reader = reader
+        _state.reader_generation = _state.generation
+
+    return _state.reader
+
+
+def connect_snapshot() -> aiosqlite.Connection:
+    """
+    Отдельное соединение со снимком для `async with` (или с живой БД,
+    если снимок недоступен) — для кода, открывающего соединение на вызов.
+    """
+    if snapshot_usable():
+        return aiosqlite.connect(_snapshot_uri(ANALYTICS_SNAPSHOT_FILE), uri=True)
+    return aiosqlite.connect(DATABASE_FILE)
+
+
+# ============================================================
+# ОБНОВЛЕНИЕ
+# ============================================================
+
+async def refresh_snapshot(source: Optional[str] = None, target: Optional[str] = None) -> float:
+    """
+    Копирует source в target через online backup API.
+
+    Копирование идет одним шагом (согласованная копия без перезапусков);
+    запись в source при этом не блокируется, только если source в режиме WAL.
+    Копия пишется во временный файл и подменяет target через os.replace:
+    уже открытые соединения дочитывают прежний снимок.
+
+    Returns:
+        Длительность копирования в секундах.
+    """
+    source = source or DATABASE_FILE
+    target = target or ANALYTICS_SNAPSHOT_FILE
+    temp_path = f"{target}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    started = time.monotonic()
+    try:
+        # Целевое соединение используется из потока aiosqlite
+        destination = sqlite3.connect(temp_path, check_same_thread=False)
+        try:
+            async with aiosqlite.connect(source) as db:
+                await db.backup(destination)
+        finally:
+            destination.close()
+
+        os.replace(temp_path, target)
+    except Exception as e:
+        _state.last_error = str(e)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    duration = time.monotonic() - started
+    _state.generation += 1
+    _state.last_duration = duration
+    _state.last_error = None
+    return duration
+
+
+async def refresh_snapshot_job(context):
+    """Job: обновление снимка БД для отчетов."""
+    try:
+        duration = await refresh_snapshot()
+        logger.info(f"Analytics snapshot refreshed in {duration:.2f}s")
+    except Exception as e:
+        logger.error(f"Error refreshing analytics snapshot: {e}", exc_info=True)
+
+
+async def close_snapshot_db(application=None):
+    """Закрывает читающие соединения снимка (shutdown handler)."""
+    for connection in _state.retired + [_state.reader]:
+        if connection is not None:
+            await connection.close()
+    _state.retired = []
+    _state.reader = None
+    _state.reader_generation = -1
+
+
+def register_snapshot_jobs(application):
+    """Регистрирует периодическое обновление снимка и его закрытие при остановке."""
+    if not snapshot_enabled():
+        logger.info("Analytics snapshot disabled (ANALYTICS_SNAPSHOT_INTERVAL=0), reports read live DB")
+        return
+    if not application.job_queue:
+        logger.warning("JobQueue недоступен, снимок БД для отчетов не будет обновляться")
+        return
+
+    application.job_queue.run_repeating(
+        refresh_snapshot_job,
+        interval=ANALYTICS_SNAPSHOT_INTERVAL,
+        first=5,
+        name='analytics_snapshot_refresh'
+    )
+    application.bot_data.setdefault('custom_shutdown_handlers', []).append(close_snapshot_db)
+    logger.info(f"Analytics snapshot job registered (every {ANALYTICS_SNAPSHOT_INTERVAL}s)")
+
+
+def format_snapshot_status() -> str:
+    """Текст отчета для администратора (HTML)."""
+    info = snapshot_info()
+    if not info['enabled']:
+        return "📸 <b>Снимок БД для отчетов</b>\n\nОтключен: отчеты читают живую БД."
+
+    lines = ["📸 <b>Снимок БД для отчетов</b>\n", f"Файл: <code>{info['path']}</code>"]
+    if info['age'] is None:
+        lines.append("Снимок еще не создан — отчеты читают живую БД.")
+    else:
+        lines.append(f"Возраст: {int(info['age'] // 60)} мин {int(info['age'] % 60)} с")
+        lines.append(f"Размер: {info['size'] / 1024 / 1024:.1f} МБ")
+        if not info['usable']:
+            lines.append("⚠️ Снимок устарел — отчеты читают живую БД.")
+    lines.append(f"Интервал обновления: {info['interval']} с")
+    if info['last_duration'] is not None:
+        lines.append(f"Последнее копирование: {info['last_duration']:.2f} с")
+    if info['last_error']:
+        lines.append(f"❌ Ошибка: {info['last_error']}")
+    return "\n".join(lines)
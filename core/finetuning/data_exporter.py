@@ -18,7 +18,7 @@ from datetime import datetime
 
 import aiosqlite
 
-from core.config import DATABASE_FILE
+from core.db_snapshot import connect_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -51,9 +51,16 @@ class TrainingDataExporter:
         ),
     }
 
-    def __init__(self, db_path: str = DATABASE_FILE):
+    def __init__(self, db_path: Optional[str] = None):
+        # None — читаем снимок БД для отчетов (core.db_snapshot), чтобы
+        # выгрузка не держала блокировку основной БД
         self.db_path = db_path
 
+    def _connect(self) -> aiosqlite.Connection:
+        if self.db_path is None:
+            return connect_snapshot()
+        return aiosqlite.connect(self.db_path)
+
     async def export_training_data(
         self,
         output_dir: str,
@@ -160,7 +167,7 @@ class TrainingDataExporter:
         samples = []
 
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._connect() as db:
                 db.row_factory = aiosqlite.Row
 
                 query = """
@@ -214,7 +221,7 @@ class TrainingDataExporter:
         samples = []
 
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._connect() as db:
                 db.row_factory = aiosqlite.Row
 
                 # Берём оценки из user_feedback, где нет жалоб и оценка высокая
@@ -385,7 +392,7 @@ class TrainingDataExporter:
                 - by_resolution: распределение по типам резолюций
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._connect() as db:
                 db.row_factory = aiosqlite.Row
 
                 # Одобренные жалобы с данными
@@ -6,6 +6,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 from core import db, config
+from core.db_snapshot import get_snapshot_db, snapshot_caption
 
 logger = logging.getLogger(__name__)
 
@@ -136,7 +137,7 @@ async def onboarding_stats_command(update: Update, context: ContextTypes.DEFAULT
         return
 
     try:
-        conn = await db.get_db()
+        conn = await get_snapshot_db()
 
         # Проверяем наличие полей onboarding
         has_onboarding = await db.check_column_exists(conn, 'users', 'onboarding_completed')
@@ -207,6 +208,8 @@ async def onboarding_stats_command(update: Update, context: ContextTypes.DEFAULT
                 count = event[1]
                 text += f"  • {event_type}: {count}\n"
 
+        text += snapshot_caption()
+
         await update.message.reply_text(text, parse_mode='HTML')
 
     except Exception as e:
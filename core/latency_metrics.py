@@ -0,0 +1,379 @@
+"""
+Гистограммы задержек: обработчики PTB, запросы к БД, AI и Telegram API.
+
+StateMonitor хранит последние 100 длительностей только для обработчиков
+с enhanced_validate_state_transition и считает по ним средние. Здесь —
+сквозная инструментация с фиксированными корзинами (как у Prometheus):
+наблюдение стоит один bisect и два инкремента, память не растет с числом
+запросов, а p50/p95/p99 оцениваются по корзинам для каждой метки.
+
+Подключение:
+- instrument_handlers(application) — оборачивает callback всех
+  зарегистрированных обработчиков (вызывается в post_init);
+- instrument_db_connection(conn) — общее соединение core.db.get_db();
+- @timed(AI_LATENCY, service, method) — вызовы AI-сервисов;
+- InstrumentedHTTPXRequest — исходящие запросы к Telegram Bot API (основа
+  core.telegram_transport.TelegramTransport).
+
+Результаты: render_prometheus() (эндпоинт /metrics webhook-сервера)
+и format_latency_report() (админская команда /latency).
+"""
+
+import functools
+import html
+import logging
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiosqlite.context import Result
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин в секундах (последняя корзина — +Inf)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+    0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+# Ограничение числа серий на гистограмму (защита от взрыва меток)
+MAX_SERIES = 500
+OVERFLOW_LABEL = 'other'
+
+
+class LatencyHistogram:
+    """Гистограмма длительностей с фиксированными корзинами по наборам меток."""
+
+    __slots__ = ('name', 'description', 'label_names', 'buckets', '_series')
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # метки -> [счетчики корзин..., счетчик +Inf, сумма секунд]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, seconds: float, labels: Tuple[str, ...]):
+        series = self._series.get(labels)
+        if series is None:
+            if len(self._series) >= MAX_SERIES:
+                labels = (OVERFLOW_LABEL,) * len(self.label_names)
+                series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def time(self, *labels: str) -> '_Timer':
+        """Контекстный менеджер: with HISTOGRAM.time('label'): ..."""
+        return _Timer(self, labels)
+
+    def reset(self):
+        self._series.clear()
+
+    def series(self) -> Dict[Tuple[str, ...], List[float]]:
+        return self._series
+
+    def count(self, labels: Tuple[str, ...]) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def quantile(self, labels: Tuple[str, ...], q: float) -> Optional[float]:
+        """
+        Оценка квантиля по корзинам (линейная интерполяция внутри корзины,
+        как histogram_quantile в Prometheus). None, если наблюдений нет.
+        """
+        series = self._series.get(labels)
+        if not series:
+            return None
+        counts = series[:-1]
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = q * total
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    # В корзине +Inf — верхняя оценка неизвестна
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        """Строки в текстовом формате Prometheus."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        bounds = [_format_float(bound) for bound in self.buckets] + ['+Inf']
+        for labels, series in sorted(self._series.items()):
+            label_text = ','.join(
+                f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, labels)
+            )
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, series[:-1]):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: LatencyHistogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, self.labels)
+        return False
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# ============================================================
+# РЕЕСТР
+# ============================================================
+
+HANDLER_LATENCY = LatencyHistogram(
+    'bot_handler_duration_seconds',
+    'Время выполнения callback обработчика PTB',
+    ('handler',)
+)
+DB_LATENCY = LatencyHistogram(
+    'bot_db_query_duration_seconds',
+    'Время выполнения запроса в общем соединении core.db',
+    ('operation', 'table')
+)
+AI_LATENCY = LatencyHistogram(
+    'bot_ai_request_duration_seconds',
+    'Время запроса к AI-сервису',
+    ('service', 'method')
+)
+TELEGRAM_LATENCY = LatencyHistogram(
+    'bot_telegram_request_duration_seconds',
+    'Время исходящего запроса к Telegram Bot API',
+    ('method',)
+)
+
+HISTOGRAMS: Dict[str, LatencyHistogram] = {
+    'handler': HANDLER_LATENCY,
+    'db': DB_LATENCY,
+    'ai': AI_LATENCY,
+    'telegram': TELEGRAM_LATENCY,
+}
+
+
+def render_prometheus() -> str:
+    """Все гистограммы в текстовом формате Prometheus."""
+    lines: List[str] = []
+    for histogram in HISTOGRAMS.values():
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# ИНСТРУМЕНТАЦИЯ
+# ============================================================
+
+def timed(histogram: LatencyHistogram, *labels: str) -> Callable:
+    """Декоратор корутины: длительность каждого вызова (и неуспешного тоже)."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, labels)
+        return wrapper
+    return decorator
+
+
+def _handler_label(callback: Callable) -> str:
+    module = getattr(callback, '__module__', None) or ''
+    name = getattr(callback, '__qualname__', None) or type(callback).__name__
+    return f"{module}.{name}" if module else name
+
+
+def _wrap_callback(handler) -> bool:
+    callback = getattr(handler, 'callback', None)
+    if callback is None or getattr(callback, '_latency_instrumented', False):
+        return False
+
+    labels = (_handler_label(callback),)
+
+    @functools.wraps(callback)
+    async def instrumented(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, labels)
+
+    instrumented._latency_instrumented = True
+    handler.callback = instrumented
+    return True
+
+
+def _iter_handlers(handlers):
+    """Обработчики с учетом вложенных (ConversationHandler, индексированные группы)."""
+    for handler in handlers:
+        nested = getattr(handler, 'handlers', None)
+        if isinstance(nested, list):
+            # core.callback_dispatch.IndexedCallbackGroup
+            yield from _iter_handlers(nested)
+            continue
+        if hasattr(handler, 'entry_points') and hasattr(handler, 'states'):
+            yield from _iter_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                yield from _iter_handlers(state_handlers)
+            yield from _iter_handlers(handler.fallbacks)
+            continue
+        yield handler
+
+
+def instrument_handlers(application) -> int:
+    """
+    Оборачивает callback всех обработчиков приложения замером времени.
+    Вызывать после регистрации обработчиков; повторный вызов безопасен.
+
+    Returns:
+        Сколько обработчиков обернуто.
+    """
+    wrapped = 0
+    for handlers in application.handlers.values():
+        for handler in _iter_handlers(handlers):
+            if _wrap_callback(handler):
+                wrapped += 1
+    logger.info(f"Latency instrumentation: {wrapped} handler callbacks wrapped")
+    return wrapped
+
+
+_SQL_OPERATION_RE = re.compile(r'^\s*(\w+)')
+_SQL_TABLE_RE = re.compile(
+    r'\b(?:FROM|INTO|UPDATE|TABLE|INDEX\s+\w+\s+ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?["`]?(\w+)',
+    re.IGNORECASE
+)
+
+
+@functools.lru_cache(maxsize=2048)
+def sql_labels(sql: str) -> Tuple[str, str]:
+    """(операция, таблица) для запроса — метки гистограммы БД."""
+    operation = _SQL_OPERATION_RE.match(sql)
+    table = _SQL_TABLE_RE.search(sql)
+    return (
+        operation.group(1).upper() if operation else 'OTHER',
+        table.group(1) if table else '-',
+    )
+
+
+def instrument_db_connection(connection):
+    """
+    Замер execute/executemany соединения aiosqlite. Время — до получения
+    курсора, т.е. выполнение запроса до первой строки результата.
+    """
+    if getattr(connection, '_latency_instrumented', False):
+        return connection
+
+    for method_name in ('execute', 'executemany'):
+        original = getattr(connection, method_name)
+
+        def make_wrapper(original):
+            async def measured(sql, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await original(sql, *args, **kwargs)
+                finally:
+                    DB_LATENCY.observe(time.perf_counter() - started, sql_labels(sql))
+
+            # Result сохраняет оба способа вызова: await conn.execute(...)
+            # и async with conn.execute(...) as cursor
+            @functools.wraps(original)
+            def instrumented(sql, *args, **kwargs):
+                return Result(measured(sql, *args, **kwargs))
+            return instrumented
+
+        setattr(connection, method_name, make_wrapper(original))
+
+    connection._latency_instrumented = True
+    return connection
+
+
+def telegram_method(url: str) -> str:
+    if '/file/bot' in url:
+        return 'file_download'
+    return url.rsplit('/', 1)[-1] or 'unknown'
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest, замеряющий каждый запрос к Bot API по имени метода."""
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, request_data=request_data, **kwargs)
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, (telegram_method(url),))
+
+
+# ============================================================
+# ОТЧЕТ
+# ============================================================
+
+def format_latency_report(family: Optional[str] = None, limit: Optional[int] = None) -> str:
+    """Текст отчета для администратора (HTML): топ серий по числу вызовов."""
+    if family not in HISTOGRAMS:
+        family = None
+    families = [family] if family else list(HISTOGRAMS)
+    # Сводка по всем группам должна уместиться в одно сообщение
+    limit = limit or (25 if family else 6)
+    lines = ["⏱ <b>Задержки (p50 / p95 / p99, мс)</b>"]
+
+    for name in families:
+        histogram = HISTOGRAMS[name]
+        series = sorted(histogram.series(), key=histogram.count, reverse=True)
+        lines.append(f"\n<b>{name}</b> ({len(series)} серий)")
+        if not series:
+            lines.append("  нет данных")
+            continue
+        for labels in series[:limit]:
+            p50, p95, p99 = (histogram.quantile(labels, q) * 1000 for q in (0.5, 0.95, 0.99))
+            label = ' '.join(labels)
+            if len(label) > 48:
+                label = '…' + label[-47:]
+            lines.append(
+                f"<code>{html.escape(label)}</code>\n"
+                f"  {histogram.count(labels)} выз. · {p50:.0f} / {p95:.0f} / {p99:.0f}"
+            )
+
+    if family is None:
+        lines.append("\n<i>/latency handler|db|ai|telegram — подробнее по группе</i>")
+    return "\n".join(lines)
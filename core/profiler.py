@@ -0,0 +1,278 @@
+"""
+Сэмплирующий профайлер event loop бота — включается администратором.
+
+line-profiler и memory-profiler из requirements детерминированные: они
+замедляют каждую строку и для боевого процесса не подходят. Здесь —
+фоновый поток, который каждые SAMPLE_INTERVAL секунд снимает стек потока
+event loop (sys._current_frames) и считает одинаковые стеки. Параллельно
+в loop крутится heartbeat-задача: если поток видит, что heartbeat не
+обновлялся дольше порога, значит loop занят одним callback — стек в этот
+момент записывается как блокировка вместе с ее длительностью.
+
+Результат — collapsed stacks (flamegraph.pl, speedscope, inferno) или
+файл speedscope; запуск — /profile N в админке или GET /debug/profile
+webhook-сервера.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005
+HEARTBEAT_INTERVAL = 0.01
+# Callback, занимающий loop дольше порога, считается блокирующим
+LAG_THRESHOLD = 0.1
+MAX_PROFILE_SECONDS = 300
+MAX_STACK_DEPTH = 128
+MAX_BLOCKING_EVENTS = 50
+
+IDLE_FRAME = '<idle>'
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB_ROOT = sysconfig.get_paths()['stdlib']
+
+Frame = Tuple[str, str, int]
+
+
+class ProfilerBusyError(RuntimeError):
+    """Профилирование уже идет."""
+
+
+@dataclass
+class BlockingEvent:
+    """Отрезок, в течение которого loop не возвращался к heartbeat."""
+    started_at: float
+    duration: float
+    stack: Tuple[Frame, ...]
+
+
+@dataclass
+class ProfileResult:
+    duration: float
+    interval: float
+    stacks: Counter = field(default_factory=Counter)
+    blocking: List[BlockingEvent] = field(default_factory=list)
+    max_lag: float = 0.0
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    @property
+    def idle_samples(self) -> int:
+        return sum(count for stack, count in self.stacks.items() if stack and stack[-1][0] == IDLE_FRAME)
+
+    def collapsed(self) -> str:
+        """Формат collapsed stacks: 'корень;...;лист количество'."""
+        lines = [
+            f"{';'.join(_frame_name(frame) for frame in stack)} {count}"
+            for stack, count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> str:
+        """Файл для https://www.speedscope.app (sampled profile, веса в секундах)."""
+        frame_index: Dict[Frame, int] = {}
+        frames = []
+        samples = []
+        weights = []
+        for stack, count in self.stacks.most_common():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    name, path, line = frame
+                    frames.append({'name': name, 'file': path, 'line': line} if path else {'name': name})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(round(count * self.interval, 6))
+
+        return json.dumps({
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': 'bot event loop',
+            'exporter': 'core.profiler',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': 'event loop thread',
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': round(self.duration, 6),
+                'samples': samples,
+                'weights': weights,
+            }],
+        })
+
+    def summary(self, limit: int = 5) -> str:
+        """Краткий текст для администратора (HTML)."""
+        import html
+
+        samples = self.samples
+        busy = (samples - self.idle_samples) / samples * 100 if samples else 0.0
+        lines = [
+            "🔬 <b>Профиль event loop</b>\n",
+            f"Длительность: {self.duration:.1f} с, сэмплов: {samples}",
+            f"Loop занят: {busy:.0f}%",
+            f"Макс. задержка loop: {self.max_lag * 1000:.0f} мс",
+            f"Блокировок дольше {LAG_THRESHOLD * 1000:.0f} мс: {len(self.blocking)}",
+        ]
+        for event in sorted(self.blocking, key=lambda e: e.duration, reverse=True)[:limit]:
+            # Ближайшие к листу кадры кода бота и библиотек, без машинерии asyncio
+            frames = [frame for frame in event.stack if frame[1] and not frame[1].startswith('asyncio')][-3:]
+            where = " ← ".join(_frame_name(frame) for frame in reversed(frames)) or "?"
+            lines.append(f"\n• {event.duration * 1000:.0f} мс\n<code>{html.escape(where)}</code>")
+        return "\n".join(lines)
+
+
+def _frame_name(frame: Frame) -> str:
+    name, path, line = frame
+    return f"{name} ({path}:{line})" if path else name
+
+
+def _short_path(filename: str) -> str:
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    for root in (_PROJECT_ROOT, _STDLIB_ROOT):
+        if filename.startswith(root + os.sep):
+            return os.path.relpath(filename, root)
+    return filename
+
+
+def _capture_stack(frame) -> Tuple[Frame, ...]:
+    """Стек от корня к листу; ожидание в селекторе — одним кадром <idle>."""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_qualname, _short_path(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+
+    if stack and os.path.basename(stack[-1][1]) == 'selectors.py':
+        # BaseEventLoop._run_once -> selector.select: loop ждет событий
+        return tuple(stack[:-1]) + ((IDLE_FRAME, '', 0),)
+    return tuple(stack)
+
+
+class LoopSampler(threading.Thread):
+    """Поток, сэмплирующий стек потока event loop и следящий за heartbeat."""
+
+    def __init__(self, target_thread_id: int, interval: float, lag_threshold: float):
+        super().__init__(name='loop-profiler', daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.lag_threshold = lag_threshold
+        self.heartbeat = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.blocking: List[BlockingEvent] = []
+        self.max_lag = 0.0
+        self._current_block: Optional[BlockingEvent] = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                return
+            stack = _capture_stack(frame)
+            del frame
+            self.stacks[stack] += 1
+            self._check_lag(stack)
+
+    def _check_lag(self, stack: Tuple[Frame, ...]):
+        now = time.perf_counter()
+        heartbeat = self.heartbeat
+        lag = now - heartbeat
+        block = self._current_block
+
+        if block is not None and block.started_at != heartbeat:
+            # loop вернулся к heartbeat — блокировка закончилась
+            self._current_block = block = None
+
+        self.max_lag = max(self.max_lag, lag)
+        if lag <= self.lag_threshold:
+            return
+        if block is None:
+            if len(self.blocking) >= MAX_BLOCKING_EVENTS:
+                return
+            # Стек в момент обнаружения — тот callback, что держит loop
+            block = self._current_block = BlockingEvent(heartbeat, lag, stack)
+            self.blocking.append(block)
+        else:
+            block.duration = lag
+
+
+_active: Optional[LoopSampler] = None
+
+
+def profiling_active() -> bool:
+    return _active is not None
+
+
+async def profile_loop(
+    seconds: float,
+    interval: float = SAMPLE_INTERVAL,
+    lag_threshold: float = LAG_THRESHOLD
+) -> ProfileResult:
+    """
+    Профилирует текущий event loop в течение seconds секунд.
+    Одновременно может идти только одно профилирование.
+
+    Raises:
+        ProfilerBusyError: профилирование уже запущено.
+    """
+    global _active
+    if _active is not None:
+        raise ProfilerBusyError("Профилирование уже запущено")
+
+    seconds = max(1.0, min(float(seconds), MAX_PROFILE_SECONDS))
+    sampler = LoopSampler(threading.get_ident(), interval, lag_threshold)
+    _active = sampler
+    started = time.perf_counter()
+    sampler.start()
+    logger.info(f"Event loop profiling started for {seconds:.0f}s")
+
+    try:
+        deadline = started + seconds
+        while True:
+            sampler.heartbeat = time.perf_counter()
+            if sampler.heartbeat >= deadline:
+                break
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+    finally:
+        sampler.stop()
+        await asyncio.to_thread(sampler.join)
+        _active = None
+
+    result = ProfileResult(
+        duration=time.perf_counter() - started,
+        interval=interval,
+        stacks=sampler.stacks,
+        blocking=sampler.blocking,
+        max_lag=sampler.max_lag,
+    )
+    logger.info(
+        f"Event loop profiling finished: {result.samples} samples, "
+        f"{len(result.blocking)} blocking callbacks, max lag {result.max_lag * 1000:.0f}ms"
+    )
+    return result
+
+
+def render_profile(result: ProfileResult, fmt: str = 'collapsed') -> Tuple[bytes, str]:
+    """Содержимое файла профиля и расширение имени: 'collapsed' или 'speedscope'."""
+    if fmt == 'speedscope':
+        return result.speedscope().encode('utf-8'), 'speedscope.json'
+    return result.collapsed().encode('utf-8'), 'collapsed.txt'
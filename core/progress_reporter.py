@@ -0,0 +1,171 @@
+"""
+Сообщение о ходе долгой операции: рассылки, проверки варианта, AI-проверки.
+
+Раньше такие сообщения правились по месту — каждые N шагов или по
+таймеру анимации. Правки одинакового текста падали с «message is not
+modified», частые правки упирались во flood control. ProgressReporter
+хранит только последнее желаемое состояние сообщения и отправляет его не
+чаще раза в interval секунд; совпадающее с уже показанным не отправляет.
+finish() показывает итоговое состояние сразу, отбрасывая промежуточные.
+
+    progress = await ProgressReporter.send(message, "⏳ Проверяю...")
+    for i, item in enumerate(items, 1):
+        ...
+        progress.update(f"⏳ Проверено {i} из {len(items)}")
+    await progress.finish("✅ Готово")   # или await progress.delete()
+"""
+
+import asyncio
+import logging
+from typing import Optional, Tuple
+
+from telegram import InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Не чаще одной правки сообщения за столько секунд
+DEFAULT_INTERVAL = 3.0
+
+State = Tuple[str, Optional[InlineKeyboardMarkup]]
+
+
+class ProgressReporter:
+    """Троттлинг и дедупликация правок одного сообщения."""
+
+    def __init__(
+        self,
+        message: Message,
+        interval: float = DEFAULT_INTERVAL,
+        parse_mode: Optional[str] = None
+    ):
+        self.message = message
+        self.interval = interval
+        self.parse_mode = parse_mode
+        self.closed = False
+        # Сколько правок отправлено и сколько состояний свернуто или пропущено
+        self.edits = 0
+        self.skipped = 0
+
+        self._rendered: Optional[State] = (message.text or message.caption or '', message.reply_markup)
+        self._desired: Optional[State] = None
+        self._next_edit = 0.0
+        self._flood_until = 0.0
+        self._finishing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def send(
+        cls,
+        reply_to: Message,
+        text: str,
+        interval: float = DEFAULT_INTERVAL,
+        parse_mode: Optional[str] = None,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> 'ProgressReporter':
+        """Отправляет сообщение о прогрессе в ответ на reply_to."""
+        message = await reply_to.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        reporter = cls(message, interval=interval, parse_mode=parse_mode)
+        # message.text — уже без HTML-разметки, сравниваем с исходным текстом
+        reporter._rendered = (text, reply_markup)
+        reporter._next_edit = asyncio.get_running_loop().time() + interval
+        return reporter
+
+    def update(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """Запоминает желаемое состояние; правка уйдет не раньше чем через interval."""
+        if self.closed:
+            return
+        if self._desired is not None:
+            self.skipped += 1
+        self._desired = (text, reply_markup)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def finish(self, text: Optional[str] = None, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        """
+        Показывает итоговое состояние без ожидания интервала и закрывает репортер.
+
+        Returns:
+            True, если сообщение показывает итоговое состояние.
+        """
+        if self.closed:
+            return False
+        if text is not None:
+            if self._desired is not None:
+                self.skipped += 1
+            self._desired = (text, reply_markup)
+        final = self._desired or self._rendered
+        self._finishing.set()
+
+        if self._task is not None:
+            await self._task
+        elif self._desired is not None:
+            await self._flush()
+        self.closed = True
+        return self._rendered == final
+
+    async def delete(self):
+        """Закрывает репортер и удаляет сообщение (ошибки удаления не важны)."""
+        self.closed = True
+        self._desired = None
+        self._finishing.set()
+        try:
+            await self.message.delete()
+        except TelegramError as e:
+            logger.debug(f"Failed to delete progress message: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._desired is not None and not self.closed:
+                if loop.time() < self._flood_until:
+                    await asyncio.sleep(self._flood_until - loop.time())
+                    continue
+                delay = self._next_edit - loop.time()
+                if delay > 0 and not self._finishing.is_set():
+                    try:
+                        await asyncio.wait_for(self._finishing.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._flush()
+        finally:
+            self._task = None
+
+    async def _flush(self):
+        state, self._desired = self._desired, None
+        if state is None or self.closed:
+            return
+        if state == self._rendered:
+            self.skipped += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        self._next_edit = loop.time() + self.interval
+        text, reply_markup = state
+        try:
+            await self.message.get_bot().edit_message_text(
+                text,
+                chat_id=self.message.chat_id,
+                message_id=self.message.message_id,
+                parse_mode=self.parse_mode,
+                reply_markup=reply_markup
+            )
+            self.edits += 1
+            self._rendered = state
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            self._flood_until = loop.time() + retry_after
+            if self._desired is None:
+                self._desired = state
+        except BadRequest as e:
+            error = str(e).lower()
+            if 'not modified' in error:
+                self._rendered = state
+            elif 'not found' in error or "can't be edited" in error:
+                # Сообщение удалено — дальше править нечего
+                self.closed = True
+            else:
+                logger.debug(f"Progress message edit failed: {e}")
+        except TelegramError as e:
+            logger.debug(f"Progress message edit failed: {e}")
@@ -3,13 +3,18 @@ Middleware для автоматического отслеживания кли
 
 Этот middleware работает прозрачно для всех существующих callback-кнопок:
 - Проверяет, было ли недавно отправлено retention уведомление пользователю
+  (по индексу в памяти, без запроса в БД)
 - При первом клике по любой кнопке логирует клик в notification_log
+  (пачками, раз в CLICK_FLUSH_INTERVAL секунд)
 - Не требует изменения существующих кнопок
 """
 
+import asyncio
 import logging
+import time
 import aiosqlite
 from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -17,75 +22,156 @@ from core.db import DATABASE_FILE
 
 logger = logging.getLogger(__name__)
 
+# Клик засчитывается уведомлению, отправленному не раньше чем столько назад
+CLICK_WINDOW = timedelta(days=7)
+
+# Как часто клики пишутся в notification_log (секунды)
+CLICK_FLUSH_INTERVAL = 30
+
 
 class RetentionClickTracker:
     """Трекер кликов по retention уведомлениям"""
 
     def __init__(self, database_file: str = DATABASE_FILE):
         self.database_file = database_file
-        # Кэш для избежания повторных запросов в БД
-        self._tracked_users = set()  # user_id, которые уже кликнули в текущей сессии
+        # user_id -> время (epoch) последнего неоткликнутого уведомления за CLICK_WINDOW.
+        # Остальные пользователи в БД не проверяются вовсе.
+        self._pending: Dict[int, float] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        # Клики, еще не записанные в БД: (user_id, clicked_at)
+        self._clicks: List[Tuple[int, str]] = []
+
+    async def load_pending(self) -> int:
+        """
+        Загружает пользователей с неоткликнутыми уведомлениями за CLICK_WINDOW
+        одним запросом. Возвращает их количество.
+        """
+        async with self._load_lock:
+            # Индекс уже загрузил другой вызов, пока этот ждал блокировку:
+            # повторная загрузка вернула бы в индекс уже засчитанные клики
+            if self._loaded:
+                return len(self._pending)
+            try:
+                async with aiosqlite.connect(self.database_file) as db:
+                    cursor = await db.execute("""
+                        SELECT user_id, MAX(sent_at)
+                        FROM notification_log
+                        WHERE clicked = 0
+                          AND sent_at > datetime('now', ?)
+                        GROUP BY user_id
+                    """, (f'-{CLICK_WINDOW.days} days',))
+                    rows = await cursor.fetchall()
+            except Exception as e:
+                # Не повторяем запрос на каждом callback — индекс пополнится отправками
+                logger.error(f"Error loading pending retention notifications: {e}")
+                self._loaded = True
+                return len(self._pending)
+
+            for user_id, sent_at in rows:
+                sent_ts = _parse_timestamp(sent_at)
+                # Уведомления, отправленные после старта загрузки, уже в индексе
+                self._pending[user_id] = max(sent_ts, self._pending.get(user_id, 0.0))
+            self._loaded = True
+
+        logger.info(f"Retention click tracker: {len(self._pending)} users with pending notifications")
+        return len(self._pending)
+
+    def mark_notification_sent(self, user_id: int, sent_at: Optional[datetime] = None):
+        """Добавляет пользователя в индекс после отправки retention уведомления."""
+        sent_ts = sent_at.timestamp() if sent_at else time.time()
+        self._pending[user_id] = max(sent_ts, self._pending.get(user_id, 0.0))
+
+    def has_pending(self, user_id: int) -> bool:
+        """Есть ли у пользователя неоткликнутое уведомление за CLICK_WINDOW."""
+        sent_ts = self._pending.get(user_id)
+        if sent_ts is None:
+            return False
+        if time.time() - sent_ts > CLICK_WINDOW.total_seconds():
+            self._pending.pop(user_id, None)
+            return False
+        return True
 
     async def track_click_if_needed(self, user_id: int) -> bool:
         """
         Проверяет и логирует клик по retention уведомлению.
 
+        В БД ничего не читается: решение принимается по индексу в памяти,
+        а сам клик ставится в очередь и записывается в flush_clicks().
+
         Args:
             user_id: ID пользователя
 
         Returns:
-            True если клик был залогирован
+            True если клик был засчитан
         """
-        # Проверяем кэш - не отслеживаем повторно в той же сессии
-        if user_id in self._tracked_users:
+        if not self._loaded:
+            await self.load_pending()
+
+        if not self.has_pending(user_id):
             return False
 
+        self._pending.pop(user_id, None)
+        self._clicks.append((user_id, datetime.now(timezone.utc).isoformat()))
+        logger.info(f"Tracked retention notification click: user_id={user_id}")
+        return True
+
+    async def flush_clicks(self) -> int:
+        """
+        Записывает накопленные клики одной транзакцией: у каждого
+        пользователя отмечается последнее неоткликнутое уведомление.
+
+        Returns:
+            Количество записанных кликов
+        """
+        if not self._clicks:
+            return 0
+
+        clicks, self._clicks = self._clicks, []
         try:
             async with aiosqlite.connect(self.database_file) as db:
-                # Ищем последнее неоткликнутое retention уведомление за последние 7 дней
-                cursor = await db.execute("""
-                    SELECT id, sent_at
-                    FROM notification_log
-                    WHERE user_id = ?
-                      AND clicked = 0
-                      AND sent_at > datetime('now', '-7 days')
-                    ORDER BY sent_at DESC
-                    LIMIT 1
-                """, (user_id,))
-
-                notification = await cursor.fetchone()
-
-                if not notification:
-                    return False
-
-                notification_id, sent_at = notification
-
-                # Логируем клик
-                await db.execute("""
+                await db.executemany("""
                     UPDATE notification_log
                     SET clicked = 1, clicked_at = ?
-                    WHERE id = ?
-                """, (datetime.now(timezone.utc).isoformat(), notification_id))
-
+                    WHERE id = (
+                        SELECT id FROM notification_log
+                        WHERE user_id = ?
+                          AND clicked = 0
+                          AND sent_at > datetime('now', ?)
+                        ORDER BY sent_at DESC
+                        LIMIT 1
+                    )
+                """, [
+                    (clicked_at, user_id, f'-{CLICK_WINDOW.days} days')
+                    for user_id, clicked_at in clicks
+                ])
                 await db.commit()
+        except Exception as e:
+            logger.error(f"Error flushing retention clicks: {e}", exc_info=True)
+            # Вернем клики в очередь — попробуем при следующем сбросе
+            self._clicks = clicks + self._clicks
+            return 0
 
-                # Добавляем в кэш
-                self._tracked_users.add(user_id)
-
-                logger.info(
-                    f"Tracked retention notification click: user_id={user_id}, "
-                    f"notification_id={notification_id}, sent_at={sent_at}"
-                )
+        logger.debug(f"Flushed {len(clicks)} retention clicks")
+        return len(clicks)
 
-                return True
+    def clear_cache(self):
+        """Удаляет из индекса уведомления старше CLICK_WINDOW"""
+        cutoff = time.time() - CLICK_WINDOW.total_seconds()
+        expired = [user_id for user_id, sent_ts in self._pending.items() if sent_ts < cutoff]
+        for user_id in expired:
+            del self._pending[user_id]
 
-        except Exception as e:
-            logger.error(f"Error tracking retention click for user {user_id}: {e}", exc_info=True)
-            return False
 
-    def clear_cache(self):
-        """Очищает кэш отслеженных пользователей"""
-        self._tracked_users.clear()
+def _parse_timestamp(value) -> float:
+    """sent_at из notification_log (isoformat или str(datetime)) -> epoch."""
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return time.time()
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
 
 
 # Глобальный экземпляр трекера
@@ -131,7 +217,7 @@ async def retention_click_middleware(update: Update, context: ContextTypes.DEFAU
 
 async def reset_retention_click_cache(context: ContextTypes.DEFAULT_TYPE):
     """
-    Периодическая очистка кэша отслеженных кликов.
+    Периодическая очистка индекса от устаревших уведомлений.
 
     Запускается раз в час через Job Queue.
     """
@@ -140,6 +226,20 @@ async def reset_retention_click_cache(context: ContextTypes.DEFAULT_TYPE):
     logger.debug("Retention click tracker cache cleared")
 
 
+async def flush_retention_clicks(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическая запись накопленных кликов в notification_log."""
+    await get_retention_click_tracker().flush_clicks()
+
+
+async def load_retention_click_index(context: ContextTypes.DEFAULT_TYPE):
+    """Загрузка индекса неоткликнутых уведомлений при старте."""
+    await get_retention_click_tracker().load_pending()
+
+
+async def _flush_on_shutdown(application):
+    await get_retention_click_tracker().flush_clicks()
+
+
 def register_retention_click_middleware(application):
     """
     Регистрирует middleware для автоматического отслеживания кликов.
@@ -156,6 +256,21 @@ def register_retention_click_middleware(application):
         group=-2
     )
 
+    # Индекс неоткликнутых уведомлений — одним запросом сразу после старта
+    application.job_queue.run_once(
+        load_retention_click_index,
+        when=0,
+        name='retention_click_index_load'
+    )
+
+    # Клики пишутся в БД пачками
+    application.job_queue.run_repeating(
+        flush_retention_clicks,
+        interval=CLICK_FLUSH_INTERVAL,
+        first=CLICK_FLUSH_INTERVAL,
+        name='retention_click_flush'
+    )
+
     # Добавляем периодическую очистку кэша (каждый час)
     application.job_queue.run_repeating(
         reset_retention_click_cache,
@@ -164,4 +279,9 @@ def register_retention_click_middleware(application):
         name='retention_click_cache_cleanup'
     )
 
-    logger.info("Retention click middleware registered (group=-2) with hourly cache cleanup")
+    # Незаписанные клики сохраняем при остановке
+    if 'custom_shutdown_handlers' not in application.bot_data:
+        application.bot_data['custom_shutdown_handlers'] = []
+    application.bot_data['custom_shutdown_handlers'].append(_flush_on_shutdown)
+
+    logger.info("Retention click middleware registered (group=-2) with batched click logging")
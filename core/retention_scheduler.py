@@ -203,6 +203,10 @@ class RetentionScheduler:
 
             await db.commit()
 
+        # Пользователь попадает в индекс ожидаемых кликов (retention_click_middleware)
+        from core.retention_click_middleware import get_retention_click_tracker
+        get_retention_click_tracker().mark_notification_sent(user_id)
+
     def extract_promo_code(self, text: str) -> Optional[str]:
         """Извлекает промокод из текста уведомления"""
         import re
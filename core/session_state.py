@@ -0,0 +1,422 @@
+# core/session_state.py
+"""
+Ограничение размера состояния пользователя в context.user_data.
+
+Ключи user_data группируются по модулям (пространства имен по префиксам
+ключей, см. MODULE_KEY_PREFIXES). Для каждого пользователя действует
+бюджет в байтах; периодическая задача sweep_session_state():
+- удаляет ключи с истекшим TTL (временные данные: тексты, пакеты проверки);
+- при превышении бюджета удаляет временные ключи в порядке истечения;
+  истории результатов (task19_results, scores_history и т.п.) — это
+  прогресс пользователя, они не удаляются и не обрезаются: пользователь
+  сверх бюджета только отмечается в метриках (over_budget);
+- собирает метрики размера состояния по модулям (/session_stats).
+
+Крупные значения (варианты, результаты пакетной проверки) модули
+сохраняют через put_blob()/get_blob(): значение уходит в таблицу
+session_blobs, а в user_data остается короткая ссылка.
+"""
+
+import logging
+import pickle
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import db
+from core.sqlite_persistence import SQLitePersistence
+
+logger = logging.getLogger(__name__)
+
+# Бюджет состояния одного пользователя, байт (в сериализованном виде)
+USER_BUDGET_BYTES = 64 * 1024
+# Значения крупнее выносятся в БД при сохранении через put_blob()
+BLOB_THRESHOLD_BYTES = 4 * 1024
+# Вынесенные значения без своего TTL удаляются через 30 дней
+BLOB_DEFAULT_TTL = 30 * 24 * 3600
+# Период задачи очистки, секунды
+SWEEP_INTERVAL = 15 * 60
+
+# Служебный ключ user_data: {ключ: время истечения (unix)}
+EXPIRES_KEY = '_session_expires'
+# Метка ссылки на вынесенное в БД значение
+BLOB_REF_KEY = '__session_blob__'
+
+# Пространства имен модулей: префиксы (или точные имена) ключей
+MODULE_KEY_PREFIXES: List[Tuple[str, Tuple[str, ...]]] = [
+    ('task19', ('task19_', 't19_')),
+    ('task20', ('task20_', 't20_')),
+    ('task21', ('task21_', 't21_')),
+    ('task22', ('task22_', 't22_')),
+    ('task23', ('task23_', 't23_')),
+    ('task24', ('task24_', 't24_', 'practiced_topics', 'scores_history', 'last_plan_result')),
+    ('task25', ('task25_', 't25_')),
+    ('full_exam', ('fe_',)),
+    ('teacher_mode', ('vc_', 'qc_', 'assignment_', 'browser_', 'custom_questions',
+                      'current_homework', 'selected_students', 'question_ids_by_exam',
+                      'mixed_modules', 'pending_teacher_')),
+    ('test_part', ('exam_', 'mistake', 'test_questions_', 'questions_')),
+]
+CORE_MODULE = 'core'
+
+# TTL по умолчанию для временных ключей, которые модули пишут напрямую.
+# Отсчитывается от первого прохода очистки, увидевшего ключ.
+TRANSIENT_KEY_TTL: Dict[str, int] = {
+    'document_text': 3600,
+    'qc_source_text': 3600,
+    'qc_condition_image': 3600,
+    '_ocr_answer': 3600,
+    'vc_student_answers': 24 * 3600,
+    'vc_results': 24 * 3600,
+    'qc_bulk_answers': 24 * 3600,
+    'last_plan_result': 24 * 3600,
+    't19_last_feedback': 24 * 3600,
+}
+
+_blobs_table_ready = False
+# Метрики последнего прохода очистки
+_last_metrics: Dict[str, Any] = {}
+
+
+def module_of(key: str) -> str:
+    """Модуль, которому принадлежит ключ user_data."""
+    for module, prefixes in MODULE_KEY_PREFIXES:
+        if key.startswith(prefixes):
+            return module
+    return CORE_MODULE
+
+
+def value_size(value: Any) -> int:
+    """Размер значения в сериализованном виде (как его сохранит persistence)."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def state_sizes(user_data: dict) -> Dict[str, int]:
+    """Размер состояния пользователя по ключам, байт."""
+    return {key: value_size(value) for key, value in user_data.items()}
+
+
+def module_sizes(user_data: dict) -> Dict[str, int]:
+    """Размер состояния пользователя по модулям, байт."""
+    sizes: Dict[str, int] = {}
+    for key, size in state_sizes(user_data).items():
+        module = module_of(key)
+        sizes[module] = sizes.get(module, 0) + size
+    return sizes
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and BLOB_REF_KEY in value
+
+
+# ──────────────────────────────────────────────────────────────
+# Ключи с TTL
+# ──────────────────────────────────────────────────────────────
+
+def put(user_data: dict, key: str, value: Any, ttl: Optional[int] = None):
+    """Сохраняет значение; с ttl — удаляется через ttl секунд."""
+    user_data[key] = value
+    if ttl is not None:
+        user_data.setdefault(EXPIRES_KEY, {})[key] = time.time() + ttl
+    elif key in user_data.get(EXPIRES_KEY, {}):
+        del user_data[EXPIRES_KEY][key]
+
+
+def get(user_data: dict, key: str, default: Any = None) -> Any:
+    """Значение ключа; истекшие ключи удаляются и не возвращаются."""
+    expires_at = user_data.get(EXPIRES_KEY, {}).get(key)
+    if expires_at is not None and expires_at <= time.time():
+        _drop(user_data, key)
+        return default
+    return user_data.get(key, default)
+
+
+def _drop(user_data: dict, key: str) -> Any:
+    user_data.get(EXPIRES_KEY, {}).pop(key, None)
+    return user_data.pop(key, None)
+
+
+# ──────────────────────────────────────────────────────────────
+# Вынос крупных значений в БД
+# ──────────────────────────────────────────────────────────────
+
+async def _ensure_blobs_table(conn):
+    global _blobs_table_ready
+    if _blobs_table_ready:
+        return
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_blobs (
+            blob_id TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_session_blobs_expires ON session_blobs(expires_at)"
+    )
+    await conn.commit()
+    _blobs_table_ready = True
+
+
+async def put_blob(user_data: dict, key: str, value: Any, ttl: Optional[int] = None):
+    """
+    Сохраняет значение; крупное (> BLOB_THRESHOLD_BYTES) — в таблицу session_blobs.
+
+    В user_data в этом случае остается ссылка {BLOB_REF_KEY: id, 'size': n}.
+    Читать такие ключи нужно через get_blob().
+    """
+    await pop_blob(user_data, key)
+
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) <= BLOB_THRESHOLD_BYTES:
+        put(user_data, key, value, ttl)
+        return
+
+    blob_id = uuid.uuid4().hex
+    expires_at = time.time() + (ttl if ttl is not None else BLOB_DEFAULT_TTL)
+    conn = await db.get_db()
+    await _ensure_blobs_table(conn)
+    await conn.execute(
+        "INSERT INTO session_blobs (blob_id, data, expires_at) VALUES (?, ?, ?)",
+        (blob_id, data, expires_at)
+    )
+    await conn.commit()
+    put(user_data, key, {BLOB_REF_KEY: blob_id, 'size': len(data)}, ttl)
+
+
+async def get_blob(user_data: dict, key: str, default: Any = None) -> Any:
+    """Значение, сохраненное через put_blob()."""
+    value = get(user_data, key, default)
+    if not is_blob_ref(value):
+        return value
+
+    conn = await db.get_db()
+    await _ensure_blobs_table(conn)
+    cursor = await conn.execute(
+        "SELECT data FROM session_blobs WHERE blob_id = ?", (value[BLOB_REF_KEY],)
+    )
+    row = await cursor.fetchone()
+    if row is None:
+        # Значение удалено по сроку хранения
+        _drop(user_data, key)
+        return default
+    return pickle.loads(row[0])
+
+
+async def pop_blob(user_data: dict, key: str, default: Any = None) -> Any:
+    """Удаляет ключ вместе с вынесенным значением (без его загрузки)."""
+    value = _drop(user_data, key)
+    if not is_blob_ref(value):
+        return default if value is None else value
+    await delete_blobs([value[BLOB_REF_KEY]])
+    return default
+
+
+async def delete_blobs(blob_ids: List[str]):
+    if not blob_ids:
+        return
+    conn = await db.get_db()
+    await _ensure_blobs_table(conn)
+    await conn.executemany(
+        "DELETE FROM session_blobs WHERE blob_id = ?", [(blob_id,) for blob_id in blob_ids]
+    )
+    await conn.commit()
+
+
+async def purge_expired_blobs() -> int:
+    """Удаляет вынесенные значения с истекшим сроком (в т.ч. потерянные ссылки)."""
+    conn = await db.get_db()
+    await _ensure_blobs_table(conn)
+    cursor = await conn.execute("DELETE FROM session_blobs WHERE expires_at <= ?", (time.time(),))
+    await conn.commit()
+    return cursor.rowcount
+
+
+# ──────────────────────────────────────────────────────────────
+# Соблюдение бюджета
+# ──────────────────────────────────────────────────────────────
+
+def compact(user_data: dict, budget: int = USER_BUDGET_BYTES,
+            now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Удаляет истекшие ключи и приводит состояние к бюджету.
+
+    Returns:
+        dict: freed (байт), dropped (удаленные ключи), scheduled (ключи,
+        получившие TTL по умолчанию), blob_ids (ссылки удаленных ключей — удалить из БД),
+        sizes (размеры оставшихся ключей), size (итоговый размер),
+        over_budget (бюджет не достигнут)
+    """
+    now = time.time() if now is None else now
+    result = {'freed': 0, 'dropped': [], 'scheduled': [], 'blob_ids': [],
+              'size': 0, 'over_budget': False}
+    expires = user_data.get(EXPIRES_KEY)
+    if expires is None:
+        expires = user_data[EXPIRES_KEY] = {}
+
+    # TTL по умолчанию для временных ключей, записанных напрямую
+    for key, ttl in TRANSIENT_KEY_TTL.items():
+        if key in user_data and key not in expires:
+            expires[key] = now + ttl
+            result['scheduled'].append(key)
+    for key in [k for k in expires if k not in user_data]:
+        del expires[key]
+
+    sizes = state_sizes(user_data)
+
+    def drop(key):
+        value = _drop(user_data, key)
+        if is_blob_ref(value):
+            result['blob_ids'].append(value[BLOB_REF_KEY])
+        result['freed'] += sizes.pop(key, 0)
+        result['dropped'].append(key)
+
+    for key, expires_at in list(expires.items()):
+        if expires_at <= now:
+            drop(key)
+
+    # Временные ключи — в порядке истечения срока
+    for key, _ in sorted(expires.items(), key=lambda item: item[1]):
+        if sum(sizes.values()) <= budget:
+            break
+        drop(key)
+
+    if not expires:
+        user_data.pop(EXPIRES_KEY, None)
+    result['sizes'] = sizes
+    result['size'] = sum(sizes.values())
+    result['over_budget'] = result['size'] > budget
+    return result
+
+
+async def sweep_session_state(context) -> Dict[str, Any]:
+    """
+    Задача JobQueue: очистка состояния всех пользователей и сбор метрик
+    по модулям.
+
+    Пользователи из application.user_data очищаются в памяти. Данные
+    остальных (persistence загружает их лениво) читаются из БД по одному
+    и, если они изменились, записываются обратно — в память они не попадают.
+    """
+    global _last_metrics
+    application = context.application
+    persistence = application.persistence
+    started = time.perf_counter()
+
+    modules: Dict[str, Dict[str, int]] = {}
+    changed_users, blob_ids = [], []
+    totals = {'users': 0, 'bytes': 0, 'max_user_bytes': 0, 'over_budget': 0,
+              'freed': 0, 'stored_users': 0}
+
+    def account(user_id: int, result: Dict[str, Any]):
+        blob_ids.extend(result['blob_ids'])
+
+        totals['users'] += 1
+        totals['bytes'] += result['size']
+        totals['freed'] += result['freed']
+        totals['max_user_bytes'] = max(totals['max_user_bytes'], result['size'])
+        if result['over_budget']:
+            totals['over_budget'] += 1
+            logger.warning(f"User {user_id} session state {result['size']} bytes exceeds budget")
+
+        user_modules: Dict[str, int] = {}
+        for key, size in result['sizes'].items():
+            module = module_of(key)
+            user_modules[module] = user_modules.get(module, 0) + size
+        for module, size in user_modules.items():
+            stats = modules.setdefault(module, {'users': 0, 'bytes': 0, 'max_bytes': 0})
+            stats['users'] += 1
+            stats['bytes'] += size
+            stats['max_bytes'] = max(stats['max_bytes'], size)
+
+    for user_id, user_data in list(application.user_data.items()):
+        if not user_data:
+            continue
+        result = compact(user_data)
+        if result['dropped']:
+            changed_users.append(user_id)
+        account(user_id, result)
+
+    if changed_users:
+        application.mark_data_for_update_persistence(user_ids=changed_users)
+
+    if isinstance(persistence, SQLitePersistence) and persistence.store_data.user_data:
+        try:
+            for user_id in await persistence.stored_user_ids():
+                if user_id in application.user_data or persistence.is_user_loaded(user_id):
+                    continue
+                user_data = await persistence.read_user_data(user_id)
+                if not user_data:
+                    continue
+                result = compact(user_data)
+                if result['dropped'] or result['scheduled']:
+                    # Пока читали, пользователь мог прислать апдейт: тогда его
+                    # данные уже в памяти и будут очищены следующим проходом
+                    if persistence.is_user_loaded(user_id):
+                        continue
+                    await persistence.write_user_data(user_id, user_data)
+                totals['stored_users'] += 1
+                account(user_id, result)
+        except Exception as e:
+            logger.error(f"Error sweeping stored session state: {e}")
+
+    try:
+        await delete_blobs(blob_ids)
+        totals['blobs_purged'] = await purge_expired_blobs() + len(blob_ids)
+    except Exception as e:
+        logger.error(f"Error purging session blobs: {e}")
+
+    _last_metrics = {
+        'timestamp': time.time(),
+        'duration_ms': (time.perf_counter() - started) * 1000,
+        'totals': totals,
+        'modules': modules,
+    }
+    logger.info(
+        f"Session state sweep: {totals['users']} users, {totals['bytes'] / 1024:.0f} KB, "
+        f"freed {totals['freed'] / 1024:.0f} KB, over budget {totals['over_budget']}"
+    )
+    return _last_metrics
+
+
+def get_session_metrics() -> Dict[str, Any]:
+    """Метрики последнего прохода очистки."""
+    return _last_metrics
+
+
+def format_session_metrics() -> str:
+    """Текст отчета для администратора (HTML)."""
+    metrics = _last_metrics
+    if not metrics:
+        return "📦 <b>Состояние сессий</b>\n\nДанных пока нет — очистка еще не запускалась."
+
+    totals = metrics['totals']
+    lines = [
+        "📦 <b>Состояние сессий</b>\n",
+        f"Пользователей: {totals['users']}, из них не в памяти: {totals.get('stored_users', 0)}",
+        f"Всего: {totals['bytes'] / 1024:.0f} КБ, максимум у пользователя: "
+        f"{totals['max_user_bytes'] / 1024:.1f} КБ",
+        f"Сверх бюджета ({USER_BUDGET_BYTES // 1024} КБ): {totals['over_budget']}",
+        f"Освобождено за проход: {totals['freed'] / 1024:.0f} КБ\n",
+        "<b>По модулям:</b>",
+    ]
+    for module, stats in sorted(metrics['modules'].items(), key=lambda item: -item[1]['bytes']):
+        lines.append(
+            f"• {module}: {stats['bytes'] / 1024:.0f} КБ, {stats['users']} польз., "
+            f"макс. {stats['max_bytes'] / 1024:.1f} КБ"
+        )
+    return "\n".join(lines)
+
+
+def register_session_state_jobs(application):
+    """Регистрирует периодическую очистку состояния сессий."""
+    application.job_queue.run_repeating(
+        sweep_session_state,
+        interval=SWEEP_INTERVAL,
+        first=60,
+        name='session_state_sweep'
+    )
+    logger.info("Session state sweep scheduled")
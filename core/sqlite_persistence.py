@@ -0,0 +1,506 @@
+"""
+Хранение user_data/chat_data/conversations бота в SQLite.
+
+Замена PicklePersistence: вместо перезаписи одного pickle-файла со всеми
+пользователями каждая запись user_data/chat_data хранится отдельной строкой.
+Application передает в update_*() только измененных пользователей и чаты,
+они записываются одной транзакцией. Pickle снимается в event loop (данные
+в это время меняют обработчики, в другом потоке снимок вышел бы рваным),
+сжатие и запись выполняются вне его. Строки с неизменившимися данными
+не перезаписываются.
+
+Данные пользователей и чатов загружаются лениво — при первом обращении
+(refresh_user_data/refresh_chat_data вызываются Application перед каждым
+обработчиком), поэтому старт бота не зависит от числа пользователей.
+Следствие: application.user_data содержит только пользователей, от которых
+были апдейты после запуска. Код, работающий с данными других пользователей
+(админские сбросы, периодические задачи), использует load_user_data() и
+delete_user_data() этого модуля или read_user_data()/write_user_data().
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import pickle
+import zlib
+from collections import defaultdict
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+from telegram import Bot
+from telegram.ext import BasePersistence, PersistenceInput, PicklePersistence
+
+logger = logging.getLogger(__name__)
+
+# Виды записей в очереди на запись
+KIND_USER = 'user'
+KIND_CHAT = 'chat'
+KIND_CONVERSATION = 'conversation'
+KIND_BOT = 'bot'
+
+# Ключи служебной таблицы persistence_bot
+BOT_DATA_KEY = 'bot_data'
+CALLBACK_DATA_KEY = 'callback_data'
+
+# Сериализованные данные длиннее порога сжимаются zlib
+COMPRESS_THRESHOLD = 1024
+_FORMAT_PICKLE = b'p'
+_FORMAT_ZLIB = b'z'
+
+_REPLACED_KNOWN_BOT = 'known_bot'
+_REPLACED_UNKNOWN_BOT = 'unknown_bot'
+
+# Маркер удаления в очереди записи
+_DELETED = object()
+
+
+class _Replace:
+    """Данные в очереди записи, заменяющие строку целиком (без слияния с БД)."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: Any):
+        self.data = data
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS persistence_user_data (
+    user_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS persistence_chat_data (
+    chat_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS persistence_conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS persistence_bot (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+_UPSERT = {
+    KIND_USER: "INSERT INTO persistence_user_data (user_id, data) VALUES (?, ?) "
+               "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, "
+               "updated_at = CURRENT_TIMESTAMP",
+    KIND_CHAT: "INSERT INTO persistence_chat_data (chat_id, data) VALUES (?, ?) "
+               "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data, "
+               "updated_at = CURRENT_TIMESTAMP",
+    KIND_CONVERSATION: "INSERT OR REPLACE INTO persistence_conversations (name, key, state) "
+                       "VALUES (?, ?, ?)",
+    KIND_BOT: "INSERT OR REPLACE INTO persistence_bot (key, data) VALUES (?, ?)",
+}
+
+_DELETE = {
+    KIND_USER: "DELETE FROM persistence_user_data WHERE user_id = ?",
+    KIND_CHAT: "DELETE FROM persistence_chat_data WHERE chat_id = ?",
+    KIND_CONVERSATION: "DELETE FROM persistence_conversations WHERE name = ? AND key = ?",
+    KIND_BOT: "DELETE FROM persistence_bot WHERE key = ?",
+}
+
+
+class _BotPickler(pickle.Pickler):
+    """Pickler, заменяющий объект Bot меткой (как в PicklePersistence)."""
+
+    def __init__(self, bot: Optional[Bot], *args, **kwargs):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def persistent_id(self, obj: object) -> Optional[str]:
+        if isinstance(obj, Bot):
+            return _REPLACED_KNOWN_BOT if obj is self._bot else _REPLACED_UNKNOWN_BOT
+        return None
+
+
+class _BotUnpickler(pickle.Unpickler):
+    """Unpickler, подставляющий текущего бота вместо метки."""
+
+    def __init__(self, bot: Optional[Bot], *args, **kwargs):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def persistent_load(self, pid: str) -> Optional[Bot]:
+        if pid == _REPLACED_KNOWN_BOT:
+            return self._bot
+        if pid == _REPLACED_UNKNOWN_BOT:
+            return None
+        raise pickle.UnpicklingError(f"Неизвестный persistent id: {pid!r}")
+
+
+def _pickle(obj: Any, bot: Optional[Bot] = None) -> bytes:
+    buffer = BytesIO()
+    _BotPickler(bot, buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+
+def _pack(data: bytes) -> bytes:
+    if len(data) > COMPRESS_THRESHOLD:
+        return _FORMAT_ZLIB + zlib.compress(data, 1)
+    return _FORMAT_PICKLE + data
+
+
+def dumps(obj: Any, bot: Optional[Bot] = None) -> bytes:
+    """Компактная сериализация: pickle, крупные значения сжимаются zlib."""
+    return _pack(_pickle(obj, bot))
+
+
+def loads(blob: bytes, bot: Optional[Bot] = None) -> Any:
+    """Обратная операция к dumps()."""
+    data = blob[1:]
+    if blob[:1] == _FORMAT_ZLIB:
+        data = zlib.decompress(data)
+    return _BotUnpickler(bot, BytesIO(data)).load()
+
+
+def _digest(blob: bytes) -> bytes:
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+def _conversation_key(key: Tuple) -> str:
+    return json.dumps(list(key))
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    BasePersistence на SQLite (WAL) с построчной записью.
+
+    Args:
+        filepath: Путь к файлу БД
+        store_data: Какие данные сохранять (см. PersistenceInput)
+        update_interval: Интервал записи изменений, секунды
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 60,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = str(filepath)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+        # Очередь записи: (вид, ключ) -> данные или _DELETED
+        self._pending: Dict[Tuple[str, Any], Any] = {}
+        # Хэши последних записанных данных — чтобы не перезаписывать неизменное
+        self._digests: Dict[Tuple[str, Any], bytes] = {}
+        # Пользователи и чаты, чьи данные уже подгружены из БД
+        self._loaded_users = set()
+        self._loaded_chats = set()
+
+    async def _get_db(self) -> aiosqlite.Connection:
+        async with self._connect_lock:
+            if self._db is None:
+                db = await aiosqlite.connect(self.filepath)
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute("PRAGMA synchronous=NORMAL")
+                await db.executescript(SCHEMA)
+                await db.commit()
+                self._db = db
+            return self._db
+
+    async def _fetch_blob(self, query: str, params: tuple) -> Optional[bytes]:
+        db = await self._get_db()
+        async with db.execute(query, params) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def _load_row(self, kind: str, key: Any) -> Optional[Any]:
+        query = {
+            KIND_USER: "SELECT data FROM persistence_user_data WHERE user_id = ?",
+            KIND_CHAT: "SELECT data FROM persistence_chat_data WHERE chat_id = ?",
+            KIND_BOT: "SELECT data FROM persistence_bot WHERE key = ?",
+        }[kind]
+        blob = await self._fetch_blob(query, (key,))
+        if blob is None:
+            return None
+        self._digests[(kind, key)] = _digest(blob)
+        return loads(blob, self.bot)
+
+    # ------------------------------------------------------------------
+    # Загрузка
+    # ------------------------------------------------------------------
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        # Данные подгружаются по одному пользователю в refresh_user_data
+        await self._get_db()
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        await self._get_db()
+        return {}
+
+    async def get_bot_data(self) -> Any:
+        data = await self._load_row(KIND_BOT, BOT_DATA_KEY)
+        return data if data is not None else self.context_types.bot_data()
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return await self._load_row(KIND_BOT, CALLBACK_DATA_KEY)
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        db = await self._get_db()
+        async with db.execute(
+            "SELECT key, state FROM persistence_conversations WHERE name = ?", (name,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return {tuple(json.loads(key)): loads(state, self.bot) for key, state in rows}
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        stored = await self._load_row(KIND_USER, user_id)
+        # Значения, уже появившиеся в памяти, новее сохраненных
+        for key, value in (stored or {}).items():
+            user_data.setdefault(key, value)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        if chat_id in self._loaded_chats:
+            return
+        self._loaded_chats.add(chat_id)
+        stored = await self._load_row(KIND_CHAT, chat_id)
+        for key, value in (stored or {}).items():
+            chat_data.setdefault(key, value)
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    # ------------------------------------------------------------------
+    # Данные пользователей вне обработчиков
+    # ------------------------------------------------------------------
+
+    def is_user_loaded(self, user_id: int) -> bool:
+        """Подгружены ли данные пользователя в application.user_data."""
+        return user_id in self._loaded_users
+
+    async def stored_user_ids(self) -> List[int]:
+        """Пользователи, чьи данные сохранены в БД."""
+        db = await self._get_db()
+        async with db.execute("SELECT user_id FROM persistence_user_data") as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def read_user_data(self, user_id: int) -> Optional[Any]:
+        """Сохраненные данные пользователя, без подгрузки в Application."""
+        return await self._load_row(KIND_USER, user_id)
+
+    async def write_user_data(self, user_id: int, data: Any) -> None:
+        """
+        Записывает данные незагруженного пользователя целиком.
+
+        В отличие от update_user_data() не сливает их с сохраненными —
+        ключи, удаленные из прочитанных read_user_data() данных, удаляются.
+        """
+        await self._write((KIND_USER, user_id), _Replace(data))
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        await self._write((KIND_USER, user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        await self._write((KIND_CHAT, chat_id), data)
+
+    async def update_bot_data(self, data: Any) -> None:
+        await self._write((KIND_BOT, BOT_DATA_KEY), data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        await self._write((KIND_BOT, CALLBACK_DATA_KEY), data)
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        conversation = (KIND_CONVERSATION, (name, _conversation_key(key)))
+        await self._write(conversation, _DELETED if new_state is None else new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._loaded_users.discard(user_id)
+        await self._write((KIND_USER, user_id), _DELETED)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._loaded_chats.discard(chat_id)
+        await self._write((KIND_CHAT, chat_id), _DELETED)
+
+    async def flush(self) -> None:
+        await self._write_pending()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def _write(self, entry: Tuple[str, Any], data: Any) -> None:
+        self._pending[entry] = data
+        await self._write_pending()
+
+    async def _write_pending(self) -> None:
+        """
+        Записывает накопленные изменения одной транзакцией.
+
+        Application вызывает update_*() для всех измененных пользователей
+        одновременно (asyncio.gather); пока идет запись одной пачки,
+        остальные вызовы накапливаются и уходят следующей.
+        """
+        async with self._write_lock:
+            # Даем остальным вызовам из gather добавиться в очередь
+            await asyncio.sleep(0)
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+            try:
+                await self._merge_unloaded(pending)
+                # Снимок — в event loop: пока pickle идет в другом потоке,
+                # обработчики меняли бы те же словари
+                snapshot = self._snapshot(pending)
+                encoded = await asyncio.to_thread(self._encode, snapshot)
+            except Exception:
+                # Более новые данные, пришедшие за это время, остаются
+                for entry, data in pending.items():
+                    self._pending.setdefault(entry, data)
+                raise
+            if not encoded:
+                return
+
+            statements = defaultdict(list)
+            for kind, key, blob, _ in encoded:
+                params = key if kind == KIND_CONVERSATION else (key,)
+                if blob is None:
+                    statements[_DELETE[kind]].append(params)
+                else:
+                    statements[_UPSERT[kind]].append((*params, blob))
+
+            db = await self._get_db()
+            try:
+                for query, rows in statements.items():
+                    await db.executemany(query, rows)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                # Не записанное вернется в очередь до следующего цикла
+                for kind, key, _, _ in encoded:
+                    self._digests.pop((kind, key), None)
+                    self._pending.setdefault((kind, key), pending[(kind, key)])
+                raise
+
+            for kind, key, blob, digest in encoded:
+                if blob is None:
+                    self._digests.pop((kind, key), None)
+                else:
+                    self._digests[(kind, key)] = digest
+
+    async def _merge_unloaded(self, pending: Dict[Tuple[str, Any], Any]) -> None:
+        """
+        Дополняет данные еще не загруженных пользователей/чатов сохраненными.
+
+        Такие записи появляются, если код меняет application.user_data
+        в обход обработчиков — без слияния сохраненные ключи были бы потеряны.
+        """
+        loaded = {KIND_USER: self._loaded_users, KIND_CHAT: self._loaded_chats}
+        for (kind, key), data in pending.items():
+            if kind not in loaded or key in loaded[kind]:
+                continue
+            if data is _DELETED or isinstance(data, _Replace):
+                continue
+            stored = await self._load_row(kind, key)
+            if stored:
+                stored.update(data)
+                pending[(kind, key)] = stored
+
+    def _snapshot(self, pending: Dict[Tuple[str, Any], Any]) -> list:
+        """Pickle очереди записи: (вид, ключ, байты или None для удаления)."""
+        snapshot = []
+        for (kind, key), data in pending.items():
+            if data is _DELETED:
+                snapshot.append((kind, key, None))
+                continue
+            if isinstance(data, _Replace):
+                data = data.data
+            snapshot.append((kind, key, _pickle(data, self.bot)))
+        return snapshot
+
+    def _encode(self, snapshot: list) -> list:
+        """Сжимает снимок очереди (в отдельном потоке), пропуская неизменное."""
+        encoded = []
+        for kind, key, data in snapshot:
+            if data is None:
+                encoded.append((kind, key, None, None))
+                continue
+            blob = _pack(data)
+            digest = _digest(blob)
+            if self._digests.get((kind, key)) == digest:
+                continue
+            encoded.append((kind, key, blob, digest))
+        return encoded
+
+
+async def load_user_data(application, user_id: int) -> Any:
+    """
+    user_data пользователя с подгрузкой сохраненных данных из БД.
+
+    Данные остаются в application.user_data, как после апдейта от пользователя.
+    """
+    user_data = application.user_data[user_id]
+    persistence = application.persistence
+    if persistence is not None and persistence.store_data.user_data:
+        await persistence.refresh_user_data(user_id, user_data)
+    return user_data
+
+
+async def delete_user_data(application, user_id: int) -> None:
+    """Удаляет user_data пользователя из памяти и сразу из БД (загружен он или нет)."""
+    application.drop_user_data(user_id)
+    persistence = application.persistence
+    if persistence is not None and persistence.store_data.user_data:
+        await persistence.drop_user_data(user_id)
+
+
+async def migrate_from_pickle(pickle_path: str, db_path: str) -> Dict[str, int]:
+    """
+    Переносит данные из файла PicklePersistence в SQLitePersistence.
+
+    Returns:
+        Число перенесенных записей по видам
+    """
+    source = PicklePersistence(filepath=pickle_path)
+    target = SQLitePersistence(db_path)
+
+    # Для отсутствующих в файле разделов PicklePersistence возвращает None
+    user_data = await source.get_user_data() or {}
+    chat_data = await source.get_chat_data() or {}
+    bot_data = await source.get_bot_data()
+    callback_data = await source.get_callback_data()
+    # Имена диалогов известны только после загрузки файла
+    conversations = source.conversations or {}
+
+    for user_id, data in user_data.items():
+        target._pending[(KIND_USER, user_id)] = data
+    for chat_id, data in chat_data.items():
+        target._pending[(KIND_CHAT, chat_id)] = data
+    if bot_data:
+        target._pending[(KIND_BOT, BOT_DATA_KEY)] = bot_data
+    if callback_data:
+        target._pending[(KIND_BOT, CALLBACK_DATA_KEY)] = callback_data
+    for name, states in conversations.items():
+        for key, state in states.items():
+            target._pending[(KIND_CONVERSATION, (name, _conversation_key(key)))] = state
+
+    # Перенос целиком заменяет строки: сливать с БД нечего
+    target._loaded_users.update(user_data)
+    target._loaded_chats.update(chat_data)
+    await target.flush()
+
+    return {
+        'user_data': len(user_data),
+        'chat_data': len(chat_data),
+        'conversations': sum(len(states) for states in conversations.values()),
+        'bot_data': int(bool(bot_data)),
+        'callback_data': int(bool(callback_data)),
+    }
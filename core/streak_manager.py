@@ -18,6 +18,40 @@ from core.db import DATABASE_FILE
 
 logger = logging.getLogger(__name__)
 
+# Местное время, с которого стрик считается под угрозой / в критическом состоянии
+STREAK_AT_RISK_HOUR = 18
+STREAK_CRITICAL_HOUR = 22
+
+# UTC offset пользователей без записи о часовом поясе (Москва)
+DEFAULT_UTC_OFFSET = 3
+
+
+async def local_activity_date(
+    db: aiosqlite.Connection,
+    user_id: int,
+    now: Optional[datetime] = None
+) -> date:
+    """
+    Сегодняшняя дата по местному времени пользователя (user_timezone_info,
+    без записи — московское время). В ней хранится last_activity_date:
+    по тем же местным дням check_and_update_streak_states решает, когда
+    стрик под угрозой и когда потерян.
+    """
+    now = now or datetime.now(timezone.utc)
+    offset = DEFAULT_UTC_OFFSET
+    try:
+        cursor = await db.execute(
+            "SELECT utc_offset_hours FROM user_timezone_info WHERE user_id = ?",
+            (user_id,)
+        )
+        row = await cursor.fetchone()
+        if row and row[0] is not None:
+            offset = row[0]
+    except aiosqlite.OperationalError:
+        # Таблицы часовых поясов еще нет
+        pass
+    return (now + timedelta(hours=offset)).date()
+
 
 class StreakState(Enum):
     """Состояния стрика"""
@@ -71,16 +105,23 @@ class StreakManager:
     # DAILY STREAK MANAGEMENT
     # ============================================================
 
-    async def update_daily_streak(self, user_id: int) -> Tuple[int, int, StreakLevel]:
+    async def update_daily_streak(
+        self,
+        user_id: int,
+        now: Optional[datetime] = None
+    ) -> Tuple[int, int, StreakLevel]:
         """
-        Обновляет дневной стрик пользователя.
+        Обновляет дневной стрик пользователя. Дни считаются по местному
+        времени пользователя (local_activity_date).
 
         Returns:
             (current_streak, max_streak, streak_level)
         """
         try:
             async with aiosqlite.connect(self.database_file) as db:
-                today = datetime.now(timezone.utc).date().isoformat()
+                now = now or datetime.now(timezone.utc)
+                local_today = await local_activity_date(db, user_id, now)
+                today = local_today.isoformat()
 
                 # Получаем текущие данные
                 cursor = await db.execute("""
@@ -114,7 +155,7 @@ class StreakManager:
 
                     if last_activity_str:
                         last_activity = date.fromisoformat(last_activity_str)
-                        days_diff = (datetime.now(timezone.utc).date() - last_activity).days
+                        days_diff = (local_today - last_activity).days
 
                         if days_diff == 1:
                             # Вчера были - продолжаем стрик
@@ -162,6 +203,8 @@ class StreakManager:
                         longest_streak_ever = MAX(longest_streak_ever, ?),
                         total_days_active = total_days_active + 1,
                         streak_state = 'active',
+                        at_risk_notified = 0,
+                        critical_notified = 0,
                         updated_at = ?
                     WHERE user_id = ?
                 """, (
@@ -170,7 +213,7 @@ class StreakManager:
                     today,
                     level.level,
                     max_streak,
-                    datetime.now(timezone.utc).isoformat(),
+                    now.isoformat(),
                     user_id
                 ))
 
@@ -314,79 +357,84 @@ class StreakManager:
     # STREAK STATE MANAGEMENT
     # ============================================================
 
-    async def check_and_update_streak_states(self) -> List[Tuple[int, StreakState]]:
+    async def check_and_update_streak_states(
+        self,
+        now: Optional[datetime] = None
+    ) -> List[Tuple[int, StreakState]]:
         """
         Проверяет и обновляет состояния стриков для всех пользователей.
         Возвращает список (user_id, new_state) для уведомлений.
+
+        Стрик держится до конца следующего за последней активностью дня
+        по местному времени пользователя (user_timezone_info): с 18:00 он
+        AT_RISK, с 22:00 — CRITICAL, после полуночи — LOST. Пользователи
+        группируются по UTC offset; для каждого перехода выполняется один
+        UPDATE ... RETURNING, которому группы передаются как таблица
+        (offset, дата последней активности).
         """
         users_to_notify = []
+        now = now or datetime.now(timezone.utc)
 
         try:
             async with aiosqlite.connect(self.database_file) as db:
-                # Получаем всех пользователей с активными стриками
-                cursor = await db.execute("""
-                    SELECT user_id,
-                           current_daily_streak,
-                           last_activity_date,
-                           streak_state,
-                           at_risk_notified,
-                           critical_notified
-                    FROM user_streaks
-                    WHERE current_daily_streak > 0
-                      AND streak_state IN ('active', 'at_risk', 'critical')
-                """)
-
-                users = await cursor.fetchall()
-                now = datetime.now(timezone.utc)
-
-                for row in users:
-                    user_id = row[0]
-                    streak = row[1]
-                    last_activity = row[2]
-                    current_state = row[3]
-                    at_risk_notified = row[4]
-                    critical_notified = row[5]
-
-                    if not last_activity:
+                offsets, offset_sql = await self._get_utc_offset_buckets(db)
+
+                buckets = {state: [] for state in (StreakState.LOST, StreakState.CRITICAL, StreakState.AT_RISK)}
+                for offset in offsets:
+                    local_now = now + timedelta(hours=offset)
+                    yesterday = local_now.date() - timedelta(days=1)
+
+                    buckets[StreakState.LOST].append((offset, (yesterday - timedelta(days=1)).isoformat()))
+                    if local_now.hour >= STREAK_CRITICAL_HOUR:
+                        buckets[StreakState.CRITICAL].append((offset, yesterday.isoformat()))
+                    elif local_now.hour >= STREAK_AT_RISK_HOUR:
+                        buckets[StreakState.AT_RISK].append((offset, yesterday.isoformat()))
+
+                # (новое состояние, исходные состояния, сравнение даты, флаг уведомления)
+                transitions = [
+                    (StreakState.LOST, "'active', 'at_risk', 'critical'", "<=", None),
+                    (StreakState.CRITICAL, "'active', 'at_risk'", "=", 'critical_notified'),
+                    (StreakState.AT_RISK, "'active', 'critical'", "=", 'at_risk_notified'),
+                ]
+
+                for new_state, from_states, date_op, notified_flag in transitions:
+                    state_buckets = buckets[new_state]
+                    if not state_buckets:
                         continue
 
-                    last_activity_date = date.fromisoformat(last_activity)
-                    hours_since_activity = (now.date() - last_activity_date).days * 24
-
-                    # Определяем новое состояние
-                    new_state = None
-
-                    if hours_since_activity >= 24:
-                        # Стрик потерян
-                        new_state = StreakState.LOST
-                    elif hours_since_activity >= 22:
-                        # Критично (< 2 часов)
-                        if current_state != 'critical' and not critical_notified:
-                            new_state = StreakState.CRITICAL
-                    elif hours_since_activity >= 18:
-                        # Под угрозой (< 6 часов)
-                        if current_state != 'at_risk' and not at_risk_notified:
-                            new_state = StreakState.AT_RISK
-
-                    # Обновляем состояние
-                    if new_state:
-                        await db.execute("""
-                            UPDATE user_streaks
-                            SET streak_state = ?,
-                                at_risk_notified = ?,
-                                critical_notified = ?,
-                                updated_at = ?
-                            WHERE user_id = ?
-                        """, (
-                            new_state.value,
-                            1 if new_state == StreakState.AT_RISK else at_risk_notified,
-                            1 if new_state == StreakState.CRITICAL else critical_notified,
-                            datetime.now(timezone.utc).isoformat(),
-                            user_id
-                        ))
-
-                        users_to_notify.append((user_id, new_state))
-                        logger.info(f"User {user_id} streak state changed to {new_state.value}")
+                    dates = [activity_date for _, activity_date in state_buckets]
+                    values_sql = ", ".join("(?, ?)" for _ in state_buckets)
+                    flag_set = f", {notified_flag} = 1" if notified_flag else ""
+                    flag_filter = f"AND COALESCE({notified_flag}, 0) = 0" if notified_flag else ""
+
+                    # Диапазон дат отсекает строки по индексу, точная дата
+                    # для offset пользователя берется из buckets
+                    cursor = await db.execute(f"""
+                        WITH buckets(utc_offset, activity_date) AS (VALUES {values_sql})
+                        UPDATE user_streaks
+                        SET streak_state = ?,
+                            updated_at = ?{flag_set}
+                        WHERE streak_state IN ({from_states})
+                          AND last_activity_date BETWEEN ? AND ?
+                          AND current_daily_streak > 0
+                          {flag_filter}
+                          AND last_activity_date {date_op} (
+                              SELECT b.activity_date FROM buckets b
+                              WHERE b.utc_offset = {offset_sql}
+                          )
+                        RETURNING user_id
+                    """, (
+                        *[param for bucket in state_buckets for param in bucket],
+                        new_state.value,
+                        now.isoformat(),
+                        min(dates) if date_op == "=" else '',
+                        max(dates),
+                    ))
+
+                    user_ids = [row[0] for row in await cursor.fetchall()]
+                    users_to_notify.extend((user_id, new_state) for user_id in user_ids)
+                    if user_ids:
+                        logger.info(f"{len(user_ids)} streak(s) changed to {new_state.value}")
 
                 await db.commit()
 
@@ -395,6 +443,31 @@ class StreakManager:
 
         return users_to_notify
 
+    async def _get_utc_offset_buckets(self, db) -> Tuple[List[int], str]:
+        """
+        Возвращает различные UTC offset пользователей и SQL-выражение
+        offset для строки user_streaks. Без записи в user_timezone_info
+        (или без самой таблицы) используется московское время.
+        """
+        cursor = await db.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='user_timezone_info'"
+        )
+        if not await cursor.fetchone():
+            return [DEFAULT_UTC_OFFSET], str(DEFAULT_UTC_OFFSET)
+
+        cursor = await db.execute(
+            "SELECT DISTINCT COALESCE(utc_offset_hours, ?) FROM user_timezone_info",
+            (DEFAULT_UTC_OFFSET,)
+        )
+        offsets = {row[0] for row in await cursor.fetchall()}
+        offsets.add(DEFAULT_UTC_OFFSET)
+
+        offset_sql = (
+            "COALESCE((SELECT tz.utc_offset_hours FROM user_timezone_info tz "
+            f"WHERE tz.user_id = user_streaks.user_id), {DEFAULT_UTC_OFFSET})"
+        )
+        return sorted(offsets), offset_sql
+
     # ============================================================
     # MILESTONE & REWARDS
     # ============================================================
@@ -102,6 +102,12 @@ async def apply_streak_system_migration():
                 ON user_streaks(last_activity_date)
             """)
 
+            # Для почасовой проверки состояний (check_and_update_streak_states)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_streak_state_activity
+                ON user_streaks(streak_state, last_activity_date)
+            """)
+
             logger.info("✓ user_streaks table created with indexes")
 
             # ============================================================
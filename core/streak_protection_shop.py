@@ -17,7 +17,7 @@ from telegram.ext import ContextTypes, CallbackQueryHandler, Application
 from telegram.constants import ParseMode
 
 from core.db import DATABASE_FILE
-from core.streak_manager import get_streak_manager, StreakState
+from core.streak_manager import get_streak_manager, local_activity_date, StreakState
 
 logger = logging.getLogger(__name__)
 
@@ -654,7 +654,7 @@ class StreakProtectionShop:
                         streak_lost_at = NULL
                     WHERE user_id = ?
                 """, (lost_streak, max(max_streak, lost_streak),
-                      datetime.now(timezone.utc).date().isoformat(), user_id))
+                      (await local_activity_date(db, user_id)).isoformat(), user_id))
 
                 # Логируем восстановление
                 repair_price = await self._calculate_repair_price(user_id)
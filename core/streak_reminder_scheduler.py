@@ -9,18 +9,24 @@ Phase 2: Notifications
 - Учёт часовых поясов пользователей
 """
 
+import json
 import logging
 import aiosqlite
 from datetime import datetime, date, time, timedelta, timezone
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from telegram import Bot
 from telegram.ext import ContextTypes
 from telegram.error import Forbidden, BadRequest
 
 from core.db import DATABASE_FILE
-from core.streak_manager import get_streak_manager, StreakState
+from core.streak_manager import get_streak_manager, StreakState, DEFAULT_UTC_OFFSET
 from core.streak_ui import get_streak_ui
-from core.timezone_manager import get_timezone_manager
+from core.timezone_manager import (
+    get_timezone_manager,
+    is_optimal_hour,
+    is_quiet_hour,
+    time_until_midnight,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -49,27 +55,47 @@ class StreakReminderScheduler:
         try:
             # Обновляем состояния стриков для всех пользователей
             users_to_notify = await self.streak_manager.check_and_update_streak_states()
+            if not users_to_notify:
+                logger.info("=== Streak reminder check complete: no streak state changes ===")
+                return
 
-            sent_count = 0
+            # Настройки, дневной лимит и часовой пояс — одним запросом для всех
+            candidates = await self._get_reminder_candidates(
+                [user_id for user_id, _ in users_to_notify]
+            )
+
+            now = datetime.now(timezone.utc)
+            sent_log = []
 
             for user_id, new_state in users_to_notify:
-                # Проверяем, можно ли отправить уведомление
-                if not await self._can_send_notification(user_id):
+                candidate = candidates.get(user_id)
+                if candidate is None:
                     logger.debug(f"Skipping notification for user {user_id}: notifications disabled or limit reached")
                     continue
 
+                local_time = now + timedelta(hours=candidate['utc_offset'])
+
                 # Определяем тип уведомления
                 if new_state == StreakState.AT_RISK:
-                    success = await self._send_at_risk_notification(bot, user_id)
+                    notification_type = 'at_risk'
+                    success = await self._send_at_risk_notification(
+                        bot, user_id, candidate['streak'], local_time
+                    )
                 elif new_state == StreakState.CRITICAL:
-                    success = await self._send_critical_notification(bot, user_id)
+                    notification_type = 'critical'
+                    success = await self._send_critical_notification(
+                        bot, user_id, candidate['streak'], local_time
+                    )
                 else:
                     continue
 
                 if success:
-                    sent_count += 1
+                    sent_log.append((user_id, notification_type, candidate['streak'], now.isoformat()))
 
-            logger.info(f"=== Streak reminder check complete: {sent_count} notifications sent ===")
+            # Логируем все отправки одной транзакцией
+            await self._log_notifications(sent_log)
+
+            logger.info(f"=== Streak reminder check complete: {len(sent_log)} notifications sent ===")
 
         except Exception as e:
             logger.error(f"Error in streak reminder scheduler: {e}", exc_info=True)
@@ -78,29 +104,31 @@ class StreakReminderScheduler:
     # NOTIFICATION SENDING
     # ============================================================
 
-    async def _send_at_risk_notification(self, bot: Bot, user_id: int) -> bool:
+    async def _send_at_risk_notification(
+        self,
+        bot: Bot,
+        user_id: int,
+        current_streak: int,
+        local_time: datetime
+    ) -> bool:
         """
         Отправляет предупреждение 'At Risk' (за ~6 часов до сброса).
-        Учитывает часовой пояс пользователя.
+        Учитывает часовой пояс пользователя (local_time — его текущее время).
         """
         try:
-            # Получаем информацию о стрике
-            streak_info = await self.streak_manager.get_daily_streak_info(user_id)
-            current_streak = streak_info['current']
-
             if current_streak == 0:
                 return False
 
             # Проверяем, не ночь ли у пользователя (тихие часы)
-            if await self.timezone_manager.is_quiet_hours(user_id):
+            if is_quiet_hour(local_time.hour):
                 logger.debug(f"Skipping notification for user {user_id}: quiet hours")
                 return False
 
             # Вычисляем оставшееся время до полуночи в часовом поясе пользователя
-            hours_left, minutes_left = await self.timezone_manager.calculate_time_until_midnight_user(user_id)
+            hours_left, minutes_left = time_until_midnight(local_time)
 
             # Проверяем, оптимальное ли время для уведомления (±2 часа от 18:00 локального)
-            if not await self.timezone_manager.is_optimal_notification_time(user_id, preferred_hour=18, tolerance=2):
+            if not is_optimal_hour(local_time.hour, preferred_hour=18, tolerance=2):
                 logger.debug(f"Skipping at_risk notification for user {user_id}: not optimal time in their timezone")
                 return False
 
@@ -130,9 +158,6 @@ class StreakReminderScheduler:
                 parse_mode='HTML'
             )
 
-            # Логируем отправку
-            await self._log_notification(user_id, 'at_risk', current_streak)
-
             logger.info(f"Sent at_risk notification to user {user_id}")
             return True
 
@@ -147,16 +172,18 @@ class StreakReminderScheduler:
             logger.error(f"Error sending at_risk notification to {user_id}: {e}")
             return False
 
-    async def _send_critical_notification(self, bot: Bot, user_id: int) -> bool:
+    async def _send_critical_notification(
+        self,
+        bot: Bot,
+        user_id: int,
+        current_streak: int,
+        local_time: datetime
+    ) -> bool:
         """
         Отправляет критическое предупреждение (за ~2 часа до сброса).
-        Учитывает часовой пояс пользователя.
+        Учитывает часовой пояс пользователя (local_time — его текущее время).
         """
         try:
-            # Получаем информацию о стрике
-            streak_info = await self.streak_manager.get_daily_streak_info(user_id)
-            current_streak = streak_info['current']
-
             if current_streak == 0:
                 return False
 
@@ -164,7 +191,7 @@ class StreakReminderScheduler:
             # это последний шанс сохранить стрик
 
             # Вычисляем оставшееся время до полуночи в часовом поясе пользователя
-            hours_left, minutes_left = await self.timezone_manager.calculate_time_until_midnight_user(user_id)
+            hours_left, minutes_left = time_until_midnight(local_time)
 
             # Формируем сообщение
             message_data = self.streak_ui.get_at_risk_warning_message(
@@ -180,9 +207,6 @@ class StreakReminderScheduler:
                 parse_mode=message_data['parse_mode']
             )
 
-            # Логируем отправку
-            await self._log_notification(user_id, 'critical', current_streak)
-
             logger.info(f"Sent critical notification to user {user_id}")
             return True
 
@@ -197,54 +221,6 @@ class StreakReminderScheduler:
             logger.error(f"Error sending critical notification to {user_id}: {e}")
             return False
 
-    # ============================================================
-    # SMART TIMING
-    # ============================================================
-
-    async def _get_optimal_notification_time(self, user_id: int) -> Optional[int]:
-        """
-        Определяет оптимальное время для отправки уведомлений.
-
-        DEPRECATED: Используйте timezone_manager.is_optimal_notification_time()
-
-        Returns:
-            Час дня (0-23) или None
-        """
-        try:
-            async with aiosqlite.connect(self.database_file) as db:
-                # Проверяем, есть ли у пользователя сохранённый preferred_hour
-                cursor = await db.execute("""
-                    SELECT optimal_notification_hour FROM user_timezone_info
-                    WHERE user_id = ?
-                """, (user_id,))
-                row = await cursor.fetchone()
-
-                if row and row[0]:
-                    return row[0]
-
-                # Анализируем последние 30 дней активности
-                cursor = await db.execute("""
-                    SELECT activity_date, time_spent_minutes
-                    FROM daily_activity_calendar
-                    WHERE user_id = ?
-                      AND activity_date > date('now', '-30 days')
-                    ORDER BY activity_date DESC
-                    LIMIT 30
-                """, (user_id,))
-
-                activities = await cursor.fetchall()
-
-                if not activities:
-                    return 18  # Дефолтное время (после школы)
-
-                # Возвращаем 18:00 как оптимальное время
-                # TODO: Реализовать ML модель для персонализации
-                return 18
-
-        except Exception as e:
-            logger.error(f"Error getting optimal time for user {user_id}: {e}")
-            return 18
-
     # ============================================================
     # HELPER METHODS
     # ============================================================
@@ -272,46 +248,64 @@ class StreakReminderScheduler:
 
         return hours_left, minutes_left
 
-    async def _can_send_notification(self, user_id: int) -> bool:
+    async def _get_reminder_candidates(self, user_ids: List[int]) -> Dict[int, Dict]:
         """
-        Проверяет, можно ли отправить уведомление пользователю.
+        Отбирает пользователей, которым можно отправить напоминание:
+        уведомления не отключены и дневной лимит (2 напоминания о стрике)
+        не исчерпан. Вместе с текущим стриком и UTC offset — одним запросом.
+
+        Returns:
+            {user_id: {'streak': int, 'utc_offset': int}}
         """
+        if not user_ids:
+            return {}
+
         try:
             async with aiosqlite.connect(self.database_file) as db:
-                # Проверка 1: Пользователь не отключил уведомления
-                cursor = await db.execute("""
-                    SELECT enabled FROM notification_preferences
-                    WHERE user_id = ?
-                """, (user_id,))
-                pref = await cursor.fetchone()
-
-                if pref and not pref[0]:
-                    return False
-
-                # Проверка 2: Дневной лимит (максимум 2 напоминания о стрике в день)
-                cursor = await db.execute("""
-                    SELECT COUNT(*) FROM streak_notifications_log
-                    WHERE user_id = ?
-                      AND notification_type IN ('at_risk', 'critical')
-                      AND date(sent_at) = date('now')
-                """, (user_id,))
-
-                count = (await cursor.fetchone())[0]
-
-                if count >= 2:
-                    return False
-
-                return True
+                cursor = await db.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' AND name='user_timezone_info'"
+                )
+                if await cursor.fetchone():
+                    offset_sql = "COALESCE(tz.utc_offset_hours, ?)"
+                    timezone_join = "LEFT JOIN user_timezone_info tz ON tz.user_id = s.user_id"
+                else:
+                    offset_sql = "?"
+                    timezone_join = ""
+
+                cursor = await db.execute(f"""
+                    SELECT s.user_id,
+                           s.current_daily_streak,
+                           {offset_sql}
+                    FROM user_streaks s
+                    LEFT JOIN notification_preferences np ON np.user_id = s.user_id
+                    {timezone_join}
+                    WHERE s.user_id IN (SELECT value FROM json_each(?))
+                      AND COALESCE(np.enabled, 1) != 0
+                      AND (
+                          SELECT COUNT(*) FROM streak_notifications_log l
+                          WHERE l.user_id = s.user_id
+                            AND l.notification_type IN ('at_risk', 'critical')
+                            AND date(l.sent_at) = date('now')
+                      ) < 2
+                """, (DEFAULT_UTC_OFFSET, json.dumps(user_ids)))
+
+                return {
+                    row[0]: {'streak': row[1] or 0, 'utc_offset': row[2]}
+                    for row in await cursor.fetchall()
+                }
 
         except Exception as e:
-            logger.error(f"Error checking notification permission for user {user_id}: {e}")
-            return False
+            logger.error(f"Error selecting reminder candidates: {e}")
+            return {}
+
+    async def _log_notifications(self, rows: List[Tuple[int, str, int, str]]):
+        """Логирует отправленные уведомления: (user_id, тип, стрик, sent_at)"""
+        if not rows:
+            return
 
-    async def _log_notification(self, user_id: int, notification_type: str, streak_value: int):
-        """Логирует отправленное уведомление"""
         try:
             async with aiosqlite.connect(self.database_file) as db:
-                await db.execute("""
+                await db.executemany("""
                     INSERT INTO streak_notifications_log (
                         user_id,
                         notification_type,
@@ -319,17 +313,12 @@ class StreakReminderScheduler:
                         sent_at,
                         delivered
                     ) VALUES (?, ?, ?, ?, 1)
-                """, (
-                    user_id,
-                    notification_type,
-                    streak_value,
-                    datetime.now(timezone.utc).isoformat()
-                ))
+                """, rows)
 
                 await db.commit()
 
         except Exception as e:
-            logger.error(f"Error logging notification: {e}")
+            logger.error(f"Error logging notifications: {e}")
 
     async def _disable_notifications(self, user_id: int, reason: str):
         """Отключает уведомления для пользователя"""
@@ -0,0 +1,263 @@
+"""
+Исходящий транспорт Telegram Bot API под нагрузкой.
+
+InstrumentedHTTPXRequest с настройками по умолчанию упирается в пул
+соединений: запросы ждут свободного коннекта (pool_timeout), правки
+сообщений уходят друг за другом. TelegramTransport добавляет:
+
+- явный размер пула (TELEGRAM_POOL_SIZE) и HTTP/2 (TELEGRAM_HTTP2), если
+  установлен пакет h2 — все запросы мультиплексируются в одно соединение;
+- склейку правок: пока editMessageText одного сообщения в полете, новые
+  правки того же сообщения ждут, и отправляется только последняя —
+  промежуточные вызовы получают ее результат;
+- глобальную паузу по 429: после RetryAfter новые запросы ждут
+  retry_after секунд, а сам запрос повторяется один раз, если пауза не
+  длиннее TELEGRAM_MAX_RETRY_AFTER (иначе PTB поднимает RetryAfter как
+  раньше);
+- счетчики занятости пула: render_prometheus() для /metrics и
+  format_transport_report() для /latency.
+"""
+
+import asyncio
+import importlib.util
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from telegram.error import NetworkError, TimedOut
+
+from core.latency_metrics import InstrumentedHTTPXRequest, telegram_method
+
+logger = logging.getLogger(__name__)
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+Response = Tuple[int, bytes]
+
+
+@dataclass
+class TransportStats:
+    pool_size: int = 0
+    http_version: str = '1.1'
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    requests: int = 0
+    # Запросов, пришедших, когда все соединения пула были заняты
+    saturated: int = 0
+    pool_timeouts: int = 0
+    retry_after: int = 0
+    throttled_seconds: float = 0.0
+    edits_coalesced: int = 0
+
+
+STATS = TransportStats()
+
+
+class _EditSlot:
+    """Очередь правок одного сообщения: отправляет только последнюю."""
+
+    __slots__ = ('lock', 'last_ticket', 'waiting', 'users', 'next_result')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.last_ticket = 0
+        # Номера правок, ждущих своей очереди
+        self.waiting = set()
+        self.users = 0
+        # Результат ближайшей отправки — для замененных правок
+        self.next_result: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def has_newer(self, ticket: int) -> bool:
+        return any(other > ticket for other in self.waiting)
+
+    def abort_pending(self):
+        """Будит замененные правки, если отправлять за них больше некому."""
+        if not self.next_result.done():
+            self.next_result.set_exception(NetworkError("Правка сообщения отменена"))
+            self.next_result.exception()  # ожидающих может и не быть
+        self.next_result = asyncio.get_running_loop().create_future()
+
+
+def _edit_key(request_data) -> Optional[tuple]:
+    params = request_data.parameters if request_data else {}
+    if params.get('inline_message_id'):
+        return ('inline', params['inline_message_id'])
+    if params.get('chat_id') is not None and params.get('message_id') is not None:
+        return (str(params['chat_id']), int(params['message_id']))
+    return None
+
+
+def _retry_after(payload: bytes) -> Optional[float]:
+    try:
+        return float(json.loads(payload)['parameters']['retry_after'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class TelegramTransport(InstrumentedHTTPXRequest):
+    """HTTPXRequest с пулом, HTTP/2, склейкой правок и паузой по RetryAfter."""
+
+    def __init__(
+        self,
+        connection_pool_size: int = 32,
+        http2: bool = True,
+        max_retry_after: float = 30,
+        coalesce_edits: bool = True,
+        **kwargs
+    ):
+        http_version = '2' if http2 and HTTP2_AVAILABLE else '1.1'
+        if http2 and not HTTP2_AVAILABLE:
+            logger.info("HTTP/2 для Bot API недоступен (нет пакета h2), используется HTTP/1.1")
+
+        super().__init__(connection_pool_size=connection_pool_size, http_version=http_version, **kwargs)
+        self.pool_size = connection_pool_size
+        self.max_retry_after = max_retry_after
+        self.coalesce_edits = coalesce_edits
+        self._paused_until = 0.0
+        self._edit_slots: Dict[tuple, _EditSlot] = {}
+
+        STATS.pool_size = connection_pool_size
+        STATS.http_version = http_version
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs) -> Response:
+        if self.coalesce_edits and telegram_method(url) == 'editMessageText':
+            key = _edit_key(request_data)
+            if key is not None:
+                return await self._coalesced_edit(
+                    key, lambda: self._throttled_request(url, method, request_data, kwargs)
+                )
+        return await self._throttled_request(url, method, request_data, kwargs)
+
+    # --- Склейка правок ---
+
+    async def _coalesced_edit(self, key: tuple, send: Callable[[], Awaitable[Response]]) -> Response:
+        slot = self._edit_slots.get(key)
+        if slot is None:
+            slot = self._edit_slots[key] = _EditSlot()
+        slot.last_ticket += 1
+        ticket = slot.last_ticket
+        slot.waiting.add(ticket)
+        slot.users += 1
+        decided = False
+
+        try:
+            async with slot.lock:
+                slot.waiting.discard(ticket)
+                decided = True
+                if slot.has_newer(ticket):
+                    # Пока ждали, пришла более новая правка — отправит она
+                    STATS.edits_coalesced += 1
+                    superseded_by = slot.next_result
+                else:
+                    result_future = slot.next_result
+                    slot.next_result = asyncio.get_running_loop().create_future()
+                    try:
+                        result = await send()
+                    except BaseException as e:
+                        if isinstance(e, asyncio.CancelledError):
+                            e = NetworkError("Правка сообщения отменена")
+                        result_future.set_exception(e)
+                        result_future.exception()
+                        raise
+                    result_future.set_result(result)
+                    return result
+
+            return await superseded_by
+        finally:
+            slot.waiting.discard(ticket)
+            if not decided and not slot.has_newer(ticket):
+                # Самая новая правка снята, не дойдя до отправки
+                slot.abort_pending()
+            slot.users -= 1
+            if not slot.users:
+                self._edit_slots.pop(key, None)
+
+    # --- Пауза по RetryAfter ---
+
+    async def _wait_for_pause(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = self._paused_until - loop.time()
+            if delay <= 0:
+                return
+            STATS.throttled_seconds += delay
+            await asyncio.sleep(delay)
+
+    async def _throttled_request(self, url: str, method: str, request_data, kwargs: Dict[str, Any]) -> Response:
+        retried = False
+        while True:
+            await self._wait_for_pause()
+            code, payload = await self._pooled_request(url, method, request_data, kwargs)
+            if code != 429:
+                return code, payload
+
+            retry_after = _retry_after(payload)
+            if retry_after is None:
+                return code, payload
+
+            STATS.retry_after += 1
+            loop = asyncio.get_running_loop()
+            self._paused_until = max(self._paused_until, loop.time() + retry_after)
+            logger.warning(
+                f"Telegram flood control on {telegram_method(url)}: "
+                f"все запросы приостановлены на {retry_after:.0f}с"
+            )
+            if retried or retry_after > self.max_retry_after:
+                return code, payload
+            retried = True
+
+    async def _pooled_request(self, url: str, method: str, request_data, kwargs: Dict[str, Any]) -> Response:
+        STATS.requests += 1
+        STATS.in_flight += 1
+        STATS.peak_in_flight = max(STATS.peak_in_flight, STATS.in_flight)
+        if STATS.in_flight > self.pool_size:
+            STATS.saturated += 1
+        try:
+            return await super().do_request(url, method, request_data=request_data, **kwargs)
+        except TimedOut as e:
+            if isinstance(e.__cause__, httpx.PoolTimeout):
+                STATS.pool_timeouts += 1
+            raise
+        finally:
+            STATS.in_flight -= 1
+
+
+# ============================================================
+# МЕТРИКИ
+# ============================================================
+
+_PROMETHEUS_METRICS = (
+    ('telegram_pool_size', 'gauge', 'Размер пула соединений к Bot API', 'pool_size'),
+    ('telegram_requests_in_flight', 'gauge', 'Запросов к Bot API в работе', 'in_flight'),
+    ('telegram_requests_in_flight_peak', 'gauge', 'Пик одновременных запросов к Bot API', 'peak_in_flight'),
+    ('telegram_requests_total', 'counter', 'Запросов к Bot API', 'requests'),
+    ('telegram_pool_saturated_total', 'counter', 'Запросов, заставших пул занятым', 'saturated'),
+    ('telegram_pool_timeouts_total', 'counter', 'Запросов, не дождавшихся соединения', 'pool_timeouts'),
+    ('telegram_retry_after_total', 'counter', 'Ответов 429 (RetryAfter)', 'retry_after'),
+    ('telegram_throttled_seconds_total', 'counter', 'Суммарное ожидание запросов из-за RetryAfter', 'throttled_seconds'),
+    ('telegram_edits_coalesced_total', 'counter', 'Правок сообщений, замененных более новыми', 'edits_coalesced'),
+)
+
+
+def render_prometheus() -> str:
+    """Счетчики транспорта в текстовом формате Prometheus."""
+    lines: List[str] = []
+    for name, kind, description, attr in _PROMETHEUS_METRICS:
+        value = getattr(STATS, attr)
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {round(value, 3) if isinstance(value, float) else value}")
+    return "\n".join(lines) + "\n"
+
+
+def format_transport_report() -> str:
+    """Состояние пула для админского отчета (HTML)."""
+    return (
+        f"<b>Пул Bot API</b> (HTTP/{STATS.http_version}, {STATS.pool_size} соед.)\n"
+        f"Сейчас в работе: {STATS.in_flight}, пик: {STATS.peak_in_flight}\n"
+        f"Ждали соединения: {STATS.saturated} из {STATS.requests}, pool timeout: {STATS.pool_timeouts}\n"
+        f"RetryAfter: {STATS.retry_after} (ожидание {STATS.throttled_seconds:.0f} с)\n"
+        f"Склеено правок: {STATS.edits_coalesced}"
+    )
@@ -38,6 +38,37 @@ QUIET_HOURS_START = 22  # 22:00
 QUIET_HOURS_END = 8     # 08:00
 
 
+def is_quiet_hour(local_hour: int) -> bool:
+    """True, если локальный час попадает в тихие часы (22:00 - 08:00)."""
+    return QUIET_HOURS_START <= local_hour or local_hour < QUIET_HOURS_END
+
+
+def is_optimal_hour(local_hour: int, preferred_hour: int = 18, tolerance: int = 2) -> bool:
+    """True, если локальный час не в тихие часы и не дальше tolerance от preferred_hour."""
+    if is_quiet_hour(local_hour):
+        return False
+
+    diff = abs(local_hour - preferred_hour)
+    # Учитываем переход через полночь
+    diff = min(diff, 24 - diff)
+
+    return diff <= tolerance
+
+
+def time_until_midnight(local_time: datetime) -> Tuple[int, int]:
+    """(hours_left, minutes_left) до ближайшей полуночи локального времени."""
+    midnight = local_time.replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) + timedelta(days=1)
+
+    time_left = midnight - local_time
+
+    hours_left = int(time_left.total_seconds() // 3600)
+    minutes_left = int((time_left.total_seconds() % 3600) // 60)
+
+    return hours_left, minutes_left
+
+
 class TimezoneManager:
     """Менеджер часовых поясов пользователей"""
 
@@ -172,10 +203,7 @@ class TimezoneManager:
         local_hour = await self.get_user_local_hour(user_id)
 
         # Тихие часы: 22:00 - 08:00
-        if QUIET_HOURS_START <= local_hour or local_hour < QUIET_HOURS_END:
-            return True
-
-        return False
+        return is_quiet_hour(local_hour)
 
     async def is_optimal_notification_time(
         self,
@@ -194,18 +222,9 @@ class TimezoneManager:
         Returns:
             True если сейчас оптимальное время (±tolerance от preferred_hour)
         """
-        # Проверяем тихие часы
-        if await self.is_quiet_hours(user_id):
-            return False
-
         local_hour = await self.get_user_local_hour(user_id)
 
-        # Проверяем близость к предпочитаемому часу
-        diff = abs(local_hour - preferred_hour)
-        # Учитываем переход через полночь
-        diff = min(diff, 24 - diff)
-
-        return diff <= tolerance
+        return is_optimal_hour(local_hour, preferred_hour, tolerance)
 
     async def get_users_for_notification_now(
         self,
@@ -270,17 +289,7 @@ class TimezoneManager:
         """
         user_time = await self.get_user_local_time(user_id)
 
-        # Полночь следующего дня
-        midnight = user_time.replace(
-            hour=0, minute=0, second=0, microsecond=0
-        ) + timedelta(days=1)
-
-        time_left = midnight - user_time
-
-        hours_left = int(time_left.total_seconds() // 3600)
-        minutes_left = int((time_left.total_seconds() % 3600) // 60)
-
-        return hours_left, minutes_left
+        return time_until_midnight(user_time)
 
     async def ensure_user_timezone_record(self, user_id: int) -> None:
         """
@@ -4,12 +4,14 @@
 import asyncio
 import random
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 import logging
 
+from core.progress_reporter import ProgressReporter
+
 logger = logging.getLogger(__name__)
 
 async def show_thinking_animation(message: Message, text: str = "Анализирую") -> Message:
@@ -50,6 +52,9 @@ async def show_extended_thinking_animation(message: Message, text: str = "Про
                                          duration: int = 40) -> Message:
     """
     Показывает длительную анимированную проверку для AI-оценки.
+
+    Кадры анимации идут через ProgressReporter: в Telegram уходит не больше
+    одной правки за интервал. Убирать сообщение — stop_thinking_animation().
     
     Args:
         message: Сообщение для ответа
@@ -63,51 +68,32 @@ async def show_extended_thinking_animation(message: Message, text: str = "Про
     dots_sequence = [".", "..", "..."]
     
     # Отправляем начальное сообщение
-    thinking_msg = await message.reply_text(f"{emojis[0]} {text}{dots_sequence[0]}")
+    reporter = await ProgressReporter.send(message, f"{emojis[0]} {text}{dots_sequence[0]}")
     
     # Создаем фоновую задачу для анимации
     async def animate():
-        try:
-            # Получаем объект бота
-            bot = thinking_msg.get_bot()
-            chat_id = thinking_msg.chat_id
-            message_id = thinking_msg.message_id
-            
-            update_interval = 1.5
-            iterations = int(duration / update_interval)
-            
-            for i in range(iterations):
-                emoji_index = (i // 3) % len(emojis)
-                emoji = emojis[emoji_index]
-                dots = dots_sequence[i % len(dots_sequence)]
-                
-                try:
-                    if i % 10 == 5:
-                        variation_text = "Анализирую детали"
-                    elif i % 10 == 8:
-                        variation_text = "Почти готово"
-                    else:
-                        variation_text = text
-                    
-                    # Используем bot.edit_message_text
-                    await bot.edit_message_text(
-                        text=f"{emoji} {variation_text}{dots}",
-                        chat_id=chat_id,
-                        message_id=message_id
-                    )
-                    await asyncio.sleep(update_interval)
-                    
-                except Exception as e:
-                    logger.debug(f"Animation stopped: {e}")
-                    break
-                    
-        except Exception as e:
-            logger.error(f"Animation error: {e}")
-    
-    # Запускаем анимацию в фоне
-    asyncio.create_task(animate())
+        update_interval = 1.5
+        iterations = int(duration / update_interval)
+
+        for i in range(iterations):
+            if reporter.closed:
+                break
+            emoji_index = (i // 3) % len(emojis)
+            emoji = emojis[emoji_index]
+            dots = dots_sequence[i % len(dots_sequence)]
+
+            if i % 10 == 5:
+                variation_text = "Анализирую детали"
+            elif i % 10 == 8:
+                variation_text = "Почти готово"
+            else:
+                variation_text = text
+
+            reporter.update(f"{emoji} {variation_text}{dots}")
+            await asyncio.sleep(update_interval)
+        _thinking_reporters.pop(_message_key(reporter.message), None)
     
-    return thinking_msg
+    return _start_animation(reporter, animate())
 
 
 async def show_ai_evaluation_animation(message: Message, duration: int = 40) -> Message:
@@ -135,7 +121,7 @@ async def show_ai_evaluation_animation(message: Message, duration: int = 40) ->
     
     # Отправляем начальное сообщение
     emoji, text = phases[0]
-    thinking_msg = await message.reply_text(f"{emoji} {text}{dots_sequence[0]}")
+    reporter = await ProgressReporter.send(message, f"{emoji} {text}{dots_sequence[0]}")
     
     # Рассчитываем время для каждой фазы
     phase_duration = duration / len(phases)
@@ -143,55 +129,72 @@ async def show_ai_evaluation_animation(message: Message, duration: int = 40) ->
     
     # Создаём корутину для анимации
     async def run_animation():
-        try:
-            # Получаем объект бота из сообщения
-            bot = thinking_msg.get_bot()
-            chat_id = thinking_msg.chat_id
-            message_id = thinking_msg.message_id
-            
-            for phase_idx, (emoji, phase_text) in enumerate(phases):
-                for update_idx in range(updates_per_phase):
-                    dots = dots_sequence[update_idx % len(dots_sequence)]
-                    
-                    try:
-                        # Используем bot.edit_message_text вместо message.edit_text
-                        if update_idx == updates_per_phase - 1 and phase_idx < len(phases) - 1:
-                            await bot.edit_message_text(
-                                text=f"{emoji} {phase_text}... ✓",
-                                chat_id=chat_id,
-                                message_id=message_id
-                            )
-                            await asyncio.sleep(0.7)
-                        else:
-                            await bot.edit_message_text(
-                                text=f"{emoji} {phase_text}{dots}",
-                                chat_id=chat_id,
-                                message_id=message_id
-                            )
-                            await asyncio.sleep(1.3)
-                            
-                    except Exception as e:
-                        logger.debug(f"Animation update failed: {e}")
-                        return
-            
-            # Финальное сообщение
-            try:
-                await bot.edit_message_text(
-                    text="✅ Проверка завершена!",
-                    chat_id=chat_id,
-                    message_id=message_id
-                )
-                await asyncio.sleep(0.5)
-            except:
-                pass
-                
-        except Exception as e:
-            logger.error(f"Animation error: {e}")
+        for phase_idx, (emoji, phase_text) in enumerate(phases):
+            for update_idx in range(updates_per_phase):
+                if reporter.closed:
+                    return
+                dots = dots_sequence[update_idx % len(dots_sequence)]
+
+                if update_idx == updates_per_phase - 1 and phase_idx < len(phases) - 1:
+                    reporter.update(f"{emoji} {phase_text}... ✓")
+                    await asyncio.sleep(0.7)
+                else:
+                    reporter.update(f"{emoji} {phase_text}{dots}")
+                    await asyncio.sleep(1.3)
+
+        # Финальное сообщение
+        await reporter.finish("✅ Проверка завершена!")
+        _thinking_reporters.pop(_message_key(reporter.message), None)
     
+    return _start_animation(reporter, run_animation())
+
+
+# Анимации, которые еще идут: (chat_id, message_id) -> ProgressReporter
+_thinking_reporters: Dict[Tuple[int, int], ProgressReporter] = {}
+
+
+def _message_key(message: Message) -> Tuple[int, int]:
+    return message.chat_id, message.message_id
+
+
+def _start_animation(reporter: ProgressReporter, animation) -> Message:
+    _thinking_reporters[_message_key(reporter.message)] = reporter
     # Запускаем анимацию как фоновую задачу
-    asyncio.create_task(run_animation())
-    
-    return thinking_msg
+    asyncio.create_task(animation)
+    return reporter.message
+
+
+async def stop_thinking_animation(thinking_msg: Message):
+    """Останавливает анимацию и удаляет ее сообщение (ошибки удаления не важны)."""
+    reporter = _thinking_reporters.pop(_message_key(thinking_msg), None)
+    if reporter is not None:
+        await reporter.delete()
+        return
+    try:
+        await thinking_msg.delete()
+    except Exception as e:
+        logger.debug(f"Failed to delete thinking message: {e}")
+
+
+async def finish_thinking_animation(
+    thinking_msg: Message,
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    parse_mode: Optional[str] = None
+):
+    """
+    Показывает результат в сообщении анимации вместо нее.
+
+    Итог уходит через ProgressReporter анимации: отложенный кадр и
+    финальное «✅ Проверка завершена!» уже не перезапишут результат.
+    """
+    reporter = _thinking_reporters.pop(_message_key(thinking_msg), None)
+    if reporter is not None:
+        reporter.parse_mode = parse_mode
+        if await reporter.finish(text, reply_markup=reply_markup):
+            return
+    # Анимация уже закончилась (или правка не прошла) — правим напрямую
+    await thinking_msg.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
 
 async def show_streak_notification(update: Update, context: ContextTypes.DEFAULT_TYPE, 
                                  streak_type: str, value: int):
@@ -448,6 +451,8 @@ __all__ = [
     'show_thinking_animation',
     'show_extended_thinking_animation',
     'show_ai_evaluation_animation',
+    'stop_thinking_animation',
+    'finish_thinking_animation',
     'show_streak_notification',
     'get_personalized_greeting',
     'get_motivational_message',
@@ -24,6 +24,7 @@ from dataclasses import dataclass
 
 from core.image_preprocessor import preprocess_for_ocr, preprocess_for_ocr_enhanced, compress_for_claude
 from core.ai_service import _get_provider, AIProvider
+from core.latency_metrics import AI_LATENCY, timed
 
 logger = logging.getLogger(__name__)
 
@@ -170,6 +171,7 @@ class VisionService:
         """Очистка ресурсов"""
         await self._close_session()
 
+    @timed(AI_LATENCY, 'vision', 'process_telegram_photo')
     async def process_telegram_photo(
         self,
         photo: PhotoSize,
@@ -285,6 +287,7 @@ class VisionService:
     # Claude Vision API — распознавание рукописного текста напрямую
     # ================================================================
 
+    @timed(AI_LATENCY, 'vision', 'recognize_claude')
     async def _recognize_with_claude(
         self,
         image_bytes: bytes,
@@ -630,6 +633,7 @@ class VisionService:
             logger.error(f"Error extracting Claude response: {e}", exc_info=True)
             return ''
 
+    @timed(AI_LATENCY, 'vision', 'ocr')
     async def _recognize_text(self, image_bytes: bytes) -> Dict[str, Any]:
         """
         Распознавание текста из изображения через Yandex Vision API.
@@ -818,6 +822,7 @@ class VisionService:
             logger.error(f"Error extracting text from Vision API response: {e}", exc_info=True)
             return '', 0.0
 
+    @timed(AI_LATENCY, 'vision', 'ocr_correction')
     async def _correct_ocr_with_llm(
         self,
         ocr_text: str,
@@ -5,12 +5,13 @@
 - flashcard_decks: Колоды карточек
 - flashcard_cards: Карточки внутри колод
 - flashcard_progress: Прогресс пользователя по каждой карточке (SM-2)
+- flashcard_generation_state: Хэши источников и колод для инкрементальной генерации
 """
 
 import logging
 import aiosqlite
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from core.db import DATABASE_FILE
 
@@ -65,6 +66,18 @@ async def ensure_tables() -> None:
 
             CREATE INDEX IF NOT EXISTS idx_fc_cards_deck
                 ON flashcard_cards(deck_id);
+
+            CREATE TABLE IF NOT EXISTS flashcard_generation_state (
+                key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+
+            -- Покрывающий индекс для сводной статистики по колодам
+            CREATE INDEX IF NOT EXISTS idx_fc_progress_deck_stats
+                ON flashcard_progress(
+                    user_id, deck_id, next_review, interval_days, correct_count
+                );
         """)
         await db.commit()
         logger.info("Flashcard tables ensured")
@@ -186,6 +199,128 @@ async def bulk_upsert_cards(cards: List[Dict[str, Any]]) -> None:
         await db.commit()
 
 
+async def get_generation_hashes() -> Dict[str, str]:
+    """Возвращает сохранённые хэши источников и колод."""
+    async with aiosqlite.connect(DATABASE_FILE) as db:
+        cursor = await db.execute(
+            "SELECT key, content_hash FROM flashcard_generation_state"
+        )
+        return {key: content_hash for key, content_hash in await cursor.fetchall()}
+
+
+async def set_generation_hashes(hashes: Dict[str, str]) -> None:
+    """Сохраняет хэши источников и колод."""
+    if not hashes:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    async with aiosqlite.connect(DATABASE_FILE) as db:
+        await db.executemany("""
+            INSERT INTO flashcard_generation_state (key, content_hash, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                updated_at = excluded.updated_at
+        """, [(key, value, now) for key, value in hashes.items()])
+        await db.commit()
+
+
+_CARD_FIELDS = ('deck_id', 'front_text', 'back_text', 'hint', 'sort_order')
+
+
+async def sync_decks(decks: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Приводит колоды и их карточки в БД к заданному состоянию одной транзакцией.
+
+    Записываются только добавленные и изменённые карточки; карточки,
+    которых больше нет в колоде, удаляются вместе с прогрессом. Карточка,
+    перешедшая в другую колоду, переносится с сохранением прогресса.
+
+    Args:
+        decks: [{'deck': {id, title, description, category, icon, is_premium},
+                 'cards': [{id, deck_id, front_text, back_text, hint, sort_order}]}]
+
+    Returns:
+        {added, changed, removed}
+    """
+    stats = {'added': 0, 'changed': 0, 'removed': 0}
+    if not decks:
+        return stats
+
+    deck_ids = [spec['deck']['id'] for spec in decks]
+    now = datetime.now(timezone.utc).isoformat()
+
+    async with aiosqlite.connect(DATABASE_FILE) as db:
+        cursor = await db.execute(
+            "SELECT id, deck_id, front_text, back_text, hint, sort_order FROM flashcard_cards"
+        )
+        existing = {row[0]: row[1:] for row in await cursor.fetchall()}
+
+        upserts: List[Dict[str, Any]] = []
+        moved: List[tuple] = []
+        wanted_ids = set()
+        for spec in decks:
+            for card in spec['cards']:
+                wanted_ids.add(card['id'])
+                current = existing.get(card['id'])
+                desired = tuple(card.get(field) for field in _CARD_FIELDS)
+                if current is None:
+                    stats['added'] += 1
+                elif current != desired:
+                    stats['changed'] += 1
+                    if current[0] != card['deck_id']:
+                        moved.append((card['deck_id'], card['id']))
+                else:
+                    continue
+                upserts.append(card)
+
+        removed = [
+            card_id for card_id, row in existing.items()
+            if row[0] in deck_ids and card_id not in wanted_ids
+        ]
+        stats['removed'] = len(removed)
+
+        await db.executemany("""
+            INSERT INTO flashcard_decks (id, title, description, category, icon, is_premium, created_at)
+            VALUES (:id, :title, :description, :category, :icon, :is_premium, :created_at)
+            ON CONFLICT(id) DO UPDATE SET
+                title = excluded.title,
+                description = excluded.description,
+                category = excluded.category,
+                icon = excluded.icon,
+                is_premium = excluded.is_premium
+        """, [{**spec['deck'], 'created_at': now} for spec in decks])
+
+        await db.executemany("""
+            INSERT INTO flashcard_cards (id, deck_id, front_text, back_text, hint, sort_order)
+            VALUES (:id, :deck_id, :front_text, :back_text, :hint, :sort_order)
+            ON CONFLICT(id) DO UPDATE SET
+                deck_id = excluded.deck_id,
+                front_text = excluded.front_text,
+                back_text = excluded.back_text,
+                hint = excluded.hint,
+                sort_order = excluded.sort_order
+        """, upserts)
+
+        await db.executemany(
+            "UPDATE flashcard_progress SET deck_id = ? WHERE card_id = ?", moved
+        )
+        await db.executemany(
+            "DELETE FROM flashcard_progress WHERE card_id = ?", [(cid,) for cid in removed]
+        )
+        await db.executemany(
+            "DELETE FROM flashcard_cards WHERE id = ?", [(cid,) for cid in removed]
+        )
+
+        await db.executemany("""
+            UPDATE flashcard_decks
+            SET card_count = (SELECT COUNT(*) FROM flashcard_cards WHERE deck_id = ?)
+            WHERE id = ?
+        """, [(deck_id, deck_id) for deck_id in deck_ids])
+        await db.commit()
+
+    return stats
+
+
 # ============================================================
 # PROGRESS / SM-2 OPERATIONS
 # ============================================================
@@ -232,7 +367,9 @@ async def get_cards_due_for_review(
               AND (p.next_review IS NULL OR p.next_review <= ?)
             ORDER BY
                 is_new DESC,
-                p.next_review ASC
+                p.next_review ASC,
+                CASE WHEN p.card_id IS NULL THEN c.sort_order ELSE 0 END,
+                c.id
             LIMIT ?
         """, (user_id, deck_id, now, limit))
 
@@ -240,6 +377,48 @@ async def get_cards_due_for_review(
         return [dict(row) for row in rows]
 
 
+async def get_cards_with_progress(
+    user_id: int,
+    card_ids: List[str],
+) -> List[Dict[str, Any]]:
+    """
+    Возвращает карточки по ID вместе с прогрессом пользователя.
+
+    Формат совпадает с get_cards_due_for_review; порядок не гарантируется.
+    """
+    if not card_ids:
+        return []
+
+    placeholders = ",".join("?" * len(card_ids))
+    async with aiosqlite.connect(DATABASE_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(f"""
+            SELECT
+                c.id as card_id,
+                c.deck_id,
+                c.front_text,
+                c.back_text,
+                c.hint,
+                COALESCE(p.easiness_factor, 2.5) as easiness_factor,
+                COALESCE(p.interval_days, 0) as interval_days,
+                COALESCE(p.repetition_number, 0) as repetition_number,
+                p.next_review,
+                p.last_reviewed,
+                COALESCE(p.total_reviews, 0) as total_reviews,
+                CASE
+                    WHEN p.card_id IS NULL THEN 1
+                    ELSE 0
+                END as is_new
+            FROM flashcard_cards c
+            LEFT JOIN flashcard_progress p
+                ON c.id = p.card_id AND p.user_id = ?
+            WHERE c.id IN ({placeholders})
+        """, (user_id, *card_ids))
+
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
 async def update_card_progress(
     user_id: int,
     card_id: str,
@@ -322,6 +501,84 @@ async def get_deck_stats(user_id: int, deck_id: str) -> Dict[str, int]:
         }
 
 
+async def get_decks_overview(user_id: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Все колоды со статистикой пользователя за один запрос.
+
+    Returns:
+        (decks, overall): колоды в порядке get_all_decks() с ключом 'stats'
+        (как у get_deck_stats) и общая статистика (как у get_user_overall_stats)
+    """
+    now = datetime.now(timezone.utc).isoformat()
+
+    async with aiosqlite.connect(DATABASE_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("""
+            WITH card_totals AS (
+                SELECT deck_id, COUNT(*) AS total
+                FROM flashcard_cards
+                GROUP BY deck_id
+            ),
+            user_progress AS (
+                SELECT
+                    deck_id,
+                    COUNT(*) AS reviewed,
+                    SUM(CASE WHEN interval_days >= 21 THEN 1 ELSE 0 END) AS mastered,
+                    SUM(CASE WHEN next_review <= ? THEN 1 ELSE 0 END) AS due,
+                    SUM(correct_count) AS correct
+                FROM flashcard_progress
+                WHERE user_id = ?
+                GROUP BY deck_id
+            )
+            SELECT
+                d.*,
+                COALESCE(ct.total, 0) AS stat_total,
+                COALESCE(up.reviewed, 0) AS stat_reviewed,
+                COALESCE(up.mastered, 0) AS stat_mastered,
+                COALESCE(up.due, 0) AS stat_due,
+                COALESCE(up.correct, 0) AS stat_correct
+            FROM flashcard_decks d
+            LEFT JOIN card_totals ct ON ct.deck_id = d.id
+            LEFT JOIN user_progress up ON up.deck_id = d.id
+            ORDER BY d.category, d.title
+        """, (now, user_id))
+        rows = await cursor.fetchall()
+
+    decks = []
+    overall = {
+        'total_reviews': 0,
+        'total_correct': 0,
+        'unique_cards': 0,
+        'decks_touched': 0,
+    }
+    for row in rows:
+        deck = dict(row)
+        total = deck.pop('stat_total')
+        reviewed = deck.pop('stat_reviewed')
+        mastered = deck.pop('stat_mastered')
+        due_today = deck.pop('stat_due')
+        correct = deck.pop('stat_correct')
+
+        new_cards = total - reviewed
+        deck['stats'] = {
+            'total': total,
+            'new': new_cards,
+            'reviewing': reviewed - mastered,
+            'mastered': mastered,
+            'due_today': due_today + new_cards,
+        }
+        decks.append(deck)
+
+        # Прогресс по карточкам без колоды в flashcard_decks не учитывается
+        overall['total_reviews'] += reviewed
+        overall['unique_cards'] += reviewed
+        overall['total_correct'] += correct
+        if reviewed:
+            overall['decks_touched'] += 1
+
+    return decks, overall
+
+
 async def get_card_progress(user_id: int, card_id: str) -> Optional[Dict[str, Any]]:
     """Возвращает прогресс пользователя по конкретной карточке."""
     async with aiosqlite.connect(DATABASE_FILE) as db:
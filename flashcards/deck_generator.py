@@ -5,12 +5,17 @@
 - data/task23_questions.json → Колода "Конституция РФ"
 - WebApp/glossary.json → Колода "Глоссарий обществознания"
 - user_mistakes + questions.json → Персональная колода ошибок
+
+Общие колоды генерируются инкрементально: для каждого источника и каждой
+колоды хранится хэш содержимого. Неизменённые источники не разбираются,
+неизменённые колоды не пишутся, а в изменённых записывается только разница.
 """
 
+import hashlib
 import json
 import logging
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import aiosqlite
 
@@ -21,53 +26,147 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
 
-async def generate_all_decks() -> None:
-    """Генерирует все колоды из доступных источников данных."""
+# Увеличить при изменении логики построения колод — это сбросит все хэши
+DECK_GENERATOR_VERSION = 1
+
+
+def _hash_bytes(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _hash_deck(spec: Dict[str, Any]) -> str:
+    payload = json.dumps(spec, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return _hash_bytes(payload)
+
+
+def _source_hash(path: Optional[str]) -> Optional[str]:
+    """Хэш файла-источника с учётом версии генератора."""
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    return _hash_bytes(f"v{DECK_GENERATOR_VERSION}:".encode('utf-8') + content)
+
+
+async def generate_all_decks(force: bool = False) -> bool:
+    """
+    Генерирует общие колоды из доступных источников данных.
+
+    Args:
+        force: игнорировать сохранённые хэши и сверить все колоды
+
+    Returns:
+        True, если в БД что-то изменилось
+    """
     logger.info("Starting deck generation...")
 
-    await generate_constitution_deck()
-    await generate_glossary_decks()
-    await generate_topic_decks()
+    sources = [
+        ('constitution', _constitution_path(), _build_constitution_deck),
+        ('glossary', _glossary_path(), _build_glossary_decks),
+        ('topics', _topics_path(), _build_topic_decks),
+    ]
+
+    stored = {} if force else await flashcard_db.get_generation_hashes()
+    new_hashes: Dict[str, str] = {}
+    changed_specs: List[Dict[str, Any]] = []
+
+    for name, path, builder in sources:
+        source_hash = _source_hash(path)
+        source_key = f"source:{name}"
+        if source_hash is not None and stored.get(source_key) == source_hash:
+            logger.info(f"Deck source '{name}' unchanged, skipping")
+            continue
+
+        for spec in builder():
+            deck_key = f"deck:{spec['deck']['id']}"
+            deck_hash = _hash_deck(spec)
+            if stored.get(deck_key) == deck_hash:
+                continue
+            changed_specs.append(spec)
+            new_hashes[deck_key] = deck_hash
+
+        if source_hash is not None:
+            new_hashes[source_key] = source_hash
+
+    if changed_specs:
+        stats = await flashcard_db.sync_decks(changed_specs)
+        logger.info(
+            f"Synced {len(changed_specs)} decks: +{stats['added']} "
+            f"~{stats['changed']} -{stats['removed']} cards"
+        )
+    await flashcard_db.set_generation_hashes(new_hashes)
 
     logger.info("Deck generation complete")
+    return bool(changed_specs)
+
+
+def _deck_spec(
+    deck_id: str,
+    title: str,
+    description: str,
+    category: str,
+    icon: str,
+    cards: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    return {
+        'deck': {
+            'id': deck_id,
+            'title': title,
+            'description': description,
+            'category': category,
+            'icon': icon,
+            'is_premium': 0,
+        },
+        'cards': cards,
+    }
+
+
+async def _generate_from(builder) -> None:
+    """Безусловно записывает колоды одного источника."""
+    specs = builder()
+    if specs:
+        await flashcard_db.sync_decks(specs)
 
 
 # ============================================================
 # КОНСТИТУЦИЯ РФ (Задание 23)
 # ============================================================
 
+def _constitution_path() -> str:
+    return os.path.join(BASE_DIR, 'data', 'task23_questions.json')
+
+
 async def generate_constitution_deck() -> None:
+    """Генерирует колоду «Конституция РФ» без проверки хэшей."""
+    await _generate_from(_build_constitution_deck)
+
+
+def _build_constitution_deck() -> List[Dict[str, Any]]:
     """
-    Генерирует колоду карточек из task23_questions.json.
+    Строит колоду карточек из task23_questions.json.
 
     Для каждого вопроса:
     - Лицевая сторона: характеристика
     - Обратная сторона: положения Конституции (model_answers)
     """
-    data_path = os.path.join(BASE_DIR, 'data', 'task23_questions.json')
+    data_path = _constitution_path()
 
     try:
         with open(data_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
     except FileNotFoundError:
         logger.warning(f"Task23 data not found: {data_path}")
-        return
+        return []
 
     questions = data.get('questions', [])
     if not questions:
         logger.warning("No questions found in task23 data")
-        return
+        return []
 
     deck_id = "constitution_rf"
-    await flashcard_db.upsert_deck(
-        deck_id=deck_id,
-        title="Конституция РФ",
-        description="Положения Конституции для задания 23 ЕГЭ",
-        category="Конституционное право",
-        icon="📜",
-        is_premium=0,
-    )
-
     cards: List[Dict[str, Any]] = []
 
     for i, question in enumerate(questions):
@@ -115,10 +214,15 @@ async def generate_constitution_deck() -> None:
                         'sort_order': i * 10 + j,
                     })
 
-    if cards:
-        await flashcard_db.bulk_upsert_cards(cards)
-        await flashcard_db.update_deck_card_count(deck_id)
-        logger.info(f"Generated {len(cards)} constitution flashcards")
+    logger.info(f"Built {len(cards)} constitution flashcards")
+    return [_deck_spec(
+        deck_id,
+        title="Конституция РФ",
+        description="Положения Конституции для задания 23 ЕГЭ",
+        category="Конституционное право",
+        icon="📜",
+        cards=cards,
+    )]
 
 
 # ============================================================
@@ -206,34 +310,42 @@ def _classify_term(term_id: str, term_text: str, definition: str) -> str:
     return best_cat
 
 
+# Ищем glossary.json в нескольких местах (WebApp может быть не задеплоен)
+GLOSSARY_PATHS = [
+    os.path.join(BASE_DIR, 'data', 'glossary.json'),
+    os.path.join(BASE_DIR, 'WebApp', 'glossary.json'),
+]
+
+
+def _glossary_path() -> Optional[str]:
+    for data_path in GLOSSARY_PATHS:
+        if os.path.exists(data_path):
+            return data_path
+    return None
+
+
 async def generate_glossary_decks() -> None:
+    """Генерирует колоды глоссария без проверки хэшей."""
+    await _generate_from(_build_glossary_decks)
+
+
+def _build_glossary_decks() -> List[Dict[str, Any]]:
     """
-    Генерирует колоды из glossary.json.
+    Строит колоды из glossary.json.
 
     Разбивает термины по категориям (Экономика, Право, Политика, Человек и общество).
     """
-    # Ищем glossary.json в нескольких местах (WebApp может быть не задеплоен)
-    possible_paths = [
-        os.path.join(BASE_DIR, 'data', 'glossary.json'),
-        os.path.join(BASE_DIR, 'WebApp', 'glossary.json'),
-    ]
+    data_path = _glossary_path()
+    if data_path is None:
+        logger.warning(f"Glossary data not found in: {GLOSSARY_PATHS}")
+        return []
 
-    terms = None
-    for data_path in possible_paths:
-        try:
-            with open(data_path, 'r', encoding='utf-8') as f:
-                terms = json.load(f)
-            break
-        except FileNotFoundError:
-            continue
-
-    if terms is None:
-        logger.warning(f"Glossary data not found in: {possible_paths}")
-        return
+    with open(data_path, 'r', encoding='utf-8') as f:
+        terms = json.load(f)
 
     if not terms:
         logger.warning("No terms found in glossary")
-        return
+        return []
 
     # Классифицируем термины по категориям
     categorized: Dict[str, List[Dict]] = {cat: [] for cat in GLOSSARY_CATEGORIES}
@@ -250,21 +362,13 @@ async def generate_glossary_decks() -> None:
         categorized[category].append(term_data)
 
     # Создаём колоды
+    specs = []
     for cat_id, cat_info in GLOSSARY_CATEGORIES.items():
         cat_terms = categorized.get(cat_id, [])
         if not cat_terms:
             continue
 
         deck_id = f"glossary_{cat_id}"
-        await flashcard_db.upsert_deck(
-            deck_id=deck_id,
-            title=f"Термины: {cat_info['title']}",
-            description=f"Определения терминов раздела \"{cat_info['title']}\"",
-            category="Глоссарий",
-            icon=cat_info['icon'],
-            is_premium=0,
-        )
-
         cards = []
         for i, term_data in enumerate(cat_terms):
             term = term_data['term']
@@ -280,12 +384,17 @@ async def generate_glossary_decks() -> None:
                 'sort_order': i,
             })
 
-        if cards:
-            await flashcard_db.bulk_upsert_cards(cards)
-            await flashcard_db.update_deck_card_count(deck_id)
-            logger.info(
-                f"Generated {len(cards)} glossary flashcards for {cat_info['title']}"
-            )
+        specs.append(_deck_spec(
+            deck_id,
+            title=f"Термины: {cat_info['title']}",
+            description=f"Определения терминов раздела \"{cat_info['title']}\"",
+            category="Глоссарий",
+            icon=cat_info['icon'],
+            cards=cards,
+        ))
+        logger.info(f"Built {len(cards)} glossary flashcards for {cat_info['title']}")
+
+    return specs
 
 
 # ============================================================
@@ -385,43 +494,44 @@ async def generate_mistakes_deck(user_id: int) -> int:
 # ТЕМАТИЧЕСКИЕ КОЛОДЫ (Задание 13, издержки, налоги и т.д.)
 # ============================================================
 
+def _topics_path() -> str:
+    return os.path.join(BASE_DIR, 'data', 'flashcard_topics.json')
+
+
 async def generate_topic_decks() -> None:
+    """Генерирует тематические колоды без проверки хэшей."""
+    await _generate_from(_build_topic_decks)
+
+
+def _build_topic_decks() -> List[Dict[str, Any]]:
     """
-    Генерирует тематические колоды из data/flashcard_topics.json.
+    Строит тематические колоды из data/flashcard_topics.json.
 
     Каждый элемент JSON содержит deck_id, title, description, category, icon
     и массив cards с полями front/back.
     """
-    data_path = os.path.join(BASE_DIR, 'data', 'flashcard_topics.json')
+    data_path = _topics_path()
 
     try:
         with open(data_path, 'r', encoding='utf-8') as f:
             topics = json.load(f)
     except FileNotFoundError:
         logger.warning(f"Topic decks data not found: {data_path}")
-        return
+        return []
     except json.JSONDecodeError as e:
         logger.warning(f"Invalid JSON in flashcard_topics.json: {e}")
-        return
+        return []
 
     if not topics:
         logger.warning("No topic decks found in flashcard_topics.json")
-        return
+        return []
 
+    specs = []
     for topic in topics:
         deck_id = topic.get('deck_id', '')
         if not deck_id:
             continue
 
-        await flashcard_db.upsert_deck(
-            deck_id=deck_id,
-            title=topic.get('title', ''),
-            description=topic.get('description', ''),
-            category=topic.get('category', 'Темы'),
-            icon=topic.get('icon', '📚'),
-            is_premium=0,
-        )
-
         raw_cards = topic.get('cards', [])
         cards = []
         for i, card_data in enumerate(raw_cards):
@@ -439,9 +549,14 @@ async def generate_topic_decks() -> None:
                 'sort_order': i,
             })
 
-        if cards:
-            await flashcard_db.bulk_upsert_cards(cards)
-            await flashcard_db.update_deck_card_count(deck_id)
-            logger.info(
-                f"Generated {len(cards)} topic flashcards for '{topic.get('title', deck_id)}'"
-            )
+        specs.append(_deck_spec(
+            deck_id,
+            title=topic.get('title', ''),
+            description=topic.get('description', ''),
+            category=topic.get('category', 'Темы'),
+            icon=topic.get('icon', '📚'),
+            cards=cards,
+        ))
+
+    logger.info(f"Built {len(specs)} topic decks")
+    return specs
@@ -0,0 +1,274 @@
+"""
+Очередь карточек к повторению по всем колодам пользователя.
+
+Для каждого пользователя в памяти держится:
+- min-куча изученных карточек по next_review (просроченные — в её вершине);
+- списки новых карточек по колодам (в порядке sort_order).
+
+Очередь заполняется из БД одним проходом при первом обращении
+и дальше обновляется результатами SM-2 (record_review), поэтому выбор
+следующих N карточек стоит O(N log D) вместо LEFT JOIN по всем карточкам.
+Новые карточки разных колод чередуются по кругу; порядок новых
+и просроченных задаётся политикой.
+"""
+
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import aiosqlite
+
+from core.db import DATABASE_FILE
+from . import db as flashcard_db
+
+logger = logging.getLogger(__name__)
+
+# Политики чередования новых и просроченных карточек
+POLICY_NEW_FIRST = "new_first"          # как в get_cards_due_for_review
+POLICY_OVERDUE_FIRST = "overdue_first"
+POLICY_INTERLEAVE = "interleave"        # одна новая после каждых N просроченных
+
+DEFAULT_POLICY = POLICY_NEW_FIRST
+INTERLEAVE_OVERDUE_PER_NEW = 3
+
+# Через сколько секунд очередь пересобирается из БД
+# (прогресс может меняться из WebApp API в другом процессе)
+DUE_QUEUE_TTL_SECONDS = 600
+MAX_CACHED_QUEUES = 5000
+
+
+class UserDueQueue:
+    """Индекс карточек к повторению одного пользователя."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        # card_id -> (next_review, deck_id) для изученных карточек
+        self._scheduled: Dict[str, Tuple[str, str]] = {}
+        # Куча (next_review, card_id); устаревшие записи пропускаются лениво
+        self._heap: List[Tuple[str, str]] = []
+        # deck_id -> новые карточки в порядке sort_order
+        self._new: Dict[str, List[str]] = {}
+        self._new_pos: Dict[str, int] = {}
+        self._deck_rank: Dict[str, int] = {}
+        self.loaded_at = time.monotonic()
+
+    # ── Наполнение ──
+
+    def add_new_card(self, card_id: str, deck_id: str) -> None:
+        if deck_id not in self._new:
+            self._new[deck_id] = []
+            self._new_pos[deck_id] = 0
+            self._deck_rank[deck_id] = len(self._deck_rank)
+        self._new[deck_id].append(card_id)
+
+    def schedule(self, card_id: str, deck_id: str, next_review: str) -> None:
+        """Учитывает результат повторения (новая дата next_review)."""
+        self._scheduled[card_id] = (next_review, deck_id)
+        heapq.heappush(self._heap, (next_review, card_id))
+
+        # Пропускаем уже изученные карточки в начале списка новых
+        new_cards = self._new.get(deck_id)
+        if new_cards is not None:
+            pos = self._new_pos[deck_id]
+            while pos < len(new_cards) and new_cards[pos] in self._scheduled:
+                pos += 1
+            self._new_pos[deck_id] = pos
+
+        # Куча растёт при каждом повторении — периодически чистим дубликаты
+        if len(self._heap) > 2 * len(self._scheduled) + 64:
+            self._heap = [(nr, cid) for cid, (nr, _) in self._scheduled.items()]
+            heapq.heapify(self._heap)
+
+    # ── Выборка ──
+
+    def _take_overdue(
+        self, now: str, limit: int, deck_ids: Optional[Set[str]]
+    ) -> List[Tuple[str, str]]:
+        """До limit просроченных карточек по возрастанию next_review."""
+        taken: List[Tuple[str, str]] = []
+        popped: List[Tuple[str, str]] = []
+        seen: Set[str] = set()
+        while self._heap and len(taken) < limit:
+            next_review, card_id = self._heap[0]
+            if next_review > now:
+                break
+            heapq.heappop(self._heap)
+            current = self._scheduled.get(card_id)
+            if current is None or current[0] != next_review or card_id in seen:
+                continue  # устаревшая запись
+            popped.append((next_review, card_id))
+            seen.add(card_id)
+            if deck_ids is None or current[1] in deck_ids:
+                taken.append((card_id, current[1]))
+
+        # Выборка не меняет очередь — возвращаем актуальные записи обратно
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return taken
+
+    def _take_new(self, limit: int, deck_ids: Optional[Set[str]]) -> List[Tuple[str, str]]:
+        """До limit новых карточек, по одной из каждой колоды по кругу."""
+        heap = []
+        for deck_id, cards in self._new.items():
+            if deck_ids is not None and deck_id not in deck_ids:
+                continue
+            pos = self._new_pos[deck_id]
+            if pos < len(cards):
+                heap.append((pos, self._deck_rank[deck_id], deck_id))
+        heapq.heapify(heap)
+
+        taken: List[Tuple[str, str]] = []
+        while heap and len(taken) < limit:
+            pos, rank, deck_id = heapq.heappop(heap)
+            cards = self._new[deck_id]
+            card_id = cards[pos]
+            pos += 1
+            if card_id not in self._scheduled:
+                taken.append((card_id, deck_id))
+            while pos < len(cards) and cards[pos] in self._scheduled:
+                pos += 1
+            if pos < len(cards):
+                heapq.heappush(heap, (pos, rank, deck_id))
+        return taken
+
+    def next_cards(
+        self,
+        limit: int = 20,
+        policy: str = DEFAULT_POLICY,
+        deck_ids: Optional[Iterable[str]] = None,
+        now: Optional[str] = None,
+    ) -> List[Tuple[str, str, bool]]:
+        """
+        Следующие limit карточек к повторению.
+
+        Returns:
+            Список (card_id, deck_id, is_new)
+        """
+        if now is None:
+            now = datetime.now(timezone.utc).isoformat()
+        decks = set(deck_ids) if deck_ids is not None else None
+
+        new = [(cid, did, True) for cid, did in self._take_new(limit, decks)]
+        overdue = [(cid, did, False) for cid, did in self._take_overdue(now, limit, decks)]
+
+        if policy == POLICY_OVERDUE_FIRST:
+            return (overdue + new)[:limit]
+        if policy == POLICY_INTERLEAVE:
+            result = []
+            while (new or overdue) and len(result) < limit:
+                batch = overdue[:INTERLEAVE_OVERDUE_PER_NEW]
+                del overdue[:INTERLEAVE_OVERDUE_PER_NEW]
+                result.extend(batch)
+                if new and len(result) < limit:
+                    result.append(new.pop(0))
+            return result[:limit]
+        return (new + overdue)[:limit]
+
+    def due_count(self, now: Optional[str] = None) -> int:
+        """Количество карточек к повторению (новые + просроченные)."""
+        if now is None:
+            now = datetime.now(timezone.utc).isoformat()
+        new_count = sum(
+            1 for cards in self._new.values() for cid in cards if cid not in self._scheduled
+        )
+        overdue = sum(1 for nr, _ in self._scheduled.values() if nr <= now)
+        return new_count + overdue
+
+
+async def _load_queue(user_id: int) -> UserDueQueue:
+    """
+    Строит очередь пользователя из flashcard_progress и flashcard_cards.
+
+    Новые карточки берутся из общих колод, своей колоды ошибок
+    и персональных колод (учительских), которые пользователь уже начал.
+    """
+    queue = UserDueQueue(user_id)
+    async with aiosqlite.connect(DATABASE_FILE) as db:
+        cursor = await db.execute(r"""
+            SELECT c.id, c.deck_id
+            FROM flashcard_cards c
+            JOIN flashcard_decks d ON d.id = c.deck_id
+            WHERE (
+                (d.id NOT LIKE 'mistakes\_%' ESCAPE '\'
+                 AND d.id NOT LIKE 'teacher\_%' ESCAPE '\')
+                OR d.id = 'mistakes_' || ?
+                OR d.id IN (
+                    SELECT DISTINCT deck_id FROM flashcard_progress WHERE user_id = ?
+                )
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM flashcard_progress p
+                WHERE p.user_id = ? AND p.card_id = c.id
+            )
+            ORDER BY d.category, d.title, c.sort_order, c.id
+        """, (user_id, user_id, user_id))
+        for card_id, deck_id in await cursor.fetchall():
+            queue.add_new_card(card_id, deck_id)
+
+        cursor = await db.execute("""
+            SELECT card_id, deck_id, COALESCE(next_review, '')
+            FROM flashcard_progress
+            WHERE user_id = ?
+        """, (user_id,))
+        rows = await cursor.fetchall()
+
+    queue._scheduled = {card_id: (next_review, deck_id) for card_id, deck_id, next_review in rows}
+    queue._heap = [(next_review, card_id) for card_id, _, next_review in rows]
+    heapq.heapify(queue._heap)
+    return queue
+
+
+_queues: "OrderedDict[int, UserDueQueue]" = OrderedDict()
+
+
+async def get_due_queue(user_id: int) -> UserDueQueue:
+    """Очередь пользователя (из кэша или загруженная из БД)."""
+    queue = _queues.get(user_id)
+    if queue is None or time.monotonic() - queue.loaded_at > DUE_QUEUE_TTL_SECONDS:
+        queue = await _load_queue(user_id)
+        _queues[user_id] = queue
+    _queues.move_to_end(user_id)
+    while len(_queues) > MAX_CACHED_QUEUES:
+        _queues.popitem(last=False)
+    return queue
+
+
+def record_review(user_id: int, card_id: str, deck_id: str, next_review: str) -> None:
+    """Обновляет очередь после повторения карточки (если она загружена)."""
+    queue = _queues.get(user_id)
+    if queue is not None:
+        queue.schedule(card_id, deck_id, next_review)
+
+
+def invalidate_due_queues(user_id: Optional[int] = None) -> None:
+    """Сбрасывает очередь пользователя (или все) — например, после генерации колоды."""
+    if user_id is None:
+        _queues.clear()
+    else:
+        _queues.pop(user_id, None)
+
+
+async def get_due_cards(
+    user_id: int,
+    limit: int = 20,
+    policy: str = DEFAULT_POLICY,
+    deck_ids: Optional[Iterable[str]] = None,
+) -> List[Dict]:
+    """
+    Карточки к повторению по всем колодам (или по deck_ids).
+
+    Формат элементов совпадает с flashcard_db.get_cards_due_for_review.
+    """
+    queue = await get_due_queue(user_id)
+    picked = queue.next_cards(limit=limit, policy=policy, deck_ids=deck_ids)
+    if not picked:
+        return []
+
+    cards = await flashcard_db.get_cards_with_progress(
+        user_id, [card_id for card_id, _, _ in picked]
+    )
+    by_id = {card['card_id']: card for card in cards}
+    return [by_id[card_id] for card_id, _, _ in picked if card_id in by_id]
@@ -9,9 +9,12 @@ Telegram-хендлеры для модуля карточек (Flashcards).
 5. Итоги сессии повторения
 """
 
+import gzip
+import hashlib
 import json
 import logging
 import os
+import tempfile
 from datetime import date, datetime, timezone
 from typing import Dict, Any, List, Optional
 
@@ -32,11 +35,24 @@ from .sm2 import review_card
 from .deck_generator import generate_all_decks, generate_mistakes_deck
 from .daily_challenge import ensure_challenge_table
 from .leaderboard import add_xp, ensure_leaderboard_tables, XP_CARD_CORRECT, XP_CARD_WRONG
+from .ranking import get_leaderboard_index
+from .due_queue import get_due_cards, get_due_queue, record_review, invalidate_due_queues
 from .teacher_decks import ensure_teacher_decks_tables
 from .duels import ensure_duel_tables
 
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+WEBAPP_JSON_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'WebApp', 'flashcards-data.json',
+)
+
 
 # ============================================================
 # ПРОВЕРКА ПОДПИСКИ
@@ -79,25 +95,73 @@ async def init_flashcards_data() -> None:
         await flashcard_db.ensure_tables()
         await ensure_challenge_table()
         await ensure_leaderboard_tables()
+        await get_leaderboard_index()
         await ensure_teacher_decks_tables()
         await ensure_duel_tables()
         await generate_all_decks()
-        # Экспортируем данные в статический JSON для WebApp
+        # Экспорт включает и колоды ошибок/учителей, которые меняются без
+        # генератора, поэтому решает хеш самого JSON, а не decks_changed
         await _export_webapp_json()
         logger.info("Flashcards module initialized")
     except Exception as e:
         logger.error(f"Failed to initialize flashcards: {e}", exc_info=True)
 
 
+def _file_sha256(path: str) -> Optional[str]:
+    """SHA-256 содержимого файла или None, если файла нет."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    """Записывает файл через временный файл и rename (nginx не увидит половину)."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
 async def _export_webapp_json() -> None:
-    """Генерирует flashcards-data.json для WebApp (чтобы не зависеть от API)."""
+    """
+    Генерирует flashcards-data.json для WebApp (чтобы не зависеть от API).
+
+    Рядом пишутся предсжатые .gz и .br (если установлен brotli)
+    для gzip_static / brotli_static в nginx. Если JSON не изменился,
+    файлы не переписываются (и nginx сохраняет ETag).
+    """
     try:
         data = await flashcard_db.export_all_decks_json()
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        json_path = os.path.join(base_dir, 'WebApp', 'flashcards-data.json')
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
-        logger.info(f"Exported {len(data)} decks to {json_path}")
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+        br_path = WEBAPP_JSON_PATH + '.br'
+        if (
+            _file_sha256(WEBAPP_JSON_PATH) == hashlib.sha256(payload).hexdigest()
+            and os.path.exists(WEBAPP_JSON_PATH + '.gz')
+            and os.path.exists(br_path) == BROTLI_AVAILABLE
+        ):
+            logger.info("WebApp JSON unchanged, export skipped")
+            return
+
+        _write_atomic(WEBAPP_JSON_PATH, payload)
+        _write_atomic(WEBAPP_JSON_PATH + '.gz', gzip.compress(payload, compresslevel=9, mtime=0))
+
+        if BROTLI_AVAILABLE:
+            _write_atomic(br_path, brotli.compress(payload))
+        elif os.path.exists(br_path):
+            # Устаревшая .br-копия отдавалась бы вместо свежего JSON
+            os.unlink(br_path)
+
+        logger.info(f"Exported {len(data)} decks to {WEBAPP_JSON_PATH}")
     except Exception as e:
         logger.warning(f"Could not export webapp JSON: {e}")
 
@@ -127,8 +191,7 @@ async def show_decks_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     has_sub = await _has_subscription(user_id, context)
 
-    decks = await flashcard_db.get_all_decks()
-    overall = await flashcard_db.get_user_overall_stats(user_id)
+    decks, overall = await flashcard_db.get_decks_overview(user_id)
 
     text = "<b>🃏 Карточки для заучивания</b>\n\n"
     text += "Выберите колоду для повторения.\n"
@@ -153,7 +216,7 @@ async def show_decks_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     keyboard = []
     for cat_name, cat_decks in categories.items():
         for deck in cat_decks:
-            deck_stats = await flashcard_db.get_deck_stats(user_id, deck['id'])
+            deck_stats = deck['stats']
             due = deck_stats['due_today']
             total = deck_stats['total']
             mastered = deck_stats['mastered']
@@ -182,6 +245,15 @@ async def show_decks_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 callback_data=f"fc_deck_{deck['id']}"
             )])
 
+    # Повторение по всем колодам сразу: счет берется из той же очереди, что и
+    # сессия (сумма по обзору учла бы чужие колоды ошибок и учительские колоды)
+    total_due = (await get_due_queue(user_id)).due_count() if has_sub else 0
+    if total_due > 0:
+        keyboard.append([InlineKeyboardButton(
+            f"🎯 Повторить всё к сроку ({total_due})",
+            callback_data="fc_review_due_all"
+        )])
+
     # Разделитель — режимы
     keyboard.append([InlineKeyboardButton(
         "🏆 Ежедневный челлендж", callback_data="fc_daily_menu"
@@ -424,6 +496,39 @@ async def start_review_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return FC_REVIEWING
 
 
+@safe_handler()
+async def start_review_due_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начинает повторение карточек к сроку сразу по всем колодам."""
+    query = update.callback_query
+    user_id = query.from_user.id
+
+    if not await _has_subscription(user_id, context):
+        await query.answer("🔒 Карточки доступны по подписке", show_alert=True)
+        return FC_MENU
+
+    cards = await get_due_cards(user_id, limit=20)
+
+    if not cards:
+        await query.answer("Нет карточек для повторения!", show_alert=True)
+        return FC_MENU
+
+    context.user_data['fc_session'] = {
+        'cards': cards,
+        'current_index': 0,
+        'total': len(cards),
+        'correct': 0,
+        'again': 0,
+        'hard': 0,
+        'good': 0,
+        'easy': 0,
+        'scope': 'all_decks',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+    await _show_card_front(query, context)
+    return FC_REVIEWING
+
+
 async def _show_card_front(query, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает лицевую сторону карточки."""
     session = context.user_data.get('fc_session', {})
@@ -567,6 +672,7 @@ async def rate_card(update: Update, context: ContextTypes.DEFAULT_TYPE):
         next_review=result.next_review.isoformat(),
         is_correct=is_correct,
     )
+    record_review(user_id, card['card_id'], card['deck_id'], result.next_review.isoformat())
 
     # Начисляем XP
     xp = XP_CARD_CORRECT if is_correct else XP_CARD_WRONG
@@ -654,11 +760,17 @@ async def _show_session_results(query, context: ContextTypes.DEFAULT_TYPE) -> No
 
     deck_id = context.user_data.get('fc_current_deck', '')
 
-    keyboard = [
-        [InlineKeyboardButton("🔄 Повторить ещё", callback_data="fc_start_review")],
-        [InlineKeyboardButton("◀️ К колоде", callback_data=f"fc_deck_{deck_id}")],
-        [InlineKeyboardButton("📋 Все колоды", callback_data="fc_back_to_decks")],
-    ]
+    if session.get('scope') == 'all_decks':
+        keyboard = [
+            [InlineKeyboardButton("🔄 Повторить ещё", callback_data="fc_review_due_all")],
+            [InlineKeyboardButton("📋 Все колоды", callback_data="fc_back_to_decks")],
+        ]
+    else:
+        keyboard = [
+            [InlineKeyboardButton("🔄 Повторить ещё", callback_data="fc_start_review")],
+            [InlineKeyboardButton("◀️ К колоде", callback_data=f"fc_deck_{deck_id}")],
+            [InlineKeyboardButton("📋 Все колоды", callback_data="fc_back_to_decks")],
+        ]
 
     reply_markup = InlineKeyboardMarkup(keyboard)
     await safe_edit_message(
@@ -708,6 +820,7 @@ async def generate_mistakes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Failed to generate mistakes deck: {e}", exc_info=True)
         count = 0
+    invalidate_due_queues(user_id)
 
     if count == 0:
         await query.answer(
@@ -824,6 +937,7 @@ async def handle_webapp_review_data(update: Update, context: ContextTypes.DEFAUL
             next_review=result.next_review.isoformat(),
             is_correct=is_correct,
         )
+        record_review(user_id, card_id, deck_id, result.next_review.isoformat())
 
         # XP
         xp = XP_CARD_CORRECT if is_correct else XP_CARD_WRONG
@@ -8,7 +8,8 @@
 - Конструктор планов: +2 XP за верный ответ
 - Стрик-бонус: множитель x1.5 при стрике ≥7 дней
 
-Лидерборд кешируется и пересчитывается при каждом запросе (данные актуальны).
+Рейтинг хранится в in-memory индексе (flashcards.ranking), который
+обновляется при каждом начислении XP; SQL-запросы остаются запасным путём.
 """
 
 import logging
@@ -24,6 +25,7 @@ from core.db import DATABASE_FILE
 from core.error_handler import safe_handler
 from core.utils import safe_edit_message
 from core.streak_manager import get_streak_manager
+from .ranking import current_week_start, get_leaderboard_index, get_loaded_index
 
 logger = logging.getLogger(__name__)
 
@@ -125,7 +127,7 @@ async def add_xp(
 
     async with aiosqlite.connect(DATABASE_FILE) as db:
         # Обновляем или создаём запись XP
-        await db.execute("""
+        cursor = await db.execute("""
             INSERT INTO flashcard_xp (user_id, total_xp, weekly_xp, week_start, last_updated)
             VALUES (?, ?, ?, ?, ?)
             ON CONFLICT(user_id) DO UPDATE SET
@@ -136,6 +138,7 @@ async def add_xp(
                 END,
                 week_start = ?,
                 last_updated = ?
+            RETURNING total_xp, weekly_xp, week_start
         """, (
             user_id, actual_xp, actual_xp, week_start, now,
             actual_xp,
@@ -143,6 +146,8 @@ async def add_xp(
             actual_xp,
             week_start, now,
         ))
+        new_state = await cursor.fetchone()
+        await cursor.close()
 
         # Обновляем счётчики
         counter_field = {
@@ -166,6 +171,11 @@ async def add_xp(
 
         await db.commit()
 
+    # Обновляем рейтинг, если индекс уже построен
+    index = get_loaded_index()
+    if index is not None and new_state:
+        index.update(user_id, *new_state)
+
     return actual_xp
 
 
@@ -214,8 +224,56 @@ async def get_leaderboard(
     Returns:
         Список {user_id, xp, rank, username, first_name}
     """
-    today = date.today()
-    week_start = (today - timedelta(days=today.weekday())).isoformat()
+    try:
+        index = await get_leaderboard_index()
+    except Exception as e:
+        logger.warning(f"Leaderboard index unavailable, falling back to SQL: {e}")
+        return await _get_leaderboard_sql(period, limit)
+
+    top = index.top(period, limit)
+    if not top:
+        return []
+
+    # Подтягиваем детали только для попавших в топ (поиск по ключу)
+    user_ids = [user_id for user_id, _ in top]
+    placeholders = ",".join("?" * len(user_ids))
+    async with aiosqlite.connect(DATABASE_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(f"""
+            SELECT fx.user_id,
+                   fx.cards_reviewed, fx.quizzes_completed,
+                   fx.challenges_completed, fx.plans_completed,
+                   u.username, u.first_name
+            FROM flashcard_xp fx
+            LEFT JOIN users u ON fx.user_id = u.user_id
+            WHERE fx.user_id IN ({placeholders})
+        """, user_ids)
+        details = {row['user_id']: dict(row) for row in await cursor.fetchall()}
+
+    result = []
+    for i, (user_id, xp) in enumerate(top):
+        data = details.get(user_id, {'user_id': user_id})
+        data['xp'] = xp
+        data['rank'] = i + 1
+        result.append(data)
+
+    return result
+
+
+async def get_user_rank(user_id: int, period: str = "all") -> Dict[str, Any]:
+    """Возвращает позицию пользователя в рейтинге."""
+    try:
+        index = await get_leaderboard_index()
+    except Exception as e:
+        logger.warning(f"Leaderboard index unavailable, falling back to SQL: {e}")
+        return await _get_user_rank_sql(user_id, period)
+
+    return index.rank(user_id, period)
+
+
+async def _get_leaderboard_sql(period: str = "all", limit: int = 10) -> List[Dict[str, Any]]:
+    """Топ пользователей напрямую из flashcard_xp (сортировка в БД)."""
+    week_start = current_week_start()
 
     if period == "week":
         xp_field = "weekly_xp"
@@ -236,7 +294,7 @@ async def get_leaderboard(
             FROM flashcard_xp fx
             LEFT JOIN users u ON fx.user_id = u.user_id
             WHERE fx.{xp_field} > 0 {where_clause}
-            ORDER BY fx.{xp_field} DESC
+            ORDER BY fx.{xp_field} DESC, fx.user_id
             LIMIT ?
         """
         cursor = await db.execute(query, params)
@@ -251,25 +309,28 @@ async def get_leaderboard(
     return result
 
 
-async def get_user_rank(user_id: int, period: str = "all") -> Dict[str, Any]:
-    """Возвращает позицию пользователя в рейтинге."""
-    today = date.today()
-    week_start = (today - timedelta(days=today.weekday())).isoformat()
+async def _get_user_rank_sql(user_id: int, period: str = "all") -> Dict[str, Any]:
+    """Позиция пользователя через COUNT(*) по flashcard_xp."""
+    week_start = current_week_start()
 
     if period == "week":
         xp_field = "weekly_xp"
+        xp_expr = "CASE WHEN week_start = ? THEN weekly_xp ELSE 0 END"
+        xp_params = [week_start]
         where_clause = "AND week_start = ?"
         where_params = [week_start]
     else:
         xp_field = "total_xp"
+        xp_expr = "total_xp"
+        xp_params = []
         where_clause = ""
         where_params = []
 
     async with aiosqlite.connect(DATABASE_FILE) as db:
         # Получаем XP пользователя
         cursor = await db.execute(
-            f"SELECT {xp_field} as xp FROM flashcard_xp WHERE user_id = ?",
-            (user_id,)
+            f"SELECT {xp_expr} as xp FROM flashcard_xp WHERE user_id = ?",
+            (*xp_params, user_id)
         )
         row = await cursor.fetchone()
         user_xp = row[0] if row else 0
@@ -103,6 +103,11 @@ class FlashcardsPlugin(BotPlugin):
                         handlers.generate_mistakes,
                         pattern="^fc_gen_mistakes$"
                     ),
+                    # Повторение по всем колодам
+                    CallbackQueryHandler(
+                        handlers.start_review_due_all,
+                        pattern="^fc_review_due_all$"
+                    ),
                     # Лидерборд
                     CallbackQueryHandler(
                         leaderboard.show_leaderboard,
@@ -137,6 +142,10 @@ class FlashcardsPlugin(BotPlugin):
                         handlers.start_review_all,
                         pattern="^fc_start_review_all$"
                     ),
+                    CallbackQueryHandler(
+                        handlers.start_review_due_all,
+                        pattern="^fc_review_due_all$"
+                    ),
                     # Quiz-режим
                     CallbackQueryHandler(
                         quiz_handlers.start_quiz,
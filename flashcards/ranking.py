@@ -0,0 +1,294 @@
+"""
+In-memory индекс лидерборда карточек.
+
+Держит два упорядоченных рейтинга (за всё время и за текущую неделю)
+в индексируемых skip-list'ах, поэтому топ-N и «моё место / всего»
+отвечаются за O(log n) без COUNT(*) и сортировки по flashcard_xp.
+
+Индекс строится из БД при первом обращении, обновляется из add_xp
+и периодически пересобирается — чтобы подхватить начисления,
+сделанные другим процессом (WebApp API пишет в ту же БД). Пересборка
+идет в отдельном потоке и в фоне: пока она не закончена, отвечает
+прежний индекс, затем рейтинги подменяются целиком.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from core.db import DATABASE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд индекс пересобирается из БД
+LEADERBOARD_RESYNC_SECONDS = 300
+
+_MAX_LEVELS = 24  # достаточно для ~16 млн участников
+
+# Ключ рейтинга: (-xp, user_id) — по возрастанию ключа идут лидеры
+RankKey = Tuple[float, int]
+
+
+def current_week_start() -> str:
+    """Начало текущей недели (понедельник) в ISO-формате."""
+    today = date.today()
+    return (today - timedelta(days=today.weekday())).isoformat()
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Optional[RankKey], levels: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * levels
+        self.width: List[int] = [1] * levels
+
+
+class IndexableSkipList:
+    """
+    Упорядоченное множество ключей с подсчётом позиции за O(log n).
+
+    Каждая ссылка хранит ширину — сколько элементов нижнего уровня она
+    перепрыгивает, — поэтому позиция ключа набирается при спуске.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVELS)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, key: RankKey) -> None:
+        chain: List[_Node] = [self._head] * _MAX_LEVELS
+        steps_at_level = [0] * _MAX_LEVELS
+        node = self._head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = 1
+        while height < _MAX_LEVELS and random.random() < 0.5:
+            height += 1
+
+        new_node = _Node(key, height)
+        steps = 0
+        for level in range(height):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, _MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key: RankKey) -> None:
+        chain: List[_Node] = [self._head] * _MAX_LEVELS
+        node = self._head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        height = len(target.next)
+        for level in range(height):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(height, _MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def count_less(self, key: RankKey) -> int:
+        """Количество ключей строго меньше key."""
+        position = 0
+        node = self._head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def head(self, n: int) -> List[RankKey]:
+        """Первые n ключей по порядку."""
+        result = []
+        node = self._head.next[0]
+        while node is not None and len(result) < n:
+            result.append(node.key)
+            node = node.next[0]
+        return result
+
+
+class _Board:
+    """Один рейтинг: user_id -> xp плюс упорядоченный индекс."""
+
+    def __init__(self):
+        self.xp: Dict[int, float] = {}
+        self.ranked = IndexableSkipList()
+
+    def set(self, user_id: int, xp: float) -> None:
+        old = self.xp.get(user_id)
+        if old == xp:
+            return
+        if old is not None:
+            self.ranked.remove((-old, user_id))
+            del self.xp[user_id]
+        if xp > 0:
+            self.xp[user_id] = xp
+            self.ranked.insert((-xp, user_id))
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        return [(user_id, -neg_xp) for neg_xp, user_id in self.ranked.head(limit)]
+
+    def rank(self, user_id: int) -> Dict[str, float]:
+        user_xp = self.xp.get(user_id, 0)
+        # Все, у кого XP строго больше: ключ (-user_xp, -inf) меньше любого
+        # ключа с тем же XP
+        better = self.ranked.count_less((-user_xp, float("-inf")))
+        return {
+            'rank': better + 1,
+            'xp': user_xp,
+            'total_users': len(self.ranked),
+        }
+
+
+def _build_boards(rows, week_start: str) -> Tuple[_Board, _Board]:
+    """Строит оба рейтинга из строк flashcard_xp (выполняется вне event loop)."""
+    all_time = _Board()
+    weekly = _Board()
+    for user_id, total_xp, weekly_xp, row_week_start in rows:
+        all_time.set(user_id, total_xp or 0)
+        weekly.set(user_id, (weekly_xp or 0) if row_week_start == week_start else 0)
+    return all_time, weekly
+
+
+class LeaderboardIndex:
+    """Рейтинги за всё время и за текущую неделю."""
+
+    def __init__(self):
+        self.all_time = _Board()
+        self.weekly = _Board()
+        self.week_start = current_week_start()
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        # Начисления, пришедшие во время пересборки: user_id -> аргументы update
+        self._pending: Optional[Dict[int, Tuple[float, float, str]]] = None
+
+    def _board(self, period: str) -> _Board:
+        self._roll_week()
+        return self.weekly if period == "week" else self.all_time
+
+    def _roll_week(self) -> None:
+        """С началом новой недели недельный рейтинг обнуляется."""
+        week_start = current_week_start()
+        if week_start != self.week_start:
+            self.week_start = week_start
+            self.weekly = _Board()
+
+    def update(self, user_id: int, total_xp: float, weekly_xp: float, week_start: str) -> None:
+        """Применяет новое состояние строки flashcard_xp."""
+        if self._pending is not None:
+            self._pending[user_id] = (total_xp, weekly_xp, week_start)
+        self._roll_week()
+        self.all_time.set(user_id, total_xp)
+        self.weekly.set(user_id, weekly_xp if week_start == self.week_start else 0)
+
+    def top(self, period: str, limit: int) -> List[Tuple[int, float]]:
+        return self._board(period).top(limit)
+
+    def rank(self, user_id: int, period: str) -> Dict[str, float]:
+        return self._board(period).rank(user_id)
+
+    @property
+    def is_stale(self) -> bool:
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > LEADERBOARD_RESYNC_SECONDS
+        )
+
+    async def load(self) -> None:
+        """
+        Пересобирает оба рейтинга из flashcard_xp.
+
+        Рейтинги строятся в отдельном потоке и подменяются целиком;
+        начисления, сделанные за время сборки, применяются поверх.
+        """
+        async with self._lock:
+            # Пока ждали блокировку, индекс мог пересобрать другой вызов
+            if not self.is_stale:
+                return
+
+            self._pending = {}
+            try:
+                async with aiosqlite.connect(DATABASE_FILE) as db:
+                    cursor = await db.execute(
+                        "SELECT user_id, total_xp, weekly_xp, week_start FROM flashcard_xp"
+                    )
+                    rows = await cursor.fetchall()
+
+                week_start = current_week_start()
+                all_time, weekly = await asyncio.to_thread(_build_boards, rows, week_start)
+
+                pending, self._pending = self._pending, None
+                self.all_time, self.weekly, self.week_start = all_time, weekly, week_start
+                for user_id, (total_xp, weekly_xp, row_week_start) in pending.items():
+                    self.update(user_id, total_xp, weekly_xp, row_week_start)
+                self.loaded_at = time.monotonic()
+            finally:
+                self._pending = None
+        logger.info(f"Leaderboard index loaded: {len(self.all_time.ranked)} users")
+
+
+_index: Optional[LeaderboardIndex] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+
+async def _refresh_in_background(index: LeaderboardIndex) -> None:
+    try:
+        await index.load()
+    except Exception as e:
+        logger.warning(f"Leaderboard index refresh failed: {e}")
+
+
+async def get_leaderboard_index() -> LeaderboardIndex:
+    """
+    Возвращает индекс, загружая его из БД при первом обращении.
+
+    Устаревший индекс пересобирается в фоне, а до конца пересборки
+    отвечает прежний.
+    """
+    global _index, _refresh_task
+    if _index is None:
+        _index = LeaderboardIndex()
+    if _index.loaded_at is None:
+        await _index.load()
+    elif _index.is_stale and (_refresh_task is None or _refresh_task.done()):
+        _refresh_task = asyncio.create_task(_refresh_in_background(_index))
+    return _index
+
+
+def get_loaded_index() -> Optional[LeaderboardIndex]:
+    """Индекс, если он уже загружен (без обращения к БД)."""
+    if _index is not None and _index.loaded_at is not None:
+        return _index
+    return None
+
+
+def reset_leaderboard_index() -> None:
+    """Сбрасывает индекс (пересоберётся при следующем обращении)."""
+    global _index, _refresh_task
+    _index = None
+    _refresh_task = None
@@ -17,6 +17,7 @@ import json
 import os
 import random
 import logging
+import threading
 from dataclasses import dataclass, field, asdict
 from typing import Dict, List, Any, Optional, Tuple, Set
 from difflib import SequenceMatcher
@@ -216,6 +217,93 @@ def _load_task25_topics() -> List[Dict[str, Any]]:
     return []
 
 
+# ──────────────────────────────────────────────────────────────
+# Пулы заданий (загружаются один раз на процесс)
+# ──────────────────────────────────────────────────────────────
+
+# Сколько лучших тем задания 25 храним для каждой темы задания 24
+SIMILARITY_TOP_K = 5
+
+
+@dataclass
+class VariantPools:
+    """
+    Все источники заданий, загруженные и проиндексированные заранее.
+
+    Хранит выборки по номерам заданий части 1, группировку тем 25 по блокам
+    и разреженную таблицу сходства «тема 24 → top-k тем 25 того же блока»,
+    чтобы генерация варианта не читала JSON и не считала SequenceMatcher.
+    """
+    part1_by_exam_number: Dict[int, List[Dict[str, Any]]] = field(default_factory=dict)
+    passages_17_18: List[Dict[str, Any]] = field(default_factory=list)
+    topics_19: List[Dict[str, Any]] = field(default_factory=list)
+    topics_20: List[Dict[str, Any]] = field(default_factory=list)
+    questions_21: List[Dict[str, Any]] = field(default_factory=list)
+    tasks_22: List[Dict[str, Any]] = field(default_factory=list)
+    questions_23: List[Dict[str, Any]] = field(default_factory=list)
+    plans_24: Dict[str, Any] = field(default_factory=dict)
+    blocks_24: Dict[str, List[str]] = field(default_factory=dict)
+    topics_25: List[Dict[str, Any]] = field(default_factory=list)
+    t25_by_block: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    # block -> {t24_name: [(score, index в t25_by_block[block]), ...]} по убыванию
+    similarity_24_25: Dict[str, Dict[str, List[Tuple[float, int]]]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, top_k: int = SIMILARITY_TOP_K) -> "VariantPools":
+        """Загружает все источники и строит индексы."""
+        pools = cls(
+            passages_17_18=_load_text_passages_17_18(),
+            topics_19=_load_task19_topics(),
+            topics_20=_load_task20_topics(),
+            questions_21=_load_task21_questions(),
+            tasks_22=_load_task22_tasks(),
+            questions_23=_load_task23_questions(),
+            topics_25=_load_task25_topics(),
+        )
+        pools.plans_24, pools.blocks_24 = _load_task24_plans()
+
+        for q in _load_test_part_questions():
+            num = q.get("exam_number")
+            if num and 1 <= num <= 16:
+                pools.part1_by_exam_number.setdefault(num, []).append(q)
+
+        for topic in pools.topics_25:
+            pools.t25_by_block.setdefault(topic.get("block", ""), []).append(topic)
+
+        pools.similarity_24_25 = _build_similarity_table(
+            pools.plans_24, pools.blocks_24, pools.t25_by_block, top_k
+        )
+        return pools
+
+    @property
+    def part1_questions(self) -> List[Dict[str, Any]]:
+        return [q for pool in self.part1_by_exam_number.values() for q in pool]
+
+
+_pools: Optional[VariantPools] = None
+_pools_lock = threading.Lock()
+
+
+def get_pools(reload: bool = False) -> VariantPools:
+    """
+    Возвращает пулы заданий, загружая их при первом обращении.
+
+    Args:
+        reload: принудительно перечитать JSON-файлы (после обновления данных)
+    """
+    global _pools
+    if _pools is None or reload:
+        with _pools_lock:
+            if _pools is None or reload:
+                _pools = VariantPools.load()
+                logger.info(
+                    f"Пулы заданий загружены: "
+                    f"{sum(len(p) for p in _pools.part1_by_exam_number.values())} тестовых, "
+                    f"{len(_pools.blocks_24)} блоков задания 24"
+                )
+    return _pools
+
+
 # ──────────────────────────────────────────────────────────────
 # Связывание тем задания 24 и 25
 # ──────────────────────────────────────────────────────────────
@@ -252,23 +340,61 @@ def _title_similarity(title_a: str, title_b: str) -> float:
     return 0.5 * seq_ratio + 0.5 * word_overlap
 
 
+def _build_similarity_table(
+    plans: Dict[str, Any],
+    blocks_24: Dict[str, List[str]],
+    t25_by_block: Dict[str, List[Dict[str, Any]]],
+    top_k: int = SIMILARITY_TOP_K,
+) -> Dict[str, Dict[str, List[Tuple[float, int]]]]:
+    """
+    Строит разреженную таблицу сходства тем 24 и 25 внутри каждого блока.
+
+    Для каждой темы 24 (у которой есть план) сохраняется top_k тем 25
+    по убыванию сходства; при равенстве — в исходном порядке тем 25.
+    """
+    table: Dict[str, Dict[str, List[Tuple[float, int]]]] = {}
+    for block, task24_topics in blocks_24.items():
+        task25_in_block = t25_by_block.get(block, [])
+        if not task25_in_block:
+            continue
+        block_table: Dict[str, List[Tuple[float, int]]] = {}
+        for t24_name in task24_topics:
+            if not plans.get(t24_name):
+                continue
+            scored = [
+                (_title_similarity(t24_name, t25.get("title", "")), idx)
+                for idx, t25 in enumerate(task25_in_block)
+            ]
+            scored.sort(key=lambda item: (-item[0], item[1]))
+            block_table[t24_name] = scored[:top_k]
+        table[block] = block_table
+    return table
+
+
 def _find_linked_pair_24_25(
     plans: Dict[str, Any],
     blocks_24: Dict[str, List[str]],
     topics_25: List[Dict[str, Any]],
     preferred_block: Optional[str] = None,
+    pools: Optional[VariantPools] = None,
 ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], str]]:
     """
     Находит тематически связанную пару задания 24 и 25.
 
+    Если переданы pools, используется предрассчитанная таблица сходства,
+    иначе сходство считается на лету.
+
     Returns:
         (task24_data, task25_data, block) или None
     """
-    # Группируем task25 по блокам
-    t25_by_block: Dict[str, List[Dict[str, Any]]] = {}
-    for topic in topics_25:
-        block = topic.get("block", "")
-        t25_by_block.setdefault(block, []).append(topic)
+    if pools is not None:
+        t25_by_block = pools.t25_by_block
+        similarity = pools.similarity_24_25
+    else:
+        t25_by_block = {}
+        for topic in topics_25:
+            t25_by_block.setdefault(topic.get("block", ""), []).append(topic)
+        similarity = _build_similarity_table(plans, blocks_24, t25_by_block, top_k=1)
 
     # Определяем блоки для поиска
     search_blocks = [preferred_block] if preferred_block else list(blocks_24.keys())
@@ -284,23 +410,22 @@ def _find_linked_pair_24_25(
             continue
 
         # Пробуем найти лучшую пару в этом блоке
+        block_table = similarity.get(block, {})
         sampled_24 = random.sample(task24_topics, min(len(task24_topics), 15))
         for t24_name in sampled_24:
-            plan_data = plans.get(t24_name)
-            if not plan_data:
+            top = block_table.get(t24_name)
+            if not top:
                 continue
 
-            for t25 in task25_in_block:
-                t25_title = t25.get("title", "")
-                score = _title_similarity(t24_name, t25_title)
-                if score > best_score:
-                    best_score = score
-                    task24_out = {
-                        "topic_name": t24_name,
-                        "plan_data": plan_data,
-                        "block": block,
-                    }
-                    best_pair = (task24_out, t25, block)
+            score, t25_idx = top[0]
+            if score > best_score:
+                best_score = score
+                task24_out = {
+                    "topic_name": t24_name,
+                    "plan_data": plans[t24_name],
+                    "block": block,
+                }
+                best_pair = (task24_out, task25_in_block[t25_idx], block)
 
         # Если нашли хорошую пару (> 0.4), используем её
         if best_score >= 0.4:
@@ -313,52 +438,76 @@ def _find_linked_pair_24_25(
 # Генерация варианта
 # ──────────────────────────────────────────────────────────────
 
-def generate_variant(variant_id: Optional[str] = None) -> ExamVariant:
+def generate_variant(
+    variant_id: Optional[str] = None,
+    pools: Optional[VariantPools] = None,
+) -> ExamVariant:
     """
     Генерирует полный вариант ЕГЭ.
 
     Args:
         variant_id: ID варианта (генерируется автоматически если не указан)
+        pools: пулы заданий (по умолчанию — общие для процесса)
 
     Returns:
         ExamVariant со всеми 23 заданиями
     """
     if not variant_id:
         variant_id = f"var_{random.randint(100000, 999999)}"
+    if pools is None:
+        pools = get_pools()
 
     variant = ExamVariant(variant_id=variant_id)
 
     # === Часть 1: тестовые задания 1-16 ===
-    _generate_part1(variant)
+    _generate_part1(variant, pools)
 
     # === Часть 2: развёрнутые задания 17-25 ===
-    _generate_part2(variant)
+    _generate_part2(variant, pools)
 
     variant.metadata["total_generated"] = variant.total_tasks
     variant.metadata["part1_count"] = len(variant.part1_tasks)
     variant.metadata["part2_count"] = len(variant.part2_tasks)
 
-    logger.info(
+    logger.debug(
         f"Вариант {variant_id} сгенерирован: "
         f"{len(variant.part1_tasks)} тестовых + {len(variant.part2_tasks)} развёрнутых"
     )
     return variant
 
 
-def _generate_part1(variant: ExamVariant):
+def generate_variants(n: int, id_prefix: Optional[str] = None) -> List[ExamVariant]:
+    """
+    Пакетная генерация вариантов (например, на весь класс).
+
+    Пулы загружаются один раз, ID вариантов уникальны в пределах пакета.
+
+    Args:
+        n: количество вариантов
+        id_prefix: префикс ID (по умолчанию — случайный)
+
+    Returns:
+        Список из n вариантов
+    """
+    pools = get_pools()
+    if not id_prefix:
+        id_prefix = f"var_{random.randint(100000, 999999)}"
+
+    variants = [
+        generate_variant(f"{id_prefix}_{i + 1}", pools=pools)
+        for i in range(n)
+    ]
+    logger.info(f"Сгенерировано {len(variants)} вариантов с префиксом {id_prefix}")
+    return variants
+
+
+def _generate_part1(variant: ExamVariant, pools: VariantPools):
     """Генерация тестовой части (задания 1-16)."""
-    questions = _load_test_part_questions()
-    if not questions:
+    by_exam_num = pools.part1_by_exam_number
+    if not by_exam_num:
         logger.error("Не удалось загрузить вопросы тестовой части")
         return
 
-    # Группируем по exam_number
-    by_exam_num: Dict[int, List[Dict[str, Any]]] = {}
-    for q in questions:
-        num = q.get("exam_number")
-        if num and 1 <= num <= 16:
-            by_exam_num.setdefault(num, []).append(q)
-
     for exam_num in range(1, 17):
         pool = by_exam_num.get(exam_num, [])
         if pool:
@@ -374,26 +523,25 @@ def _generate_part1(variant: ExamVariant):
             logger.warning(f"Нет вопросов для задания №{exam_num}")
 
 
-def _generate_part2(variant: ExamVariant):
+def _generate_part2(variant: ExamVariant, pools: VariantPools):
     """
     Генерация второй части (задания 17-25).
 
     Алгоритм:
-    1. Загружаем все данные
+    1. Берём данные из предзагруженных пулов
     2. Выбираем текстовый отрывок для заданий 17 и 18 (общий текст)
     3. Выбираем связанную пару 24+25
     4. Распределяем оставшиеся блоки для 19, 20, 22
     5. Задания 21 и 23 — случайно (без блоков)
     """
-    # Загрузка данных
-    passages_17_18 = _load_text_passages_17_18()
-    topics_19 = _load_task19_topics()
-    topics_20 = _load_task20_topics()
-    questions_21 = _load_task21_questions()
-    tasks_22 = _load_task22_tasks()
-    questions_23 = _load_task23_questions()
-    plans_24, blocks_24 = _load_task24_plans()
-    topics_25 = _load_task25_topics()
+    passages_17_18 = pools.passages_17_18
+    topics_19 = pools.topics_19
+    topics_20 = pools.topics_20
+    questions_21 = pools.questions_21
+    tasks_22 = pools.tasks_22
+    questions_23 = pools.questions_23
+    plans_24, blocks_24 = pools.plans_24, pools.blocks_24
+    topics_25 = pools.topics_25
 
     used_titles: Set[str] = set()
     used_blocks: Set[str] = set()
@@ -441,7 +589,7 @@ def _generate_part2(variant: ExamVariant):
         logger.warning("Нет текстовых отрывков для заданий 17-18")
 
     # ── Шаг 1: Связанная пара 24 + 25 ──
-    pair = _find_linked_pair_24_25(plans_24, blocks_24, topics_25)
+    pair = _find_linked_pair_24_25(plans_24, blocks_24, topics_25, pools=pools)
     if pair:
         t24_data, t25_data, pair_block = pair
 
@@ -639,6 +787,8 @@ def replace_task_in_variant(
     if not old_task:
         return False
 
+    pools = get_pools()
+
     # Собираем использованные заголовки (исключая текущее задание)
     used_titles = set()
     used_blocks = set()
@@ -651,11 +801,9 @@ def replace_task_in_variant(
 
     # Для заданий части 1
     if 1 <= exam_number <= 16:
-        questions = _load_test_part_questions()
         candidates = [
-            q for q in questions
-            if q.get("exam_number") == exam_number
-            and q.get("id") != old_task.task_data.get("id")
+            q for q in pools.part1_by_exam_number.get(exam_number, [])
+            if q.get("id") != old_task.task_data.get("id")
         ]
         if candidates:
             chosen = random.choice(candidates)
@@ -670,7 +818,7 @@ def replace_task_in_variant(
 
     # Замена заданий 17 и 18 (общий текст — заменяем оба)
     if exam_number in (17, 18):
-        passages = _load_text_passages_17_18()
+        passages = pools.passages_17_18
         old_passage_id = old_task.task_data.get("passage_id")
         candidates = [p for p in passages if p.get("id") != old_passage_id]
         if candidates:
@@ -708,17 +856,16 @@ def replace_task_in_variant(
         return False
 
     # Для заданий второй части
-    loaders = {
-        19: (_load_task19_topics, "task19"),
-        20: (_load_task20_topics, "task20"),
-        21: (_load_task21_questions, "task21"),
-        22: (_load_task22_tasks, "task22"),
-        23: (_load_task23_questions, "task23"),
+    sources = {
+        19: (pools.topics_19, "task19"),
+        20: (pools.topics_20, "task20"),
+        21: (pools.questions_21, "task21"),
+        22: (pools.tasks_22, "task22"),
+        23: (pools.questions_23, "task23"),
     }
 
-    if exam_number in loaders:
-        loader_fn, module = loaders[exam_number]
-        pool = loader_fn()
+    if exam_number in sources:
+        pool, module = sources[exam_number]
         old_id = old_task.task_data.get("id")
         candidates = [
             t for t in pool
@@ -737,7 +884,7 @@ def replace_task_in_variant(
             return True
 
     if exam_number == 24:
-        plans, blocks = _load_task24_plans()
+        plans, blocks = pools.plans_24, pools.blocks_24
         all_topics = []
         for block, names in blocks.items():
             for name in names:
@@ -755,7 +902,7 @@ def replace_task_in_variant(
             return True
 
     if exam_number == 25:
-        topics = _load_task25_topics()
+        topics = pools.topics_25
         candidates = [
             t for t in topics
             if t.get("title", "").lower() not in used_titles
@@ -19,11 +19,12 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes, ConversationHandler
 
-from core import states, db
+from core import states, db, session_state
 from core.config import DATABASE_FILE
 from core.error_handler import safe_handler
 from core.plugin_loader import build_main_menu
 from core.utils import safe_edit_message
+from core.progress_reporter import ProgressReporter
 from core.ui_helpers import show_thinking_animation
 
 from . import keyboards
@@ -42,6 +43,9 @@ logger = logging.getLogger(__name__)
 
 ALL_TASK_NUMS = list(range(1, 17)) + list(range(17, 26))
 
+# Черновик варианта для ДЗ хранится сутки
+HW_VARIANT_TTL = 24 * 3600
+
 TASK_NAMES = {
     17: "Анализ текста",
     18: "Понятие из текста",
@@ -70,9 +74,9 @@ def _get_user_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional
     return None
 
 
-def _get_variant(context: ContextTypes.DEFAULT_TYPE) -> Optional[ExamVariant]:
-    """Получить текущий вариант из user_data."""
-    data = context.user_data.get("fe_variant_data")
+async def _get_variant(context: ContextTypes.DEFAULT_TYPE) -> Optional[ExamVariant]:
+    """Получить текущий вариант (хранится вне user_data, см. core.session_state)."""
+    data = await session_state.get_blob(context.user_data, "fe_variant_data")
     if data:
         try:
             return ExamVariant.from_dict(data)
@@ -81,9 +85,9 @@ def _get_variant(context: ContextTypes.DEFAULT_TYPE) -> Optional[ExamVariant]:
     return None
 
 
-def _save_variant(context: ContextTypes.DEFAULT_TYPE, variant: ExamVariant):
-    """Сохранить вариант в user_data."""
-    context.user_data["fe_variant_data"] = variant.to_dict()
+async def _save_variant(context: ContextTypes.DEFAULT_TYPE, variant: ExamVariant):
+    """Сохранить вариант."""
+    await session_state.put_blob(context.user_data, "fe_variant_data", variant.to_dict())
 
 
 def _get_answered(context: ContextTypes.DEFAULT_TYPE) -> Set[int]:
@@ -213,7 +217,7 @@ async def new_variant(update: Update, context: ContextTypes.DEFAULT_TYPE):
     variant = generate_variant()
 
     # Очищаем предыдущий прогресс
-    context.user_data["fe_variant_data"] = variant.to_dict()
+    await _save_variant(context, variant)
     context.user_data["fe_answered"] = []
     context.user_data["fe_scores"] = {}
     context.user_data["fe_feedbacks"] = {}
@@ -236,7 +240,7 @@ async def continue_variant(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def _show_overview(message, context: ContextTypes.DEFAULT_TYPE, edit: bool = True):
     """Показ обзора варианта с кнопками заданий."""
-    variant = _get_variant(context)
+    variant = await _get_variant(context)
     if not variant:
         text = "⚠️ Вариант не найден. Начните новый."
         kb = keyboards.get_entry_keyboard()
@@ -298,7 +302,7 @@ async def goto_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except (ValueError, IndexError):
         return await _show_overview(query.message, context, edit=True)
 
-    variant = _get_variant(context)
+    variant = await _get_variant(context)
     if not variant:
         return await _show_overview(query.message, context, edit=True)
 
@@ -490,7 +494,7 @@ async def check_test_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if exam_num is None:
         return await _show_overview(update.message, context, edit=False)
 
-    variant = _get_variant(context)
+    variant = await _get_variant(context)
     if not variant:
         return await _show_overview(update.message, context, edit=False)
 
@@ -554,7 +558,7 @@ async def check_part2_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if exam_num is None or not (17 <= exam_num <= 25):
         return await _show_overview(update.message, context, edit=False)
 
-    variant = _get_variant(context)
+    variant = await _get_variant(context)
     if not variant:
         return await _show_overview(update.message, context, edit=False)
 
@@ -563,7 +567,9 @@ async def check_part2_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return await _show_overview(update.message, context, edit=False)
 
     # Показываем подтверждение приёма
-    thinking_msg = await update.message.reply_text("⏳ Сохраняю ваш ответ...")
+    progress = await ProgressReporter.send(
+        update.message, "⏳ Сохраняю ваш ответ...", parse_mode=ParseMode.HTML
+    )
 
     # Вызываем AI-оценку (результат скрыт до завершения)
     try:
@@ -590,9 +596,7 @@ async def check_part2_answer(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     kb = keyboards.get_after_answer_keyboard(exam_num)
 
-    try:
-        await thinking_msg.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=kb)
-    except Exception:
+    if not await progress.finish(text, reply_markup=kb):
         await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=kb)
 
     return states.FULL_EXAM_OVERVIEW
@@ -872,7 +876,7 @@ async def finish_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка сохранения результатов: {e}")
 
     # Очищаем данные варианта
-    context.user_data.pop("fe_variant_data", None)
+    await session_state.pop_blob(context.user_data, "fe_variant_data")
     context.user_data.pop("fe_answered", None)
     context.user_data.pop("fe_scores", None)
     context.user_data.pop("fe_feedbacks", None)
@@ -891,7 +895,7 @@ async def _save_exam_results(user_id: int, context: ContextTypes.DEFAULT_TYPE):
     """Сохранение результатов варианта в БД."""
     import aiosqlite
 
-    variant_data = context.user_data.get("fe_variant_data", {})
+    variant_data = await session_state.get_blob(context.user_data, "fe_variant_data", {})
     scores = _get_scores(context)
     answered = _get_answered(context)
 
@@ -1067,7 +1071,9 @@ async def teacher_generate_variant(update: Update, context: ContextTypes.DEFAULT
     await query.edit_message_text("⏳ Генерирую вариант для домашнего задания...")
 
     variant = generate_variant()
-    context.user_data["fe_hw_variant"] = variant.to_dict()
+    await session_state.put_blob(
+        context.user_data, "fe_hw_variant", variant.to_dict(), ttl=HW_VARIANT_TTL
+    )
 
     return await _show_teacher_preview(query.message, context, variant, edit=True)
 
@@ -1117,7 +1123,7 @@ async def teacher_replace_task(update: Update, context: ContextTypes.DEFAULT_TYP
     except (ValueError, IndexError):
         return
 
-    variant_data = context.user_data.get("fe_hw_variant")
+    variant_data = await session_state.get_blob(context.user_data, "fe_hw_variant")
     if not variant_data:
         await query.edit_message_text("⚠️ Вариант не найден.")
         return
@@ -1126,7 +1132,9 @@ async def teacher_replace_task(update: Update, context: ContextTypes.DEFAULT_TYP
     success = replace_task_in_variant(variant, exam_num)
 
     if success:
-        context.user_data["fe_hw_variant"] = variant.to_dict()
+        await session_state.put_blob(
+            context.user_data, "fe_hw_variant", variant.to_dict(), ttl=HW_VARIANT_TTL
+        )
         await query.answer(f"✅ Задание №{exam_num} заменено")
     else:
         await query.answer(f"⚠️ Не удалось заменить задание №{exam_num}", show_alert=True)
@@ -12,6 +12,7 @@ from telegram.ext import (
 from core.plugin_base import BotPlugin
 from core import states
 from . import handlers
+from .generator import get_pools
 
 logger = logging.getLogger(__name__)
 
@@ -111,6 +112,11 @@ class FullExamPlugin(BotPlugin):
         )
 
         app.add_handler(conv_handler)
+
+        # Загружаем пулы заданий и таблицу сходства 24/25 заранее,
+        # чтобы первый вариант генерировался без чтения JSON
+        get_pools()
+
         logger.info(f"FullExam plugin registered: {self.title}")
 
 
@@ -800,6 +800,10 @@ def create_webhook_app(bot: Bot = None) -> web.Application:
     
     # Health check
     app.router.add_get('/health', health_check)
+
+    # Гистограммы задержек в формате Prometheus
+    app.router.add_get('/metrics', metrics_endpoint)
+    app.router.add_get('/debug/profile', profile_endpoint)
     
     return app
 
@@ -807,6 +811,65 @@ async def health_check(request: web.Request) -> web.Response:
     """Проверка работоспособности webhook сервера."""
     return web.Response(text='OK', status=200)
 
+def _metrics_authorized(request: web.Request) -> bool:
+    """
+    Проверка METRICS_TOKEN (заголовок Authorization: Bearer или ?token=).
+
+    Webhook-сервер открыт наружу (его вызывает банк), поэтому без заданного
+    токена служебные эндпоинты недоступны.
+    """
+    token = getattr(config, 'METRICS_TOKEN', '')
+    if not token:
+        return False
+    provided = request.query.get('token', '')
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        provided = auth_header[len('Bearer '):]
+    return hmac.compare_digest(provided, token)
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    """
+    Метрики задержек (core.latency_metrics) и пула Bot API (core.telegram_transport) для Prometheus.
+    Доступны только при заданном METRICS_TOKEN.
+    """
+    if not _metrics_authorized(request):
+        return web.Response(text='Forbidden', status=403)
+
+    from core import latency_metrics, telegram_transport
+    return web.Response(
+        text=latency_metrics.render_prometheus() + telegram_transport.render_prometheus(),
+        content_type='text/plain',
+        charset='utf-8'
+    )
+
+async def profile_endpoint(request: web.Request) -> web.Response:
+    """
+    Профиль event loop (core.profiler): ?seconds=30&format=collapsed|speedscope.
+    Доступен только при заданном METRICS_TOKEN.
+    """
+    if not _metrics_authorized(request):
+        return web.Response(text='Forbidden', status=403)
+
+    from core.profiler import ProfilerBusyError, profile_loop, render_profile
+
+    try:
+        seconds = float(request.query.get('seconds', 30))
+    except ValueError:
+        return web.Response(text='Invalid seconds', status=400)
+    fmt = request.query.get('format', 'collapsed')
+
+    try:
+        result = await profile_loop(seconds)
+    except ProfilerBusyError:
+        return web.Response(text='Profiling already in progress', status=409)
+
+    data, suffix = render_profile(result, fmt)
+    return web.Response(
+        body=data,
+        content_type='application/json' if suffix.endswith('.json') else 'text/plain',
+        headers={'Content-Disposition': f'attachment; filename="profile.{suffix}"'}
+    )
+
 async def start_webhook_server(bot: Bot = None, port: int = 8080):
     """Запускает webhook сервер с rate limiting и cleanup."""
     global webhook_app, webhook_runner, webhook_site
@@ -8,6 +8,8 @@ Flask + SQLite + Bootstrap
 import os
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
 from models import db, init_db, Teacher, Classroom, Subject, SchoolClass, Student, Workload, Schedule, Lesson, ScheduleHistory
+from generation_jobs import GenerationJobManager, load_from_database
+import schedule_io
 
 # Создание приложения
 app = Flask(__name__)
@@ -18,6 +20,9 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # Инициализация БД
 init_db(app)
 
+# Фоновая генерация расписания
+generation_jobs = GenerationJobManager(app)
+
 # Названия дней недели
 DAY_NAMES = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница']
 DAY_SHORT = ['ПН', 'ВТ', 'СР', 'ЧТ', 'ПТ']
@@ -523,38 +528,75 @@ def api_schedule_activate(id):
 
 @app.route('/api/schedules/<int:id>/export', methods=['GET'])
 def api_schedule_export(id):
-    """API: Экспорт расписания в CSV"""
-    from flask import Response
-    import csv
-    import io
+    """API: Экспорт расписания (?format=csv|json|xlsx)"""
+    from flask import Response, stream_with_context
+
+    Schedule.query.get_or_404(id)
+    export_format = request.args.get('format', 'csv')
+
+    if export_format == 'json':
+        return Response(
+            stream_with_context(schedule_io.export_json_chunks(id)),
+            mimetype='application/json',
+            headers={'Content-Disposition': f'attachment; filename=schedule_{id}.json'}
+        )
+
+    if export_format == 'xlsx':
+        try:
+            content = schedule_io.export_xlsx(id)
+        except ImportError:
+            return jsonify({'error': 'Для экспорта в XLSX установите openpyxl'}), 400
+        return Response(
+            content,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={'Content-Disposition': f'attachment; filename=schedule_{id}.xlsx'}
+        )
+
+    return Response(
+        stream_with_context(schedule_io.export_csv_chunks(id)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=schedule_{id}.csv'}
+    )
 
-    schedule = Schedule.query.get_or_404(id)
-    lessons = schedule.lessons.order_by(Lesson.day, Lesson.lesson_number).all()
 
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=';')
+@app.route('/api/schedules/<int:id>/import', methods=['POST'])
+def api_schedule_import(id):
+    """API: Импорт уроков в расписание (JSON или файл CSV/JSON/XLSX)"""
+    Schedule.query.get_or_404(id)
+
+    if 'file' in request.files:
+        file = request.files['file']
+        replace = request.form.get('replace') == 'true'
+        allow_conflicts = request.form.get('allow_conflicts') == 'true'
+        try:
+            lessons = schedule_io.parse_lessons_file(file.filename or '', file.read())
+        except Exception as e:
+            return jsonify({'error': f'Ошибка чтения файла: {str(e)}'}), 400
+    else:
+        data = request.get_json(silent=True) if request.data else {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Ожидается JSON-объект с полем lessons'}), 400
+        lessons = data.get('lessons', [])
+        replace = bool(data.get('replace', False))
+        allow_conflicts = bool(data.get('allow_conflicts', False))
+
+    added, errors, conflicts = schedule_io.import_lessons(
+        id, lessons, replace=replace, allow_conflicts=allow_conflicts
+    )
+    if errors or (conflicts and not allow_conflicts):
+        return jsonify({'success': False, 'errors': errors, 'conflicts': conflicts}), 400
 
-    # Заголовок
-    writer.writerow(['День', 'Урок', 'Предмет', 'Учитель', 'Класс', 'Кабинет'])
+    log_history(id, 'import', None, None, {'added': added, 'replace': replace})
 
-    day_names = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница']
+    return jsonify({'success': True, 'added': added, 'conflicts': conflicts})
 
-    for lesson in lessons:
-        writer.writerow([
-            day_names[lesson.day] if lesson.day < 5 else str(lesson.day),
-            lesson.lesson_number,
-            lesson.subject.name if lesson.subject else '',
-            lesson.teacher.name if lesson.teacher else '',
-            lesson.school_class.name if lesson.school_class else '',
-            lesson.classroom.number if lesson.classroom else ''
-        ])
 
-    output.seek(0)
-    return Response(
-        '\ufeff' + output.read(),  # BOM for Excel
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename=schedule_{id}.csv'}
-    )
+@app.route('/api/schedules/<int:id>/conflicts', methods=['GET'])
+def api_schedule_conflicts(id):
+    """API: Все накладки расписания"""
+    Schedule.query.get_or_404(id)
+    conflicts = schedule_io.find_schedule_conflicts(id)
+    return jsonify({'count': len(conflicts), 'conflicts': conflicts})
 
 
 @app.route('/api/schedules/<int:id>/lessons', methods=['GET'])
@@ -565,7 +607,7 @@ def api_schedule_lessons(id):
     view_mode = request.args.get('view', 'class')
     filter_id = request.args.get('filter_id')
 
-    query = Lesson.query.filter_by(schedule_id=id)
+    query = Lesson.query.options(*schedule_io.lesson_eager_options()).filter_by(schedule_id=id)
 
     if filter_id:
         if view_mode == 'class':
@@ -582,14 +624,16 @@ def api_schedule_lessons(id):
 @app.route('/api/schedules/<int:id>/lessons/class/<int:class_id>', methods=['GET'])
 def api_schedule_lessons_by_class(id, class_id):
     """API: Уроки расписания для класса"""
-    lessons = Lesson.query.filter_by(schedule_id=id, class_id=class_id).all()
+    lessons = Lesson.query.options(*schedule_io.lesson_eager_options()) \
+        .filter_by(schedule_id=id, class_id=class_id).all()
     return jsonify([l.to_dict() for l in lessons])
 
 
 @app.route('/api/schedules/<int:id>/lessons/teacher/<int:teacher_id>', methods=['GET'])
 def api_schedule_lessons_by_teacher(id, teacher_id):
     """API: Уроки расписания для учителя"""
-    lessons = Lesson.query.filter_by(schedule_id=id, teacher_id=teacher_id).all()
+    lessons = Lesson.query.options(*schedule_io.lesson_eager_options()) \
+        .filter_by(schedule_id=id, teacher_id=teacher_id).all()
     return jsonify([l.to_dict() for l in lessons])
 
 
@@ -713,8 +757,8 @@ def check_lesson_conflicts(data, exclude_id=None):
     class_id = data.get('class_id')
     classroom_id = data.get('classroom_id')
 
-    # Базовый запрос
-    query = Lesson.query.filter_by(
+    # Базовый запрос (предмет и класс нужны для сообщений)
+    query = Lesson.query.options(*schedule_io.lesson_eager_options()).filter_by(
         schedule_id=schedule_id,
         day=day,
         lesson_number=lesson_number
@@ -782,25 +826,80 @@ def generate_page():
 
 @app.route('/api/generate', methods=['POST'])
 def api_generate_schedule():
-    """API: Сгенерировать расписание"""
-    data = request.json
+    """API: Запустить генерацию расписания в фоне"""
+    data = request.get_json(silent=True) if request.data else {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ожидается JSON-объект с параметрами генерации'}), 400
 
-    # Создаём новое расписание
-    schedule = Schedule(
-        name=data.get('name', f'Расписание {Schedule.query.count() + 1}'),
-        description=data.get('description', 'Автоматически сгенерировано')
-    )
-    db.session.add(schedule)
-    db.session.commit()
+    try:
+        iterations = int(data.get('iterations') or 1000)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'iterations должно быть целым числом'}), 400
+    if iterations < 1:
+        return jsonify({'error': 'iterations должно быть положительным'}), 400
+
+    if Workload.query.count() == 0 or Teacher.query.count() == 0:
+        return jsonify({'error': 'Недостаточно данных: добавьте учителей и нагрузку'}), 400
+
+    params = {
+        'name': data.get('name') or f'Расписание {Schedule.query.count() + 1}',
+        'description': data.get('description') or 'Автоматически сгенерировано',
+        'valid_from': data.get('valid_from'),
+        'valid_to': data.get('valid_to'),
+        'iterations': iterations,
+        'include_ege': data.get('include_ege', True),
+        'set_active': data.get('set_active', False),
+        'seed': data.get('seed'),
+    }
 
-    # TODO: Интеграция с алгоритмом генерации
-    # Пока просто возвращаем созданное расписание
+    loader = load_from_database(include_ege=params['include_ege'])
+    job = generation_jobs.submit(loader, params)
 
-    return jsonify({
-        'success': True,
-        'schedule': schedule.to_dict(),
-        'message': 'Расписание создано. Алгоритм генерации будет добавлен позже.'
-    })
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+
+@app.route('/api/generate/jobs/<job_id>', methods=['GET'])
+def api_generation_job(job_id):
+    """API: Состояние задачи генерации"""
+    job = generation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/generate/jobs/<job_id>/events', methods=['GET'])
+def api_generation_job_events(job_id):
+    """API: Прогресс задачи генерации (server-sent events)"""
+    import json
+    from flask import Response
+
+    job = generation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+
+    def stream():
+        version = None
+        while True:
+            if version == job.version:
+                if not generation_jobs.wait_for_update(job, version, timeout=15):
+                    yield ': keep-alive\n\n'
+                    continue
+            version = job.version
+            yield f'data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n'
+            if job.finished:
+                return
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/generate/jobs/<job_id>/cancel', methods=['POST'])
+def api_generation_job_cancel(job_id):
+    """API: Отменить генерацию"""
+    job = generation_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(job.to_dict())
 
 
 # ============== ИМПОРТ EXCEL ==============
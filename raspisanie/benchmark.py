@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк генерации расписания на школе реального размера
+
+Сравнивает индексированное расписание (Schedule) с прежней схемой,
+где каждая проверка занятости и подсчет окон просматривает весь список
+уроков. Обе версии проходят Фазы 1-3 с одинаковым seed; результат
+Фаз 1-2 должен совпадать (в Фазе 3 порядок перебора кандидатов
+зависит от реализации, поэтому сравнивается только метрика).
+
+Использование:
+    python benchmark.py                       # 50 классов, 120 учителей
+    python benchmark.py --classes 30 --teachers 80 --iterations 100
+    python benchmark.py --skip-baseline       # только индексированная версия
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import time
+from typing import Dict, List, Tuple
+
+from schedule_base import (
+    Schedule, Lesson, Teacher, Student, Class, Classroom, Subject,
+    EGEPracticeGroup, TimeSlot, DayOfWeek, SubjectType
+)
+
+
+# (предмет, часов в неделю для параллелей 5-9, для 10-11)
+SCHOOL_CURRICULUM = [
+    ("Русский язык", 5, 3),
+    ("Литература", 3, 3),
+    ("Алгебра", 4, 4),
+    ("Геометрия", 2, 2),
+    ("Английский язык", 3, 3),
+    ("История", 2, 2),
+    ("Обществознание", 1, 2),
+    ("География", 2, 1),
+    ("Биология", 2, 1),
+    ("Физика", 2, 2),
+    ("Химия", 2, 1),
+    ("Информатика", 1, 1),
+    ("Физкультура", 3, 3),
+    ("ОБЖ", 0, 1),
+    ("Технология", 1, 0),
+    ("Музыка", 1, 0),
+]
+
+EGE_SUBJECTS = [
+    ("Русский язык", 100), ("Математика базовая", 60), ("Математика профильная", 40),
+    ("Обществознание", 50), ("Английский язык", 40), ("История", 20),
+    ("Физика", 15), ("Информатика", 15), ("Химия", 10), ("Биология", 10),
+]
+
+
+class LargeSchoolLoader:
+    """Синтетическая школа (интерфейс как у DemoDataLoader)"""
+
+    def __init__(self, num_classes: int = 50, num_teachers: int = 120,
+                 num_classrooms: int = 60, seed: int = 0):
+        rng = random.Random(seed)
+
+        self.classrooms: Dict[str, Classroom] = {}
+        for i in range(num_classrooms):
+            number = f"{i // 15 + 1}{i % 15 + 1:02d}"
+            self.classrooms[number] = Classroom(
+                number=number, capacity=rng.choice([20, 25, 30, 30, 35]), floor=i // 15 + 1
+            )
+
+        # Классы: параллели 5-11, остаток достается старшим
+        grades = list(range(5, 12))
+        per_grade = [num_classes // len(grades)] * len(grades)
+        for i in range(num_classes % len(grades)):
+            per_grade[-1 - i] += 1
+
+        self.classes: Dict[str, Class] = {}
+        self.students: Dict[str, Student] = {}
+        letters = "АБВГДЕЖЗИКЛМН"
+        for grade, count in zip(grades, per_grade):
+            for letter in letters[:count]:
+                name = f"{grade}-{letter}"
+                school_class = Class(name=name, profile="Универсальный")
+                for k in range(rng.randint(22, 28)):
+                    student = Student(name=f"Ученик {name}/{k + 1}", class_name=name)
+                    if grade == 11:
+                        student.ege_subjects = sorted({
+                            subject for subject, popularity in EGE_SUBJECTS
+                            if rng.randint(1, 100) <= popularity
+                        })
+                    school_class.students.append(student)
+                    self.students[student.name] = student
+                self.classes[name] = school_class
+
+        # Учебный план: (предмет, класс, часов)
+        plan: List[Tuple[str, str, int]] = []
+        for name in self.classes:
+            grade = int(name.split("-")[0])
+            for subject, junior_hours, senior_hours in SCHOOL_CURRICULUM:
+                hours = junior_hours if grade <= 9 else senior_hours
+                if hours:
+                    plan.append((subject, name, hours))
+
+        # Учителя распределяются по предметам пропорционально нагрузке
+        hours_by_subject: Dict[str, int] = {}
+        for subject, _, hours in plan:
+            hours_by_subject[subject] = hours_by_subject.get(subject, 0) + hours
+        total_hours = sum(hours_by_subject.values())
+
+        self.teachers: Dict[str, Teacher] = {}
+        staff: Dict[str, List[Teacher]] = {}
+        rooms = list(self.classrooms)
+        by_load = sorted(hours_by_subject, key=lambda subject: -hours_by_subject[subject])
+        hiring = [
+            subject for subject in by_load
+            for _ in range(max(1, round(hours_by_subject[subject] / total_hours * num_teachers)))
+        ]
+        # Из-за округления добираем учителей по самым нагруженным предметам
+        hiring += by_load * (max(0, num_teachers - len(hiring)) // len(by_load) + 1)
+
+        for subject in hiring[:num_teachers]:
+            index = len(self.teachers) + 1
+            unavailable = {DayOfWeek.MONDAY} if rng.random() < 0.15 else set()
+            teacher = Teacher(
+                name=f"Учитель {index:03d} ({subject})",
+                subjects=[subject],
+                home_classroom=rooms[index % len(rooms)] if subject != "Физкультура" else None,
+                unavailable_days=unavailable,
+            )
+            self.teachers[teacher.name] = teacher
+            staff.setdefault(subject, []).append(teacher)
+
+        # Классы закрепляются за учителями предмета по кругу
+        self.subjects: List[Subject] = []
+        assigned: Dict[str, int] = {}
+        for subject, class_name, hours in plan:
+            teachers = staff.get(subject) or list(self.teachers.values())
+            position = assigned.get(subject, 0)
+            assigned[subject] = position + 1
+            self.subjects.append(Subject(
+                name=subject,
+                subject_type=SubjectType.MANDATORY,
+                hours_per_week=hours,
+                teacher=teachers[position % len(teachers)],
+                classes=[class_name],
+            ))
+
+        # Практикумы ЕГЭ для 11 классов
+        self.ege_groups: List[EGEPracticeGroup] = []
+        seniors = [s for s in self.students.values() if s.ege_subjects]
+        for subject, _ in EGE_SUBJECTS:
+            members = [s for s in seniors if subject in s.ege_subjects]
+            teachers = staff.get(subject.split()[0]) or staff.get("Алгебра")
+            if members and teachers:
+                self.ege_groups.append(EGEPracticeGroup(
+                    subject=subject, teacher=teachers[-1], students=members, hours_per_week=3
+                ))
+
+
+class ListSchedule(Schedule):
+    """
+    Расписание без индексов: все запросы просматривают список уроков.
+
+    Воспроизводит прежнюю стоимость операций для сравнения.
+    """
+
+    def add_lesson(self, lesson: Lesson):
+        self.lessons.append(lesson)
+
+    def move_lesson(self, lesson: Lesson, time_slot: TimeSlot):
+        lesson.time_slot = time_slot
+
+    def get_lessons_by_class(self, class_name: str) -> List[Lesson]:
+        return [l for l in self.lessons if class_name in l.class_or_group]
+
+    def get_lessons_by_teacher(self, teacher_name: str) -> List[Lesson]:
+        return [l for l in self.lessons if l.teacher.name == teacher_name]
+
+    def get_lessons_by_timeslot(self, time_slot: TimeSlot) -> List[Lesson]:
+        return [l for l in self.lessons if l.time_slot == time_slot]
+
+    def teacher_lessons_at(self, teacher_name: str, time_slot: TimeSlot) -> List[Lesson]:
+        return [l for l in self.lessons
+                if l.teacher.name == teacher_name and l.time_slot == time_slot]
+
+    def group_lessons_at(self, class_or_group: str, time_slot: TimeSlot) -> List[Lesson]:
+        return [l for l in self.lessons
+                if l.class_or_group == class_or_group and l.time_slot == time_slot]
+
+    def classroom_lessons_at(self, classroom_number: str, time_slot: TimeSlot) -> List[Lesson]:
+        return [l for l in self.lessons
+                if l.classroom and l.classroom.number == classroom_number
+                and l.time_slot == time_slot]
+
+    def _days(self, key_of) -> Dict[Tuple[str, DayOfWeek], Tuple[int, int]]:
+        days: Dict[Tuple[str, DayOfWeek], Tuple[int, int]] = {}
+        for l in self.lessons:
+            key = (key_of(l), l.time_slot.day)
+            mask, count = days.get(key, (0, 0))
+            days[key] = (mask | (1 << l.time_slot.lesson_number), count + 1)
+        return days
+
+    def teacher_day(self, teacher_name: str, day: DayOfWeek) -> Tuple[int, int]:
+        return self.teacher_days().get((teacher_name, day), (0, 0))
+
+    def group_day(self, class_or_group: str, day: DayOfWeek) -> Tuple[int, int]:
+        return self.group_days().get((class_or_group, day), (0, 0))
+
+    def teacher_days(self):
+        return self._days(lambda l: l.teacher.name)
+
+    def group_days(self):
+        return self._days(lambda l: l.class_or_group)
+
+    def teacher_day_mask(self, teacher_name: str, day: DayOfWeek) -> int:
+        mask = 0
+        for l in self.lessons:
+            if l.teacher.name == teacher_name and l.time_slot.day == day:
+                mask |= 1 << l.time_slot.lesson_number
+        return mask
+
+    def group_day_mask(self, class_or_group: str, day: DayOfWeek) -> int:
+        mask = 0
+        for l in self.lessons:
+            if l.class_or_group == class_or_group and l.time_slot.day == day:
+                mask |= 1 << l.time_slot.lesson_number
+        return mask
+
+    def is_teacher_busy(self, teacher: Teacher, time_slot: TimeSlot) -> bool:
+        return any(l.teacher == teacher and l.time_slot == time_slot for l in self.lessons)
+
+    def is_class_busy(self, class_name: str, time_slot: TimeSlot) -> bool:
+        return any(class_name in l.class_or_group and l.time_slot == time_slot for l in self.lessons)
+
+    def is_classroom_busy(self, classroom: Classroom, time_slot: TimeSlot) -> bool:
+        return any(l.classroom == classroom and l.time_slot == time_slot for l in self.lessons)
+
+    def get_teacher_gaps(self, teacher: Teacher) -> int:
+        return Schedule(lessons=self.get_lessons_by_teacher(teacher.name)).get_teacher_gaps(teacher)
+
+    def get_class_gaps(self, class_name: str) -> int:
+        return Schedule(lessons=self.get_lessons_by_class(class_name)).get_class_gaps(class_name)
+
+
+def run_pipeline(loader, schedule_cls, iterations: int, seed: int):
+    """
+    Фазы 1-3 на заданной реализации расписания.
+
+    Returns:
+        (время фаз, расписание после Фазы 2 в виде dict, оптимизатор Фазы 3)
+    """
+    from schedule_generator import ScheduleGenerator
+    from phase2_mandatory import Phase2MandatoryPlacer
+    from phase3_optimization import Phase3Optimizer
+
+    random.seed(seed)
+    timings: Dict[str, float] = {}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        generator = ScheduleGenerator(loader)
+        generator.schedule = schedule_cls()
+        generator.place_ege_practices()
+        timings['phase1'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        phase2 = Phase2MandatoryPlacer(generator.schedule, loader, generator.ege_slots)
+        phase2.place_all_mandatory_subjects()
+        timings['phase2'] = time.perf_counter() - started
+        after_phase2 = generator.schedule.to_dict()
+
+        started = time.perf_counter()
+        optimizer = Phase3Optimizer(generator.schedule, loader)
+        optimizer.optimize(max_iterations=iterations, verbose=False)
+        timings['phase3'] = time.perf_counter() - started
+
+    timings['total'] = sum(timings.values())
+    return timings, after_phase2, optimizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк генератора расписания')
+    parser.add_argument('--classes', type=int, default=50, help='Количество классов')
+    parser.add_argument('--teachers', type=int, default=120, help='Количество учителей')
+    parser.add_argument('--classrooms', type=int, default=60, help='Количество кабинетов')
+    parser.add_argument('--iterations', type=int, default=100, help='Итераций оптимизации')
+    parser.add_argument('--seed', type=int, default=42, help='Seed данных и алгоритма')
+    parser.add_argument('--skip-baseline', action='store_true',
+                        help='Не запускать версию без индексов')
+    args = parser.parse_args()
+
+    loader = LargeSchoolLoader(args.classes, args.teachers, args.classrooms, seed=args.seed)
+    lessons_required = sum(s.hours_per_week for s in loader.subjects)
+    print(f"Школа: {len(loader.classes)} классов, {len(loader.teachers)} учителей, "
+          f"{len(loader.classrooms)} кабинетов, {lessons_required} уроков в неделю")
+
+    runs = [("индексы", Schedule)]
+    if not args.skip_baseline:
+        runs.append(("список", ListSchedule))
+
+    results = {}
+    for label, schedule_cls in runs:
+        timings, after_phase2, optimizer = run_pipeline(
+            loader, schedule_cls, args.iterations, args.seed
+        )
+        results[label] = (timings, after_phase2)
+        stats = optimizer.stats
+        print(f"\n{label}: размещено {len(optimizer.schedule.lessons)} уроков, "
+              f"метрика {stats['initial_metric']:.1f} -> {stats['final_metric']:.1f}, "
+              f"{stats['iterations'] / timings['phase3']:.0f} итераций/с")
+        for phase, seconds in timings.items():
+            print(f"   {phase:7s}: {seconds:8.3f} с")
+
+    if len(results) == 2:
+        indexed, baseline = results["индексы"], results["список"]
+        same = indexed[1] == baseline[1]
+        print(f"\nРасписания после Фазы 2 совпадают: {'да' if same else 'НЕТ'}")
+        print("Ускорение:")
+        for phase in indexed[0]:
+            ratio = baseline[0][phase] / indexed[0][phase] if indexed[0][phase] else float('inf')
+            print(f"   {phase:7s}: x{ratio:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,74 @@
 """
 
 import pandas as pd
+import hashlib
+import io
 import json
+import pickle
 from collections import defaultdict
+from pathlib import Path
+from typing import Union
 from schedule_base import *
 
+# Кэш разобранных данных: <CACHE_DIR>/loader-<хэш файлов>.pkl
+DEFAULT_CACHE_DIR = Path(__file__).parent / 'data' / '.cache'
+# Увеличивать при изменении разбора, чтобы старые кэши не использовались
+CACHE_VERSION = 1
+
+# Листы исходных файлов
+CLASSROOMS_SHEET = 'БК'
+TEACHERS_SHEET = 'БК (февраль)'
+STUDENTS_SHEET = 'Результат'
+
+# Служебные строки в столбце "Класс" расстановки кадров
+SERVICE_ROWS = ['Направление/ профиль', 'Количество учащихся класса',
+                'Классный руководитель', 'Разрешено деление на группы']
+
+# Учителя, не работающие по понедельникам
+# (по данным из текущего расписания мы знаем, что 12 учителей не работают по ПН)
+TEACHERS_NOT_ON_MONDAY = [
+    'Егорова Н.В.', 'Закревская Е.А.', 'Затопляева О.В.', 'Каретникова А.В.',
+    'Новорадовская П.А.', 'Северин А.А.', 'Терехов М.Р.', 'Цуканова М.Л.',
+    'Чёрная Е.А.', 'Шах М.В.', 'Шехурдина А.А.', 'Кудряшова А.М.'
+]
+
+# Маппинг аббревиатур на полные названия предметов ЕГЭ
+EGE_SUBJECT_MAPPING = {
+    'РУ': 'Русский язык',
+    'МА': 'Математика базовая',
+    'МА проф': 'Математика профильная',
+    'АЯ': 'Английский язык',
+    'ОБ': 'Обществознание',
+    'ИС': 'История',
+    'ЛИ': 'Литература',
+    'ИНФ': 'Информатика',
+    'БИ': 'Биология',
+    'ФИ': 'Физика',
+    'ХИ': 'Химия',
+    'ГГ': 'География',
+    'ФЯ': 'Французский язык',
+    'НЯ': 'Немецкий язык',
+    'ИЯ': 'Испанский язык'
+}
+
+# Значения ячейки, означающие, что ученик не сдает предмет
+EGE_REFUSALS = ['отказ', 'н', 'nan', '']
+
+# Файл Excel: путь или содержимое (например, из st.file_uploader)
+ExcelSource = Union[str, Path, bytes]
+
+
+def _cell_is_digit(value) -> bool:
+    return pd.notna(value) and str(value).isdigit()
+
+
+def _cell_is_chosen(value) -> bool:
+    return pd.notna(value) and str(value).lower() not in EGE_REFUSALS
+
+
+def _source_bytes(source: ExcelSource) -> bytes:
+    return source if isinstance(source, bytes) else Path(source).read_bytes()
+
 
 class DataLoader:
     """Класс для загрузки данных из Excel файлов"""
@@ -19,108 +83,177 @@ class DataLoader:
         self.students: Dict[str, Student] = {}
         self.subjects: List[Subject] = []
         self.ege_groups: List[EGEPracticeGroup] = []
+
+    def load_workbooks(
+        self,
+        classrooms_file: ExcelSource,
+        teachers_file: ExcelSource,
+        students_file: ExcelSource,
+        cache_dir: Optional[Path] = DEFAULT_CACHE_DIR
+    ):
+        """
+        Загрузка всех данных и формирование групп ЕГЭ.
+
+        Каждый файл открывается один раз (если два листа лежат в одном
+        файле — он тоже читается один раз). Результат сохраняется в кэш
+        по хэшу содержимого файлов: при повторном запуске с теми же
+        файлами разбор Excel пропускается.
+
+        Args:
+            classrooms_file: Файл с листом 'БК'
+            teachers_file: Файл с листом 'БК (февраль)'
+            students_file: Файл с листом 'Результат'
+            cache_dir: Папка кэша (None — без кэша)
+        """
+        contents = [_source_bytes(f) for f in (classrooms_file, teachers_file, students_file)]
+
+        cache_path = None
+        if cache_dir is not None:
+            digest = hashlib.sha256(str(CACHE_VERSION).encode())
+            for content in contents:
+                digest.update(hashlib.sha256(content).digest())
+            cache_path = Path(cache_dir) / f"loader-{digest.hexdigest()[:32]}.pkl"
+            if self._load_cache(cache_path):
+                print(f"✓ Данные загружены из кэша ({cache_path.name})")
+                return
+
+        sheets = self._read_sheets([
+            (contents[0], CLASSROOMS_SHEET),
+            (contents[1], TEACHERS_SHEET),
+            (contents[2], STUDENTS_SHEET),
+        ])
+        print("Загрузка кабинетов...")
+        self._parse_classrooms(sheets[0])
+        print("Загрузка учителей и расстановки кадров...")
+        self._parse_teachers_and_subjects(sheets[1])
+        print("Загрузка учеников и выбора ЕГЭ...")
+        self._parse_students_and_ege_choices(sheets[2])
+        self.create_ege_practice_groups()
+
+        if cache_path is not None:
+            self._save_cache(cache_path)
+
+    @staticmethod
+    def _read_sheets(requests: List[Tuple[bytes, str]]) -> List[pd.DataFrame]:
+        """Листы из файлов; каждый файл открывается один раз (openpyxl read-only, только значения)"""
+        workbooks: Dict[bytes, pd.ExcelFile] = {}
+        frames = []
+        try:
+            for content, sheet_name in requests:
+                if content not in workbooks:
+                    workbooks[content] = pd.ExcelFile(io.BytesIO(content))
+                frames.append(workbooks[content].parse(sheet_name=sheet_name, header=0))
+        finally:
+            for workbook in workbooks.values():
+                workbook.close()
+        return frames
+
+    def _load_cache(self, path: Path) -> bool:
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return False
+        self.__dict__.update(state)
+        return True
+
+    def _save_cache(self, path: Path):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(path)
+        except OSError as e:
+            print(f"⚠️  Не удалось сохранить кэш данных: {e}")
         
     def load_classrooms(self, filename: str):
         """Загрузка кабинетов"""
         print("Загрузка кабинетов...")
-        df = pd.read_excel(filename, sheet_name='БК', header=0)
-        
-        for idx, row in df.iterrows():
-            number = str(row['Номер кабинета'])
-            capacity = int(row['Вместимость']) if pd.notna(row['Вместимость']) else 30
-            floor = int(row['Этаж']) if pd.notna(row['Этаж']) else 1
-            responsible = str(row['Ответственный']) if pd.notna(row['Ответственный']) else None
-            
-            classroom = Classroom(
+        self._parse_classrooms(pd.read_excel(filename, sheet_name=CLASSROOMS_SHEET, header=0))
+
+    def _parse_classrooms(self, df: pd.DataFrame):
+        numbers = df['Номер кабинета'].map(str)
+        capacities = df['Вместимость'].map(lambda v: int(v) if pd.notna(v) else 30)
+        floors = df['Этаж'].map(lambda v: int(v) if pd.notna(v) else 1)
+        responsible = df['Ответственный'].map(lambda v: str(v) if pd.notna(v) else None)
+
+        for number, capacity, floor, teacher in zip(numbers, capacities, floors, responsible):
+            self.classrooms[number] = Classroom(
                 number=number,
                 capacity=capacity,
                 floor=floor,
-                responsible_teacher=responsible
+                responsible_teacher=teacher
             )
-            self.classrooms[number] = classroom
         
         print(f"✓ Загружено {len(self.classrooms)} кабинетов")
     
     def load_teachers_and_subjects(self, filename: str):
         """Загрузка учителей и предметов из расстановки кадров"""
         print("Загрузка учителей и расстановки кадров...")
-        df = pd.read_excel(filename, sheet_name='БК (февраль)', header=0)
-        
-        current_teacher = None
-        teacher_subjects = defaultdict(list)
-        
+        self._parse_teachers_and_subjects(pd.read_excel(filename, sheet_name=TEACHERS_SHEET, header=0))
+
+    def _parse_teachers_and_subjects(self, df: pd.DataFrame):
         # Находим столбцы с классами
         class_columns = [col for col in df.columns if col.startswith('1')]  # 10-Д, 11-В и т.д.
+
+        # ФИО учителя указано в первой строке его блока (не меньше двух слов)
+        names = df['ФИО учителя']
+        is_name = names.map(lambda v: isinstance(v, str) and len(v.split()) >= 2).astype(bool)
+        current_teacher = names.where(is_name).map(
+            lambda v: v.strip() if isinstance(v, str) else None
+        ).ffill()
+
+        # Кабинет учителя — первый, за который он отвечает
+        home_classrooms = {}
+        for classroom_num, classroom in self.classrooms.items():
+            home_classrooms.setdefault(classroom.responsible_teacher, classroom_num)
+
+        for teacher_name in current_teacher[is_name]:
+            if teacher_name not in self.teachers:
+                self.teachers[teacher_name] = Teacher(
+                    name=teacher_name,
+                    home_classroom=home_classrooms.get(teacher_name)
+                )
+
+        # Строки предметов: название в столбце "Класс" и часы хотя бы в одном классе
+        subject_names = df['Класс'].map(lambda v: v.strip() if isinstance(v, str) else '')
+        hours_mask = df[class_columns].apply(lambda col: col.map(_cell_is_digit)).astype(bool) \
+            if class_columns else pd.DataFrame(index=df.index)
+        is_subject = (
+            current_teacher.notna()
+            & subject_names.ne('')
+            & ~subject_names.isin(SERVICE_ROWS)
+            & hours_mask.any(axis=1)
+        )
+
+        hours_values = df[class_columns].to_numpy(dtype=object)
+        hours_mask_values = hours_mask.to_numpy()
+        teacher_subjects = defaultdict(list)
+
+        for row in is_subject.to_numpy().nonzero()[0]:
+            teacher_name = current_teacher.iat[row]
+            subject_name = subject_names.iat[row]
+
+            # Добавляем предмет учителю
+            teacher = self.teachers[teacher_name]
+            if subject_name not in teacher.subjects:
+                teacher.subjects.append(subject_name)
+
+            # Определяем тип предмета
+            subject_type = SubjectType.MANDATORY
+            if 'Практикум ЕГЭ' in subject_name:
+                subject_type = SubjectType.EGE_PRACTICE
+
+            for col in hours_mask_values[row].nonzero()[0]:
+                teacher_subjects[teacher_name].append({
+                    'name': subject_name,
+                    'type': subject_type,
+                    'class': class_columns[col],
+                    'hours': int(hours_values[row, col])
+                })
         
-        for idx, row in df.iterrows():
-            # Ищем ФИО учителя
-            teacher_name = row['ФИО учителя']
-            
-            if pd.notna(teacher_name) and isinstance(teacher_name, str):
-                # Проверяем, что это реально ФИО
-                if len(teacher_name.split()) >= 2:
-                    current_teacher = teacher_name.strip()
-                    if current_teacher not in self.teachers:
-                        # Проверяем, есть ли кабинет учителя
-                        home_classroom = None
-                        for classroom_num, classroom in self.classrooms.items():
-                            if classroom.responsible_teacher == current_teacher:
-                                home_classroom = classroom_num
-                                break
-                        
-                        self.teachers[current_teacher] = Teacher(
-                            name=current_teacher,
-                            home_classroom=home_classroom
-                        )
-            
-            # Если есть текущий учитель, собираем его предметы
-            if current_teacher:
-                subject_name = row['Класс']
-                
-                if pd.notna(subject_name) and isinstance(subject_name, str):
-                    subject_name = subject_name.strip()
-                    
-                    # Проверяем, что это не служебные строки
-                    if subject_name and subject_name not in ['Направление/ профиль', 'Количество учащихся класса', 
-                                                               'Классный руководитель', 'Разрешено деление на группы']:
-                        # Проверяем, есть ли часы в классах
-                        has_hours = False
-                        classes_with_hours = []
-                        
-                        for class_col in class_columns:
-                            hours = row[class_col]
-                            if pd.notna(hours) and str(hours).isdigit():
-                                has_hours = True
-                                classes_with_hours.append((class_col, int(hours)))
-                        
-                        if has_hours:
-                            # Добавляем предмет учителю
-                            if subject_name not in self.teachers[current_teacher].subjects:
-                                self.teachers[current_teacher].subjects.append(subject_name)
-                            
-                            # Определяем тип предмета
-                            subject_type = SubjectType.MANDATORY
-                            if 'Практикум ЕГЭ' in subject_name:
-                                subject_type = SubjectType.EGE_PRACTICE
-                            
-                            # Сохраняем информацию о предмете
-                            for class_name, hours in classes_with_hours:
-                                teacher_subjects[current_teacher].append({
-                                    'name': subject_name,
-                                    'type': subject_type,
-                                    'class': class_name,
-                                    'hours': hours
-                                })
-        
-        # Определяем учителей, не работающих по понедельникам
-        # (по данным из текущего расписания мы знаем, что 12 учителей не работают по ПН)
-        teachers_not_on_monday = [
-            'Егорова Н.В.', 'Закревская Е.А.', 'Затопляева О.В.', 'Каретникова А.В.',
-            'Новорадовская П.А.', 'Северин А.А.', 'Терехов М.Р.', 'Цуканова М.Л.',
-            'Чёрная Е.А.', 'Шах М.В.', 'Шехурдина А.А.', 'Кудряшова А.М.'
-        ]
-        
-        for teacher_name in teachers_not_on_monday:
+        for teacher_name in TEACHERS_NOT_ON_MONDAY:
             if teacher_name in self.teachers:
                 self.teachers[teacher_name].unavailable_days.add(DayOfWeek.MONDAY)
         
@@ -144,71 +277,44 @@ class DataLoader:
     def load_students_and_ege_choices(self, filename: str):
         """Загрузка учеников и их выбора ЕГЭ"""
         print("Загрузка учеников и выбора ЕГЭ...")
-        df = pd.read_excel(filename, sheet_name='Результат', header=0)
-        
-        # Маппинг аббревиатур на полные названия предметов ЕГЭ
-        subject_mapping = {
-            'РУ': 'Русский язык',
-            'МА': 'Математика базовая',
-            'МА проф': 'Математика профильная',
-            'АЯ': 'Английский язык',
-            'ОБ': 'Обществознание',
-            'ИС': 'История',
-            'ЛИ': 'Литература',
-            'ИНФ': 'Информатика',
-            'БИ': 'Биология',
-            'ФИ': 'Физика',
-            'ХИ': 'Химия',
-            'ГГ': 'География',
-            'ФЯ': 'Французский язык',
-            'НЯ': 'Немецкий язык',
-            'ИЯ': 'Испанский язык'
-        }
-        
+        self._parse_students_and_ege_choices(pd.read_excel(filename, sheet_name=STUDENTS_SHEET, header=0))
+
+    def _parse_students_and_ege_choices(self, df: pd.DataFrame):
         # Находим столбцы для каждого предмета
-        subject_columns = defaultdict(list)
-        for col in df.columns:
-            for abbr in subject_mapping.keys():
-                if col.startswith(abbr):
-                    subject_columns[abbr].append(col)
-        
-        # Обрабатываем каждого ученика
-        for idx, row in df.iterrows():
-            student_name = row['ФИО']
-            class_name = row['класс']
+        # (столбцы "МА проф..." относятся и к "МА" — как и раньше, по префиксу)
+        chosen = pd.DataFrame(index=df.index)
+        for abbr, full_name in EGE_SUBJECT_MAPPING.items():
+            columns = [col for col in df.columns if col.startswith(abbr)]
+            if columns:
+                marks = df[columns].apply(lambda col: col.map(_cell_is_chosen)).astype(bool)
+                chosen[full_name] = marks.any(axis=1)
+            else:
+                chosen[full_name] = False
+
+        valid = (df['ФИО'].notna() & df['класс'].notna()).to_numpy()
+        chosen_values = chosen.to_numpy()
+        subject_names = list(chosen.columns)
+
+        for row in valid.nonzero()[0]:
+            student_name = df['ФИО'].iat[row]
+            class_name = df['класс'].iat[row]
+
+            student = Student(
+                name=student_name,
+                class_name=class_name,
+                ege_subjects=[subject_names[i] for i in chosen_values[row].nonzero()[0]]
+            )
+            
+            self.students[student_name] = student
             
-            if pd.notna(student_name) and pd.notna(class_name):
-                ege_subjects = []
-                
-                # Проверяем выбор каждого предмета
-                for abbr, full_name in subject_mapping.items():
-                    has_subject = False
-                    
-                    for col in subject_columns[abbr]:
-                        val = row[col]
-                        if pd.notna(val) and str(val).lower() not in ['отказ', 'н', 'nan', '']:
-                            has_subject = True
-                            break
-                    
-                    if has_subject:
-                        ege_subjects.append(full_name)
-                
-                student = Student(
-                    name=student_name,
-                    class_name=class_name,
-                    ege_subjects=ege_subjects
+            # Добавляем ученика в класс
+            if class_name not in self.classes:
+                self.classes[class_name] = Class(
+                    name=class_name,
+                    profile="РЛ ВШЭ"  # Упрощение, можно загружать из другого файла
                 )
-                
-                self.students[student_name] = student
-                
-                # Добавляем ученика в класс
-                if class_name not in self.classes:
-                    self.classes[class_name] = Class(
-                        name=class_name,
-                        profile="РЛ ВШЭ"  # Упрощение, можно загружать из другого файла
-                    )
-                
-                self.classes[class_name].students.append(student)
+            
+            self.classes[class_name].students.append(student)
         
         print(f"✓ Загружено {len(self.students)} учеников")
         print(f"✓ Загружено {len(self.classes)} классов")
@@ -0,0 +1,497 @@
+"""
+Фоновая генерация расписания для веб-приложения
+
+Фазы 1-3 занимают минуты, поэтому в запросе Flask они не выполняются:
+- данные из БД снимаются в DataLoader (его можно передать в другой процесс);
+- ScheduleGenerator, Phase2MandatoryPlacer и Phase3Optimizer работают
+  в отдельном процессе и присылают события прогресса через очередь;
+- поток-наблюдатель в процессе веб-приложения обновляет состояние задачи
+  и по окончании одной транзакцией записывает расписание и все его уроки.
+
+Состояние задачи можно опрашивать (to_dict) или ждать изменений
+(wait_for_update) — на этом построен поток server-sent events.
+"""
+
+import contextlib
+import io
+import itertools
+import multiprocessing
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from data_loader import DataLoader
+from schedule_base import (
+    Teacher, Student, Class, Classroom, Subject, DayOfWeek, SubjectType
+)
+
+# Состояния задачи
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Доля шкалы прогресса, с которой начинается каждая фаза
+PHASE_PROGRESS = {
+    'loading': 0,
+    'phase1': 5,
+    'phase2': 15,
+    'phase3': 40,
+    'saving': 98,
+}
+
+# Сколько ждать завершения процесса после отмены, прежде чем остановить его
+CANCEL_GRACE_SECONDS = 5.0
+# Сколько хранить завершенные задачи
+FINISHED_JOB_TTL_SECONDS = 3600
+
+
+# ============== СНИМОК ДАННЫХ ИЗ БД ==============
+
+def load_from_database(include_ege: bool = True) -> DataLoader:
+    """
+    Собирает DataLoader из таблиц веб-приложения.
+
+    Вызывается в контексте приложения Flask. Каждая таблица читается
+    одним запросом, связи собираются в памяти.
+    """
+    from models import (
+        db, Teacher as TeacherRow, Classroom as ClassroomRow,
+        SchoolClass, Student as StudentRow, Workload,
+        teacher_subjects, teacher_unavailable_days, student_ege_subjects,
+    )
+    from models import Subject as SubjectRow
+
+    loader = DataLoader()
+
+    classroom_numbers = {}
+    for row in ClassroomRow.query.all():
+        classroom_numbers[row.id] = row.number
+        loader.classrooms[row.number] = Classroom(
+            number=row.number,
+            capacity=row.capacity or 30,
+            floor=row.floor or 1,
+        )
+
+    subject_names = {row.id: row.name for row in SubjectRow.query.all()}
+
+    names_by_teacher = defaultdict(list)
+    for teacher_id, subject_id in db.session.execute(teacher_subjects.select()).fetchall():
+        names_by_teacher[teacher_id].append(subject_names[subject_id])
+
+    days_by_teacher = defaultdict(set)
+    for teacher_id, day in db.session.execute(teacher_unavailable_days.select()).fetchall():
+        days_by_teacher[teacher_id].add(DayOfWeek(day + 1))
+
+    teachers_by_id = {}
+    for row in TeacherRow.query.all():
+        teacher = Teacher(
+            name=row.name,
+            subjects=names_by_teacher[row.id],
+            home_classroom=classroom_numbers.get(row.home_classroom_id),
+            unavailable_days=days_by_teacher[row.id],
+        )
+        teachers_by_id[row.id] = teacher
+        loader.teachers[row.name] = teacher
+
+    class_names = {}
+    for row in SchoolClass.query.all():
+        class_names[row.id] = row.name
+        loader.classes[row.name] = Class(name=row.name, profile=row.profile or '')
+
+    if include_ege:
+        ege_by_student = defaultdict(list)
+        for student_id, subject_id in db.session.execute(student_ege_subjects.select()).fetchall():
+            ege_by_student[student_id].append(subject_names[subject_id])
+
+        for row in StudentRow.query.all():
+            class_name = class_names.get(row.class_id)
+            if class_name is None:
+                continue
+            student = Student(
+                name=row.name,
+                class_name=class_name,
+                ege_subjects=ege_by_student[row.id],
+            )
+            loader.students[row.name] = student
+            loader.classes[class_name].students.append(student)
+
+    for row in Workload.query.order_by(Workload.id).all():
+        name = subject_names[row.subject_id]
+        class_name = class_names[row.class_id]
+        loader.subjects.append(Subject(
+            name=name,
+            subject_type=(SubjectType.EGE_PRACTICE if 'Практикум ЕГЭ' in name
+                          else SubjectType.MANDATORY),
+            hours_per_week=row.hours_per_week or 1,
+            teacher=teachers_by_id[row.teacher_id],
+            classes=[class_name],
+            is_grouped=bool(row.is_group),
+            groups=[f"{class_name} (гр. {row.group_number})"] if row.group_number else [],
+        ))
+
+    return loader
+
+
+# ============== ПРОЦЕСС ГЕНЕРАЦИИ ==============
+
+class _Cancelled(Exception):
+    """Генерация отменена пользователем"""
+
+
+def _generation_worker(loader: DataLoader, params: Dict, events, cancel_event) -> None:
+    """
+    Выполняет фазы 1-3 в отдельном процессе.
+
+    События в очереди events — словари с ключом 'type':
+    progress (phase, iteration, best_metric), result, error, cancelled.
+    """
+    from schedule_generator import ScheduleGenerator
+    from phase2_mandatory import Phase2MandatoryPlacer
+    from phase3_optimization import Phase3Optimizer
+
+    def report(phase: str, **fields):
+        if cancel_event.is_set():
+            raise _Cancelled()
+        events.put(dict(type='progress', phase=phase, **fields))
+
+    if params.get('seed') is not None:
+        random.seed(params['seed'])
+
+    try:
+        # Фазы подробно печатают ход работы — в фоне этот вывод не нужен
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator = ScheduleGenerator(loader)
+            if params.get('include_ege', True):
+                report('phase1')
+                loader.create_ege_practice_groups()
+                generator.place_ege_practices()
+
+            report('phase2')
+            placer = Phase2MandatoryPlacer(generator.schedule, loader, generator.ege_slots)
+            phase2_stats = placer.place_all_mandatory_subjects()
+
+            report('phase3', iteration=0)
+            optimizer = Phase3Optimizer(generator.schedule, loader, seed=params.get('seed'))
+
+            def on_progress(iteration: int, best_metric: float) -> bool:
+                report('phase3', iteration=iteration, best_metric=best_metric)
+                return True
+
+            schedule = optimizer.optimize(
+                max_iterations=params.get('iterations', 1000),
+                verbose=False,
+                time_limit=params.get('time_limit'),
+                progress=on_progress,
+            )
+            if cancel_event.is_set():
+                raise _Cancelled()
+    except _Cancelled:
+        events.put({'type': 'cancelled'})
+        return
+    except Exception as e:
+        events.put({'type': 'error', 'error': f'{type(e).__name__}: {e}'})
+        return
+
+    lessons = [
+        (
+            lesson.subject,
+            lesson.teacher.name,
+            lesson.class_or_group,
+            lesson.classroom.number if lesson.classroom else None,
+            lesson.time_slot.day.value - 1,
+            lesson.time_slot.lesson_number,
+            lesson.is_ege_practice,
+        )
+        for lesson in schedule.lessons
+    ]
+    events.put({
+        'type': 'result',
+        'lessons': lessons,
+        'stats': {
+            'total_required': phase2_stats['total_required'],
+            'placed': phase2_stats['placed'],
+            'failed': phase2_stats['failed'],
+            'initial_metric': optimizer.stats['initial_metric'],
+            'final_metric': optimizer.stats['final_metric'],
+            'iterations': optimizer.stats['iterations'],
+        },
+    })
+
+
+# ============== СОХРАНЕНИЕ РЕЗУЛЬТАТА ==============
+
+def save_generated_schedule(params: Dict, lessons: List[tuple]):
+    """
+    Записывает расписание и его уроки одной транзакцией.
+
+    Справочники (учителя, предметы, классы, кабинеты) читаются
+    по одному запросу; уроки вставляются одним executemany.
+    Недостающие предметы (например, "Практикум ЕГЭ: ...") создаются.
+
+    Returns:
+        Созданная запись Schedule
+    """
+    from sqlalchemy import insert
+    from models import db, Teacher, Subject, SchoolClass, Classroom, Schedule, Lesson
+
+    try:
+        teacher_ids = {name: id_ for id_, name in db.session.query(Teacher.id, Teacher.name)}
+        subject_ids = {name: id_ for id_, name in db.session.query(Subject.id, Subject.name)}
+        class_ids = {name: id_ for id_, name in db.session.query(SchoolClass.id, SchoolClass.name)}
+        classroom_ids = {number: id_ for id_, number in db.session.query(Classroom.id, Classroom.number)}
+
+        for subject_name in sorted({lesson[0] for lesson in lessons} - subject_ids.keys()):
+            subject = Subject(name=subject_name, is_ege=subject_name.startswith('Практикум ЕГЭ'))
+            db.session.add(subject)
+            db.session.flush()
+            subject_ids[subject_name] = subject.id
+
+        schedule = Schedule(
+            name=params['name'],
+            description=params.get('description'),
+            is_active=params.get('set_active', False),
+            valid_from=_parse_date(params.get('valid_from')),
+            valid_to=_parse_date(params.get('valid_to')),
+        )
+        if schedule.is_active:
+            Schedule.query.update({'is_active': False})
+        db.session.add(schedule)
+        db.session.flush()
+
+        rows = []
+        for subject, teacher, group, classroom, day, number, is_ege in lessons:
+            class_id = class_ids.get(group)
+            rows.append({
+                'schedule_id': schedule.id,
+                'subject_id': subject_ids[subject],
+                'teacher_id': teacher_ids[teacher],
+                'class_id': class_id,
+                'classroom_id': classroom_ids.get(classroom),
+                'day': day,
+                'lesson_number': number,
+                'is_ege_practice': is_ege,
+                'group_name': None if class_id else group,
+            })
+        if rows:
+            # render_nulls: иначе строки с NULL в разных столбцах идут разными пакетами
+            db.session.execute(insert(Lesson).execution_options(render_nulls=True), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return schedule
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+# ============== ЗАДАЧИ ==============
+
+class GenerationJob:
+    """Состояние одной задачи генерации"""
+
+    def __init__(self, job_id: str, params: Dict):
+        self.id = job_id
+        self.params = params
+        self.state = JOB_QUEUED
+        self.phase = 'loading'
+        self.iteration = 0
+        self.best_metric: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.schedule_id: Optional[int] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        # Увеличивается при каждом изменении — по нему ждут обновлений
+        self.version = 0
+        self.cancel_event = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def progress(self) -> int:
+        """Примерный процент выполнения"""
+        if self.state == JOB_DONE:
+            return 100
+        start = PHASE_PROGRESS.get(self.phase, 0)
+        if self.phase == 'phase3':
+            iterations = max(1, self.params.get('iterations', 1000))
+            span = PHASE_PROGRESS['saving'] - start
+            return start + min(span, span * self.iteration // iterations)
+        return start
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'state': self.state,
+            'phase': self.phase,
+            'iteration': self.iteration,
+            'max_iterations': self.params.get('iterations', 1000),
+            'best_metric': self.best_metric,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'schedule_id': self.schedule_id,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class GenerationJobManager:
+    """
+    Очередь задач генерации.
+
+    Одновременно выполняется не больше max_running процессов,
+    остальные задачи ждут в состоянии queued.
+    """
+
+    def __init__(self, app, max_running: int = 1):
+        self.app = app
+        self._jobs: Dict[str, GenerationJob] = {}
+        self._ids = itertools.count(1)
+        self._changed = threading.Condition()
+        self._slots = threading.Semaphore(max_running)
+        self._context = multiprocessing.get_context()
+
+    def submit(self, loader: DataLoader, params: Dict) -> GenerationJob:
+        """Ставит генерацию в очередь и сразу возвращает задачу"""
+        with self._changed:
+            self._forget_finished()
+            job = GenerationJob(f"{int(time.time())}-{next(self._ids)}", params)
+            job.cancel_event = self._context.Event()
+            self._jobs[job.id] = job
+
+        thread = threading.Thread(
+            target=self._run, args=(job, loader),
+            name=f"generation-{job.id}", daemon=True
+        )
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[GenerationJob]:
+        """Просит процесс остановиться; задача в очереди отменяется сразу"""
+        job = self._jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+            if job.state == JOB_QUEUED:
+                self._update(job, state=JOB_CANCELLED)
+        return job
+
+    def wait_for_update(self, job: GenerationJob, version: int, timeout: float) -> bool:
+        """Ждет изменения задачи после версии version. False — по таймауту."""
+        with self._changed:
+            return self._changed.wait_for(lambda: job.version != version, timeout)
+
+    # ── Внутреннее ──
+
+    def _update(self, job: GenerationJob, **fields) -> None:
+        with self._changed:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            if job.finished and job.finished_at is None:
+                job.finished_at = datetime.now()
+            job.version += 1
+            self._changed.notify_all()
+
+    def _forget_finished(self) -> None:
+        now = datetime.now()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and (now - job.finished_at).total_seconds() > FINISHED_JOB_TTL_SECONDS:
+                del self._jobs[job_id]
+
+    def _run(self, job: GenerationJob, loader: DataLoader) -> None:
+        with self._slots:
+            if job.cancel_event.is_set():
+                return
+            self._update(job, state=JOB_RUNNING)
+            events = self._context.Queue()
+            process = self._context.Process(
+                target=_generation_worker,
+                args=(loader, job.params, events, job.cancel_event),
+                daemon=True,
+            )
+            process.start()
+            try:
+                outcome = self._follow(job, process, events)
+            finally:
+                process.join(timeout=1)
+
+        if outcome is None:
+            self._update(job, state=JOB_FAILED, error='Процесс генерации завершился без результата')
+        elif outcome['type'] == 'cancelled':
+            self._update(job, state=JOB_CANCELLED)
+        elif outcome['type'] == 'error':
+            self._update(job, state=JOB_FAILED, error=outcome['error'])
+        else:
+            self._save(job, outcome)
+
+    def _follow(self, job: GenerationJob, process, events) -> Optional[Dict]:
+        """Читает события процесса до итогового; None — процесс упал"""
+        cancel_deadline = None
+        while True:
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                if not process.is_alive():
+                    # Процесс мог успеть положить событие перед выходом
+                    try:
+                        event = events.get(timeout=0.5)
+                    except queue.Empty:
+                        return None
+                else:
+                    if job.cancel_event.is_set():
+                        # Фазы 1-2 не проверяют отмену — останавливаем процесс
+                        cancel_deadline = cancel_deadline or time.monotonic() + CANCEL_GRACE_SECONDS
+                        if time.monotonic() >= cancel_deadline:
+                            process.terminate()
+                            return {'type': 'cancelled'}
+                    continue
+
+            if event['type'] != 'progress':
+                return event
+            self._update(
+                job,
+                phase=event['phase'],
+                iteration=event.get('iteration', job.iteration),
+                best_metric=event.get('best_metric', job.best_metric),
+            )
+
+    def _save(self, job: GenerationJob, outcome: Dict) -> None:
+        stats = outcome['stats']
+        self._update(job, phase='saving', best_metric=stats['final_metric'])
+        try:
+            with self.app.app_context():
+                schedule = save_generated_schedule(job.params, outcome['lessons'])
+                schedule_id = schedule.id
+        except Exception as e:
+            self._update(job, state=JOB_FAILED, error=f'Ошибка сохранения: {e}')
+            return
+
+        required = stats['total_required']
+        self._update(
+            job,
+            state=JOB_DONE,
+            schedule_id=schedule_id,
+            iteration=stats['iterations'],
+            result={
+                'lessons_placed': len(outcome['lessons']),
+                'success_rate': round(stats['placed'] / required * 100, 1) if required else 100.0,
+                'conflicts': stats['failed'],
+                'quality_score': round(stats['final_metric'], 2),
+                'initial_metric': round(stats['initial_metric'], 2),
+            },
+        )
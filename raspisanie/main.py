@@ -9,6 +9,7 @@
     python main.py --phase 1          # Только Фаза 1
     python main.py --phase 2          # Фазы 1-2
     python main.py --demo             # Принудительно использовать демо-данные
+    python main.py --workers 4        # Оптимизация в 4 параллельных цепочках
 """
 
 import sys
@@ -43,6 +44,18 @@ def main():
         '--iterations', type=int, default=1000,
         help='Количество итераций оптимизации (по умолчанию 1000)'
     )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Число параллельных цепочек оптимизации (по умолчанию 1)'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='Seed оптимизации для воспроизводимого результата'
+    )
+    parser.add_argument(
+        '--time-budget', type=float, default=None,
+        help='Ограничение времени оптимизации, секунд'
+    )
     parser.add_argument(
         '--quiet', action='store_true',
         help='Минимальный вывод'
@@ -101,10 +114,7 @@ def main():
         loader = DataLoader()
 
         try:
-            loader.load_classrooms(str(data_dir / required_files[0]))
-            loader.load_teachers_and_subjects(str(data_dir / required_files[1]))
-            loader.load_students_and_ege_choices(str(data_dir / required_files[2]))
-            loader.create_ege_practice_groups()
+            loader.load_workbooks(*(data_dir / f for f in required_files))
             loader.print_summary()
         except Exception as e:
             print(f"\n❌ Ошибка при загрузке данных: {e}")
@@ -116,7 +126,7 @@ def main():
     # Импорт генератора
     from schedule_generator import ScheduleGenerator
     from phase2_mandatory import Phase2MandatoryPlacer
-    from phase3_optimization import Phase3Optimizer
+    from phase3_optimization import Phase3Optimizer, ParallelPhase3Optimizer
 
     # ===== ФАЗА 1: Практикумы ЕГЭ =====
     print("\n" + "=" * 100)
@@ -151,14 +161,29 @@ def main():
         return 0
 
     # ===== ФАЗА 3: Оптимизация =====
-    optimizer = Phase3Optimizer(
-        schedule=generator.schedule,
-        loader=loader
-    )
-    optimized_schedule = optimizer.optimize(
-        max_iterations=args.iterations,
-        verbose=not args.quiet
-    )
+    if args.workers > 1:
+        optimizer = ParallelPhase3Optimizer(
+            schedule=generator.schedule,
+            loader=loader,
+            workers=args.workers,
+            seed=args.seed or 0
+        )
+        optimized_schedule = optimizer.optimize(
+            max_iterations=args.iterations,
+            verbose=not args.quiet,
+            time_budget=args.time_budget
+        )
+    else:
+        optimizer = Phase3Optimizer(
+            schedule=generator.schedule,
+            loader=loader,
+            seed=args.seed
+        )
+        optimized_schedule = optimizer.optimize(
+            max_iterations=args.iterations,
+            verbose=not args.quiet,
+            time_limit=args.time_budget
+        )
 
     # Сохранение финального результата
     optimized_schedule.save_to_json(str(output_dir / 'schedule_final.json'))
@@ -5,11 +5,27 @@
 
 from typing import List, Optional, Dict, Tuple, Set
 from collections import defaultdict
+import numpy as np
 from schedule_base import (
     Schedule, Subject, Teacher, Classroom, Lesson,
-    TimeSlot, DayOfWeek, SubjectType
+    TimeSlot, DayOfWeek, SubjectType, mask_gaps
 )
 
+DAYS = len(DayOfWeek)
+LESSONS_PER_DAY = 7
+LESSON_NUMBERS = np.arange(1, LESSONS_PER_DAY + 1)
+
+
+def _slot_base_scores(is_hard: bool) -> np.ndarray:
+    """Оценка слотов [день × урок] без учета занятости (п. 1-2 _evaluate_slot)"""
+    n = LESSON_NUMBERS
+    if is_hard:
+        row = 100.0 + np.select([(n >= 2) & (n <= 4), n == 1, n >= 6], [30, -15, -25], 0)
+    else:
+        row = 100.0 + np.select([n >= 5, n == 1], [10, -5], 0)
+    row = row - 10 * (n == 1) - 20 * (n == 7)
+    return np.tile(row, (DAYS, 1))
+
 
 class Phase2MandatoryPlacer:
     """
@@ -48,32 +64,22 @@ class Phase2MandatoryPlacer:
             'conflicts': []
         }
 
-        # Кэш занятости для ускорения
-        self._teacher_schedule: Dict[str, Dict[TimeSlot, Lesson]] = defaultdict(dict)
-        self._class_schedule: Dict[str, Dict[TimeSlot, Lesson]] = defaultdict(dict)
-        self._classroom_schedule: Dict[str, Dict[TimeSlot, Lesson]] = defaultdict(dict)
-
-        self._build_cache()
-
-    def _build_cache(self):
-        """Построить кэш занятости из текущего расписания"""
+        # Занятость учителей и классов [строка × день × урок] для векторной
+        # оценки слотов; кабинеты проверяются по индексам Schedule
+        teacher_names = list(self.loader.teachers)
+        class_names = {class_name for subject in self.loader.subjects for class_name in subject.classes}
+        class_names.update(lesson.class_or_group for lesson in self.schedule.lessons)
+        self._teacher_rows: Dict[str, int] = {name: i for i, name in enumerate(teacher_names)}
+        self._class_rows: Dict[str, int] = {name: i for i, name in enumerate(sorted(class_names))}
+        self._teacher_busy = np.zeros((len(self._teacher_rows), DAYS, LESSONS_PER_DAY), dtype=bool)
+        self._class_busy = np.zeros((len(self._class_rows), DAYS, LESSONS_PER_DAY), dtype=bool)
         for lesson in self.schedule.lessons:
-            # Учитель
-            self._teacher_schedule[lesson.teacher.name][lesson.time_slot] = lesson
-
-            # Класс
-            self._class_schedule[lesson.class_or_group][lesson.time_slot] = lesson
+            self._mark_busy(lesson)
 
-            # Кабинет
-            if lesson.classroom:
-                self._classroom_schedule[lesson.classroom.number][lesson.time_slot] = lesson
-
-    def _update_cache(self, lesson: Lesson):
-        """Обновить кэш после добавления урока"""
-        self._teacher_schedule[lesson.teacher.name][lesson.time_slot] = lesson
-        self._class_schedule[lesson.class_or_group][lesson.time_slot] = lesson
-        if lesson.classroom:
-            self._classroom_schedule[lesson.classroom.number][lesson.time_slot] = lesson
+        self._ege_mask = np.zeros((DAYS, LESSONS_PER_DAY), dtype=bool)
+        for slot in self.ege_slots:
+            self._ege_mask[slot.day.value - 1, slot.lesson_number - 1] = True
+        self._base_scores = {is_hard: _slot_base_scores(is_hard) for is_hard in (False, True)}
 
     def place_all_mandatory_subjects(self) -> Dict:
         """
@@ -207,7 +213,7 @@ class Phase2MandatoryPlacer:
 
             # Добавляем в расписание
             self.schedule.add_lesson(lesson)
-            self._update_cache(lesson)
+            self._mark_busy(lesson)
 
             # Обновляем статистику
             placed += 1
@@ -215,28 +221,71 @@ class Phase2MandatoryPlacer:
             days_used.add(best_slot.day)
 
             # Удаляем использованный слот из оценок
-            scored_slots = [(score, slot) for score, slot in scored_slots if slot != best_slot]
+            scored_slots = [(score, slot) for score, slot in scored_slots if slot is not best_slot]
 
         return placed
 
+    def _row(self, rows: Dict[str, int], name: str, teachers: bool) -> int:
+        """Строка тензора занятости для учителя/класса (добавляется при первом обращении)"""
+        row = rows.get(name)
+        if row is None:
+            row = rows[name] = len(rows)
+            empty = np.zeros((1, DAYS, LESSONS_PER_DAY), dtype=bool)
+            if teachers:
+                self._teacher_busy = np.concatenate([self._teacher_busy, empty])
+            else:
+                self._class_busy = np.concatenate([self._class_busy, empty])
+        return row
+
+    def _mark_busy(self, lesson: Lesson):
+        day = lesson.time_slot.day.value - 1
+        number = lesson.time_slot.lesson_number - 1
+        teacher = self._row(self._teacher_rows, lesson.teacher.name, True)
+        group = self._row(self._class_rows, lesson.class_or_group, False)
+        self._teacher_busy[teacher, day, number] = True
+        self._class_busy[group, day, number] = True
+
     def _evaluate_all_slots(self, subject: Subject, is_hard: bool) -> List[Tuple[float, TimeSlot]]:
         """
         Оценить все доступные слоты для предмета.
 
+        Считает то же, что _evaluate_slot, но сразу для всех слотов —
+        операциями над тензорами занятости [день × урок].
+
         Returns:
             Список (оценка, слот), отсортированный по убыванию оценки
         """
-        scored = []
-
-        for slot in self.all_slots:
-            score = self._evaluate_slot(slot, subject, is_hard)
-            if score > 0:
-                scored.append((score, slot))
-
-        # Сортируем по убыванию оценки
-        scored.sort(reverse=True, key=lambda x: x[0])
-
-        return scored
+        class_rows = [self._row(self._class_rows, name, False) for name in subject.classes]
+        teacher = self._teacher_busy[self._row(self._teacher_rows, subject.teacher.name, True)]
+
+        # Жесткие ограничения
+        free = ~teacher & ~self._ege_mask
+        for day in subject.teacher.unavailable_days:
+            free[day.value - 1] = False
+        for row in class_rows:
+            free &= ~self._class_busy[row]
+
+        score = self._base_scores[is_hard].copy()
+
+        # Загруженность дня класса
+        if class_rows:
+            day_load = self._class_busy[class_rows[0]].sum(axis=1)
+            score -= (day_load * 3)[:, None]
+
+        # Окна у учителя: для занятых дней — окна после добавления урока,
+        # для свободных — бонус за новый день
+        count = teacher.sum(axis=1)
+        has_lessons = count > 0
+        first = np.where(has_lessons, teacher.argmax(axis=1) + 1, 0)
+        last = np.where(has_lessons, LESSONS_PER_DAY - teacher[:, ::-1].argmax(axis=1), 0)
+        new_first = np.minimum(first[:, None], LESSON_NUMBERS)
+        new_last = np.maximum(last[:, None], LESSON_NUMBERS)
+        gaps = new_last - new_first + 1 - (count[:, None] + 1)
+        score -= np.where(has_lessons[:, None], gaps * 5, -5)
+
+        flat = np.where(free, score, 0.0).ravel()
+        order = np.argsort(-flat, kind='stable')
+        return [(float(flat[i]), self.all_slots[i]) for i in order if flat[i] > 0]
 
     def _evaluate_slot(self, slot: TimeSlot, subject: Subject, is_hard: bool) -> float:
         """
@@ -275,26 +324,21 @@ class Phase2MandatoryPlacer:
         # 3. Учитываем текущую загруженность дня для класса
         class_name = subject.classes[0] if subject.classes else None
         if class_name:
-            day_load = sum(1 for ts, _ in self._class_schedule[class_name].items()
-                          if ts.day == slot.day)
+            day_load = bin(self.schedule.group_day_mask(class_name, slot.day)).count("1")
             score -= day_load * 3  # Штраф за перегруженные дни
 
         # 4. Учитываем окна у учителя
         teacher_name = subject.teacher.name
-        teacher_slots = [ts for ts in self._teacher_schedule[teacher_name].keys()
-                        if ts.day == slot.day]
+        teacher_mask = self.schedule.teacher_day_mask(teacher_name, slot.day)
 
-        if teacher_slots:
+        if teacher_mask:
             # Проверяем, создаст ли этот слот окно
-            all_lessons = sorted([ts.lesson_number for ts in teacher_slots] + [slot.lesson_number])
-            gaps = 0
-            for i in range(len(all_lessons) - 1):
-                gaps += all_lessons[i + 1] - all_lessons[i] - 1
+            gaps = mask_gaps(teacher_mask | (1 << slot.lesson_number))
             score -= gaps * 5  # Штраф за создание окон
 
         # 5. Предпочитаем равномерное распределение по дням недели
-        teacher_days = set(ts.day for ts in self._teacher_schedule[teacher_name].keys())
-        if slot.day not in teacher_days:
+        # (урок в этот день уже есть — значит, день не новый)
+        if not teacher_mask:
             score += 5  # Бонус за новый день
 
         # 6. Слот уже занят практикумом ЕГЭ
@@ -310,12 +354,12 @@ class Phase2MandatoryPlacer:
             return False
 
         # 2. Проверяем, не занят ли учитель
-        if slot in self._teacher_schedule[subject.teacher.name]:
+        if self.schedule.teacher_lessons_at(subject.teacher.name, slot):
             return False
 
         # 3. Проверяем, не занят ли класс
         for class_name in subject.classes:
-            if slot in self._class_schedule[class_name]:
+            if self.schedule.group_lessons_at(class_name, slot):
                 return False
 
         # 4. Слот занят практикумом ЕГЭ
@@ -352,12 +396,12 @@ class Phase2MandatoryPlacer:
         # 1. Предпочитаем домашний кабинет учителя
         if subject.teacher.home_classroom:
             home_room = self.loader.classrooms.get(subject.teacher.home_classroom)
-            if home_room and slot not in self._classroom_schedule.get(home_room.number, {}):
+            if home_room and not self.schedule.is_classroom_busy(home_room, slot):
                 return home_room
 
         # 2. Ищем любой свободный кабинет
         for classroom in self.loader.classrooms.values():
-            if slot not in self._classroom_schedule.get(classroom.number, {}):
+            if not self.schedule.is_classroom_busy(classroom, slot):
                 return classroom
 
         return None
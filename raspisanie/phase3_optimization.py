@@ -3,14 +3,63 @@
 Алгоритм Simulated Annealing для минимизации окон и улучшения качества
 """
 
-from typing import List, Tuple, Optional, Dict, Set
-from collections import defaultdict
+from typing import Callable, List, Tuple, Optional, Dict, Set
+from concurrent.futures import ProcessPoolExecutor
 from schedule_base import (
     Schedule, Lesson, Teacher, Classroom, TimeSlot, DayOfWeek
 )
+import os
 import random
 import math
-import copy
+import time
+
+
+# Сложные предметы лучше ставить на 2-4 уроки
+HARD_KEYWORDS = ['математика', 'алгебра', 'геометрия', 'русский',
+                 'физика', 'химия', 'английский']
+OPTIMAL_LESSON_NUMBERS = (2, 3, 4)
+
+# Снимок расписания: индекс слота (0..34) для каждого урока по порядку
+Snapshot = bytes
+
+
+def _day_gaps(mask: int, count: int) -> int:
+    """
+    Окна за день по маске номеров уроков и числу уроков.
+
+    Совпадающие уроки (конфликт в одном слоте) уменьшают счет,
+    как при попарной разности отсортированных номеров.
+    """
+    if count < 2:
+        return 0
+    first = (mask & -mask).bit_length()
+    last = mask.bit_length()
+    return last - first - (count - 1)
+
+
+def _day_spread(mask: int, count: int) -> int:
+    """Разброс дня: пустые места между первым и последним уроком"""
+    if count < 2:
+        return 0
+    first = (mask & -mask).bit_length()
+    last = mask.bit_length()
+    return last - first + 1 - count
+
+
+def _std(values: List[int]) -> float:
+    """Стандартное отклонение (для нагрузки по дням)"""
+    if not values:
+        return 0.0
+
+    mean = sum(values) / len(values)
+    variance = sum((c - mean) ** 2 for c in values) / len(values)
+
+    return math.sqrt(variance)
+
+
+def _occupied_by_other(lessons: List[Lesson], allowed: Lesson) -> bool:
+    """Есть ли в списке урок, кроме allowed"""
+    return any(other is not allowed for other in lessons)
 
 
 class Phase3Optimizer:
@@ -25,21 +74,26 @@ class Phase3Optimizer:
     5. Компактное расписание (вес: 2)
     """
 
-    def __init__(self, schedule: Schedule, loader):
+    def __init__(self, schedule: Schedule, loader, seed: Optional[int] = None):
         """
         Args:
             schedule: Расписание после Фазы 1 и 2
             loader: Загрузчик данных
+            seed: Seed генератора случайных чисел (None — общий модуль random)
         """
         self.schedule = schedule
         self.loader = loader
         self.best_schedule: Optional[Schedule] = None
         self.best_metric = float('inf')
+        self.rng = random.Random(seed) if seed is not None else random
 
         # Параметры Simulated Annealing
         self.initial_temperature = 100.0
         self.cooling_rate = 0.995
         self.min_temperature = 0.1
+        self.max_no_improvement = 200  # Ранняя остановка
+        self.progress_interval = 100  # Как часто вызывать progress в optimize
+        self.temperature = self.initial_temperature  # после optimize — конечная
 
         # Статистика
         self.stats = {
@@ -50,27 +104,32 @@ class Phase3Optimizer:
             'accepted_worse': 0
         }
 
-        # Кэши для быстрого доступа
-        self._build_indices()
-
-    def _build_indices(self):
-        """Построить индексы для быстрого поиска"""
-        self.lessons_by_teacher: Dict[str, List[Lesson]] = defaultdict(list)
-        self.lessons_by_class: Dict[str, List[Lesson]] = defaultdict(list)
-        self.lessons_by_slot: Dict[TimeSlot, List[Lesson]] = defaultdict(list)
+        self._day_slots = {
+            day: [TimeSlot(day, number) for number in range(1, 8)]
+            for day in DayOfWeek
+        }
+        self._all_slots = [slot for day in DayOfWeek for slot in self._day_slots[day]]
+        self._slot_index = {slot: index for index, slot in enumerate(self._all_slots)}
+        self._hard_subjects: Dict[str, bool] = {}
 
-        for lesson in self.schedule.lessons:
-            self.lessons_by_teacher[lesson.teacher.name].append(lesson)
-            self.lessons_by_class[lesson.class_or_group].append(lesson)
-            self.lessons_by_slot[lesson.time_slot].append(lesson)
+        # Составляющие метрики по учителю/классу и дню
+        self._build_cost_cache()
 
-    def optimize(self, max_iterations: int = 2000, verbose: bool = True) -> Schedule:
+    def optimize(self, max_iterations: int = 2000, verbose: bool = True,
+                 time_limit: Optional[float] = None,
+                 progress: Optional[Callable[[int, float], bool]] = None) -> Schedule:
         """
         Оптимизировать расписание методом Simulated Annealing.
 
+        Расписание меняется на месте; по окончании в нем восстанавливается
+        лучший найденный вариант.
+
         Args:
             max_iterations: Максимальное число итераций
             verbose: Выводить прогресс
+            time_limit: Ограничение по времени, секунд
+            progress: Вызывается каждые progress_interval итераций
+                с (итерация, лучшая метрика); если вернет False — остановка
 
         Returns:
             Оптимизированное расписание
@@ -81,10 +140,12 @@ class Phase3Optimizer:
             print("=" * 100)
 
         # Начальная метрика
+        self._build_cost_cache()
         current_metric = self._calculate_quality_metric()
-        self.stats['initial_metric'] = current_metric
+        self.stats.update(initial_metric=current_metric, improvements=0,
+                          iterations=0, accepted_worse=0)
         self.best_metric = current_metric
-        self.best_schedule = self._copy_schedule()
+        best_snapshot = self._snapshot()
 
         if verbose:
             print(f"\n📊 Начальная метрика качества: {current_metric:.2f}")
@@ -92,9 +153,19 @@ class Phase3Optimizer:
 
         temperature = self.initial_temperature
         no_improvement_count = 0
-        max_no_improvement = 200  # Ранняя остановка
+        deadline = time.monotonic() + time_limit if time_limit is not None else None
 
         for iteration in range(max_iterations):
+            if deadline is not None and time.monotonic() >= deadline:
+                if verbose:
+                    print(f"\n  ⏱️  Остановка по времени на итерации {iteration}")
+                break
+            if (progress is not None and iteration % self.progress_interval == 0
+                    and progress(iteration, self.best_metric) is False):
+                if verbose:
+                    print(f"\n  ⏹️  Остановка по запросу на итерации {iteration}")
+                break
+
             self.stats['iterations'] = iteration + 1
 
             # Находим пару уроков для обмена
@@ -116,12 +187,12 @@ class Phase3Optimizer:
 
                 if new_metric < self.best_metric:
                     self.best_metric = new_metric
-                    self.best_schedule = self._copy_schedule()
+                    best_snapshot = self._snapshot()
 
                     if verbose and iteration % 100 == 0:
                         print(f"  Итерация {iteration}: новый лучший результат = {self.best_metric:.2f}")
 
-            elif random.random() < self._acceptance_probability(delta, temperature):
+            elif self.rng.random() < self._acceptance_probability(delta, temperature):
                 # Принимаем ухудшение с некоторой вероятностью
                 current_metric = new_metric
                 self.stats['accepted_worse'] += 1
@@ -135,14 +206,15 @@ class Phase3Optimizer:
             temperature = max(self.min_temperature, temperature * self.cooling_rate)
 
             # Ранняя остановка
-            if no_improvement_count >= max_no_improvement:
+            if no_improvement_count >= self.max_no_improvement:
                 if verbose:
                     print(f"\n  ⏹️  Ранняя остановка на итерации {iteration} (нет улучшений)")
                 break
 
         # Восстанавливаем лучший результат
-        self.schedule = self.best_schedule
-        self._build_indices()
+        self.temperature = temperature
+        self._restore(best_snapshot)
+        self.best_schedule = self.schedule
         self.stats['final_metric'] = self.best_metric
 
         if verbose:
@@ -182,92 +254,154 @@ class Phase3Optimizer:
 
     def _count_teacher_gaps(self) -> int:
         """Подсчитать общее количество окон у всех учителей"""
-        total_gaps = 0
-
-        for teacher_name, lessons in self.lessons_by_teacher.items():
-            for day in DayOfWeek:
-                day_lessons = [l for l in lessons if l.time_slot.day == day]
-                if len(day_lessons) < 2:
-                    continue
-
-                lesson_numbers = sorted(l.time_slot.lesson_number for l in day_lessons)
-                for i in range(len(lesson_numbers) - 1):
-                    gap = lesson_numbers[i + 1] - lesson_numbers[i] - 1
-                    total_gaps += gap
-
-        return total_gaps
+        return sum(
+            _day_gaps(mask, count)
+            for mask, count in self.schedule.teacher_days().values()
+        )
 
     def _count_class_gaps(self) -> int:
         """Подсчитать общее количество окон у всех классов"""
-        total_gaps = 0
-
-        for class_name, lessons in self.lessons_by_class.items():
+        return sum(
+            _day_gaps(mask, count)
+            for (class_name, _), (mask, count) in self.schedule.group_days().items()
             # Пропускаем группы ЕГЭ
-            if class_name.startswith('ЕГЭ-'):
-                continue
-
-            for day in DayOfWeek:
-                day_lessons = [l for l in lessons if l.time_slot.day == day]
-                if len(day_lessons) < 2:
-                    continue
-
-                lesson_numbers = sorted(l.time_slot.lesson_number for l in day_lessons)
-                for i in range(len(lesson_numbers) - 1):
-                    gap = lesson_numbers[i + 1] - lesson_numbers[i] - 1
-                    total_gaps += gap
-
-        return total_gaps
+            if not class_name.startswith('ЕГЭ-')
+        )
 
     def _count_suboptimal_timing(self) -> int:
         """Подсчитать уроки сложных предметов вне оптимального времени (2-4 урок)"""
-        hard_keywords = ['математика', 'алгебра', 'геометрия', 'русский',
-                        'физика', 'химия', 'английский']
-        count = 0
-
-        for lesson in self.schedule.lessons:
-            if lesson.is_ege_practice:
-                continue
-
-            is_hard = any(kw in lesson.subject.lower() for kw in hard_keywords)
-            if is_hard and lesson.time_slot.lesson_number not in [2, 3, 4]:
-                count += 1
-
-        return count
+        return sum(
+            1 for lesson in self.schedule.lessons
+            if self._is_suboptimal(lesson, lesson.time_slot)
+        )
+
+    def _is_hard(self, subject: str) -> bool:
+        is_hard = self._hard_subjects.get(subject)
+        if is_hard is None:
+            is_hard = any(kw in subject.lower() for kw in HARD_KEYWORDS)
+            self._hard_subjects[subject] = is_hard
+        return is_hard
+
+    def _is_suboptimal(self, lesson: Lesson, slot: TimeSlot) -> bool:
+        """Сложный предмет вне 2-4 урока (практикумы ЕГЭ не учитываются)"""
+        return (
+            not lesson.is_ege_practice
+            and slot.lesson_number not in OPTIMAL_LESSON_NUMBERS
+            and self._is_hard(lesson.subject)
+        )
 
     def _calculate_daily_variance(self) -> float:
         """Вычислить дисперсию нагрузки по дням недели"""
-        daily_counts = []
+        by_day = {day: 0 for day in DayOfWeek}
+        for (_, day), (_, count) in self.schedule.teacher_days().items():
+            by_day[day] += count
+        return _std([by_day[day] for day in DayOfWeek])
 
-        for day in DayOfWeek:
-            count = sum(1 for l in self.schedule.lessons if l.time_slot.day == day)
-            daily_counts.append(count)
+    def _calculate_schedule_spread(self) -> float:
+        """Вычислить разброс расписания (насколько оно растянуто)"""
+        return sum(
+            _day_spread(mask, count)
+            for (class_name, _), (mask, count) in self.schedule.group_days().items()
+            if not class_name.startswith('ЕГЭ-')
+        )
 
-        if not daily_counts:
-            return 0.0
+    # ----- Инкрементальный пересчет метрики -----
 
-        mean = sum(daily_counts) / len(daily_counts)
-        variance = sum((c - mean) ** 2 for c in daily_counts) / len(daily_counts)
+    def _build_cost_cache(self):
+        """
+        Разложить метрику по учителям/классам и дням.
 
-        return math.sqrt(variance)
+        Обмен двух уроков меняет только записи их учителей и классов
+        в двух днях, поэтому после обмена пересчитываются не более
+        2 x 2 записей учителей и 2 x 2 записей классов (см. _rescore_swap).
+        """
+        self._teacher_day_cost: Dict[Tuple[str, DayOfWeek], int] = {}
+        # (класс, день) -> (окна, разброс)
+        self._class_day_cost: Dict[Tuple[str, DayOfWeek], Tuple[int, int]] = {}
+        self._day_totals = {day: 0 for day in DayOfWeek}
+        self._totals = {'teacher_gaps': 0, 'class_gaps': 0, 'suboptimal': 0, 'spread': 0}
+
+        for key, (mask, count) in self.schedule.teacher_days().items():
+            gaps = _day_gaps(mask, count)
+            self._teacher_day_cost[key] = gaps
+            self._totals['teacher_gaps'] += gaps
+            self._day_totals[key[1]] += count
+
+        for key, (mask, count) in self.schedule.group_days().items():
+            if key[0].startswith('ЕГЭ-'):
+                continue
+            cost = (_day_gaps(mask, count), _day_spread(mask, count))
+            self._class_day_cost[key] = cost
+            self._totals['class_gaps'] += cost[0]
+            self._totals['spread'] += cost[1]
 
-    def _calculate_schedule_spread(self) -> float:
-        """Вычислить разброс расписания (насколько оно растянуто)"""
-        spread = 0
+        self._totals['suboptimal'] = self._count_suboptimal_timing()
 
-        for class_name, lessons in self.lessons_by_class.items():
-            if class_name.startswith('ЕГЭ-'):
-                continue
+        # Проблемные уроки: список для random.choice и позиции в нем
+        self._problem_lessons: List[Lesson] = []
+        self._problem_positions: Dict[int, int] = {}
+        for lesson in self._find_problem_lessons():
+            self._set_problem(lesson, True)
+
+    def _current_metric(self) -> float:
+        """Метрика по кэшу (совпадает с _calculate_quality_metric)"""
+        metric = 0.0
+        metric += self._totals['teacher_gaps'] * 4
+        metric += self._totals['class_gaps'] * 4
+        metric += self._totals['suboptimal'] * 4
+        metric += _std([self._day_totals[day] for day in DayOfWeek]) * 3
+        metric += self._totals['spread'] * 2
+        return metric
 
-            for day in DayOfWeek:
-                day_lessons = [l for l in lessons if l.time_slot.day == day]
-                if len(day_lessons) < 2:
-                    continue
+    def _rescore_swap(self, lesson1: Lesson, lesson2: Lesson, slot1: TimeSlot, slot2: TimeSlot):
+        """Обновить кэш после обмена: lesson1 ушел из slot1 в slot2, lesson2 — наоборот"""
+        days = {slot1.day, slot2.day}
 
-                lesson_numbers = [l.time_slot.lesson_number for l in day_lessons]
-                day_spread = max(lesson_numbers) - min(lesson_numbers) + 1 - len(lesson_numbers)
-                spread += day_spread
+        for name in {lesson1.teacher.name, lesson2.teacher.name}:
+            for day in days:
+                key = (name, day)
+                gaps = _day_gaps(*self.schedule.teacher_day(name, day))
+                self._totals['teacher_gaps'] += gaps - self._teacher_day_cost.get(key, 0)
+                self._teacher_day_cost[key] = gaps
 
-        return spread
+        for name in {lesson1.class_or_group, lesson2.class_or_group}:
+            if name.startswith('ЕГЭ-'):
+                continue
+            for day in days:
+                key = (name, day)
+                mask, count = self.schedule.group_day(name, day)
+                cost = (_day_gaps(mask, count), _day_spread(mask, count))
+                old_gaps, old_spread = self._class_day_cost.get(key, (0, 0))
+                self._totals['class_gaps'] += cost[0] - old_gaps
+                self._totals['spread'] += cost[1] - old_spread
+                self._class_day_cost[key] = cost
+
+        self._totals['suboptimal'] += (
+            self._is_suboptimal(lesson1, slot2) - self._is_suboptimal(lesson1, slot1)
+            + self._is_suboptimal(lesson2, slot1) - self._is_suboptimal(lesson2, slot2)
+        )
+        # Число уроков по дням при обмене не меняется
+
+        # Статус «проблемный» зависит от соседних уроков учителя в тот же день
+        for name in {lesson1.teacher.name, lesson2.teacher.name}:
+            for day in days:
+                for slot in self._day_slots[day]:
+                    for lesson in self.schedule.teacher_lessons_at(name, slot):
+                        self._set_problem(lesson, self._is_problem_lesson(lesson))
+
+    def _set_problem(self, lesson: Lesson, is_problem: bool):
+        key = id(lesson)
+        position = self._problem_positions.get(key)
+        if is_problem and position is None:
+            self._problem_positions[key] = len(self._problem_lessons)
+            self._problem_lessons.append(lesson)
+        elif not is_problem and position is not None:
+            # Удаление за O(1): на место урока ставим последний
+            last = self._problem_lessons.pop()
+            del self._problem_positions[key]
+            if last is not lesson:
+                self._problem_lessons[position] = last
+                self._problem_positions[id(last)] = position
 
     def _find_and_try_swap(self) -> Optional[Tuple[Lesson, Lesson, float]]:
         """
@@ -281,12 +415,10 @@ class Phase3Optimizer:
             return None
 
         # Стратегия: фокусируемся на уроках, создающих проблемы
-        problem_lessons = self._find_problem_lessons()
-
-        if problem_lessons and random.random() < 0.7:
-            lesson1 = random.choice(problem_lessons)
+        if self._problem_lessons and self.rng.random() < 0.7:
+            lesson1 = self.rng.choice(self._problem_lessons)
         else:
-            lesson1 = random.choice(self.schedule.lessons)
+            lesson1 = self.rng.choice(self.schedule.lessons)
 
         # Ищем подходящего кандидата для обмена
         candidates = self._find_swap_candidates(lesson1)
@@ -294,64 +426,85 @@ class Phase3Optimizer:
         if not candidates:
             return None
 
-        lesson2 = random.choice(candidates)
+        lesson2 = self.rng.choice(candidates)
 
-        # Выполняем обмен
+        # Выполняем обмен (кэш метрики обновляется в _swap_lessons)
         self._swap_lessons(lesson1, lesson2)
 
-        # Пересчитываем метрику
-        new_metric = self._calculate_quality_metric()
+        new_metric = self._current_metric()
 
         return lesson1, lesson2, new_metric
 
     def _find_problem_lessons(self) -> List[Lesson]:
         """Найти уроки, которые создают проблемы (окна, плохое время)"""
-        problem_lessons = []
+        return [lesson for lesson in self.schedule.lessons if self._is_problem_lesson(lesson)]
 
-        hard_keywords = ['математика', 'алгебра', 'геометрия', 'русский',
-                        'физика', 'химия', 'английский']
+    def _is_problem_lesson(self, lesson: Lesson) -> bool:
+        if lesson.is_ege_practice:
+            return False
 
-        for lesson in self.schedule.lessons:
-            if lesson.is_ege_practice:
-                continue
+        # Сложный предмет в плохое время
+        if self._is_suboptimal(lesson, lesson.time_slot):
+            return True
 
-            # Сложный предмет в плохое время
-            is_hard = any(kw in lesson.subject.lower() for kw in hard_keywords)
-            if is_hard and lesson.time_slot.lesson_number not in [2, 3, 4]:
-                problem_lessons.append(lesson)
-                continue
+        # Урок создает окно: соседний урок учителя в этот день не вплотную
+        slot = lesson.time_slot
+        number = slot.lesson_number
+        mask = self.schedule.teacher_day_mask(lesson.teacher.name, slot.day)
 
-            # Урок создает окно
-            teacher_lessons = self.lessons_by_teacher[lesson.teacher.name]
-            day_lessons = [l for l in teacher_lessons if l.time_slot.day == lesson.time_slot.day]
+        before = mask & ((1 << number) - 1)
+        if before and number - (before.bit_length() - 1) > 1:
+            return True
 
-            if len(day_lessons) >= 2:
-                lesson_numbers = sorted(l.time_slot.lesson_number for l in day_lessons)
-                idx = lesson_numbers.index(lesson.time_slot.lesson_number)
+        after = mask >> (number + 1)
+        if after and (after & -after).bit_length() > 1:
+            # Два урока учителя в одном слоте считаются соседними
+            return len(self.schedule.teacher_lessons_at(lesson.teacher.name, slot)) < 2
 
-                # Проверяем, создает ли этот урок окно
-                if idx > 0 and lesson_numbers[idx] - lesson_numbers[idx - 1] > 1:
-                    problem_lessons.append(lesson)
-                elif idx < len(lesson_numbers) - 1 and lesson_numbers[idx + 1] - lesson_numbers[idx] > 1:
-                    problem_lessons.append(lesson)
+        return False
 
-        return problem_lessons
+    def _is_swap_candidate(self, lesson: Lesson, other: Lesson) -> bool:
+        if other is lesson:
+            return False
+
+        # Не меняем практикумы ЕГЭ между собой
+        if lesson.is_ege_practice and other.is_ege_practice:
+            return False
+
+        # Проверяем, можно ли поменять
+        return self._can_swap(lesson, other)
 
     def _find_swap_candidates(self, lesson: Lesson) -> List[Lesson]:
-        """Найти уроки, с которыми можно обменять данный урок"""
+        """
+        Найти уроки, с которыми можно обменять данный урок.
+
+        Просматриваются не все уроки, а только слоты, куда урок может
+        переехать: если учитель или класс в слоте заняты, обменяться можно
+        лишь с тем самым уроком, который их занимает.
+        """
+        schedule = self.schedule
+        teacher = lesson.teacher
         candidates = []
 
-        for other in self.schedule.lessons:
-            if other == lesson:
+        for slot in self._all_slots:
+            if slot == lesson.time_slot or not teacher.is_available(slot.day):
                 continue
 
-            # Не меняем практикумы ЕГЭ между собой
-            if lesson.is_ege_practice and other.is_ege_practice:
+            teacher_busy = schedule.teacher_lessons_at(teacher.name, slot)
+            group_busy = schedule.group_lessons_at(lesson.class_or_group, slot)
+            if len(teacher_busy) > 1 or len(group_busy) > 1:
                 continue
 
-            # Проверяем, можно ли поменять
-            if self._can_swap(lesson, other):
-                candidates.append(other)
+            if teacher_busy:
+                pool = teacher_busy
+            elif group_busy:
+                pool = group_busy
+            else:
+                pool = schedule.get_lessons_by_timeslot(slot)
+
+            for other in pool:
+                if self._is_swap_candidate(lesson, other):
+                    candidates.append(other)
 
         return candidates
 
@@ -364,62 +517,49 @@ class Phase3Optimizer:
         if slot1 == slot2:
             return False
 
+        schedule = self.schedule
+
+        # Проверяем классы (самое частое препятствие — проверяем первым)
+        if _occupied_by_other(schedule.group_lessons_at(lesson1.class_or_group, slot2), lesson2):
+            return False
+
+        if _occupied_by_other(schedule.group_lessons_at(lesson2.class_or_group, slot1), lesson1):
+            return False
+
         # Проверяем учителя lesson1 в slot2
         if not lesson1.teacher.is_available(slot2.day):
             return False
 
-        for other in self.lessons_by_slot.get(slot2, []):
-            if other != lesson2 and other.teacher.name == lesson1.teacher.name:
-                return False
+        if _occupied_by_other(schedule.teacher_lessons_at(lesson1.teacher.name, slot2), lesson2):
+            return False
 
         # Проверяем учителя lesson2 в slot1
         if not lesson2.teacher.is_available(slot1.day):
             return False
 
-        for other in self.lessons_by_slot.get(slot1, []):
-            if other != lesson1 and other.teacher.name == lesson2.teacher.name:
-                return False
-
-        # Проверяем классы
-        for other in self.lessons_by_slot.get(slot2, []):
-            if other != lesson2 and other.class_or_group == lesson1.class_or_group:
-                return False
-
-        for other in self.lessons_by_slot.get(slot1, []):
-            if other != lesson1 and other.class_or_group == lesson2.class_or_group:
-                return False
+        if _occupied_by_other(schedule.teacher_lessons_at(lesson2.teacher.name, slot1), lesson1):
+            return False
 
         # Проверяем кабинеты
         if lesson1.classroom and lesson2.classroom:
-            for other in self.lessons_by_slot.get(slot2, []):
-                if other != lesson2 and other.classroom == lesson1.classroom:
-                    return False
+            if _occupied_by_other(schedule.classroom_lessons_at(lesson1.classroom.number, slot2), lesson2):
+                return False
 
-            for other in self.lessons_by_slot.get(slot1, []):
-                if other != lesson1 and other.classroom == lesson2.classroom:
-                    return False
+            if _occupied_by_other(schedule.classroom_lessons_at(lesson2.classroom.number, slot1), lesson1):
+                return False
 
         return True
 
     def _swap_lessons(self, lesson1: Lesson, lesson2: Lesson):
         """Обменять слоты двух уроков"""
-        # Обновляем индексы
         slot1 = lesson1.time_slot
         slot2 = lesson2.time_slot
 
-        # Удаляем из старых слотов
-        if lesson1 in self.lessons_by_slot[slot1]:
-            self.lessons_by_slot[slot1].remove(lesson1)
-        if lesson2 in self.lessons_by_slot[slot2]:
-            self.lessons_by_slot[slot2].remove(lesson2)
-
-        # Меняем слоты
-        lesson1.time_slot = slot2
-        lesson2.time_slot = slot1
+        # Schedule обновляет индексы занятости при переносе
+        self.schedule.move_lesson(lesson1, slot2)
+        self.schedule.move_lesson(lesson2, slot1)
 
-        # Добавляем в новые слоты
-        self.lessons_by_slot[slot2].append(lesson1)
-        self.lessons_by_slot[slot1].append(lesson2)
+        self._rescore_swap(lesson1, lesson2, slot1, slot2)
 
     def _acceptance_probability(self, delta: float, temperature: float) -> float:
         """Вероятность принятия ухудшающего изменения (Simulated Annealing)"""
@@ -427,23 +567,19 @@ class Phase3Optimizer:
             return 0.0
         return math.exp(-delta / temperature)
 
-    def _copy_schedule(self) -> Schedule:
-        """Создать глубокую копию расписания"""
-        new_schedule = Schedule()
-
-        for lesson in self.schedule.lessons:
-            new_lesson = Lesson(
-                subject=lesson.subject,
-                teacher=lesson.teacher,
-                class_or_group=lesson.class_or_group,
-                classroom=lesson.classroom,
-                time_slot=TimeSlot(lesson.time_slot.day, lesson.time_slot.lesson_number),
-                is_ege_practice=lesson.is_ege_practice,
-                students=lesson.students
-            )
-            new_schedule.add_lesson(new_lesson)
+    def _snapshot(self) -> Snapshot:
+        """Компактный снимок: индекс слота каждого урока"""
+        slot_index = self._slot_index
+        return bytes(slot_index[lesson.time_slot] for lesson in self.schedule.lessons)
 
-        return new_schedule
+    def _restore(self, snapshot: Snapshot):
+        """Вернуть уроки в слоты из снимка и пересчитать кэши"""
+        for lesson, index in zip(self.schedule.lessons, snapshot):
+            lesson.time_slot = self._all_slots[index]
+        # Индексы строятся заново в порядке уроков — состояние после
+        # восстановления не зависит от истории обменов
+        self.schedule.rebuild_index()
+        self._build_cost_cache()
 
     def _print_metric_breakdown(self):
         """Вывести детализацию метрики"""
@@ -514,6 +650,186 @@ class Phase3Optimizer:
         self._print_final_statistics()
 
 
+
+# ----- Мультистарт: несколько цепочек отжига в пуле процессов -----
+
+# Оптимизатор процесса-исполнителя (создается один раз в _init_worker)
+_worker_optimizer: Optional[Phase3Optimizer] = None
+
+
+def _init_worker(schedule: Schedule):
+    """Инициализация процесса пула: своя копия расписания"""
+    global _worker_optimizer
+    _worker_optimizer = Phase3Optimizer(schedule, loader=None)
+
+
+def _run_chain(optimizer: Phase3Optimizer, snapshot: Snapshot, temperature: float,
+               seed: str, iterations: int, time_limit: Optional[float]) -> Tuple:
+    """
+    Один отрезок цепочки отжига от снимка snapshot.
+
+    Returns:
+        (лучшая метрика, снимок лучшего решения, конечная температура, статистика)
+    """
+    optimizer._restore(snapshot)
+    optimizer.rng = random.Random(seed)
+    optimizer.initial_temperature = temperature
+    optimizer.optimize(max_iterations=iterations, verbose=False, time_limit=time_limit)
+    return optimizer.best_metric, optimizer._snapshot(), optimizer.temperature, dict(optimizer.stats)
+
+
+def _run_worker_chain(snapshot: Snapshot, temperature: float, seed: str,
+                      iterations: int, time_limit: Optional[float]) -> Tuple:
+    return _run_chain(_worker_optimizer, snapshot, temperature, seed, iterations, time_limit)
+
+
+class ParallelPhase3Optimizer:
+    """
+    Мультистарт Simulated Annealing (островная модель).
+
+    Несколько независимых цепочек с разными seed и начальной температурой
+    работают в пуле процессов отрезками по exchange_interval итераций.
+    После каждого отрезка худшая половина цепочек продолжает с глобально
+    лучшего решения. Между процессами передаются только компактные снимки
+    (индекс слота на урок), а не копии уроков.
+
+    При одинаковом seed и без ограничения по времени результат
+    детерминирован и не зависит от числа процессов.
+    """
+
+    def __init__(self, schedule: Schedule, loader, workers: Optional[int] = None,
+                 chains: Optional[int] = None, seed: int = 0):
+        """
+        Args:
+            schedule: Расписание после Фазы 1 и 2 (будет изменено на месте)
+            loader: Загрузчик данных
+            workers: Число процессов (по умолчанию — число CPU; 1 — без пула)
+            chains: Число цепочек (по умолчанию равно workers)
+            seed: Seed для воспроизводимости
+        """
+        self.schedule = schedule
+        self.loader = loader
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chains = max(1, chains or self.workers)
+        self.seed = seed
+
+        self.initial_temperature = 100.0
+        # Итераций цепочки между обменами; None — max_iterations / exchange_rounds,
+        # чтобы обмены были при любом числе итераций (в CLI по умолчанию 1000)
+        self.exchange_interval: Optional[int] = None
+        self.exchange_rounds = 10
+
+        self.stats = {
+            'initial_metric': 0.0,
+            'final_metric': 0.0,
+            'improvements': 0,
+            'iterations': 0,
+            'accepted_worse': 0,
+            'chains': self.chains,
+            'rounds': 0
+        }
+
+    def _temperatures(self) -> List[float]:
+        """Начальные температуры цепочек: от 0.5x до 2x базовой"""
+        if self.chains == 1:
+            return [self.initial_temperature]
+        return [
+            self.initial_temperature * (0.5 + 1.5 * i / (self.chains - 1))
+            for i in range(self.chains)
+        ]
+
+    def optimize(self, max_iterations: int = 20000, verbose: bool = True,
+                 time_budget: Optional[float] = None) -> Schedule:
+        """
+        Запустить цепочки и вернуть лучшее найденное расписание.
+
+        Args:
+            max_iterations: Итераций на одну цепочку
+            verbose: Выводить прогресс
+            time_budget: Общее ограничение по времени, секунд
+
+        Returns:
+            Оптимизированное расписание (тот же объект, что передан в конструктор)
+        """
+        if verbose:
+            print("\n" + "=" * 100)
+            print(" " * 22 + f"ФАЗА 3: ОПТИМИЗАЦИЯ РАСПИСАНИЯ ({self.chains} цепочек, "
+                  f"{self.workers} процессов)")
+            print("=" * 100)
+
+        base = Phase3Optimizer(self.schedule, self.loader)
+        best_metric = base._calculate_quality_metric()
+        best_snapshot = base._snapshot()
+        self.stats.update(initial_metric=best_metric, improvements=0, iterations=0,
+                          accepted_worse=0, rounds=0)
+
+        if verbose:
+            print(f"\n📊 Начальная метрика качества: {best_metric:.2f}")
+
+        states = [(best_snapshot, temperature) for temperature in self._temperatures()]
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        exchange_interval = self.exchange_interval or max(1, math.ceil(max_iterations / self.exchange_rounds))
+        rounds = math.ceil(max_iterations / exchange_interval)
+
+        executor = None
+        if self.workers > 1 and self.chains > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.workers, self.chains),
+                initializer=_init_worker,
+                initargs=(self.schedule,)
+            )
+
+        try:
+            for round_number in range(rounds):
+                time_limit = None
+                if deadline is not None:
+                    time_limit = deadline - time.monotonic()
+                    if time_limit <= 0:
+                        break
+
+                iterations = min(exchange_interval,
+                                 max_iterations - round_number * exchange_interval)
+                tasks = [
+                    (snapshot, temperature, f"{self.seed}:{chain}:{round_number}",
+                     iterations, time_limit)
+                    for chain, (snapshot, temperature) in enumerate(states)
+                ]
+
+                if executor is not None:
+                    results = list(executor.map(_run_worker_chain, *zip(*tasks)))
+                else:
+                    results = [_run_chain(base, *task) for task in tasks]
+
+                for _, _, _, chain_stats in results:
+                    for key in ('improvements', 'iterations', 'accepted_worse'):
+                        self.stats[key] += chain_stats[key]
+                self.stats['rounds'] = round_number + 1
+
+                # Обмен: худшая половина цепочек продолжает с лучшего решения
+                order = sorted(range(len(results)), key=lambda i: (results[i][0], i))
+                if results[order[0]][0] < best_metric:
+                    best_metric, best_snapshot = results[order[0]][0], results[order[0]][1]
+
+                states = [(snapshot, temperature) for _, snapshot, temperature, _ in results]
+                for chain in order[(len(order) + 1) // 2:]:
+                    states[chain] = (best_snapshot, states[chain][1])
+
+                if verbose:
+                    metrics = ", ".join(f"{results[i][0]:.1f}" for i in range(len(results)))
+                    print(f"  Раунд {round_number + 1}: лучший = {best_metric:.2f} (цепочки: {metrics})")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        base._restore(best_snapshot)
+        self.stats['final_metric'] = best_metric
+
+        if verbose:
+            base.stats.update(self.stats)
+            base._print_final_statistics()
+
+        return self.schedule
+
 # Тестирование
 if __name__ == '__main__':
     import sys
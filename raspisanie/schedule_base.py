@@ -32,7 +32,9 @@ class TimeSlot:
     lesson_number: int  # 1-7
     
     def __hash__(self):
-        return hash((self.day, self.lesson_number))
+        # Хэш Enum и свойство value вычисляются на Python — берем атрибут напрямую,
+        # слоты хэшируются на каждой проверке занятости
+        return hash((self.day._value_, self.lesson_number))
     
     def __str__(self):
         day_names = {
@@ -148,74 +150,267 @@ class Lesson:
         return f"{self.time_slot}: {self.subject} ({self.teacher.name}) [{self.class_or_group}] в каб. {classroom_str}"
 
 
+def mask_gaps(mask: int) -> int:
+    """Количество "окон" в битовой маске уроков дня (бит N = урок N)"""
+    if not mask:
+        return 0
+    first = (mask & -mask).bit_length()
+    last = mask.bit_length()
+    return last - first + 1 - bin(mask).count("1")
+
+
 @dataclass
 class Schedule:
-    """Расписание"""
+    """
+    Расписание
+
+    Помимо списка уроков держит индексы занятости, которые обновляются
+    в add_lesson / remove_lesson / move_lesson:
+    - (учитель, слот), (класс/группа, слот), (кабинет, слот) -> уроки;
+    - слот -> уроки;
+    - (учитель, день) и (класс/группа, день) -> битовая маска номеров уроков
+      и количество уроков.
+
+    Поэтому проверки занятости и подсчет окон не просматривают весь список.
+    Время урока нужно менять только через move_lesson.
+    """
     lessons: List[Lesson] = field(default_factory=list)
-    
+
+    # Уроки учителя / класса-группы в порядке добавления
+    _by_teacher: Dict[str, List[Lesson]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    _by_group: Dict[str, List[Lesson]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    _by_teacher_slot: Dict[Tuple[str, TimeSlot], List[Lesson]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    _by_group_slot: Dict[Tuple[str, TimeSlot], List[Lesson]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    _by_classroom_slot: Dict[Tuple[str, TimeSlot], List[Lesson]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    _by_slot: Dict[TimeSlot, List[Lesson]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    # (имя, день) -> [битовая маска номеров уроков, количество уроков]
+    _teacher_days: Dict[Tuple[str, DayOfWeek], List[int]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    _group_days: Dict[Tuple[str, DayOfWeek], List[int]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+    # Класс -> группы, в названии которых он встречается (см. is_class_busy)
+    _groups_for_class: Dict[str, Tuple[str, ...]] = field(
+        default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """Перестроить индексы по списку уроков (после прямой правки time_slot)"""
+        for index in (self._by_teacher, self._by_group, self._by_teacher_slot,
+                      self._by_group_slot, self._by_classroom_slot, self._by_slot,
+                      self._teacher_days, self._group_days, self._groups_for_class):
+            index.clear()
+        for lesson in self.lessons:
+            self._index_owner(lesson)
+            self._index(lesson)
+
+    # ----- Индексы -----
+
+    @staticmethod
+    def _append(index: dict, key, lesson: Lesson):
+        bucket = index.get(key)
+        if bucket is None:
+            index[key] = [lesson]
+        else:
+            bucket.append(lesson)
+
+    @staticmethod
+    def _discard(index: dict, key, lesson: Lesson) -> bool:
+        """Убрать урок из индекса; True, если по ключу больше нет уроков"""
+        bucket = index[key]
+        for i, other in enumerate(bucket):
+            if other is lesson:
+                del bucket[i]
+                break
+        if bucket:
+            return False
+        del index[key]
+        return True
+
+    @staticmethod
+    def _mark_day(days: dict, key, lesson_number: int):
+        entry = days.get(key)
+        if entry is None:
+            days[key] = [1 << lesson_number, 1]
+        else:
+            entry[0] |= 1 << lesson_number
+            entry[1] += 1
+
+    @staticmethod
+    def _unmark_day(days: dict, key, lesson_number: int, slot_freed: bool):
+        entry = days[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del days[key]
+        elif slot_freed:
+            entry[0] &= ~(1 << lesson_number)
+
+    def _index(self, lesson: Lesson):
+        slot = lesson.time_slot
+        teacher = lesson.teacher.name
+        group = lesson.class_or_group
+
+        self._append(self._by_slot, slot, lesson)
+        self._append(self._by_teacher_slot, (teacher, slot), lesson)
+        self._append(self._by_group_slot, (group, slot), lesson)
+        if lesson.classroom:
+            self._append(self._by_classroom_slot, (lesson.classroom.number, slot), lesson)
+
+        self._mark_day(self._teacher_days, (teacher, slot.day), slot.lesson_number)
+        self._mark_day(self._group_days, (group, slot.day), slot.lesson_number)
+
+    def _unindex(self, lesson: Lesson):
+        slot = lesson.time_slot
+        teacher = lesson.teacher.name
+        group = lesson.class_or_group
+
+        self._discard(self._by_slot, slot, lesson)
+        teacher_freed = self._discard(self._by_teacher_slot, (teacher, slot), lesson)
+        group_freed = self._discard(self._by_group_slot, (group, slot), lesson)
+        if lesson.classroom:
+            self._discard(self._by_classroom_slot, (lesson.classroom.number, slot), lesson)
+
+        self._unmark_day(self._teacher_days, (teacher, slot.day), slot.lesson_number, teacher_freed)
+        self._unmark_day(self._group_days, (group, slot.day), slot.lesson_number, group_freed)
+
+    def _index_owner(self, lesson: Lesson):
+        group = lesson.class_or_group
+        if group not in self._by_group:
+            self._groups_for_class.clear()
+        self._append(self._by_teacher, lesson.teacher.name, lesson)
+        self._append(self._by_group, group, lesson)
+
+    def _unindex_owner(self, lesson: Lesson):
+        self._discard(self._by_teacher, lesson.teacher.name, lesson)
+        if self._discard(self._by_group, lesson.class_or_group, lesson):
+            self._groups_for_class.clear()
+
+    def _groups_of_class(self, class_name: str) -> Tuple[str, ...]:
+        """Названия классов/групп, содержащие class_name"""
+        groups = self._groups_for_class.get(class_name)
+        if groups is None:
+            groups = tuple(g for g in self._by_group if class_name in g)
+            self._groups_for_class[class_name] = groups
+        return groups
+
+    # ----- Изменение -----
+
     def add_lesson(self, lesson: Lesson):
         """Добавить урок в расписание"""
         self.lessons.append(lesson)
-    
+        self._index_owner(lesson)
+        self._index(lesson)
+
+    def remove_lesson(self, lesson: Lesson):
+        """Удалить урок из расписания"""
+        for i, other in enumerate(self.lessons):
+            if other is lesson:
+                del self.lessons[i]
+                break
+        else:
+            raise ValueError(f"Урок не найден в расписании: {lesson}")
+        self._unindex_owner(lesson)
+        self._unindex(lesson)
+
+    def move_lesson(self, lesson: Lesson, time_slot: TimeSlot):
+        """Перенести урок в другой слот"""
+        self._unindex(lesson)
+        lesson.time_slot = time_slot
+        self._index(lesson)
+
+    # ----- Запросы -----
+
     def get_lessons_by_class(self, class_name: str) -> List[Lesson]:
         """Получить все уроки для класса"""
-        return [l for l in self.lessons if class_name in l.class_or_group]
+        groups = self._groups_of_class(class_name)
+        if len(groups) > 1:
+            # Несколько групп — сохраняем общий порядок уроков
+            return [l for l in self.lessons if class_name in l.class_or_group]
+        return list(self._by_group[groups[0]]) if groups else []
     
     def get_lessons_by_teacher(self, teacher_name: str) -> List[Lesson]:
         """Получить все уроки учителя"""
-        return [l for l in self.lessons if l.teacher.name == teacher_name]
+        return list(self._by_teacher.get(teacher_name, ()))
     
     def get_lessons_by_timeslot(self, time_slot: TimeSlot) -> List[Lesson]:
         """Получить все уроки в определенное время"""
-        return [l for l in self.lessons if l.time_slot == time_slot]
-    
+        return list(self._by_slot.get(time_slot, ()))
+
+    def teacher_lessons_at(self, teacher_name: str, time_slot: TimeSlot) -> List[Lesson]:
+        """Уроки учителя в слоте (обычно ноль или один)"""
+        return self._by_teacher_slot.get((teacher_name, time_slot), [])
+
+    def group_lessons_at(self, class_or_group: str, time_slot: TimeSlot) -> List[Lesson]:
+        """Уроки класса/группы (точное название) в слоте"""
+        return self._by_group_slot.get((class_or_group, time_slot), [])
+
+    def classroom_lessons_at(self, classroom_number: str, time_slot: TimeSlot) -> List[Lesson]:
+        """Уроки в кабинете в слоте"""
+        return self._by_classroom_slot.get((classroom_number, time_slot), [])
+
+    def teacher_day_mask(self, teacher_name: str, day: DayOfWeek) -> int:
+        """Битовая маска номеров уроков учителя в день"""
+        entry = self._teacher_days.get((teacher_name, day))
+        return entry[0] if entry else 0
+
+    def group_day_mask(self, class_or_group: str, day: DayOfWeek) -> int:
+        """Битовая маска номеров уроков класса/группы (точное название) в день"""
+        entry = self._group_days.get((class_or_group, day))
+        return entry[0] if entry else 0
+
+    def teacher_day(self, teacher_name: str, day: DayOfWeek) -> Tuple[int, int]:
+        """(маска уроков, количество уроков) учителя в день"""
+        entry = self._teacher_days.get((teacher_name, day))
+        return (entry[0], entry[1]) if entry else (0, 0)
+
+    def group_day(self, class_or_group: str, day: DayOfWeek) -> Tuple[int, int]:
+        """(маска уроков, количество уроков) класса/группы в день"""
+        entry = self._group_days.get((class_or_group, day))
+        return (entry[0], entry[1]) if entry else (0, 0)
+
+    def teacher_days(self) -> Dict[Tuple[str, DayOfWeek], Tuple[int, int]]:
+        """(учитель, день) -> (маска уроков, количество уроков)"""
+        return {key: (mask, count) for key, (mask, count) in self._teacher_days.items()}
+
+    def group_days(self) -> Dict[Tuple[str, DayOfWeek], Tuple[int, int]]:
+        """(класс/группа, день) -> (маска уроков, количество уроков)"""
+        return {key: (mask, count) for key, (mask, count) in self._group_days.items()}
+
     def is_teacher_busy(self, teacher: Teacher, time_slot: TimeSlot) -> bool:
         """Проверка, занят ли учитель в данное время"""
-        return any(l.teacher == teacher and l.time_slot == time_slot for l in self.lessons)
+        return (teacher.name, time_slot) in self._by_teacher_slot
     
     def is_class_busy(self, class_name: str, time_slot: TimeSlot) -> bool:
         """Проверка, занят ли класс в данное время"""
-        return any(class_name in l.class_or_group and l.time_slot == time_slot for l in self.lessons)
+        return any(
+            (group, time_slot) in self._by_group_slot
+            for group in self._groups_of_class(class_name)
+        )
     
     def is_classroom_busy(self, classroom: Classroom, time_slot: TimeSlot) -> bool:
         """Проверка, занят ли кабинет в данное время"""
-        return any(l.classroom == classroom and l.time_slot == time_slot for l in self.lessons)
+        return (classroom.number, time_slot) in self._by_classroom_slot
     
     def get_teacher_gaps(self, teacher: Teacher) -> int:
         """Подсчет "окон" в расписании учителя"""
-        teacher_lessons = self.get_lessons_by_teacher(teacher.name)
-        
-        gaps = 0
-        for day in DayOfWeek:
-            day_lessons = [l for l in teacher_lessons if l.time_slot.day == day]
-            if not day_lessons:
-                continue
-            
-            lesson_numbers = sorted([l.time_slot.lesson_number for l in day_lessons])
-            
-            # Считаем окна между первым и последним уроком
-            for i in range(lesson_numbers[0], lesson_numbers[-1]):
-                if i not in lesson_numbers:
-                    gaps += 1
-        
-        return gaps
+        return sum(mask_gaps(self.teacher_day_mask(teacher.name, day)) for day in DayOfWeek)
     
     def get_class_gaps(self, class_name: str) -> int:
         """Подсчет "окон" в расписании класса"""
-        class_lessons = self.get_lessons_by_class(class_name)
-        
+        groups = self._groups_of_class(class_name)
         gaps = 0
         for day in DayOfWeek:
-            day_lessons = [l for l in class_lessons if l.time_slot.day == day]
-            if not day_lessons:
-                continue
-            
-            lesson_numbers = sorted([l.time_slot.lesson_number for l in day_lessons])
-            
-            for i in range(lesson_numbers[0], lesson_numbers[-1]):
-                if i not in lesson_numbers:
-                    gaps += 1
-        
+            mask = 0
+            for group in groups:
+                mask |= self.group_day_mask(group, day)
+            gaps += mask_gaps(mask)
         return gaps
     
     def to_dict(self) -> dict:
@@ -0,0 +1,379 @@
+"""
+Массовые операции с уроками расписания для REST API
+
+- экспорт всего расписания в CSV / JSON / XLSX одним запросом с JOIN,
+  строки читаются из БД и отдаются частями;
+- импорт (добавление или замена) всех уроков одной транзакцией;
+- поиск всех накладок (учитель, класс, кабинет) одним сгруппированным запросом.
+
+Уроки в файлах описываются названиями (предмет, учитель, класс, кабинет),
+поэтому расписание можно перенести между базами.
+"""
+
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert, literal, select, tuple_, union_all
+from sqlalchemy.orm import joinedload
+
+from models import db, Teacher, Classroom, Subject, SchoolClass, Lesson
+
+DAY_NAMES = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница']
+DAY_SHORT = ['ПН', 'ВТ', 'СР', 'ЧТ', 'ПТ']
+
+# Столбцы CSV/XLSX и соответствующие ключи JSON
+EXPORT_COLUMNS = [
+    ('День', 'day'),
+    ('Урок', 'lesson_number'),
+    ('Предмет', 'subject'),
+    ('Учитель', 'teacher'),
+    ('Класс', 'class'),
+    ('Кабинет', 'classroom'),
+    ('Группа', 'group_name'),
+    ('Практикум ЕГЭ', 'is_ege_practice'),
+]
+
+EXPORT_CHUNK_SIZE = 500
+
+CONFLICT_MESSAGES = {
+    'teacher': 'Учитель ведёт несколько уроков одновременно',
+    'class': 'У класса несколько уроков одновременно',
+    'classroom': 'В кабинете несколько уроков одновременно',
+}
+
+
+def lesson_eager_options():
+    """Опции запроса Lesson, загружающие связи для to_dict() в том же запросе"""
+    return (
+        joinedload(Lesson.subject),
+        joinedload(Lesson.teacher),
+        joinedload(Lesson.school_class),
+        joinedload(Lesson.classroom),
+    )
+
+
+# ============== ЭКСПОРТ ==============
+
+def iter_export_rows(schedule_id: int, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict]:
+    """Уроки расписания в порядке дня и номера урока — без загрузки ORM-объектов"""
+    query = (
+        db.session.query(
+            Lesson.day, Lesson.lesson_number, Subject.name, Teacher.name,
+            SchoolClass.name, Classroom.number, Lesson.group_name, Lesson.is_ege_practice,
+        )
+        .outerjoin(Subject, Lesson.subject_id == Subject.id)
+        .outerjoin(Teacher, Lesson.teacher_id == Teacher.id)
+        .outerjoin(SchoolClass, Lesson.class_id == SchoolClass.id)
+        .outerjoin(Classroom, Lesson.classroom_id == Classroom.id)
+        .filter(Lesson.schedule_id == schedule_id)
+        .order_by(Lesson.day, Lesson.lesson_number, Lesson.id)
+        .yield_per(chunk_size)
+    )
+    keys = [key for _, key in EXPORT_COLUMNS]
+    for row in query:
+        yield dict(zip(keys, row))
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _table_row(lesson: Dict) -> List:
+    day = lesson['day']
+    return [
+        DAY_NAMES[day] if 0 <= day < len(DAY_NAMES) else str(day),
+        lesson['lesson_number'],
+        lesson['subject'] or '',
+        lesson['teacher'] or '',
+        lesson['class'] or '',
+        lesson['classroom'] or '',
+        lesson['group_name'] or '',
+        'да' if lesson['is_ege_practice'] else '',
+    ]
+
+
+def export_csv_chunks(schedule_id: int) -> Iterator[str]:
+    """CSV (разделитель ';', BOM для Excel) частями по EXPORT_CHUNK_SIZE строк"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow([title for title, _ in EXPORT_COLUMNS])
+    yield '\ufeff' + buffer.getvalue()
+
+    for chunk in _chunks(iter_export_rows(schedule_id), EXPORT_CHUNK_SIZE):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_table_row(lesson) for lesson in chunk)
+        yield buffer.getvalue()
+
+
+def export_json_chunks(schedule_id: int) -> Iterator[str]:
+    """JSON-массив уроков частями"""
+    yield '['
+    first = True
+    for chunk in _chunks(iter_export_rows(schedule_id), EXPORT_CHUNK_SIZE):
+        body = ',\n'.join(json.dumps(lesson, ensure_ascii=False) for lesson in chunk)
+        yield body if first else ',\n' + body
+        first = False
+    yield ']'
+
+
+def export_xlsx(schedule_id: int) -> bytes:
+    """XLSX в режиме write-only (строки не держатся в памяти openpyxl)"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Расписание')
+    sheet.append([title for title, _ in EXPORT_COLUMNS])
+    for lesson in iter_export_rows(schedule_id):
+        sheet.append(_table_row(lesson))
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+# ============== ИМПОРТ ==============
+
+def parse_lessons_file(filename: str, content: bytes) -> List[Dict]:
+    """
+    Читает уроки из файла экспорта (CSV, JSON или XLSX).
+
+    Returns:
+        Список словарей с ключами как в JSON-экспорте
+    """
+    name = filename.lower()
+    if name.endswith('.json'):
+        return json.loads(content.decode('utf-8-sig'))
+
+    if name.endswith(('.xlsx', '.xls')):
+        import pandas as pd
+        df = pd.read_excel(io.BytesIO(content), dtype=str).fillna('')
+        table = [df.columns.tolist()] + df.values.tolist()
+    else:
+        table = list(csv.reader(io.StringIO(content.decode('utf-8-sig')), delimiter=';'))
+
+    if not table:
+        return []
+    titles = {title: key for title, key in EXPORT_COLUMNS}
+    header = [titles.get(str(title).strip(), str(title).strip()) for title in table[0]]
+    lessons = []
+    for values in table[1:]:
+        if not any(str(v).strip() for v in values):
+            continue
+        lessons.append({key: str(value).strip() for key, value in zip(header, values)})
+    return lessons
+
+
+def _parse_day(value) -> Optional[int]:
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+    for i, (name, short) in enumerate(zip(DAY_NAMES, DAY_SHORT)):
+        if text.lower() in (name.lower(), short.lower()):
+            return i
+    return None
+
+
+def _resolve(lesson: Dict, key: str, names: Dict[str, int], ids: Set[int]) -> Optional[int]:
+    """id по полю <key>_id или по названию в поле <key>; -1, если такого нет"""
+    if lesson.get(f'{key}_id'):
+        value = str(lesson[f'{key}_id']).strip()
+        if not value.isdigit() or int(value) not in ids:
+            return -1
+        return int(value)
+    name = lesson.get(key)
+    if not name:
+        return None
+    return names.get(str(name).strip(), -1)
+
+
+def import_lessons(schedule_id: int, lessons: List[Dict], replace: bool = False,
+                   allow_conflicts: bool = False) -> Tuple[int, List[str], List[Dict]]:
+    """
+    Добавляет уроки в расписание одной транзакцией.
+
+    Справочники читаются по одному запросу; накладки проверяются в памяти
+    (среди импортируемых уроков и, если replace=False, с уже имеющимися).
+    При ошибках (и при накладках, если не allow_conflicts) ничего не записывается.
+
+    Args:
+        schedule_id: Расписание
+        lessons: Уроки (ключи как в JSON-экспорте; вместо названий можно
+            передать subject_id, teacher_id, class_id, classroom_id)
+        replace: Удалить существующие уроки расписания
+        allow_conflicts: Записать уроки, несмотря на накладки
+
+    Returns:
+        (количество добавленных уроков, ошибки, накладки)
+    """
+    if not isinstance(lessons, list):
+        return 0, ['Ожидается список уроков'], []
+
+    directories = {
+        'subject': dict(db.session.query(Subject.name, Subject.id)),
+        'teacher': dict(db.session.query(Teacher.name, Teacher.id)),
+        'class': dict(db.session.query(SchoolClass.name, SchoolClass.id)),
+        'classroom': dict(db.session.query(Classroom.number, Classroom.id)),
+    }
+    known_ids = {key: set(names.values()) for key, names in directories.items()}
+
+    def resolve(lesson: Dict, key: str) -> Optional[int]:
+        return _resolve(lesson, key, directories[key], known_ids[key])
+
+    rows = []
+    errors = []
+    for i, lesson in enumerate(lessons, 1):
+        if not isinstance(lesson, dict):
+            errors.append(f'Урок {i}: ожидается объект с полями урока')
+            continue
+        day = _parse_day(lesson.get('day', ''))
+        number = str(lesson.get('lesson_number', '')).strip()
+        row = {
+            'schedule_id': schedule_id,
+            'subject_id': resolve(lesson, 'subject'),
+            'teacher_id': resolve(lesson, 'teacher'),
+            'class_id': resolve(lesson, 'class'),
+            'classroom_id': resolve(lesson, 'classroom'),
+            'day': day,
+            'lesson_number': int(number) if number.isdigit() else None,
+            'is_ege_practice': str(lesson.get('is_ege_practice', '')).lower() in ('true', '1', 'да', 'yes'),
+            'group_name': lesson.get('group_name') or None,
+        }
+
+        problems = [
+            f'не найден {label} "{lesson.get(f"{key}_id") or lesson.get(key)}"'
+            for key, label in (('subject', 'предмет'), ('teacher', 'учитель'),
+                               ('class', 'класс'), ('classroom', 'кабинет'))
+            if row[f'{key}_id'] == -1
+        ]
+        if row['subject_id'] is None:
+            problems.append('не указан предмет')
+        if row['teacher_id'] is None:
+            problems.append('не указан учитель')
+        if day is None or not 0 <= day < len(DAY_NAMES):
+            problems.append(f'неверный день "{lesson.get("day")}"')
+        if row['lesson_number'] is None or not 1 <= row['lesson_number'] <= 8:
+            problems.append(f'неверный номер урока "{lesson.get("lesson_number")}"')
+
+        if problems:
+            errors.append(f'Урок {i}: ' + ', '.join(problems))
+        else:
+            rows.append(row)
+
+    if errors:
+        return 0, errors, []
+
+    existing = []
+    if not replace:
+        existing = [
+            dict(zip(('id', 'teacher_id', 'class_id', 'classroom_id', 'day', 'lesson_number'), values))
+            for values in db.session.query(
+                Lesson.id, Lesson.teacher_id, Lesson.class_id, Lesson.classroom_id,
+                Lesson.day, Lesson.lesson_number,
+            ).filter(Lesson.schedule_id == schedule_id)
+        ]
+    conflicts = _conflicts_in_memory(existing + rows, first_new=len(existing))
+    if conflicts and not allow_conflicts:
+        return 0, [], conflicts
+
+    try:
+        if replace:
+            Lesson.query.filter_by(schedule_id=schedule_id).delete(synchronize_session=False)
+        if rows:
+            # render_nulls: иначе строки с NULL в разных столбцах идут разными пакетами
+            db.session.execute(insert(Lesson).execution_options(render_nulls=True), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows), [], conflicts
+
+
+def _conflicts_in_memory(rows: List[Dict], first_new: int) -> List[Dict]:
+    """Накладки, в которых участвует хотя бы один новый урок (индекс >= first_new)"""
+    conflicts = []
+    for kind, key in (('teacher', 'teacher_id'), ('class', 'class_id'), ('classroom', 'classroom_id')):
+        slots: Dict[Tuple, List[int]] = {}
+        for i, row in enumerate(rows):
+            if row[key] is not None:
+                slots.setdefault((row[key], row['day'], row['lesson_number']), []).append(i)
+        for (value, day, number), indexes in slots.items():
+            if len(indexes) > 1 and indexes[-1] >= first_new:
+                conflicts.append({
+                    'type': kind,
+                    key: value,
+                    'day': day,
+                    'lesson_number': number,
+                    'rows': [i - first_new + 1 for i in indexes if i >= first_new],
+                    'message': CONFLICT_MESSAGES[kind],
+                })
+    return conflicts
+
+
+# ============== НАКЛАДКИ ==============
+
+def find_schedule_conflicts(schedule_id: int) -> List[Dict]:
+    """
+    Все накладки расписания: учитель, класс или кабинет заняты
+    в одном слоте несколькими уроками.
+
+    Накладки ищутся одним запросом (UNION ALL трех GROUP BY ... HAVING),
+    затем уроки-участники загружаются одним запросом со связями.
+    """
+    def grouped(kind: str, column):
+        return (
+            select(
+                literal(kind).label('kind'), column.label('key'),
+                Lesson.day, Lesson.lesson_number, func.count().label('lessons'),
+            )
+            .where(Lesson.schedule_id == schedule_id, column.isnot(None))
+            .group_by(column, Lesson.day, Lesson.lesson_number)
+            .having(func.count() > 1)
+        )
+
+    statement = union_all(
+        grouped('teacher', Lesson.teacher_id),
+        grouped('class', Lesson.class_id),
+        grouped('classroom', Lesson.classroom_id),
+    )
+    groups = db.session.execute(statement).fetchall()
+    if not groups:
+        return []
+
+    slots = {(day, number) for _, _, day, number, _ in groups}
+    lessons = (
+        Lesson.query.options(*lesson_eager_options())
+        .filter(Lesson.schedule_id == schedule_id)
+        .filter(tuple_(Lesson.day, Lesson.lesson_number).in_(slots))
+        .order_by(Lesson.id)
+        .all()
+    )
+    key_of = {'teacher': 'teacher_id', 'class': 'class_id', 'classroom': 'classroom_id'}
+
+    conflicts = []
+    for kind, key, day, number, count in sorted(groups, key=lambda g: (g[2], g[3], g[0], g[1])):
+        members = [
+            lesson for lesson in lessons
+            if lesson.day == day and lesson.lesson_number == number
+            and getattr(lesson, key_of[kind]) == key
+        ]
+        conflicts.append({
+            'type': kind,
+            key_of[kind]: key,
+            'day': day,
+            'lesson_number': number,
+            'lessons': [lesson.to_dict() for lesson in members],
+            'message': CONFLICT_MESSAGES[kind],
+        })
+    return conflicts
@@ -8,6 +8,7 @@
 import streamlit as st
 import pandas as pd
 import json
+import os
 from pathlib import Path
 from io import BytesIO
 from typing import Optional
@@ -181,34 +182,17 @@ def show_step1_upload():
 
 def load_real_data(classrooms_file, teachers_file, students_file):
     """Загрузка реальных данных из Excel"""
-    import tempfile
-    import os
     from data_loader import DataLoader
 
     loader = DataLoader()
 
-    # Сохраняем файлы во временную директорию
-    with tempfile.TemporaryDirectory() as tmpdir:
-        # Кабинеты
-        classrooms_path = os.path.join(tmpdir, "classrooms.xlsx")
-        with open(classrooms_path, 'wb') as f:
-            f.write(classrooms_file.getvalue())
-        loader.load_classrooms(classrooms_path)
-
-        # Учителя
-        teachers_path = os.path.join(tmpdir, "teachers.xlsx")
-        with open(teachers_path, 'wb') as f:
-            f.write(teachers_file.getvalue())
-        loader.load_teachers_and_subjects(teachers_path)
-
-        # Ученики
-        students_path = os.path.join(tmpdir, "students.xlsx")
-        with open(students_path, 'wb') as f:
-            f.write(students_file.getvalue())
-        loader.load_students_and_ege_choices(students_path)
-
-        # Создаем группы ЕГЭ
-        loader.create_ege_practice_groups()
+    # Файлы разбираются прямо из памяти; при повторной загрузке
+    # тех же файлов данные берутся из кэша
+    loader.load_workbooks(
+        classrooms_file.getvalue(),
+        teachers_file.getvalue(),
+        students_file.getvalue()
+    )
 
     return loader
 
@@ -360,7 +344,7 @@ def show_step3_generate():
     # Параметры генерации
     st.subheader("⚙️ Параметры")
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
 
     with col1:
         iterations = st.slider(
@@ -379,6 +363,16 @@ def show_step3_generate():
             help="Оптимизация уменьшает количество окон у учителей и классов"
         )
 
+    with col3:
+        workers = st.slider(
+            "Параллельных цепочек",
+            min_value=1,
+            max_value=max(1, os.cpu_count() or 1),
+            value=1,
+            help="Несколько независимых запусков отжига на разных ядрах; "
+                 "берется лучший результат"
+        )
+
     st.markdown("---")
 
     # Описание этапов
@@ -406,14 +400,14 @@ def show_step3_generate():
 
     with col2:
         if st.button("🚀 Сгенерировать расписание", type="primary", use_container_width=True):
-            generate_schedule(loader, iterations, run_optimization)
+            generate_schedule(loader, iterations, run_optimization, workers)
 
 
-def generate_schedule(loader, iterations, run_optimization):
+def generate_schedule(loader, iterations, run_optimization, workers=1):
     """Генерация расписания с прогресс-баром"""
     from schedule_generator import ScheduleGenerator
     from phase2_mandatory import Phase2MandatoryPlacer
-    from phase3_optimization import Phase3Optimizer
+    from phase3_optimization import Phase3Optimizer, ParallelPhase3Optimizer
 
     progress = st.progress(0)
     status = st.empty()
@@ -441,10 +435,17 @@ def generate_schedule(loader, iterations, run_optimization):
     # Фаза 3
     if run_optimization:
         status.info("🔧 Фаза 3: Оптимизация расписания...")
-        optimizer = Phase3Optimizer(
-            schedule=generator.schedule,
-            loader=loader
-        )
+        if workers > 1:
+            optimizer = ParallelPhase3Optimizer(
+                schedule=generator.schedule,
+                loader=loader,
+                workers=workers
+            )
+        else:
+            optimizer = Phase3Optimizer(
+                schedule=generator.schedule,
+                loader=loader
+            )
         schedule = optimizer.optimize(max_iterations=iterations, verbose=False)
         phase3_stats = optimizer.stats
     else:
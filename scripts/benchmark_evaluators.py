@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк AI-проверщиков на экспертных кейсах data/benchmark_data.json.
+
+Каждый кейс прогоняется через настоящий Task*AIEvaluator (промпт, разбор
+ответа, постобработка баллов), но вместо Claude/YandexGPT отвечает
+детерминированная заглушка ReplayAIService:
+- если для кейса есть записанный ответ модели (--recordings), отдается он;
+- иначе ответ синтезируется в формате проверщика из actual_scores кейса —
+  баллов, которые бот поставил при сборе бенчмарка.
+
+Сеть не нужна. Отчет (JSON, ключи отсортированы) можно сравнивать между
+коммитами: пропускная способность и задержки по проверщикам, размер
+промптов, доля ответов, которые не удалось разобрать, и согласие с
+экспертными баллами.
+
+Синтетический ответ повторяет баллы бота, поэтому качество по нему не
+измерить: согласие и ошибки разбора считаются только по кейсам с
+записанными ответами, без записей в отчете n/a (None).
+
+  python scripts/benchmark_evaluators.py
+  python scripts/benchmark_evaluators.py --repeat 20 --concurrency 16 --output bench.json
+  python scripts/benchmark_evaluators.py --llm-latency-ms 800   # имитация сети
+  python scripts/benchmark_evaluators.py --record               # запись ответов настоящей модели
+"""
+
+import argparse
+import asyncio
+import contextvars
+import importlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+# Добавляем корень проекта в PYTHONPATH
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+# Пакеты заданий импортируют core.config, которому нужен токен бота;
+# к Telegram бенчмарк не обращается
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark-offline')
+
+DEFAULT_DATA = os.path.join(PROJECT_ROOT, 'data', 'benchmark_data.json')
+DEFAULT_RECORDINGS = os.path.join(PROJECT_ROOT, 'data', 'benchmark_recordings.json')
+
+# Грубая оценка токенов для русского текста (символов на токен)
+CHARS_PER_TOKEN = 3.0
+
+# Кейс, который сейчас проверяется (у каждой задачи asyncio свой контекст)
+_current_case: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar('current_case', default=None)
+
+
+@dataclass
+class EvaluatorSpec:
+    """Как вызвать проверщик задания на кейсе бенчмарка и что он ждет от модели."""
+    module: str
+    class_name: str
+    call: Callable[[Any, dict], Any]
+    synthesize: Callable[[Dict[str, int]], dict]
+    fallback_method: str
+
+
+def _json_block(payload: dict) -> str:
+    # Модель обычно заворачивает JSON в markdown — так же отдаем и синтетический ответ
+    return "```json\n" + json.dumps(payload, ensure_ascii=False, indent=2) + "\n```"
+
+
+EVALUATORS: Dict[str, EvaluatorSpec] = {
+    'task18': EvaluatorSpec(
+        'task18.evaluator', 'Task18AIEvaluator',
+        lambda ev, case: ev.evaluate(case['student_answer'], {'task_text': case['task_text']}),
+        lambda s: {
+            'score': s['total'],
+            'element1_accepted': s['total'] >= 1,
+            'element2_accepted': s['total'] >= 2,
+            'feedback': 'Синтетический ответ бенчмарка.',
+        },
+        '_basic_evaluation',
+    ),
+    'task19': EvaluatorSpec(
+        'task19.evaluator', 'Task19AIEvaluator',
+        lambda ev, case: ev.evaluate(case['student_answer'], case['topic'], task_text=case['task_text']),
+        lambda s: {
+            'score': s['total'],
+            'valid_examples_count': s['total'],
+            'total_examples': 3,
+            'penalty_applied': False,
+            'valid_examples': [{'number': i + 1, 'why_valid': 'засчитан'} for i in range(s['total'])],
+            'invalid_examples': [],
+            'feedback': 'Синтетический ответ бенчмарка.',
+            'suggestions': [],
+            'factual_errors': [],
+        },
+        '_basic_evaluation',
+    ),
+    'task20': EvaluatorSpec(
+        'task20.evaluator', 'Task20AIEvaluator',
+        lambda ev, case: ev.evaluate(case['student_answer'], case['topic'], task_text=case['task_text']),
+        lambda s: {
+            'score': s['total'],
+            'valid_arguments': [{'comment': 'засчитано'} for _ in range(s['total'])],
+            'invalid_arguments': [],
+            'feedback': 'Синтетический ответ бенчмарка.',
+            'suggestions': [],
+            'factual_errors': [],
+        },
+        '_basic_evaluation',
+    ),
+    'task22': EvaluatorSpec(
+        'task22.evaluator', 'Task22AIEvaluator',
+        lambda ev, case: ev.evaluate(case['student_answer'], {'description': case['task_text']}),
+        lambda s: {
+            'score': s['total'],
+            'correct_answers_count': s['total'],
+            'answers_evaluation': [],
+            'feedback': 'Синтетический ответ бенчмарка.',
+            'suggestions': [],
+            'factual_errors': [],
+        },
+        '_basic_evaluation',
+    ),
+    'task25': EvaluatorSpec(
+        'task25.evaluator', 'Task25AIEvaluator',
+        lambda ev, case: ev.evaluate(case['student_answer'], {'task_text': case['task_text'], 'title': case['topic']}),
+        lambda s: {
+            'k1_score': s.get('k1', 0),
+            'k2_score': s.get('k2', 0),
+            'k3_score': s.get('k3', 0),
+            'total_score': s['total'],
+            'general_feedback': 'Синтетический ответ бенчмарка.',
+        },
+        '_get_fallback_result',
+    ),
+}
+
+# Проверщики, которым нужны структурированные данные вопроса, а не текст задания
+UNSUPPORTED = {
+    'task21': 'нужны question_data с вопросами 1-3 (график спроса/предложения)',
+    'task23': 'нужны question_data с model_type и эталонными характеристиками',
+    'task24': 'проверка плана идет по эталонному плану темы, а не по тексту задания',
+}
+
+
+class RunStats:
+    """Счетчики одного прогона кейса."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.prompt_chars: List[int] = []
+        self.parse_failures = 0
+        self.fallback = False
+        self.synthesized = False
+
+
+_run_stats: contextvars.ContextVar[Optional[RunStats]] = contextvars.ContextVar('run_stats', default=None)
+
+
+def _make_replay_service_class():
+    from core.ai_service import ClaudeService
+
+    class ReplayAIService(ClaudeService):
+        """ClaudeService, отвечающий записанными или синтетическими ответами без сети."""
+
+        def __init__(self, config, recordings: Dict[str, List[str]], latency: float):
+            super().__init__(config)
+            self.recordings = recordings
+            self.latency = latency
+
+        async def get_completion(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+            case = _current_case.get()
+            stats = _run_stats.get()
+            call_index = stats.llm_calls
+            stats.llm_calls += 1
+            stats.prompt_chars.append(len(prompt) + len(system_prompt or ''))
+
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+            recorded = self.recordings.get(case['id'])
+            if recorded:
+                text = recorded[min(call_index, len(recorded) - 1)]
+            else:
+                stats.synthesized = True
+                text = _json_block(EVALUATORS[case['task_type']].synthesize(case['actual_scores']))
+
+            tokens = len(prompt) // int(CHARS_PER_TOKEN)
+            return {
+                'success': True,
+                'text': text,
+                'usage': {'inputTextTokens': str(tokens), 'completionTokens': '0', 'totalTokens': str(tokens)},
+                'model_version': 'benchmark-replay',
+            }
+
+        def _parse_json_response(self, text: str) -> Optional[Dict[str, Any]]:
+            parsed = super()._parse_json_response(text)
+            if parsed is None:
+                _run_stats.get().parse_failures += 1
+            return parsed
+
+    return ReplayAIService
+
+
+def _install_service_factory(module, factory):
+    module.create_ai_service = factory
+
+
+def _make_recording_factory(original_factory, recordings: Dict[str, List[str]]):
+    """Фабрика настоящего сервиса, сохраняющая ответы модели по id кейса."""
+    def factory(config):
+        service = original_factory(config)
+        original = service.get_completion
+
+        async def get_completion(*args, **kwargs):
+            result = await original(*args, **kwargs)
+            case = _current_case.get()
+            if case is not None and result.get('success'):
+                recordings.setdefault(case['id'], []).append(result['text'])
+            return result
+
+        service.get_completion = get_completion
+        return service
+    return factory
+
+
+def _instrument_fallback(evaluator, method_name: str):
+    original = getattr(evaluator, method_name)
+
+    def fallback(*args, **kwargs):
+        stats = _run_stats.get()
+        if stats is not None:
+            stats.fallback = True
+        return original(*args, **kwargs)
+
+    setattr(evaluator, method_name, fallback)
+
+
+async def _run_case(spec: EvaluatorSpec, evaluator, case: dict, semaphore: asyncio.Semaphore) -> dict:
+    async with semaphore:
+        _current_case.set(case)
+        stats = RunStats()
+        _run_stats.set(stats)
+        started = time.perf_counter()
+        result = await spec.call(evaluator, case)
+        elapsed = time.perf_counter() - started
+
+    return {
+        'case_id': case['id'],
+        'latency': elapsed,
+        'score': result.total_score,
+        'expected': case['expected_scores']['total'],
+        'bot_recorded': case['actual_scores']['total'],
+        'stats': stats,
+    }
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        'p50': round(pick(0.5) * 1000, 3),
+        'p95': round(pick(0.95) * 1000, 3),
+        'p99': round(pick(0.99) * 1000, 3),
+        'max': round(ordered[-1] * 1000, 3),
+    }
+
+
+def _agreement(runs: List[dict]) -> dict:
+    """Согласие с экспертными баллами по кейсам с записанными ответами модели."""
+    if not runs:
+        return {'cases': 0, 'exact': None, 'mae': None}
+    return {
+        'cases': len(runs),
+        'exact': round(sum(run['score'] == run['expected'] for run in runs) / len(runs), 4),
+        'mae': round(statistics.mean(abs(run['score'] - run['expected']) for run in runs), 4),
+    }
+
+
+def _summarize(spec: EvaluatorSpec, runs: List[dict], wall: float) -> dict:
+    prompt_chars = [chars for run in runs for chars in run['stats'].prompt_chars]
+    scored = [run for run in runs if not run['stats'].fallback]
+    first_pass = list({run['case_id']: run for run in runs}.values())
+    recorded_runs = [run for run in runs if not run['stats'].synthesized]
+    recorded = [run for run in first_pass if not run['stats'].synthesized]
+
+    return {
+        'evaluator': spec.class_name,
+        'cases': len(first_pass),
+        'runs': len(runs),
+        'throughput_per_s': round(len(runs) / wall, 2) if wall else None,
+        'latency_ms': _percentiles([run['latency'] for run in runs]),
+        'llm_calls': sum(run['stats'].llm_calls for run in runs),
+        'prompt_chars': {
+            'mean': round(statistics.mean(prompt_chars)) if prompt_chars else 0,
+            'max': max(prompt_chars, default=0),
+        },
+        'prompt_tokens_est': {
+            'mean': round(statistics.mean(prompt_chars) / CHARS_PER_TOKEN) if prompt_chars else 0,
+            'max': round(max(prompt_chars, default=0) / CHARS_PER_TOKEN),
+        },
+        # Синтетические ответы всегда разбираются — считаем только записанные
+        'parse_failures': sum(run['stats'].parse_failures for run in recorded_runs) if recorded_runs else None,
+        'fallback_rate': round(1 - len(scored) / len(runs), 4) if runs else 0.0,
+        'responses': {
+            'synthesized': len(first_pass) - len(recorded),
+            'recorded': len(recorded),
+        },
+        'agreement': {
+            **_agreement(recorded),
+            'bot_recorded_exact': round(
+                sum(run['bot_recorded'] == run['expected'] for run in first_pass) / len(first_pass), 4
+            ),
+        },
+    }
+
+
+async def run_benchmark(
+    data_path: str = DEFAULT_DATA,
+    recordings_path: Optional[str] = DEFAULT_RECORDINGS,
+    repeat: int = 5,
+    concurrency: int = 8,
+    llm_latency: float = 0.0,
+    record: bool = False,
+    only: Optional[List[str]] = None,
+) -> dict:
+    """Прогоняет кейсы через проверщики и возвращает отчет."""
+    if not record:
+        # Заглушке ключ не нужен, но проверщики без него отключают AI-проверку
+        os.environ['AI_PROVIDER'] = 'claude'
+        os.environ.setdefault('ANTHROPIC_API_KEY', 'benchmark-offline')
+
+    with open(data_path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    recordings: Dict[str, List[str]] = {}
+    if recordings_path and os.path.exists(recordings_path) and not record:
+        with open(recordings_path, encoding='utf-8') as f:
+            recordings = json.load(f)
+
+    cases_by_task: Dict[str, List[dict]] = defaultdict(list)
+    for case in data['cases']:
+        cases_by_task[case['task_type']].append(case)
+
+    from core import ai_service
+    replay_class = None if record else _make_replay_service_class()
+
+    report: Dict[str, Any] = {
+        'meta': {
+            'data_version': data.get('version'),
+            'repeat': 1 if record else repeat,
+            'concurrency': concurrency,
+            'llm_latency_ms': round(llm_latency * 1000),
+            'mode': 'record' if record else 'replay',
+            'recordings': len(recordings),
+            'python': platform.python_version(),
+        },
+        'evaluators': {},
+        'skipped': {},
+        'cases': {},
+    }
+
+    semaphore = asyncio.Semaphore(concurrency)
+    for task_type in sorted(cases_by_task):
+        if only and task_type not in only:
+            continue
+        spec = EVALUATORS.get(task_type)
+        if spec is None:
+            report['skipped'][task_type] = UNSUPPORTED.get(task_type, 'нет описания проверщика в бенчмарке')
+            continue
+
+        module = importlib.import_module(spec.module)
+        if record:
+            _install_service_factory(module, _make_recording_factory(ai_service.create_ai_service, recordings))
+        else:
+            _install_service_factory(module, lambda config: replay_class(config, recordings, llm_latency))
+
+        evaluator = getattr(module, spec.class_name)()
+        _instrument_fallback(evaluator, spec.fallback_method)
+
+        cases = cases_by_task[task_type] * (1 if record else repeat)
+        started = time.perf_counter()
+        runs = await asyncio.gather(*(
+            asyncio.create_task(_run_case(spec, evaluator, case, semaphore)) for case in cases
+        ))
+        wall = time.perf_counter() - started
+
+        report['evaluators'][task_type] = _summarize(spec, runs, wall)
+        for run in runs:
+            report['cases'][run['case_id']] = {'expected': run['expected'], 'score': run['score']}
+
+    if record and recordings_path:
+        with open(recordings_path, 'w', encoding='utf-8') as f:
+            json.dump(recordings, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    return report
+
+
+def _format_optional(value: Optional[float], spec: str, width: int) -> str:
+    return f"{'n/a':>{width}}" if value is None else f"{value:>{width}{spec}}"
+
+
+def print_report(report: dict):
+    print(f"{'Задание':<8} {'Кейсов':>6} {'Прогонов':>8} {'в сек':>8} {'p50, мс':>8} {'p95, мс':>8} "
+          f"{'Токенов':>8} {'Fallback':>8} {'Записано':>8} {'Точно':>6} {'MAE':>5}")
+    for task_type, stats in sorted(report['evaluators'].items()):
+        agreement = stats['agreement']
+        print(
+            f"{task_type:<8} {stats['cases']:>6} {stats['runs']:>8} {stats['throughput_per_s']:>8} "
+            f"{stats['latency_ms']['p50']:>8.2f} {stats['latency_ms']['p95']:>8.2f} "
+            f"{stats['prompt_tokens_est']['mean']:>8} {stats['fallback_rate']:>8.0%} "
+            f"{stats['responses']['recorded']:>8} "
+            f"{_format_optional(agreement['exact'], '.0%', 6)} {_format_optional(agreement['mae'], '.2f', 5)}"
+        )
+    for task_type, reason in sorted(report['skipped'].items()):
+        print(f"{task_type:<8} пропущено: {reason}")
+    if report['meta']['mode'] == 'replay' and not report['meta']['recordings']:
+        print("\nЗаписанных ответов нет: ответы синтезированы из баллов бота, согласие не измерялось "
+              "(запишите их через --record)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк AI-проверщиков")
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--recordings', default=DEFAULT_RECORDINGS, help="Записанные ответы модели по id кейса")
+    parser.add_argument('--repeat', type=int, default=5, help="Прогонов каждого кейса")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help="Имитация задержки модели")
+    parser.add_argument('--tasks', nargs='+', help="Только эти задания (task19 task20 ...)")
+    parser.add_argument('--record', action='store_true', help="Вызывать настоящую модель и записать ответы")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчет")
+    args = parser.parse_args()
+
+    # Логи проверщиков (в т.ч. ожидаемые fallback) не мешают таблице
+    logging.basicConfig(level=logging.ERROR)
+
+    report = await run_benchmark(
+        data_path=args.data,
+        recordings_path=args.recordings,
+        repeat=args.repeat,
+        concurrency=args.concurrency,
+        llm_latency=args.llm_latency_ms / 1000,
+        record=args.record,
+        only=args.tasks,
+    )
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"\nОтчет: {args.output}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
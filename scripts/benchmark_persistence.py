@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Сравнение времени записи PicklePersistence и SQLitePersistence
+в зависимости от числа пользователей.
+
+Моделируется один цикл Application.update_persistence: изменились
+--dirty пользователей, для каждого вызывается update_user_data
+(одновременно, через asyncio.gather — как в Application).
+
+  python scripts/benchmark_persistence.py
+  python scripts/benchmark_persistence.py --users 1000 10000 50000 --dirty 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.ext import PicklePersistence
+
+from core.sqlite_persistence import SQLitePersistence
+
+
+def make_user_data(user_id: int, rng: random.Random) -> dict:
+    """user_data, похожий на реальный: прогресс, последние ответы, выбранный режим."""
+    return {
+        'current_module': rng.choice(['task19', 'task20', 'task24', 'task25']),
+        'practice_stats': {f'topic_{i}': {'attempts': rng.randint(0, 30), 'scores': [
+            rng.randint(0, 3) for _ in range(rng.randint(0, 10))
+        ]} for i in range(rng.randint(1, 15))},
+        'last_answer': 'ответ ' * rng.randint(5, 60),
+        'viewed': list(range(rng.randint(0, 40))),
+        'user_id': user_id,
+    }
+
+
+async def flush_cycle(persistence, dirty: dict) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(persistence.update_user_data(uid, data) for uid, data in dirty.items()))
+    return time.perf_counter() - start
+
+
+async def bench(users: int, dirty_count: int, tmpdir: str) -> dict:
+    rng = random.Random(users)
+    all_data = {uid: make_user_data(uid, rng) for uid in range(users)}
+    dirty_ids = rng.sample(range(users), min(dirty_count, users))
+    dirty = {uid: {**all_data[uid], 'last_answer': 'новый ответ'} for uid in dirty_ids}
+
+    # PicklePersistence: файл со всеми пользователями
+    pickle_path = os.path.join(tmpdir, f'bench_{users}.pickle')
+    pickle_persistence = PicklePersistence(filepath=pickle_path)
+    await pickle_persistence.get_user_data()
+    pickle_persistence.user_data.update(all_data)
+    pickle_persistence._dump_singlefile()
+    pickle_time = await flush_cycle(pickle_persistence, dirty)
+    pickle_size = os.path.getsize(pickle_path)
+
+    # SQLitePersistence: по строке на пользователя
+    db_path = os.path.join(tmpdir, f'bench_{users}.db')
+    sqlite_persistence = SQLitePersistence(db_path)
+    sqlite_persistence._pending.update({('user', uid): data for uid, data in all_data.items()})
+    sqlite_persistence._loaded_users.update(all_data)
+    await sqlite_persistence._write_pending()
+    sqlite_time = await flush_cycle(sqlite_persistence, dirty)
+    await sqlite_persistence.flush()
+    db_size = os.path.getsize(db_path)
+
+    return {
+        'users': users,
+        'pickle_ms': pickle_time * 1000,
+        'sqlite_ms': sqlite_time * 1000,
+        'pickle_mb': pickle_size / 2 ** 20,
+        'sqlite_mb': db_size / 2 ** 20,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк записи persistence")
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--dirty', type=int, default=50, help="Измененных пользователей за цикл")
+    args = parser.parse_args()
+
+    print(f"Изменено пользователей за цикл: {args.dirty}")
+    print(f"{'Пользователей':>14} {'Pickle, мс':>12} {'SQLite, мс':>12} {'Pickle, МБ':>11} {'SQLite, МБ':>11}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for users in args.users:
+            r = await bench(users, args.dirty, tmpdir)
+            print(f"{r['users']:>14} {r['pickle_ms']:>12.1f} {r['sqlite_ms']:>12.1f} "
+                  f"{r['pickle_mb']:>11.1f} {r['sqlite_mb']:>11.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
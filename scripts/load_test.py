@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный стенд: настоящее приложение бота против фейкового Telegram.
+
+Application собирается через core.app.build_application со всеми
+плагинами (post_init -> plugin_loader.load_modules), но HTTP-транспорт
+Bot API подменен на FakeTelegramRequest: он в памяти принимает
+sendMessage / editMessageText / answerCallbackQuery и остальные методы и
+помнит последние сообщения бота в каждом чате — по их кнопкам
+виртуальные ученики и «нажимают» дальше.
+
+Сценарии лежат в scripts/load_scenarios/*.json: шаги /команд, текста и
+нажатий кнопок по регулярному выражению. Апдейты идут через update_queue,
+как при polling, — значит, обрабатываются так же последовательно, как в
+бою. LLM в проверке задания 19 заменен заглушкой с настраиваемой задержкой.
+
+Отчет: апдейтов в секунду, задержка апдейта (ожидание в очереди +
+обработка), задержки обработчиков и запросов к БД (core.latency_metrics),
+повторы и ошибки из-за блокировки БД, рост памяти процесса.
+
+  python scripts/load_test.py --users 1000 --duration 120
+  python scripts/load_test.py --users 50 --scenarios menu_navigation task19_submission --output load.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+from telegram.request import BaseRequest, RequestData
+
+# Добавляем корень проекта в PYTHONPATH
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+SCENARIOS_DIR = os.path.join(PROJECT_ROOT, 'scripts', 'load_scenarios')
+
+FAKE_TOKEN = '123456:LOAD-TEST-TOKEN'
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'LoadTestBot', 'username': 'load_test_bot'}
+FIRST_USER_ID = 10_000_000
+# Сколько последних сообщений бота в чате помнит фейковый Telegram
+MESSAGES_PER_CHAT = 5
+
+# Ответ заглушки LLM для задания 19 (формат Task19AIEvaluator)
+TASK19_STUB_RESPONSE = json.dumps({
+    'score': 2,
+    'valid_examples_count': 2,
+    'total_examples': 3,
+    'penalty_applied': False,
+    'valid_examples': [{'number': 1, 'why_valid': 'конкретный пример'}, {'number': 2, 'why_valid': 'конкретный пример'}],
+    'invalid_examples': [{'number': 3, 'why_invalid': 'общее рассуждение', 'improvement': 'добавьте конкретику'}],
+    'feedback': 'Ответ нагрузочного теста.',
+    'suggestions': [],
+    'factual_errors': [],
+}, ensure_ascii=False)
+
+
+# ============================================================
+# ФЕЙКОВЫЙ TELEGRAM
+# ============================================================
+
+class FakeTelegramRequest(BaseRequest):
+    """Транспорт Bot API в памяти: отвечает как Telegram и запоминает сообщения бота."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids: Counter = Counter()
+        # chat_id -> {message_id: сообщение} последних сообщений бота (новые в конце)
+        self.messages: Dict[int, Dict[int, Dict[str, Any]]] = {}
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return 5.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        **kwargs
+    ) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        params = request_data.parameters if request_data else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result = self._handle(api_method, params)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def _message(self, chat_id: int, message_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Load'},
+            'from': BOT_USER,
+            'text': params.get('text') or params.get('caption') or '',
+        }
+        if params.get('reply_markup'):
+            message['reply_markup'] = params['reply_markup']
+        return message
+
+    def _remember(self, chat_id: int, message: Dict[str, Any]):
+        chat = self.messages.setdefault(chat_id, {})
+        chat.pop(message['message_id'], None)
+        chat[message['message_id']] = message
+        while len(chat) > MESSAGES_PER_CHAT:
+            del chat[next(iter(chat))]
+
+    def recent_messages(self, chat_id: int) -> List[Dict[str, Any]]:
+        """Сообщения бота в чате, от последнего к более ранним."""
+        return list(reversed(self.messages.get(chat_id, {}).values()))
+
+    def _handle(self, api_method: str, params: Dict[str, Any]) -> Any:
+        if api_method == 'getMe':
+            return {**BOT_USER, 'can_join_groups': False, 'can_read_all_group_messages': False,
+                    'supports_inline_queries': False}
+
+        if api_method == 'getChatMember':
+            return {'status': 'member', 'user': {'id': params.get('user_id'), 'is_bot': False, 'first_name': 'Load'}}
+
+        if api_method.startswith('send') and api_method != 'sendChatAction' and 'chat_id' in params:
+            chat_id = int(params['chat_id'])
+            self._message_ids[chat_id] += 1
+            message = self._message(chat_id, self._message_ids[chat_id], params)
+            self._remember(chat_id, message)
+            return message
+
+        if api_method.startswith('edit') and 'chat_id' in params:
+            chat_id = int(params['chat_id'])
+            message_id = int(params['message_id'])
+            previous = self.messages.get(chat_id, {}).get(message_id, {})
+            merged = {'text': previous.get('text', ''), 'reply_markup': previous.get('reply_markup'), **params}
+            if api_method == 'editMessageText' and 'reply_markup' not in params:
+                # Telegram убирает клавиатуру, если в editMessageText ее не передали
+                merged.pop('reply_markup', None)
+            message = self._message(chat_id, message_id, merged)
+            self._remember(chat_id, message)
+            return message
+
+        if api_method == 'deleteMessage' and 'chat_id' in params:
+            self.messages.get(int(params['chat_id']), {}).pop(int(params['message_id']), None)
+            return True
+
+        # answerCallbackQuery, sendChatAction, setMyCommands и т.п.
+        return True
+
+
+# ============================================================
+# ВИРТУАЛЬНЫЕ УЧЕНИКИ
+# ============================================================
+
+class LoadStats:
+    def __init__(self):
+        self.updates = 0
+        self.update_latencies: List[float] = []
+        self.timeouts = 0
+        self.click_misses: Counter = Counter()
+        self.scenario_runs: Counter = Counter()
+
+
+def _make_application_class():
+    from telegram.ext import Application
+
+    class LoadTestApplication(Application):
+        """Application, сообщающий стенду о завершении обработки каждого апдейта."""
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.pending: Dict[int, Tuple[float, asyncio.Future]] = {}
+
+        async def process_update(self, update: object) -> None:
+            try:
+                await super().process_update(update)
+            finally:
+                entry = self.pending.pop(getattr(update, 'update_id', None), None)
+                if entry is not None and not entry[1].done():
+                    entry[1].set_result(time.perf_counter() - entry[0])
+
+    return LoadTestApplication
+
+
+class VirtualUser:
+    """Ученик, проходящий сценарий: отправляет апдейты и ждет их обработки."""
+
+    _update_ids = iter(range(1, 10 ** 9))
+
+    def __init__(self, user_id: int, application, fake: FakeTelegramRequest, stats: LoadStats, rng: random.Random):
+        self.user_id = user_id
+        self.application = application
+        self.fake = fake
+        self.stats = stats
+        self.rng = rng
+        self.message_id = 0
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f'Load{user_id}', 'language_code': 'ru'}
+
+    def _chat(self) -> Dict[str, Any]:
+        return {'id': self.user_id, 'type': 'private', 'first_name': self.user['first_name']}
+
+    async def _send(self, payload: Dict[str, Any], timeout: float = 60.0):
+        from telegram import Update
+
+        update_id = next(self._update_ids)
+        update = Update.de_json({'update_id': update_id, **payload}, self.application.bot)
+        future = asyncio.get_running_loop().create_future()
+        self.application.pending[update_id] = (time.perf_counter(), future)
+        await self.application.update_queue.put(update)
+        try:
+            latency = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.application.pending.pop(update_id, None)
+            self.stats.timeouts += 1
+            return
+        self.stats.updates += 1
+        self.stats.update_latencies.append(latency)
+
+    async def send_text(self, text: str):
+        self.message_id += 1
+        message = {
+            'message_id': self.message_id,
+            'date': int(time.time()),
+            'chat': self._chat(),
+            'from': self.user,
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        await self._send({'message': message})
+
+    async def send_callback(self, data: str, message: Optional[Dict[str, Any]] = None):
+        if message is None:
+            recent = self.fake.recent_messages(self.user_id)
+            message = recent[0] if recent else {
+                'message_id': 1, 'date': int(time.time()), 'chat': self._chat(), 'from': BOT_USER, 'text': ''
+            }
+        await self._send({'callback_query': {
+            'id': f'{self.user_id}-{time.monotonic_ns()}',
+            'from': self.user,
+            'chat_instance': str(self.user_id),
+            'message': {**message, 'date': int(time.time())},
+            'data': data,
+        }})
+
+    def find_button(self, pattern: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Кнопка, подходящая под pattern, в последнем сообщении бота, где такая есть."""
+        for message in self.fake.recent_messages(self.user_id):
+            keyboard = (message.get('reply_markup') or {}).get('inline_keyboard', [])
+            matching = [
+                button['callback_data']
+                for row in keyboard for button in row
+                if button.get('callback_data') and re.search(pattern, button['callback_data'])
+            ]
+            if matching:
+                return self.rng.choice(matching), message
+        return None, None
+
+    async def run_steps(self, steps: List[Dict[str, Any]], scenario: Dict[str, Any]):
+        think_min, think_max = scenario.get('think_time_ms', [200, 1000])
+        for step in steps:
+            if 'repeat' in step:
+                for _ in range(step['repeat']):
+                    if not await self.run_steps(step['steps'], scenario):
+                        return False
+                continue
+
+            if 'command' in step:
+                await self.send_text(step['command'])
+            elif 'text' in step:
+                text = step['text']
+                await self.send_text(self.rng.choice(text) if isinstance(text, list) else text)
+            elif 'callback' in step:
+                await self.send_callback(step['callback'])
+            elif 'click' in step:
+                data, message = self.find_button(step['click'])
+                if data is None:
+                    self.stats.click_misses[f"{scenario['name']}: {step['click']}"] += 1
+                    if step.get('optional'):
+                        continue
+                    return False
+                await self.send_callback(data, message)
+
+            await asyncio.sleep(self.rng.uniform(think_min, think_max) / 1000)
+        return True
+
+
+# ============================================================
+# СБОР МЕТРИК
+# ============================================================
+
+class LockCounter(logging.Handler):
+    """Считает повторы и ошибки из-за блокировки SQLite по логам."""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.retries = 0
+        self.errors = 0
+
+    def emit(self, record: logging.LogRecord):
+        message = record.getMessage()
+        if 'БД заблокирована' in message:
+            self.retries += 1
+        elif 'database is locked' in message or (
+            record.exc_info and 'database is locked' in str(record.exc_info[1])
+        ):
+            self.errors += 1
+
+
+def _percentiles_ms(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': pick(1.0)}
+
+
+def _histogram_summary(histogram, limit: int) -> List[Dict[str, Any]]:
+    rows = []
+    for labels in sorted(histogram.series(), key=histogram.count, reverse=True)[:limit]:
+        rows.append({
+            'labels': ' '.join(labels),
+            'count': histogram.count(labels),
+            'p50_ms': round(histogram.quantile(labels, 0.5) * 1000, 2),
+            'p95_ms': round(histogram.quantile(labels, 0.95) * 1000, 2),
+            'p99_ms': round(histogram.quantile(labels, 0.99) * 1000, 2),
+        })
+    return rows
+
+
+def load_scenarios(names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    scenarios = []
+    for path in sorted(glob.glob(os.path.join(SCENARIOS_DIR, '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            scenario = json.load(f)
+        scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+        if not names or scenario['name'] in names:
+            scenarios.append(scenario)
+    if not scenarios:
+        raise SystemExit(f"Сценарии не найдены в {SCENARIOS_DIR}")
+    return scenarios
+
+
+# ============================================================
+# ПРОГОН
+# ============================================================
+
+def _stub_llm(latency: float):
+    """Подменяет AI-сервис проверки задания 19 заглушкой без сети."""
+    import task19.evaluator as task19_evaluator
+    from core.ai_service import ClaudeService
+
+    class StubLLMService(ClaudeService):
+        async def get_completion(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+            await asyncio.sleep(latency)
+            return {'success': True, 'text': TASK19_STUB_RESPONSE, 'usage': {}, 'model_version': 'load-test-stub'}
+
+    task19_evaluator.create_ai_service = StubLLMService
+
+
+async def run_load_test(
+    users: int,
+    duration: float,
+    scenarios: List[Dict[str, Any]],
+    ramp_up: float = 10.0,
+    api_latency: float = 0.03,
+    llm_latency: float = 2.0,
+    seed: int = 1,
+    workdir: Optional[str] = None,
+) -> Dict[str, Any]:
+    import flashcards.handlers
+    from core import db
+    from core.app import build_application
+    from core.latency_metrics import DB_LATENCY, HANDLER_LATENCY
+    from core.sqlite_persistence import SQLitePersistence
+    from telegram.ext import PersistenceInput
+
+    if workdir:
+        # Экспорт колод для WebApp пишет в каталог проекта, а не в БД —
+        # перенаправляем его в каталог стенда
+        flashcards.handlers.WEBAPP_JSON_PATH = os.path.join(workdir, 'flashcards-data.json')
+
+    lock_counter = LockCounter()
+    logging.getLogger().addHandler(lock_counter)
+
+    fake = FakeTelegramRequest(latency=api_latency)
+    persistence = SQLitePersistence(
+        os.environ['PERSISTENCE_DATABASE_FILE'],
+        update_interval=30,
+        store_data=PersistenceInput(bot_data=False),
+    )
+    application = build_application(
+        token=FAKE_TOKEN,
+        request=fake,
+        get_updates_request=FakeTelegramRequest(),
+        persistence=persistence,
+        application_class=_make_application_class(),
+    )
+
+    process = psutil.Process()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    _stub_llm(llm_latency)
+    await application.start()
+
+    rss_start = process.memory_info().rss
+    rss_peak = rss_start
+    stats = LoadStats()
+    weights = [scenario.get('weight', 1) for scenario in scenarios]
+    deadline = time.perf_counter() + duration
+
+    async def student(index: int):
+        rng = random.Random(seed * 1_000_003 + index)
+        await asyncio.sleep(ramp_up * index / max(users, 1))
+        user = VirtualUser(FIRST_USER_ID + index, application, fake, stats, rng)
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            stats.scenario_runs[scenario['name']] += 1
+            await user.run_steps(scenario['steps'], scenario)
+
+    async def sample_memory():
+        nonlocal rss_peak
+        while time.perf_counter() < deadline:
+            rss_peak = max(rss_peak, process.memory_info().rss)
+            await asyncio.sleep(1)
+
+    started = time.perf_counter()
+    await asyncio.gather(sample_memory(), *(student(i) for i in range(users)))
+    wall = time.perf_counter() - started
+    rss_end = process.memory_info().rss
+    rss_peak = max(rss_peak, rss_end)
+
+    await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+    await application.shutdown()
+    await db.close_db()
+    logging.getLogger().removeHandler(lock_counter)
+
+    mb = 2 ** 20
+    return {
+        'config': {
+            'users': users,
+            'duration_s': duration,
+            'ramp_up_s': ramp_up,
+            'api_latency_ms': round(api_latency * 1000),
+            'llm_latency_ms': round(llm_latency * 1000),
+            'scenarios': [scenario['name'] for scenario in scenarios],
+        },
+        'updates': stats.updates,
+        'updates_per_s': round(stats.updates / wall, 2),
+        'update_latency_ms': _percentiles_ms(stats.update_latencies),
+        'update_timeouts': stats.timeouts,
+        'scenario_runs': dict(stats.scenario_runs),
+        'click_misses': dict(stats.click_misses.most_common()),
+        'api_calls': dict(fake.calls.most_common()),
+        'db_lock_retries': lock_counter.retries,
+        'db_lock_errors': lock_counter.errors,
+        'memory_mb': {
+            'start': round(rss_start / mb, 1),
+            'peak': round(rss_peak / mb, 1),
+            'end': round(rss_end / mb, 1),
+            'growth': round((rss_end - rss_start) / mb, 1),
+        },
+        'handlers': _histogram_summary(HANDLER_LATENCY, 25),
+        'db_queries': _histogram_summary(DB_LATENCY, 15),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    config = report['config']
+    print(f"\nУчеников: {config['users']}, {config['duration_s']:.0f} с, сценарии: {', '.join(config['scenarios'])}")
+    print(f"Апдейтов: {report['updates']} ({report['updates_per_s']}/с), таймаутов: {report['update_timeouts']}")
+    latency = report['update_latency_ms']
+    if latency:
+        print(f"Задержка апдейта, мс: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"Блокировки БД: повторов {report['db_lock_retries']}, ошибок {report['db_lock_errors']}")
+    memory = report['memory_mb']
+    print(f"Память, МБ: {memory['start']} -> {memory['end']} (пик {memory['peak']}, рост {memory['growth']:+})")
+    print(f"Запросы к Bot API: {report['api_calls']}")
+    if report['click_misses']:
+        print(f"Кнопка не найдена: {report['click_misses']}")
+
+    print(f"\n{'Обработчик':<70} {'Вызовов':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for row in report['handlers']:
+        label = row['labels'] if len(row['labels']) <= 70 else '…' + row['labels'][-69:]
+        print(f"{label:<70} {row['count']:>8} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с фейковым Telegram")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=60.0, help="Длительность, с")
+    parser.add_argument('--ramp-up', type=float, default=10.0, help="Время подключения всех учеников, с")
+    parser.add_argument('--scenarios', nargs='+', help="Имена сценариев из scripts/load_scenarios")
+    parser.add_argument('--api-latency-ms', type=float, default=30.0, help="Задержка ответа фейкового Telegram")
+    parser.add_argument('--llm-latency-ms', type=float, default=2000.0, help="Задержка заглушки LLM")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="Каталог для БД и файлов стенда (по умолчанию временный)")
+    parser.add_argument('--output', help="Куда сохранить JSON-отчет")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format='%(levelname)s %(name)s: %(message)s')
+    scenarios = load_scenarios(args.scenarios)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bot-load-')
+    # Конфиг читается при импорте core.config — БД стенда задаем до импорта бота
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': FAKE_TOKEN,
+        'DATABASE_FILE': os.path.join(workdir, 'quiz_async.db'),
+        'STORAGE_DATABASE_FILE': os.path.join(workdir, 'fsm_storage.db'),
+        'PERSISTENCE_DATABASE_FILE': os.path.join(workdir, 'bot_persistence.db'),
+        'ANALYTICS_SNAPSHOT_FILE': os.path.join(workdir, 'quiz_async.db.snapshot'),
+        'AI_PROVIDER': 'claude',
+        'ANTHROPIC_API_KEY': 'load-test-offline',
+    })
+    for variable in ('TINKOFF_TERMINAL_KEY', 'TINKOFF_SECRET_KEY', 'ANTHROPIC_PROXY_URL', 'ANTHROPIC_HTTP_PROXY'):
+        os.environ.pop(variable, None)
+
+    report = asyncio.run(run_load_test(
+        users=args.users,
+        duration=args.duration,
+        scenarios=scenarios,
+        ramp_up=args.ramp_up,
+        api_latency=args.api_latency_ms / 1000,
+        llm_latency=args.llm_latency_ms / 1000,
+        seed=args.seed,
+        workdir=workdir,
+    ))
+    print_report(report)
+    print(f"\nБД стенда: {workdir}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Отчет: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
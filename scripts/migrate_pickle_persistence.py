@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Однократный перенос данных бота из bot_persistence.pickle (PicklePersistence)
+в SQLite-хранилище (core.sqlite_persistence).
+
+Запускать при остановленном боте:
+  python scripts/migrate_pickle_persistence.py
+  python scripts/migrate_pickle_persistence.py --pickle old.pickle --db bot_persistence.db
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Добавляем корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import PERSISTENCE_DATABASE_FILE
+from core.sqlite_persistence import migrate_from_pickle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос PicklePersistence в SQLite")
+    parser.add_argument('--pickle', default='bot_persistence.pickle', help="Файл PicklePersistence")
+    parser.add_argument('--db', default=PERSISTENCE_DATABASE_FILE, help="Файл SQLite")
+    parser.add_argument('--force', action='store_true', help="Перезаписать данные в существующей БД")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pickle):
+        print(f"Файл {args.pickle} не найден")
+        sys.exit(1)
+    if os.path.exists(args.db) and not args.force:
+        print(f"БД {args.db} уже существует. Используйте --force, чтобы перенести данные поверх.")
+        sys.exit(1)
+
+    counts = asyncio.run(migrate_from_pickle(args.pickle, args.db))
+    print(f"Перенесено в {args.db}:")
+    for kind, count in counts.items():
+        print(f"  {kind}: {count}")
+    print(f"Файл {args.pickle} можно удалить после проверки работы бота.")
+
+
+if __name__ == '__main__':
+    main()
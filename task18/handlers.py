@@ -22,6 +22,7 @@ from core.ui_helpers import (
     get_personalized_greeting,
     show_ai_evaluation_animation,
     show_streak_notification,
+    stop_thinking_animation,
 )
 from core.utils import safe_edit_message
 
@@ -341,7 +342,7 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Удалить анимацию
     try:
-        await thinking_msg.delete()
+        await stop_thinking_animation(thinking_msg)
     except Exception:
         pass
 
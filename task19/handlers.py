@@ -29,6 +29,8 @@ from core.ui_helpers import (
     show_thinking_animation,
     show_extended_thinking_animation,
     show_streak_notification,
+    stop_thinking_animation,
+    finish_thinking_animation,
     show_ai_evaluation_animation,
     get_personalized_greeting,
     get_motivational_message,
@@ -819,7 +821,8 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
             [InlineKeyboardButton("📝 В меню", callback_data="t19_menu")]
         ])
 
-        await thinking_msg.edit_text(
+        await finish_thinking_animation(
+            thinking_msg,
             f"{new_limit_display}\n\n{feedback_text}",
             reply_markup=after_check_keyboard,
             parse_mode=ParseMode.HTML
@@ -841,7 +844,7 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         
     except Exception as e:
         logger.error(f"Error in handle_answer: {e}")
-        await thinking_msg.delete()
+        await stop_thinking_animation(thinking_msg)
         
         await update.message.reply_text(
             "❌ Произошла ошибка при проверке. Попробуйте еще раз.",
@@ -2012,7 +2015,8 @@ async def handle_confirm_ocr(update: Update, context: ContextTypes.DEFAULT_TYPE)
             [InlineKeyboardButton("📝 В меню", callback_data="t19_menu")]
         ])
 
-        await thinking_msg.edit_text(
+        await finish_thinking_animation(
+            thinking_msg,
             f"{new_limit_display}\n\n{feedback_text}",
             reply_markup=after_check_keyboard,
             parse_mode=ParseMode.HTML
@@ -2030,7 +2034,7 @@ async def handle_confirm_ocr(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     except Exception as e:
         logger.error(f"Error in handle_confirm_ocr: {e}")
-        await thinking_msg.delete()
+        await stop_thinking_animation(thinking_msg)
 
         await query.message.reply_text(
             "❌ Произошла ошибка при проверке. Попробуйте еще раз.",
@@ -18,6 +18,7 @@ from core.universal_ui import UniversalUIComponents, AdaptiveKeyboards, MessageF
 from core.ui_helpers import (
     show_thinking_animation,
     show_streak_notification,
+    stop_thinking_animation,
     show_extended_thinking_animation,
     show_ai_evaluation_animation,
     get_personalized_greeting,
@@ -979,7 +980,7 @@ async def safe_handle_answer_task20(update: Update, context: ContextTypes.DEFAUL
             }, topic, user_answer)
         
         # Удаляем анимацию
-        await thinking_msg.delete()
+        await stop_thinking_animation(thinking_msg)
 
         # FREEMIUM: Расходуем AI-проверку
         await freemium_manager.use_ai_check(user_id, module_code)
@@ -1062,7 +1063,7 @@ async def safe_handle_answer_task20(update: Update, context: ContextTypes.DEFAUL
         
         # Пытаемся удалить анимацию
         try:
-            await thinking_msg.delete()
+            await stop_thinking_animation(thinking_msg)
         except:
             pass
         
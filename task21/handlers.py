@@ -27,6 +27,7 @@ from core.ui_helpers import (
     get_personalized_greeting,
     get_motivational_message,
     show_streak_notification,
+    stop_thinking_animation,
 )
 from core.streak_manager import get_streak_manager
 
@@ -393,7 +394,7 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Удаляем анимацию
     try:
-        await thinking_msg.delete()
+        await stop_thinking_animation(thinking_msg)
     except Exception:
         pass
 
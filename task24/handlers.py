@@ -22,6 +22,7 @@ from core.ui_helpers import (
     show_thinking_animation,
     show_extended_thinking_animation,  # Добавить
     show_streak_notification,
+    stop_thinking_animation,
     get_personalized_greeting,
     get_motivational_message,
     create_visual_progress
@@ -30,6 +31,7 @@ from core.plugin_loader import build_main_menu
 from core.state_validator import validate_state_transition, state_validator
 import math
 from core.error_handler import safe_handler, auto_answer_callback
+from core.sqlite_persistence import delete_user_data
 
 
 logger = logging.getLogger(__name__)
@@ -984,7 +986,7 @@ async def handle_plan_enhanced(update: Update, context: ContextTypes.DEFAULT_TYP
         
         # Удаляем сообщение "Анализирую..."
         try:
-            await thinking_msg.delete()
+            await stop_thinking_animation(thinking_msg)
         except Exception as e:
             logger.debug(f"Failed to delete thinking message: {e}")
         
@@ -1023,7 +1025,7 @@ async def handle_plan_enhanced(update: Update, context: ContextTypes.DEFAULT_TYP
         
         # Удаляем сообщение "Анализирую..."
         try:
-            await thinking_msg.delete()
+            await stop_thinking_animation(thinking_msg)
         except Exception as e2:
             logger.debug(f"Failed to delete thinking message: {e2}")
         
@@ -1886,10 +1888,10 @@ async def force_reset_user_progress(update: Update, context: ContextTypes.DEFAUL
     # Эта функция автоматически проверит права админа
     user_id = int(update.callback_query.data.split(":")[-1])
     
-    # Сброс данных пользователя
-    if user_id in context.application.user_data:
-        context.application.user_data[user_id].clear()
-    pass  # или можно добавить логирование
+    # Сброс данных пользователя: в памяти есть только пользователи, писавшие
+    # боту после запуска, поэтому удаляем и сохраненные данные
+    await delete_user_data(context.application, user_id)
+    logger.info(f"Admin {update.effective_user.id} reset progress of user {user_id}")
 
 @safe_handler()
 async def export_progress(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -30,6 +30,7 @@ from core.ui_helpers import (
     show_extended_thinking_animation,
     show_ai_evaluation_animation,
     show_streak_notification,
+    stop_thinking_animation,
     get_personalized_greeting,
     get_motivational_message,
     create_visual_progress
@@ -960,7 +961,7 @@ async def safe_handle_answer_task25(update: Update, context: ContextTypes.DEFAUL
             score = _estimate_score(user_answer)
         
         # Удаляем анимацию
-        await thinking_msg.delete()
+        await stop_thinking_animation(thinking_msg)
 
         # Регистрируем использование AI-проверки
         if freemium_manager:
@@ -1030,7 +1031,7 @@ async def safe_handle_answer_task25(update: Update, context: ContextTypes.DEFAUL
         
     except Exception as e:
         logger.error(f"Error in handle_answer: {e}")
-        await thinking_msg.delete()
+        await stop_thinking_animation(thinking_msg)
         await update.message.reply_text(
             "❌ Произошла ошибка при проверке. Попробуйте еще раз.",
             reply_markup=InlineKeyboardMarkup([[
@@ -17,6 +17,9 @@ from typing import Dict, List, Optional, Tuple, Any
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
+from core import session_state
+from core.progress_reporter import ProgressReporter
+
 from ..states import TeacherStates
 from ..services import quick_check_service
 from ..services.ai_homework_evaluator import evaluate_homework_answer
@@ -31,6 +34,8 @@ logger = logging.getLogger(__name__)
 
 # Максимальное число учеников в пакетном режиме
 MAX_BATCH_STUDENTS = 30
+# Результаты пакетной проверки хранятся вне user_data (core.session_state) сутки
+BATCH_RESULTS_TTL = 24 * 3600
 
 # Названия заданий
 TASK_NAMES = {
@@ -51,17 +56,19 @@ TASK_MODULES = {
 }
 
 
-def _clear_vc_data(context: ContextTypes.DEFAULT_TYPE):
+async def _clear_vc_data(context: ContextTypes.DEFAULT_TYPE):
     """Очищает данные проверки варианта из контекста."""
     keys_to_clear = [
         'vc_source', 'vc_variant_data', 'vc_selected_tasks',
         'vc_keys', 'vc_current_task_idx', 'vc_student_answers',
-        'vc_results', 'vc_batch_results', 'vc_mode',
+        'vc_results', 'vc_mode',
         'vc_entering_keys_idx', 'vc_student_name',
         'vc_part1_keys', 'vc_part1_answers',
     ]
     for key in keys_to_clear:
         context.user_data.pop(key, None)
+    # Результаты пакетной проверки лежат в session_blobs — удаляем и их
+    await session_state.pop_blob(context.user_data, 'vc_batch_results')
 
 
 # ============================================
@@ -87,7 +94,7 @@ async def variant_check_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return TeacherStates.QUICK_CHECK_MENU
 
-    _clear_vc_data(context)
+    await _clear_vc_data(context)
 
     text = (
         "📋 <b>Проверка варианта</b>\n\n"
@@ -1199,7 +1206,7 @@ async def select_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
     mode = query.data.replace("vc_mode_", "")
     context.user_data['vc_mode'] = mode
-    context.user_data['vc_batch_results'] = []
+    await session_state.put_blob(context.user_data, 'vc_batch_results', [], ttl=BATCH_RESULTS_TTL)
     context.user_data['vc_student_answers'] = {}
     context.user_data['vc_current_task_idx'] = 0
 
@@ -1219,7 +1226,7 @@ async def _prompt_for_student_answers(
     selected = context.user_data.get('vc_selected_tasks', [])
     idx = context.user_data.get('vc_current_task_idx', 0)
     mode = context.user_data.get('vc_mode', 'single')
-    batch_results = context.user_data.get('vc_batch_results', [])
+    batch_results = await session_state.get_blob(context.user_data, 'vc_batch_results', [])
 
     student_num = len(batch_results) + 1 if mode == 'batch' else None
 
@@ -1570,7 +1577,8 @@ async def _run_evaluation(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     # Отправляем сообщение о начале проверки
     msg = update.callback_query.message if update.callback_query else update.message
-    progress_msg = await msg.reply_text(
+    progress = await ProgressReporter.send(
+        msg,
         f"⏳ <b>Проверяю вариант...</b>\n\n"
         f"Заданий: {len(tasks_to_check)}\n"
         f"AI-проверка: {len(ai_tasks)} заданий\n\n"
@@ -1582,7 +1590,14 @@ async def _run_evaluation(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     results = {}
     part1_correct = {}
 
-    for task_num in tasks_to_check:
+    for checked, task_num in enumerate(tasks_to_check):
+        if task_num >= 17:
+            progress.update(
+                f"⏳ <b>Проверяю вариант...</b>\n\n"
+                f"Проверено: {checked} из {len(tasks_to_check)}\n"
+                f"Сейчас: задание {task_num} (AI-проверка)"
+            )
+
         answer = answers[task_num]
         key = keys.get(task_num, {})
 
@@ -1616,20 +1631,19 @@ async def _run_evaluation(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # В пакетном режиме: добавляем к списку результатов
     mode = context.user_data.get('vc_mode', 'single')
     if mode == 'batch':
-        batch_results = context.user_data.get('vc_batch_results', [])
+        batch_results = await session_state.get_blob(context.user_data, 'vc_batch_results', [])
         batch_results.append({
             'student_num': len(batch_results) + 1,
             'student_name': context.user_data.get('vc_student_name', f'Ученик {len(batch_results) + 1}'),
             'answers': dict(answers),
             'results': dict(results),
         })
-        context.user_data['vc_batch_results'] = batch_results
+        await session_state.put_blob(
+            context.user_data, 'vc_batch_results', batch_results, ttl=BATCH_RESULTS_TTL
+        )
 
     # Удаляем сообщение о прогрессе
-    try:
-        await progress_msg.delete()
-    except Exception:
-        pass
+    await progress.delete()
 
     # Показываем результаты
     return await _show_results(update, context, results)
@@ -1846,7 +1860,7 @@ async def _show_results(
 
     # Пакетный режим: следующий ученик
     if mode == 'batch':
-        batch_results = context.user_data.get('vc_batch_results', [])
+        batch_results = await session_state.get_blob(context.user_data, 'vc_batch_results', [])
         if len(batch_results) < MAX_BATCH_STUDENTS:
             keyboard.append([InlineKeyboardButton(
                 f"👤 Следующий ученик (#{len(batch_results) + 1})",
@@ -1947,7 +1961,7 @@ async def show_batch_summary(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
 
-    batch_results = context.user_data.get('vc_batch_results', [])
+    batch_results = await session_state.get_blob(context.user_data, 'vc_batch_results', [])
     selected = context.user_data.get('vc_selected_tasks', [])
 
     if not batch_results:
@@ -8,7 +8,7 @@ from typing import Dict, List, Any, Optional
 from collections import defaultdict
 from datetime import datetime
 
-from core.db import get_db
+from core.db_snapshot import get_snapshot_db
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +41,7 @@ async def analyze_student_performance(
         Словарь с аналитикой
     """
     try:
-        db = await get_db()
+        db = await get_snapshot_db()
 
         # Получаем все задания от этого учителя для этого ученика
         cursor = await db.execute("""
@@ -220,7 +220,7 @@ async def get_teacher_statistics(teacher_id: int) -> Dict[str, Any]:
         Словарь со статистикой
     """
     try:
-        db = await get_db()
+        db = await get_snapshot_db()
 
         # Получаем количество учеников
         cursor = await db.execute("""
@@ -319,7 +319,7 @@ async def get_homework_statistics(homework_id: int) -> Dict[str, Any]:
         Словарь со статистикой
     """
     try:
-        db = await get_db()
+        db = await get_snapshot_db()
 
         # Получаем информацию о задании
         cursor = await db.execute("""
@@ -430,7 +430,7 @@ async def identify_weak_topics(student_id: int, teacher_id: int = None) -> List[
         Список тем с низкой успеваемостью
     """
     try:
-        db = await get_db()
+        db = await get_snapshot_db()
 
         # Формируем запрос с учетом teacher_id
         if teacher_id:
@@ -507,7 +507,7 @@ async def analyze_group_performance(teacher_id: int) -> Dict[str, Any]:
         Словарь с групповой аналитикой
     """
     try:
-        db = await get_db()
+        db = await get_snapshot_db()
 
         # Получаем всех активных учеников
         cursor = await db.execute("""
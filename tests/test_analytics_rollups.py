@@ -0,0 +1,208 @@
+"""
+Тесты сводных таблиц аналитики (analytics.rollups).
+
+Проверяется паритет с исходными запросами core.db (воронка, когорты)
+и что повторное обновление обрабатывает только новые строки.
+"""
+
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+from analytics import rollups
+from core import db as core_db
+
+
+def _ts(days_ago, hours=0):
+    return (datetime.utcnow() - timedelta(days=days_ago, hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _day(days_ago):
+    return (datetime.utcnow() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+
+
+@pytest_asyncio.fixture
+async def analytics_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'bot.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript("""
+            CREATE TABLE users (user_id INTEGER PRIMARY KEY, first_seen DATETIME, last_activity_date DATE);
+            CREATE TABLE answered_questions (
+                user_id INTEGER NOT NULL, question_id TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (user_id, question_id)
+            );
+            CREATE TABLE user_ai_limits (user_id INTEGER NOT NULL, check_date TEXT, PRIMARY KEY (user_id, check_date));
+            CREATE TABLE subscriptions (user_id INTEGER, is_active INTEGER);
+            CREATE TABLE user_sources (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL UNIQUE,
+                source TEXT, medium TEXT, created_at TIMESTAMP
+            );
+            CREATE TABLE conversions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                conversion_type TEXT NOT NULL, value_rub REAL DEFAULT 0, created_at TIMESTAMP
+            );
+            CREATE TABLE attempts (user_id INTEGER, module_type TEXT, score REAL, created_at TIMESTAMP);
+        """)
+
+    monkeypatch.setattr(core_db, 'DATABASE_FILE', db_path)
+    monkeypatch.setattr(core_db, '_db', None)
+    yield db_path
+    await core_db.close_db()
+
+
+def _populate(db_path, user_ids, rng, max_days_ago=80):
+    with sqlite3.connect(db_path) as conn:
+        for user_id in user_ids:
+            registered = rng.randint(0, max_days_ago)
+            if max_days_ago:
+                # Старые записи, в том числе без first_seen
+                first_seen = None if user_id % 17 == 0 else _ts(registered, rng.randint(0, 23))
+            else:
+                # Новые пользователи: first_seen = CURRENT_TIMESTAMP, по возрастанию
+                first_seen = _ts(0)
+            activity = _day(rng.randint(0, registered)) if rng.random() < 0.8 else None
+            conn.execute("INSERT INTO users VALUES (?, ?, ?)", (user_id, first_seen, activity))
+            for question in range(rng.choice([0, 0, 1, 3])):
+                conn.execute("INSERT INTO answered_questions (user_id, question_id) VALUES (?, ?)",
+                             (user_id, f'q{question}'))
+            if rng.random() < 0.3:
+                conn.execute("INSERT INTO user_ai_limits VALUES (?, ?)", (user_id, _day(0)))
+            if rng.random() < 0.1:
+                conn.execute("INSERT INTO subscriptions VALUES (?, ?)", (user_id, rng.randint(0, 1)))
+            if rng.random() < 0.6:
+                conn.execute(
+                    "INSERT INTO user_sources (user_id, source, medium, created_at) VALUES (?, ?, ?, ?)",
+                    (user_id, rng.choice(['yandex', 'vk', 'telegram', None]), rng.choice(['cpc', None]),
+                     first_seen or _ts(registered))
+                )
+            for _ in range(rng.choice([0, 0, 1, 2])):
+                conn.execute(
+                    "INSERT INTO conversions (user_id, conversion_type, value_rub, created_at) VALUES (?, ?, ?, ?)",
+                    (user_id, rng.choice(['trial_purchase', 'subscription_purchase']), 299, _ts(0))
+                )
+            for _ in range(rng.randint(0, 3)):
+                conn.execute("INSERT INTO attempts VALUES (?, ?, ?, ?)",
+                             (user_id, rng.choice(rollups.GLOBAL_STATS_MODULES), rng.randint(0, 3), _ts(0)))
+
+
+async def _legacy_funnel_and_cohorts(db_path):
+    """Исходные запросы core.db: сводки на время вызова скрыты."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("ALTER TABLE analytics_rollup_watermarks RENAME TO hidden_watermarks")
+    try:
+        assert await rollups.get_funnel_rollup(db_path) is None
+        return await core_db.get_funnel_stats(), await core_db.get_cohort_stats(weeks=20)
+    finally:
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("ALTER TABLE hidden_watermarks RENAME TO analytics_rollup_watermarks")
+
+
+async def _rollup_funnel_and_cohorts():
+    return await core_db.get_funnel_stats(), await core_db.get_cohort_stats(weeks=20)
+
+
+@pytest.mark.asyncio
+async def test_rollups_match_raw_queries_and_refresh_incrementally(analytics_db, monkeypatch):
+    # Маленькие порции — проверяем и разбиение журналов на транзакции
+    monkeypatch.setattr(rollups, 'ROLLUP_BATCH_ROWS', 50)
+    rng = random.Random(7)
+    _populate(analytics_db, range(1, 301), rng)
+
+    stats = await rollups.refresh_rollups(analytics_db)
+    assert stats['users'] == 300
+    assert await _rollup_funnel_and_cohorts() == await _legacy_funnel_and_cohorts(analytics_db)
+
+    # Следующий проход берет только новые строки
+    _populate(analytics_db, range(301, 341), rng, max_days_ago=0)
+    with sqlite3.connect(analytics_db) as conn:
+        conn.execute("INSERT OR IGNORE INTO answered_questions (user_id, question_id) VALUES (5, 'new')")
+        conn.execute("INSERT INTO subscriptions VALUES (6, 1)")
+        conn.execute("UPDATE users SET last_activity_date = ? WHERE user_id <= 20", (_day(0),))
+
+    stats = await rollups.refresh_rollups(analytics_db)
+    assert stats['users'] < 100
+    assert stats['user_sources'] < 40
+    assert await _rollup_funnel_and_cohorts() == await _legacy_funnel_and_cohorts(analytics_db)
+
+    # Повторный проход без новых данных ничего не меняет
+    stats = await rollups.refresh_rollups(analytics_db)
+    assert stats['answered_questions'] == stats['conversions'] == 0
+    assert await _rollup_funnel_and_cohorts() == await _legacy_funnel_and_cohorts(analytics_db)
+
+
+@pytest.mark.asyncio
+async def test_traffic_retention_and_modules(analytics_db):
+    with sqlite3.connect(analytics_db) as conn:
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?)", [
+            (1, _ts(10), _day(0)),
+            (2, _ts(10), _day(9)),
+            (3, _ts(40), _day(5)),
+        ])
+        conn.executemany(
+            "INSERT INTO user_sources (user_id, source, medium, created_at) VALUES (?, ?, ?, ?)", [
+                (1, 'vk', 'cpc', _ts(10)),
+                (2, 'vk', 'cpc', _ts(10)),
+                (3, 'yandex', None, _ts(40)),
+            ])
+        conn.executemany(
+            "INSERT INTO conversions (user_id, conversion_type, value_rub) VALUES (?, ?, ?)", [
+                (1, 'trial_purchase', 1),
+                (1, 'subscription_purchase', 299),
+                (1, 'subscription_purchase', 299),
+            ])
+        conn.executemany("INSERT INTO attempts VALUES (?, ?, ?, ?)", [
+            (1, 'task19', 2, _ts(1)),
+            (1, 'task19', None, _ts(1)),
+            (2, 'task19', 4, _ts(2)),
+        ])
+
+    await rollups.refresh_rollups(analytics_db)
+
+    traffic = await rollups.get_traffic_rollup(days=30, database_file=analytics_db)
+    assert traffic['rows'] == [{
+        'source': 'vk', 'medium': 'cpc', 'total_users': 2,
+        'trial_conversions': 1, 'paid_conversions': 1, 'total_revenue': 598.0,
+    }]
+
+    retention = await rollups.get_retention_rollup(days=60, database_file=analytics_db)
+    by_source = {row['source']: row for row in retention['rows']}
+    assert (by_source['vk']['retained_day1'], by_source['vk']['retained_day7']) == (1, 1)
+    assert by_source['yandex']['retained_day30'] == 1
+
+    global_stats = await rollups.get_global_rollup(database_file=analytics_db)
+    assert global_stats['total_users'] == 3
+    assert global_stats['active_users'] == 3
+    assert global_stats['total_attempts'] == 3
+    assert global_stats['by_module']['task19'] == {'users': 2, 'attempts': 3, 'avg_score': 3.0}
+
+    # Попытки не учитываются повторно
+    await rollups.refresh_rollups(analytics_db)
+    global_stats = await rollups.get_global_rollup(database_file=analytics_db)
+    assert global_stats['total_attempts'] == 3
+
+
+@pytest.mark.asyncio
+async def test_deleted_rows_do_not_hide_new_activity(analytics_db):
+    with sqlite3.connect(analytics_db) as conn:
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?)", [(1, _ts(3), _day(0)), (2, _ts(3), _day(0))])
+        conn.execute("INSERT INTO answered_questions (user_id, question_id, timestamp) VALUES (1, 'q1', ?)",
+                     (_ts(1),))
+        conn.execute("INSERT INTO user_ai_limits VALUES (1, ?)", (_day(1),))
+    await rollups.refresh_rollups(analytics_db)
+
+    # Сброс прогресса и чистка лимитов освобождают rowid, новые строки их переиспользуют
+    with sqlite3.connect(analytics_db) as conn:
+        conn.execute("DELETE FROM answered_questions")
+        conn.execute("DELETE FROM user_ai_limits")
+        conn.execute("INSERT INTO answered_questions (user_id, question_id) VALUES (2, 'q1')")
+        conn.execute("INSERT INTO user_ai_limits VALUES (2, ?)", (_day(0),))
+        assert conn.execute("SELECT MAX(rowid) FROM answered_questions").fetchone()[0] == 1
+    stats = await rollups.refresh_rollups(analytics_db)
+
+    assert stats['answered_questions'] == stats['user_ai_limits'] == 1
+    with sqlite3.connect(analytics_db) as conn:
+        facts = conn.execute("SELECT user_id, answered, ai_used FROM analytics_user_facts ORDER BY user_id").fetchall()
+    assert facts == [(1, 1, 1), (2, 1, 1)]
@@ -0,0 +1,57 @@
+"""
+Тесты офлайн-бенчмарка проверщиков (scripts/benchmark_evaluators.py).
+
+Прогон идет без сети: ответы модели берутся из записей или синтезируются.
+"""
+
+import json
+
+import pytest
+
+# Пакеты заданий тянут core.admin_tools (графики)
+pytest.importorskip('matplotlib')
+
+from scripts import benchmark_evaluators  # noqa: E402
+
+
+@pytest.fixture
+def offline_env(monkeypatch):
+    monkeypatch.setenv('AI_PROVIDER', 'claude')
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'benchmark-offline')
+    # Бенчмарк подменяет фабрику сервиса в модуле проверщика — вернем после теста
+    from task22 import evaluator
+    monkeypatch.setattr(evaluator, 'create_ai_service', evaluator.create_ai_service)
+
+
+@pytest.mark.asyncio
+async def test_synthesized_run_reports_no_agreement(offline_env):
+    report = await benchmark_evaluators.run_benchmark(recordings_path=None, repeat=2, only=['task22'])
+
+    stats = report['evaluators']['task22']
+    assert report['meta']['recordings'] == 0
+    assert stats['runs'] == 2 * stats['cases']
+    assert stats['responses'] == {'synthesized': stats['cases'], 'recorded': 0}
+    # Синтетические ответы повторяют баллы бота — согласие не измеряется
+    assert stats['agreement']['exact'] is None and stats['agreement']['mae'] is None
+    assert stats['parse_failures'] is None
+    assert stats['agreement']['bot_recorded_exact'] is not None
+
+
+@pytest.mark.asyncio
+async def test_recorded_responses_are_scored(offline_env, tmp_path):
+    recordings = tmp_path / 'recordings.json'
+    recordings.write_text(json.dumps({
+        't22_001': ['модель ответила не JSON'],
+        't22_002': [benchmark_evaluators._json_block({
+            'score': 3, 'correct_answers_count': 3, 'answers_evaluation': [],
+            'feedback': 'Записанный ответ.', 'suggestions': [], 'factual_errors': [],
+        })],
+    }, ensure_ascii=False), encoding='utf-8')
+
+    report = await benchmark_evaluators.run_benchmark(recordings_path=str(recordings), repeat=1, only=['task22'])
+
+    stats = report['evaluators']['task22']
+    assert stats['responses']['recorded'] == 2
+    assert stats['agreement']['cases'] == 2
+    assert stats['parse_failures'] >= 1
+    assert report['cases']['t22_002'] == {'expected': 3, 'score': 3}
@@ -0,0 +1,96 @@
+"""
+Тесты индексированной маршрутизации callback-запросов (core.callback_dispatch).
+
+Главная проверка — паритет с PTB: на реальных pattern и callback_data
+из кода бота в каждой группе срабатывает тот же обработчик, что и при
+линейном переборе.
+"""
+
+import re
+from pathlib import Path
+
+from telegram import CallbackQuery, Update, User
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ConversationHandler
+
+from core.callback_dispatch import (
+    DispatchStats,
+    IndexedCallbackGroup,
+    install_callback_index,
+    literal_prefixes,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+PATTERN_RE = re.compile(r'pattern\s*=\s*r?(["\'])(.+?)\1')
+CALLBACK_DATA_RE = re.compile(r'callback_data\s*=\s*f?(["\'])([^"\'{}]+)')
+
+
+def _repo_literals(regex):
+    found = []
+    for path in sorted(ROOT.glob('*/**/*.py')):
+        if 'tests' in path.parts:
+            continue
+        for match in regex.finditer(path.read_text(encoding='utf-8', errors='ignore')):
+            found.append(match.group(2))
+    return found
+
+
+def _callback_update(data, update_id=1):
+    user = User(id=1, first_name='u', is_bot=False)
+    return Update(update_id, callback_query=CallbackQuery('q', user, chat_instance='c', data=data))
+
+
+async def _noop(update, context):
+    pass
+
+
+def _winner(handlers, update):
+    for handler in handlers:
+        check = handler.check_update(update)
+        if not (check is None or check is False):
+            if isinstance(handler, IndexedCallbackGroup):
+                return check[0]
+            return handler
+    return None
+
+
+def test_literal_prefixes():
+    assert literal_prefixes(re.compile(r'^admin:settings$')) == {'admin:settings'}
+    assert literal_prefixes(re.compile(r'^(t19_|t20_)menu')) == {'t19_menu', 't20_menu'}
+    assert literal_prefixes(re.compile(r'^pay_(\d+)$')) == {'pay_'}
+    assert literal_prefixes(re.compile(r'^[^:]+:x')) == {''}
+    assert literal_prefixes(re.compile(r'(?i)^admin')) == {''}
+
+
+def test_same_handler_wins_as_linear_dispatch():
+    patterns = []
+    for pattern in _repo_literals(PATTERN_RE):
+        try:
+            patterns.append(re.compile(pattern))
+        except re.error:
+            continue
+    assert len(patterns) > 300
+
+    application = Application.builder().token('123:TEST').build()
+    groups = [-100, -40, -1, 0, 1]
+    for position, pattern in enumerate(patterns):
+        application.add_handler(CallbackQueryHandler(_noop, pattern=pattern), group=groups[position % len(groups)])
+        if position % 97 == 0:
+            # Не-callback обработчики разрывают серии, без pattern — проверяются всегда
+            application.add_handler(CommandHandler(f'cmd{position}', _noop), group=groups[position % len(groups)])
+            application.add_handler(CallbackQueryHandler(_noop), group=groups[position % len(groups)])
+    application.add_handler(ConversationHandler([CommandHandler('conv', _noop)], {}, []), group=-1)
+
+    linear = {group: list(handlers) for group, handlers in application.handlers.items()}
+    stats = DispatchStats()
+    summary = install_callback_index(application, stats)
+    assert summary['indexed'] > 300
+    assert any(isinstance(h, ConversationHandler) for h in application.handlers[-1])
+
+    samples = _repo_literals(CALLBACK_DATA_RE) + ['', 'unknown', 'admin:', 'conv', 'pay_123', 't19_menu']
+    for update_id, data in enumerate(samples):
+        update = _callback_update(data, update_id)
+        for group, handlers in application.handlers.items():
+            assert _winner(handlers, update) is _winner(linear[group], update), (group, data)
+
+    snapshot = stats.snapshot()
+    assert snapshot['total_checked'] < snapshot['total_linear'] / 5
@@ -0,0 +1,100 @@
+"""
+Тесты загрузки исходных Excel-файлов (raspisanie.data_loader).
+"""
+
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'raspisanie'))
+
+openpyxl = pytest.importorskip('openpyxl')
+
+import data_loader  # noqa: E402
+from data_loader import DataLoader  # noqa: E402
+from schedule_base import DayOfWeek, SubjectType  # noqa: E402
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """Одна книга со всеми тремя листами."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'БК'
+    ws.append(['Номер кабинета', 'Вместимость', 'Этаж', 'Ответственный'])
+    ws.append([101, 28, 1, 'Егорова Н.В.'])
+    ws.append([102, None, None, None])
+
+    ws = wb.create_sheet('БК (февраль)')
+    ws.append(['ФИО учителя', 'Класс', '10-А', '11-А'])
+    ws.append([None, 'Классный руководитель', 'x', 'y'])
+    ws.append(['Егорова Н.В.', None, None, None])
+    ws.append([None, 'Физика', 3, '2'])
+    ws.append([None, 'Классный руководитель', 1, None])   # служебная строка
+    ws.append([None, 'Практикум ЕГЭ по физике', None, 1])
+    ws.append(['Петров', 'История', 2, None])             # не ФИО — часы Егоровой
+    ws.append(['Петров Б.Б.', ' Химия ', 'н', None])      # без часов
+
+    ws = wb.create_sheet('Результат')
+    ws.append(['ФИО', 'класс', 'ФИ', 'МА', 'МА проф'])
+    ws.append(['Ученик 1', '11-А', 'да', None, 80])
+    ws.append(['Ученик 2', '11-А', 'отказ', None, None])
+    ws.append([None, '11-А', 'да', None, None])
+
+    path = tmp_path / 'data.xlsx'
+    wb.save(path)
+    return path
+
+
+def _load(path, cache_dir):
+    loader = DataLoader()
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.load_workbooks(path, path.read_bytes(), path, cache_dir=cache_dir)
+    return loader
+
+
+def test_load_workbooks(workbook):
+    loader = _load(workbook, None)
+
+    assert loader.classrooms['101'].capacity == 28
+    assert (loader.classrooms['102'].capacity, loader.classrooms['102'].floor) == (30, 1)
+
+    assert list(loader.teachers) == ['Егорова Н.В.', 'Петров Б.Б.']
+    egorova = loader.teachers['Егорова Н.В.']
+    assert egorova.home_classroom == '101'
+    assert egorova.unavailable_days == {DayOfWeek.MONDAY}
+    assert egorova.subjects == ['Физика', 'Практикум ЕГЭ по физике', 'История']
+    assert loader.teachers['Петров Б.Б.'].subjects == []
+    assert [(s.name, s.classes[0], s.hours_per_week) for s in loader.subjects] == [
+        ('Физика', '10-А', 3), ('Физика', '11-А', 2),
+        ('Практикум ЕГЭ по физике', '11-А', 1), ('История', '10-А', 2),
+    ]
+    assert loader.subjects[2].subject_type == SubjectType.EGE_PRACTICE
+
+    assert list(loader.students) == ['Ученик 1', 'Ученик 2']
+    assert loader.students['Ученик 1'].ege_subjects == [
+        'Математика базовая', 'Математика профильная', 'Физика'
+    ]
+    assert len(loader.classes['11-А'].students) == 2
+
+
+def test_cache_skips_parsing(workbook, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    first = _load(workbook, cache_dir)
+    assert len(list(cache_dir.glob('loader-*.pkl'))) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('книга не должна читаться повторно')
+
+    monkeypatch.setattr(DataLoader, '_read_sheets', staticmethod(fail))
+    cached = _load(workbook, cache_dir)
+    assert list(cached.teachers) == list(first.teachers)
+    assert [s.name for s in cached.subjects] == [s.name for s in first.subjects]
+
+    # Изменение версии разбора делает старый кэш недействительным
+    monkeypatch.setattr(data_loader, 'CACHE_VERSION', data_loader.CACHE_VERSION + 1)
+    with pytest.raises(AssertionError):
+        _load(workbook, cache_dir)
@@ -0,0 +1,97 @@
+"""
+Тесты снимка БД для отчетов (core.db_snapshot).
+
+Проверяется, что отчеты читают согласованную копию, видят новые данные
+только после обновления снимка и возвращаются к живой БД, если снимка
+нет или он устарел.
+"""
+
+import os
+import sqlite3
+import time
+
+import pytest
+import pytest_asyncio
+
+from core import db as core_db
+from core import db_snapshot
+
+
+@pytest_asyncio.fixture
+async def snapshot_paths(tmp_path, monkeypatch):
+    live = str(tmp_path / 'bot.db')
+    snapshot = str(tmp_path / 'bot.db.snapshot')
+    with sqlite3.connect(live) as conn:
+        conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY)")
+        conn.executemany("INSERT INTO users VALUES (?)", [(1,), (2,)])
+
+    monkeypatch.setattr(core_db, 'DATABASE_FILE', live)
+    monkeypatch.setattr(core_db, '_db', None)
+    monkeypatch.setattr(db_snapshot, 'DATABASE_FILE', live)
+    monkeypatch.setattr(db_snapshot, 'ANALYTICS_SNAPSHOT_FILE', snapshot)
+    monkeypatch.setattr(db_snapshot, 'ANALYTICS_SNAPSHOT_INTERVAL', 60)
+    yield live, snapshot
+    await db_snapshot.close_snapshot_db()
+    await core_db.close_db()
+
+
+async def _count_users(conn):
+    cursor = await conn.execute("SELECT COUNT(*) FROM users")
+    return (await cursor.fetchone())[0]
+
+
+@pytest.mark.asyncio
+async def test_reports_read_snapshot_until_refresh(snapshot_paths):
+    live, snapshot = snapshot_paths
+
+    # Снимка еще нет — живая БД
+    assert await db_snapshot.get_snapshot_db() is await core_db.get_db()
+    assert db_snapshot.snapshot_caption() == ""
+
+    await db_snapshot.refresh_snapshot()
+    reader = await db_snapshot.get_snapshot_db()
+    assert reader is not await core_db.get_db()
+    assert await _count_users(reader) == 2
+    assert "Данные на" in db_snapshot.snapshot_caption()
+
+    # Запись в живую БД не блокируется открытым снимком и не видна в нем
+    with sqlite3.connect(live, timeout=0) as conn:
+        conn.execute("INSERT INTO users VALUES (3)")
+    assert await _count_users(await db_snapshot.get_snapshot_db()) == 2
+
+    async with db_snapshot.connect_snapshot() as conn:
+        assert await _count_users(conn) == 2
+
+    # После обновления — новые данные, старое соединение еще живо
+    await db_snapshot.refresh_snapshot()
+    assert await _count_users(await db_snapshot.get_snapshot_db()) == 3
+    assert await _count_users(reader) == 2
+
+    # Снимок только для чтения
+    with pytest.raises(sqlite3.OperationalError):
+        await (await db_snapshot.get_snapshot_db()).execute("DELETE FROM users")
+
+    # Устаревший снимок не используется
+    stale = time.time() - 60 * db_snapshot.SNAPSHOT_MAX_AGE_FACTOR - 1
+    os.utime(snapshot, (stale, stale))
+    assert await db_snapshot.get_snapshot_db() is await core_db.get_db()
+    assert "устарел" in db_snapshot.format_snapshot_status()
+
+
+@pytest.mark.asyncio
+async def test_live_db_writes_are_not_blocked_by_snapshot_read(snapshot_paths):
+    live, _ = snapshot_paths
+    db = await core_db.get_db()
+    cursor = await db.execute("PRAGMA journal_mode")
+    assert (await cursor.fetchone())[0] == 'wal'
+
+    # Читающая транзакция (как шаг backup) держится, запись проходит без ожидания
+    with sqlite3.connect(live) as reader:
+        reader.execute("BEGIN")
+        assert reader.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+        with sqlite3.connect(live, timeout=0) as writer:
+            writer.execute("INSERT INTO users VALUES (3)")
+        reader.rollback()
+
+    await db_snapshot.refresh_snapshot()
+    assert await _count_users(await db_snapshot.get_snapshot_db()) == 3
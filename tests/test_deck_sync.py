@@ -0,0 +1,125 @@
+"""
+Тесты инкрементальной генерации колод (flashcards.deck_generator, flashcards.db.sync_decks).
+
+Проверяется, что неизменённые источники и колоды не пишутся в БД,
+а синхронизация удаляет исчезнувшие карточки вместе с прогрессом
+и переносит прогресс карточек, сменивших колоду.
+"""
+
+import json
+import os
+import tempfile
+
+import pytest
+import pytest_asyncio
+
+from flashcards import db as flashcard_db
+from flashcards import deck_generator
+
+
+def _card(deck_id, card_id, front, order=0):
+    return {'id': card_id, 'deck_id': deck_id, 'front_text': front,
+            'back_text': f"Ответ {front}", 'hint': None, 'sort_order': order}
+
+
+def _spec(deck_id, cards):
+    return deck_generator._deck_spec(deck_id, f"Колода {deck_id}", "", "Тест", "🃏", cards)
+
+
+@pytest_asyncio.fixture
+async def cards_db(monkeypatch):
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    monkeypatch.setattr(flashcard_db, 'DATABASE_FILE', db_path)
+    await flashcard_db.ensure_tables()
+    yield db_path
+    os.unlink(db_path)
+
+
+async def _progress(user_id, card_id, deck_id):
+    await flashcard_db.update_card_progress(user_id, card_id, deck_id, 2.5, 1, 1, '2026-01-01T00:00:00', True)
+
+
+@pytest.mark.asyncio
+async def test_sync_removes_cards_with_progress_and_moves_progress(cards_db):
+    stats = await flashcard_db.sync_decks([
+        _spec('a', [_card('a', 'a1', 'Q1'), _card('a', 'a2', 'Q2'), _card('a', 'x', 'QX')]),
+        _spec('b', [_card('b', 'b1', 'Q3')]),
+    ])
+    assert stats == {'added': 4, 'changed': 0, 'removed': 0}
+    for user_id in (1, 2):
+        await _progress(user_id, 'a2', 'a')
+        await _progress(user_id, 'x', 'a')
+    await _progress(1, 'a1', 'a')
+
+    # a2 исчез, x перешёл в колоду b, a1 изменился, b1 без изменений
+    stats = await flashcard_db.sync_decks([
+        _spec('a', [_card('a', 'a1', 'Q1 (новая формулировка)')]),
+        _spec('b', [_card('b', 'b1', 'Q3'), _card('b', 'x', 'QX')]),
+    ])
+    assert stats == {'added': 0, 'changed': 2, 'removed': 1}
+
+    for user_id in (1, 2):
+        assert await flashcard_db.get_card_progress(user_id, 'a2') is None
+        assert (await flashcard_db.get_card_progress(user_id, 'x'))['deck_id'] == 'b'
+    assert (await flashcard_db.get_card_progress(1, 'a1'))['deck_id'] == 'a'
+    assert (await flashcard_db.get_deck('a'))['card_count'] == 1
+    assert (await flashcard_db.get_deck('b'))['card_count'] == 2
+
+    # Повторная синхронизация того же состояния ничего не пишет
+    assert await flashcard_db.sync_decks([
+        _spec('a', [_card('a', 'a1', 'Q1 (новая формулировка)')]),
+        _spec('b', [_card('b', 'b1', 'Q3'), _card('b', 'x', 'QX')]),
+    ]) == {'added': 0, 'changed': 0, 'removed': 0}
+
+
+@pytest.mark.asyncio
+async def test_generate_all_decks_skips_unchanged_sources_and_decks(cards_db, tmp_path, monkeypatch):
+    source = tmp_path / 'source.json'
+    builds, synced = [], []
+
+    def build():
+        builds.append(1)
+        data = json.loads(source.read_text(encoding='utf-8'))
+        return [_spec(deck_id, [_card(deck_id, f"{deck_id}_{i}", q) for i, q in enumerate(questions)])
+                for deck_id, questions in data['decks'].items()]
+
+    original_sync = flashcard_db.sync_decks
+
+    async def spy_sync(specs):
+        synced.append(sorted(spec['deck']['id'] for spec in specs))
+        return await original_sync(specs)
+
+    monkeypatch.setattr(deck_generator, '_constitution_path', lambda: str(source))
+    monkeypatch.setattr(deck_generator, '_build_constitution_deck', build)
+    monkeypatch.setattr(deck_generator, '_glossary_path', lambda: None)
+    monkeypatch.setattr(deck_generator, '_build_glossary_decks', lambda: [])
+    monkeypatch.setattr(deck_generator, '_topics_path', lambda: None)
+    monkeypatch.setattr(deck_generator, '_build_topic_decks', lambda: [])
+    monkeypatch.setattr(flashcard_db, 'sync_decks', spy_sync)
+
+    def write(decks, extra=''):
+        source.write_text(json.dumps({'decks': decks, 'note': extra}, ensure_ascii=False), encoding='utf-8')
+
+    write({'c1': ['Q1', 'Q2'], 'c2': ['Q3']})
+    assert await deck_generator.generate_all_decks()
+    assert synced == [['c1', 'c2']]
+
+    # Файл не изменился — источник даже не разбирается
+    assert not await deck_generator.generate_all_decks()
+    assert len(builds) == 1 and len(synced) == 1
+
+    # Файл изменился, колоды — нет: разбор есть, записи нет
+    write({'c1': ['Q1', 'Q2'], 'c2': ['Q3']}, extra='комментарий')
+    assert not await deck_generator.generate_all_decks()
+    assert len(builds) == 2 and len(synced) == 1
+
+    # Изменилась одна колода — пишется только она
+    write({'c1': ['Q1', 'Q2'], 'c2': ['Q3', 'Q4']}, extra='комментарий')
+    assert await deck_generator.generate_all_decks()
+    assert synced[-1] == ['c2']
+    assert (await flashcard_db.get_deck('c2'))['card_count'] == 2
+
+    # force сверяет все колоды заново
+    assert await deck_generator.generate_all_decks(force=True)
+    assert synced[-1] == ['c1', 'c2']
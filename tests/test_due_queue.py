@@ -0,0 +1,132 @@
+"""
+Тесты очереди карточек к повторению (flashcards.due_queue).
+
+Проверяется, что в пределах одной колоды очередь выдаёт карточки
+в том же порядке, что и SQL-запрос get_cards_due_for_review,
+и что после результатов SM-2 очередь совпадает с пересобранной из БД.
+"""
+
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+from flashcards import db as flashcard_db
+from flashcards import due_queue
+from flashcards.sm2 import review_card
+
+USER_ID = 1
+
+
+@pytest_asyncio.fixture
+async def cards_db(monkeypatch):
+    """Временная БД с тремя колодами и частичным прогрессом пользователя."""
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+
+    monkeypatch.setattr(flashcard_db, 'DATABASE_FILE', db_path)
+    monkeypatch.setattr(due_queue, 'DATABASE_FILE', db_path)
+    due_queue.invalidate_due_queues()
+
+    await flashcard_db.ensure_tables()
+    rng = random.Random(3)
+    now = datetime.now(timezone.utc)
+    for d, size in enumerate([12, 7, 20]):
+        deck_id = f"deck_{d}"
+        await flashcard_db.upsert_deck(deck_id, f"Колода {d}", "", "Тест")
+        await flashcard_db.bulk_upsert_cards([{
+            'id': f"{deck_id}_c{i:02d}",
+            'deck_id': deck_id,
+            'front_text': f"Q{i}",
+            'back_text': f"A{i}",
+            'hint': None,
+            'sort_order': rng.randint(0, 5),  # с повторами
+        } for i in range(size)])
+        for i in range(size):
+            if rng.random() < 0.6:
+                # Часть карточек с одинаковым next_review
+                next_review = now + timedelta(days=rng.choice([-3, -3, -1, 0, 2, 5]))
+                await flashcard_db.update_card_progress(
+                    USER_ID, f"{deck_id}_c{i:02d}", deck_id,
+                    2.5, 1, 1, next_review.replace(microsecond=0).isoformat(), True,
+                )
+    # Чужая колода ошибок не попадает в очередь
+    await flashcard_db.upsert_deck("mistakes_999", "Ошибки", "", "Мои")
+    await flashcard_db.bulk_upsert_cards([{
+        'id': "m999_c0", 'deck_id': "mistakes_999", 'front_text': "Q",
+        'back_text': "A", 'hint': None, 'sort_order': 0,
+    }])
+
+    yield db_path
+
+    due_queue.invalidate_due_queues()
+    os.unlink(db_path)
+
+
+def _ids(cards):
+    return [card['card_id'] for card in cards]
+
+
+@pytest.mark.asyncio
+async def test_single_deck_order_matches_sql(cards_db):
+    for deck_id in ("deck_0", "deck_1", "deck_2"):
+        for limit in (1, 5, 20, 50):
+            expected = await flashcard_db.get_cards_due_for_review(USER_ID, deck_id, limit=limit)
+            actual = await due_queue.get_due_cards(USER_ID, limit=limit, deck_ids=[deck_id])
+            assert _ids(actual) == _ids(expected)
+            assert actual == expected
+
+
+@pytest.mark.asyncio
+async def test_cross_deck_queue(cards_db):
+    cards = await due_queue.get_due_cards(USER_ID, limit=200)
+    new = [c for c in cards if c['is_new']]
+    overdue = [c for c in cards if not c['is_new']]
+
+    # Политика по умолчанию: сначала новые, затем просроченные по сроку
+    assert cards == new + overdue
+    assert [c['next_review'] for c in overdue] == sorted(c['next_review'] for c in overdue)
+    assert "m999_c0" not in _ids(cards)
+
+    # Новые карточки чередуются по колодам
+    assert len({c['deck_id'] for c in new[:3]}) == 3
+
+    interleaved = await due_queue.get_due_cards(
+        USER_ID, limit=8, policy=due_queue.POLICY_INTERLEAVE
+    )
+    assert [c['is_new'] for c in interleaved] == [0, 0, 0, 1, 0, 0, 0, 1]
+
+
+@pytest.mark.asyncio
+async def test_incremental_updates_match_reload(cards_db):
+    queue = await due_queue.get_due_queue(USER_ID)
+    rng = random.Random(11)
+
+    for _ in range(3):
+        for card in await due_queue.get_due_cards(USER_ID, limit=15):
+            result = review_card(
+                rng.randint(0, 3), card['repetition_number'],
+                card['easiness_factor'], card['interval_days'],
+            )
+            next_review = result.next_review.isoformat()
+            await flashcard_db.update_card_progress(
+                USER_ID, card['card_id'], card['deck_id'],
+                result.easiness_factor, result.interval_days,
+                result.repetition_number, next_review, True,
+            )
+            due_queue.record_review(USER_ID, card['card_id'], card['deck_id'], next_review)
+
+    assert await due_queue.get_due_queue(USER_ID) is queue
+    incremental = await due_queue.get_due_cards(USER_ID, limit=200)
+
+    due_queue.invalidate_due_queues(USER_ID)
+    reloaded = await due_queue.get_due_cards(USER_ID, limit=200)
+    assert _ids(incremental) == _ids(reloaded)
+
+    for deck_id in ("deck_0", "deck_1", "deck_2"):
+        expected = await flashcard_db.get_cards_due_for_review(USER_ID, deck_id, limit=50)
+        actual = await due_queue.get_due_cards(USER_ID, limit=50, deck_ids=[deck_id])
+        assert _ids(actual) == _ids(expected)
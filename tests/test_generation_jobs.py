@@ -0,0 +1,115 @@
+"""
+Тесты фоновой генерации расписания (raspisanie.generation_jobs).
+
+БД веб-приложения заполняется демо-данными; задача должна пройти
+все фазы в отдельном процессе и записать уроки в расписание,
+а отмена — остановить оптимизацию.
+"""
+
+import contextlib
+import io
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'raspisanie'))
+
+from flask import Flask  # noqa: E402
+
+from demo_data import DemoDataLoader  # noqa: E402
+from generation_jobs import (  # noqa: E402
+    GenerationJobManager, load_from_database, JOB_DONE, JOB_CANCELLED
+)
+from models import (  # noqa: E402
+    db, init_db, Teacher, Classroom, Subject, SchoolClass, Student, Workload,
+    Schedule, Lesson
+)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Приложение с временной БД, заполненной демо-данными."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'school.db'}"
+    init_db(app)
+
+    random.seed(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        demo = DemoDataLoader()
+        demo.load_all()
+
+    with app.app_context():
+        subjects = {s.name: s for s in Subject.query.all()}
+
+        def subject(name):
+            if name not in subjects:
+                subjects[name] = Subject(name=name)
+                db.session.add(subjects[name])
+            return subjects[name]
+
+        rooms = {number: Classroom(number=number, capacity=room.capacity, floor=room.floor)
+                 for number, room in demo.classrooms.items()}
+        teachers = {t.name: Teacher(name=t.name, home_classroom=rooms.get(t.home_classroom),
+                                    subjects=[subject(n) for n in t.subjects])
+                    for t in demo.teachers.values()}
+        classes = {name: SchoolClass(name=name, profile=c.profile)
+                   for name, c in demo.classes.items()}
+        db.session.add_all([*rooms.values(), *teachers.values(), *classes.values()])
+        db.session.flush()
+
+        for t in demo.teachers.values():
+            teachers[t.name].set_unavailable_days([day.value - 1 for day in t.unavailable_days])
+        for s in demo.students.values():
+            db.session.add(Student(name=s.name, school_class=classes[s.class_name],
+                                   ege_subjects=[subject(n) for n in s.ege_subjects]))
+        for s in demo.subjects:
+            for class_name in s.classes:
+                db.session.add(Workload(subject=subject(s.name), school_class=classes[class_name],
+                                        teacher=teachers[s.teacher.name],
+                                        hours_per_week=s.hours_per_week))
+        db.session.commit()
+
+    yield app
+
+
+def _wait(manager, job):
+    while not job.finished:
+        manager.wait_for_update(job, job.version, timeout=30)
+
+
+def test_job_saves_schedule(app):
+    with app.app_context():
+        loader = load_from_database()
+    manager = GenerationJobManager(app)
+
+    job = manager.submit(loader, {'name': 'Тест', 'iterations': 500, 'seed': 3, 'set_active': True})
+    _wait(manager, job)
+
+    assert job.state == JOB_DONE, job.error
+    with app.app_context():
+        schedule = db.session.get(Schedule, job.schedule_id)
+        assert schedule.is_active
+        lessons = Lesson.query.filter_by(schedule_id=schedule.id).all()
+        assert len(lessons) == job.result['lessons_placed'] > 0
+        # Практикумы ЕГЭ идут группами, остальные уроки — классам
+        assert all(l.group_name for l in lessons if l.class_id is None)
+        assert any(l.is_ege_practice for l in lessons)
+
+
+def test_cancel_stops_optimization(app):
+    with app.app_context():
+        loader = load_from_database()
+    manager = GenerationJobManager(app)
+
+    job = manager.submit(loader, {'name': 'Отмена', 'iterations': 10 ** 6})
+    while job.phase != 'phase3' or job.iteration < 100:
+        assert not job.finished, job.error
+        manager.wait_for_update(job, job.version, timeout=30)
+    manager.cancel(job.id)
+    _wait(manager, job)
+
+    assert job.state == JOB_CANCELLED
+    with app.app_context():
+        assert Schedule.query.count() == 0
@@ -0,0 +1,94 @@
+"""
+Тесты гистограмм задержек (core.latency_metrics).
+"""
+
+import aiosqlite
+import pytest
+from telegram.ext import CommandHandler, ConversationHandler
+
+from core import latency_metrics
+from core.latency_metrics import LatencyHistogram
+
+
+def test_quantiles_and_prometheus_output():
+    histogram = LatencyHistogram('test_seconds', 'Тест', ('handler',), buckets=(0.01, 0.1, 1.0))
+    for _ in range(90):
+        histogram.observe(0.005, ('fast',))
+    for _ in range(10):
+        histogram.observe(0.5, ('fast',))
+    histogram.observe(5.0, ('slow',))
+
+    assert histogram.count(('fast',)) == 100
+    assert 0 < histogram.quantile(('fast',), 0.5) <= 0.01
+    assert 0.1 < histogram.quantile(('fast',), 0.95) <= 1.0
+    assert histogram.quantile(('slow',), 0.99) == 1.0
+    assert histogram.quantile(('missing',), 0.5) is None
+
+    lines = histogram.render()
+    assert '# TYPE test_seconds histogram' in lines
+    assert 'test_seconds_bucket{handler="fast",le="0.01"} 90' in lines
+    assert 'test_seconds_bucket{handler="fast",le="+Inf"} 100' in lines
+    assert 'test_seconds_count{handler="slow"} 1' in lines
+
+
+def test_series_limit_folds_into_overflow(monkeypatch):
+    monkeypatch.setattr(latency_metrics, 'MAX_SERIES', 2)
+    histogram = LatencyHistogram('test_seconds', 'Тест', ('handler',))
+    for name in ('a', 'b', 'c', 'd'):
+        histogram.observe(0.01, (name,))
+    assert set(histogram.series()) == {('a',), ('b',), ('other',)}
+    assert histogram.count(('other',)) == 2
+
+
+def test_sql_labels():
+    assert latency_metrics.sql_labels("SELECT * FROM users WHERE user_id = ?") == ('SELECT', 'users')
+    assert latency_metrics.sql_labels("  insert or ignore into user_progress VALUES (?)") == ('INSERT', 'user_progress')
+    assert latency_metrics.sql_labels("UPDATE users SET x = 1") == ('UPDATE', 'users')
+    assert latency_metrics.sql_labels("PRAGMA journal_mode=WAL") == ('PRAGMA', '-')
+
+
+@pytest.mark.asyncio
+async def test_instrument_handlers_wraps_nested_handlers_once():
+    latency_metrics.HANDLER_LATENCY.reset()
+
+    async def start(update, context):
+        return 'started'
+
+    async def answer(update, context):
+        return ConversationHandler.END
+
+    conversation = ConversationHandler(
+        entry_points=[CommandHandler('start', start)],
+        states={1: [CommandHandler("answer", answer)]},
+        fallbacks=[],
+    )
+
+    class FakeApplication:
+        handlers = {0: [conversation], 1: [CommandHandler('help', start)]}
+
+    application = FakeApplication()
+    assert latency_metrics.instrument_handlers(application) == 3
+    assert latency_metrics.instrument_handlers(application) == 0
+
+    assert await conversation.entry_points[0].callback(None, None) == 'started'
+    label = (f"{__name__}.test_instrument_handlers_wraps_nested_handlers_once.<locals>.start",)
+    assert latency_metrics.HANDLER_LATENCY.count(label) == 1
+    assert '&lt;locals&gt;' in latency_metrics.format_latency_report('handler')
+
+
+@pytest.mark.asyncio
+async def test_instrument_db_connection():
+    latency_metrics.DB_LATENCY.reset()
+
+    async with aiosqlite.connect(':memory:') as conn:
+        latency_metrics.instrument_db_connection(conn)
+        latency_metrics.instrument_db_connection(conn)
+        await conn.execute("CREATE TABLE users (user_id INTEGER)")
+        await conn.executemany("INSERT INTO users VALUES (?)", [(1,), (2,)])
+        cursor = await conn.execute("SELECT COUNT(*) FROM users")
+        assert (await cursor.fetchone())[0] == 2
+        async with conn.execute("SELECT user_id FROM users") as cursor:
+            assert len(await cursor.fetchall()) == 2
+
+    assert latency_metrics.DB_LATENCY.count(('SELECT', 'users')) == 2
+    assert latency_metrics.DB_LATENCY.count(('INSERT', 'users')) == 1
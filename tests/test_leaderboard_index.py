@@ -0,0 +1,147 @@
+"""
+Тесты in-memory индекса лидерборда карточек.
+
+Проверяется, что топ-N и позиция пользователя из индекса совпадают
+с результатами SQL-запросов по flashcard_xp — после загрузки из БД
+и после инкрементальных начислений через add_xp.
+"""
+
+import asyncio
+import os
+import random
+import time
+import tempfile
+from datetime import date, timedelta
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+
+from flashcards import leaderboard, ranking
+from flashcards.ranking import IndexableSkipList, current_week_start
+
+
+@pytest_asyncio.fixture
+async def xp_db(monkeypatch):
+    """Временная БД с flashcard_xp и набором пользователей."""
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+
+    monkeypatch.setattr(leaderboard, 'DATABASE_FILE', db_path)
+    monkeypatch.setattr(ranking, 'DATABASE_FILE', db_path)
+    ranking.reset_leaderboard_index()
+
+    async with aiosqlite.connect(db_path) as db:
+        await db.execute("""
+            CREATE TABLE users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT
+            )
+        """)
+        await db.commit()
+    await leaderboard.ensure_leaderboard_tables()
+
+    rng = random.Random(42)
+    this_week = current_week_start()
+    last_week = (date.fromisoformat(this_week) - timedelta(days=7)).isoformat()
+    async with aiosqlite.connect(db_path) as db:
+        for user_id in range(1, 301):
+            await db.execute(
+                "INSERT INTO users (user_id, first_name) VALUES (?, ?)",
+                (user_id, f"User {user_id}")
+            )
+            # Много совпадающих значений XP, чтобы проверить равенство мест
+            total_xp = rng.choice([0, 0.5, 1, 2, 2, 5, 7.5, 10, 10, 42]) * rng.randint(0, 20)
+            weekly_xp = min(total_xp, rng.choice([0, 1, 2, 5, 10]))
+            week_start = rng.choice([this_week, this_week, last_week])
+            await db.execute("""
+                INSERT INTO flashcard_xp (user_id, total_xp, weekly_xp, week_start)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, total_xp, weekly_xp, week_start))
+        await db.commit()
+
+    yield db_path
+
+    ranking.reset_leaderboard_index()
+    os.unlink(db_path)
+
+
+async def _assert_matches_sql(user_ids):
+    for period in ("all", "week"):
+        top = await leaderboard.get_leaderboard(period=period, limit=25)
+        top_sql = await leaderboard._get_leaderboard_sql(period=period, limit=25)
+        assert [(e['user_id'], e['xp'], e['rank']) for e in top] == \
+            [(e['user_id'], e['xp'], e['rank']) for e in top_sql]
+        assert [e['first_name'] for e in top] == [e['first_name'] for e in top_sql]
+
+        for user_id in user_ids:
+            assert await leaderboard.get_user_rank(user_id, period) == \
+                await leaderboard._get_user_rank_sql(user_id, period)
+
+
+def test_skip_list_counts_and_order():
+    rng = random.Random(7)
+    skip_list = IndexableSkipList()
+    keys = set()
+    for _ in range(2000):
+        key = (-rng.randint(0, 50), rng.randint(1, 500))
+        if key in keys:
+            skip_list.remove(key)
+            keys.remove(key)
+        else:
+            skip_list.insert(key)
+            keys.add(key)
+
+    ordered = sorted(keys)
+    assert len(skip_list) == len(ordered)
+    assert skip_list.head(50) == ordered[:50]
+    for probe in [(-25, float("-inf")), (0, 0), (-51, 0), (-10, 250)]:
+        assert skip_list.count_less(probe) == sum(1 for k in ordered if k < probe)
+
+
+@pytest.mark.asyncio
+async def test_index_matches_sql_after_load(xp_db):
+    await _assert_matches_sql(list(range(1, 301)) + [999])
+
+
+@pytest.mark.asyncio
+async def test_index_matches_sql_after_add_xp(xp_db):
+    await ranking.get_leaderboard_index()
+
+    rng = random.Random(1)
+    for _ in range(200):
+        user_id = rng.randint(1, 320)  # в том числе новые пользователи
+        await leaderboard.add_xp(
+            user_id, rng.choice([0.5, 1, 2, 5]), 'quiz', apply_streak_bonus=False
+        )
+
+    await _assert_matches_sql(range(1, 321))
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_xp_added_while_building(xp_db, monkeypatch):
+    index = await ranking.get_leaderboard_index()
+    old_board = index.all_time
+
+    build_boards = ranking._build_boards
+
+    def slow_build(rows, week_start):
+        time.sleep(0.3)
+        return build_boards(rows, week_start)
+
+    monkeypatch.setattr(ranking, '_build_boards', slow_build)
+    monkeypatch.setattr(ranking, 'LEADERBOARD_RESYNC_SECONDS', -1)
+
+    # Устаревший индекс отдается сразу, пересборка идет в фоне
+    assert await ranking.get_leaderboard_index() is index
+    await asyncio.sleep(0.1)
+    assert ranking._refresh_task is not None and not ranking._refresh_task.done()
+
+    await leaderboard.add_xp(7, 1000, 'quiz', apply_streak_bonus=False)
+    await ranking._refresh_task
+
+    assert index.all_time is not old_board
+    assert index.top('all', 1)[0][0] == 7
+    monkeypatch.setattr(ranking, 'LEADERBOARD_RESYNC_SECONDS', 300)
+    await _assert_matches_sql(range(1, 301))
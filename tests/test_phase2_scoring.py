@@ -0,0 +1,54 @@
+"""
+Тесты векторной оценки слотов Фазы 2 (raspisanie.phase2_mandatory).
+
+На каждом шаге размещения демо-данных оценки из тензоров занятости
+должны совпадать с поштучной оценкой _evaluate_slot, включая порядок.
+"""
+
+import contextlib
+import io
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'raspisanie'))
+
+from demo_data import DemoDataLoader  # noqa: E402
+from phase2_mandatory import Phase2MandatoryPlacer  # noqa: E402
+from schedule_base import SubjectType  # noqa: E402
+from schedule_generator import ScheduleGenerator  # noqa: E402
+
+
+def _scalar_scores(placer, subject, is_hard):
+    scored = []
+    for slot in placer.all_slots:
+        score = placer._evaluate_slot(slot, subject, is_hard)
+        if score > 0:
+            scored.append((score, slot))
+    scored.sort(reverse=True, key=lambda x: x[0])
+    return scored
+
+
+def test_vectorized_scores_match_scalar():
+    random.seed(4)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = DemoDataLoader()
+        loader.load_all()
+        generator = ScheduleGenerator(loader)
+        generator.place_ege_practices()
+    placer = Phase2MandatoryPlacer(generator.schedule, loader, generator.ege_slots)
+
+    subjects = placer._sort_by_priority(
+        [s for s in loader.subjects if s.subject_type == SubjectType.MANDATORY]
+    )
+    checked = 0
+    for class_subjects in placer._group_by_class(subjects).values():
+        for subject in class_subjects:
+            is_hard = placer._is_hard_subject(subject)
+            assert placer._evaluate_all_slots(subject, is_hard) == \
+                _scalar_scores(placer, subject, is_hard)
+            placer._place_subject(subject)
+            checked += 1
+
+    assert checked > 50
+    assert placer.stats['placed'] > 0
@@ -0,0 +1,94 @@
+"""
+Тесты инкрементального пересчета метрики Фазы 3 (raspisanie.phase3_optimization).
+
+После серии обменов (принятых и откаченных) метрика из кэша
+должна совпадать с полным пересчетом по всему расписанию.
+"""
+
+import contextlib
+import io
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'raspisanie'))
+
+from demo_data import DemoDataLoader  # noqa: E402
+from phase2_mandatory import Phase2MandatoryPlacer  # noqa: E402
+from phase3_optimization import Phase3Optimizer, ParallelPhase3Optimizer  # noqa: E402
+from schedule_generator import ScheduleGenerator  # noqa: E402
+
+
+def _demo_optimizer(seed: int) -> Phase3Optimizer:
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = DemoDataLoader()
+        loader.load_all()
+        generator = ScheduleGenerator(loader)
+        generator.place_ege_practices()
+        Phase2MandatoryPlacer(generator.schedule, loader, generator.ege_slots) \
+            .place_all_mandatory_subjects()
+    return Phase3Optimizer(generator.schedule, loader)
+
+
+def test_incremental_metric_matches_full_recompute():
+    optimizer = _demo_optimizer(seed=7)
+    assert optimizer._current_metric() == optimizer._calculate_quality_metric()
+
+    rng = random.Random(1)
+    swaps = 0
+    for step in range(1500):
+        result = optimizer._find_and_try_swap()
+        if result is None:
+            continue
+        swaps += 1
+        lesson1, lesson2, new_metric = result
+        assert new_metric == optimizer._current_metric()
+
+        if rng.random() < 0.5:
+            optimizer._swap_lessons(lesson1, lesson2)  # откат
+
+        if step % 25 == 0:
+            assert optimizer._current_metric() == optimizer._calculate_quality_metric()
+            assert {id(l) for l in optimizer._problem_lessons} == \
+                {id(l) for l in optimizer._find_problem_lessons()}
+
+    assert swaps > 1000
+    assert optimizer._current_metric() == optimizer._calculate_quality_metric()
+
+
+def test_optimize_reports_true_metric():
+    optimizer = _demo_optimizer(seed=3)
+    initial = optimizer._calculate_quality_metric()
+
+    result = optimizer.optimize(max_iterations=3000, verbose=False)
+
+    assert optimizer.schedule is result
+    assert optimizer.stats['final_metric'] == optimizer._calculate_quality_metric()
+    assert optimizer.stats['final_metric'] <= initial
+
+
+def test_parallel_result_independent_of_workers():
+    results = []
+    for workers in (1, 2):
+        base = _demo_optimizer(seed=5)
+        optimizer = ParallelPhase3Optimizer(
+            base.schedule, base.loader, workers=workers, chains=2, seed=1
+        )
+        optimizer.exchange_interval = 300
+        schedule = optimizer.optimize(max_iterations=1200, verbose=False)
+
+        check = Phase3Optimizer(schedule, base.loader)
+        assert optimizer.stats['final_metric'] == check._calculate_quality_metric()
+        results.append((schedule.to_dict(), optimizer.stats['final_metric']))
+
+    assert results[0] == results[1]
+
+
+def test_parallel_exchanges_with_default_interval():
+    base = _demo_optimizer(seed=5)
+    optimizer = ParallelPhase3Optimizer(base.schedule, base.loader, workers=1, chains=2, seed=1)
+    optimizer.optimize(max_iterations=200, verbose=False)
+
+    assert optimizer.stats['rounds'] == optimizer.exchange_rounds
+    assert optimizer.stats['iterations'] == 2 * 200
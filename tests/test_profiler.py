@@ -0,0 +1,54 @@
+"""
+Тесты сэмплирующего профайлера event loop (core.profiler).
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from core import profiler
+
+
+def _block_loop():
+    time.sleep(0.25)
+
+
+@pytest.mark.asyncio
+async def test_profile_detects_blocking_callback():
+    async def workload():
+        await asyncio.sleep(0.2)
+        _block_loop()
+
+    task = asyncio.create_task(workload())
+    result = await profiler.profile_loop(1)
+    await task
+
+    assert not profiler.profiling_active()
+    assert result.samples > 50
+    assert result.max_lag >= 0.2
+    assert len(result.blocking) == 1
+    assert result.blocking[0].duration >= 0.2
+    assert any(frame[0] == '_block_loop' for frame in result.blocking[0].stack)
+    assert '_block_loop' in result.summary()
+
+    collapsed = result.collapsed()
+    assert any(line.endswith(' ' + str(count)) for line, count in
+               zip(collapsed.splitlines(), [c for _, c in result.stacks.most_common()]))
+    assert profiler.IDLE_FRAME in collapsed
+
+    speedscope = json.loads(result.speedscope())
+    profile = speedscope['profiles'][0]
+    assert profile['type'] == 'sampled'
+    assert len(profile['samples']) == len(profile['weights']) == len(result.stacks)
+
+
+@pytest.mark.asyncio
+async def test_only_one_profile_at_a_time():
+    first = asyncio.create_task(profiler.profile_loop(1))
+    await asyncio.sleep(0.05)
+    with pytest.raises(profiler.ProfilerBusyError):
+        await profiler.profile_loop(1)
+    await first
+    assert not profiler.profiling_active()
@@ -0,0 +1,97 @@
+"""
+Тесты сообщения о прогрессе (core.progress_reporter).
+"""
+
+import asyncio
+
+import pytest
+from telegram.error import BadRequest
+
+from core.progress_reporter import ProgressReporter
+
+
+class FakeBot:
+    def __init__(self):
+        self.edits = []
+        self.fail_with = None
+
+    async def edit_message_text(self, text, chat_id, message_id, parse_mode=None, reply_markup=None):
+        if self.fail_with:
+            raise self.fail_with
+        self.edits.append(text)
+        return True
+
+
+class FakeMessage:
+    chat_id = 1
+    message_id = 10
+    caption = None
+    reply_markup = None
+
+    def __init__(self, text, bot):
+        self.text = text
+        self.bot = bot
+        self.deleted = False
+
+    def get_bot(self):
+        return self.bot
+
+    async def reply_text(self, text, parse_mode=None, reply_markup=None):
+        return FakeMessage(text, self.bot)
+
+    async def delete(self):
+        self.deleted = True
+
+
+@pytest.mark.asyncio
+async def test_updates_are_throttled_and_final_state_wins():
+    bot = FakeBot()
+    progress = await ProgressReporter.send(FakeMessage('', bot), 'Старт', interval=0.1)
+
+    for i in range(1, 101):
+        progress.update(f"Прогресс {i}/100")
+        progress.update(f"Прогресс {i}/100")
+        if i % 25 == 0:
+            await asyncio.sleep(0.12)
+
+    assert await progress.finish('Готово')
+    assert bot.edits[-1] == 'Готово'
+    # 200 обновлений свернулись в несколько правок
+    assert len(bot.edits) <= 6
+    assert progress.closed
+
+    progress.update('после завершения')
+    await asyncio.sleep(0.15)
+    assert bot.edits[-1] == 'Готово'
+
+
+@pytest.mark.asyncio
+async def test_identical_state_and_deleted_message():
+    bot = FakeBot()
+    progress = await ProgressReporter.send(FakeMessage('', bot), 'Проверяю', interval=0)
+
+    progress.update('Проверяю')
+    await asyncio.sleep(0.01)
+    assert bot.edits == []
+
+    bot.fail_with = BadRequest("Message to edit not found")
+    progress.update('Проверяю дальше')
+    await asyncio.sleep(0.01)
+    assert progress.closed
+    assert not await progress.finish('Готово')
+
+
+@pytest.mark.asyncio
+async def test_result_is_not_overwritten_by_running_animation():
+    from core import ui_helpers
+
+    bot = FakeBot()
+    thinking_msg = await ui_helpers.show_ai_evaluation_animation(FakeMessage('', bot), duration=5)
+    await asyncio.sleep(0.01)
+
+    await ui_helpers.finish_thinking_animation(thinking_msg, 'Результат: 3/3', parse_mode='HTML')
+    assert bot.edits == ['Результат: 3/3']
+
+    # Анимация просыпается после паузы кадра и видит, что репортер закрыт
+    await asyncio.sleep(1.5)
+    assert bot.edits == ['Результат: 3/3']
@@ -0,0 +1,82 @@
+"""
+Тесты отслеживания кликов по retention уведомлениям
+(core.retention_click_middleware).
+
+Проверяется, что индекс ожидаемых кликов загружается одним запросом,
+пользователи без уведомлений в БД не проверяются, а клики пишутся пачкой.
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.retention_click_middleware import RetentionClickTracker
+
+
+def _create_log(db_path, rows):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE notification_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                clicked BOOLEAN DEFAULT 0,
+                clicked_at TIMESTAMP NULL
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO notification_log (user_id, sent_at, clicked) VALUES (?, ?, ?)", rows
+        )
+
+
+@pytest.mark.asyncio
+async def test_clicks_use_index_and_flush_in_batch(tmp_path):
+    db_path = tmp_path / 'bot.db'
+    now = datetime.now(timezone.utc)
+    _create_log(db_path, [
+        (1, now - timedelta(days=1), 0),
+        (1, now - timedelta(hours=2), 0),
+        (2, now - timedelta(days=8), 0),   # слишком старое
+        (3, now - timedelta(hours=1), 1),  # уже кликнуто
+    ])
+
+    tracker = RetentionClickTracker(str(db_path))
+    assert await tracker.load_pending() == 1
+
+    # Без индекса в БД не ходим: ломаем БД и убеждаемся, что ответы прежние
+    tracker.database_file = str(tmp_path / 'missing' / 'bot.db')
+    assert not await tracker.track_click_if_needed(2)
+    assert not await tracker.track_click_if_needed(3)
+    assert await tracker.track_click_if_needed(1)
+    assert not await tracker.track_click_if_needed(1)
+
+    # Новое уведомление попадает в индекс сразу после отправки
+    tracker.mark_notification_sent(4)
+    assert await tracker.track_click_if_needed(4)
+
+    # Ошибка записи не теряет клики
+    assert await tracker.flush_clicks() == 0
+    tracker.database_file = str(db_path)
+    assert await tracker.flush_clicks() == 2
+
+    with sqlite3.connect(db_path) as conn:
+        clicked = conn.execute(
+            "SELECT user_id, sent_at FROM notification_log WHERE clicked = 1 AND clicked_at IS NOT NULL"
+        ).fetchall()
+    # Отмечено только последнее уведомление пользователя 1
+    assert [row[0] for row in clicked] == [1]
+    assert clicked[0][1] == str(now - timedelta(hours=2))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_clicks_load_index_once(tmp_path):
+    db_path = tmp_path / 'bot.db'
+    _create_log(db_path, [(1, datetime.now(timezone.utc) - timedelta(hours=1), 0)])
+    tracker = RetentionClickTracker(str(db_path))
+
+    # Несколько callback'ов приходят до загрузки индекса: клик засчитывается один раз
+    results = await asyncio.gather(*(tracker.track_click_if_needed(1) for _ in range(3)))
+    assert sorted(results) == [False, False, True]
+    assert len(tracker._clicks) == 1
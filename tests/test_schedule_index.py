@@ -0,0 +1,75 @@
+"""
+Тесты индексов занятости расписания (raspisanie.schedule_base.Schedule).
+
+После случайных добавлений, удалений и переносов уроков проверки
+занятости и подсчет окон должны совпадать с полным просмотром списка.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'raspisanie'))
+
+from schedule_base import (  # noqa: E402
+    Schedule, Lesson, Teacher, Classroom, TimeSlot, DayOfWeek
+)
+
+SLOTS = [TimeSlot(day, number) for day in DayOfWeek for number in range(1, 8)]
+
+
+def _linear_gaps(lessons):
+    gaps = 0
+    for day in DayOfWeek:
+        numbers = sorted({l.time_slot.lesson_number for l in lessons if l.time_slot.day == day})
+        if numbers:
+            gaps += numbers[-1] - numbers[0] + 1 - len(numbers)
+    return gaps
+
+
+def test_indices_match_linear_scan():
+    rng = random.Random(5)
+    teachers = [Teacher(name=f"Учитель {i}") for i in range(6)]
+    rooms = [Classroom(number=str(100 + i), capacity=30, floor=1) for i in range(4)]
+    # Группа, в названии которой есть класс, тоже занимает класс
+    groups = ["10-А", "10-Б", "11-А", "11-А (гр. 1)", "ЕГЭ-Физика"]
+
+    schedule = Schedule()
+    for step in range(600):
+        action = rng.random()
+        if action < 0.5 or len(schedule.lessons) < 5:
+            schedule.add_lesson(Lesson(
+                subject="Предмет",
+                teacher=rng.choice(teachers),
+                class_or_group=rng.choice(groups),
+                classroom=rng.choice(rooms + [None]),
+                time_slot=rng.choice(SLOTS),
+            ))
+        elif action < 0.7:
+            schedule.remove_lesson(rng.choice(schedule.lessons))
+        else:
+            schedule.move_lesson(rng.choice(schedule.lessons), rng.choice(SLOTS))
+
+        if step % 20:
+            continue
+
+        lessons = schedule.lessons
+        for slot in SLOTS:
+            for teacher in teachers:
+                assert schedule.is_teacher_busy(teacher, slot) == any(
+                    l.teacher == teacher and l.time_slot == slot for l in lessons)
+            for room in rooms:
+                assert schedule.is_classroom_busy(room, slot) == any(
+                    l.classroom == room and l.time_slot == slot for l in lessons)
+            for name in ["10-А", "11-А", "11-А (гр. 1)", "9-В"]:
+                assert schedule.is_class_busy(name, slot) == any(
+                    name in l.class_or_group and l.time_slot == slot for l in lessons)
+
+        for teacher in teachers:
+            own = [l for l in lessons if l.teacher.name == teacher.name]
+            assert schedule.get_lessons_by_teacher(teacher.name) == own
+            assert schedule.get_teacher_gaps(teacher) == _linear_gaps(own)
+        for name in ["10-Б", "11-А", "Физика"]:
+            own = [l for l in lessons if name in l.class_or_group]
+            assert schedule.get_lessons_by_class(name) == own
+            assert schedule.get_class_gaps(name) == _linear_gaps(own)
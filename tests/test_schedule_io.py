@@ -0,0 +1,134 @@
+"""
+Тесты массового экспорта/импорта уроков и поиска накладок (raspisanie.schedule_io).
+"""
+
+import csv
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'raspisanie'))
+
+from flask import Flask  # noqa: E402
+
+import schedule_io  # noqa: E402
+from models import (  # noqa: E402
+    db, init_db, Teacher, Classroom, Subject, SchoolClass, Schedule, Lesson
+)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Временная БД с расписанием из шести уроков, две накладки."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'school.db'}"
+    init_db(app)
+
+    with app.app_context():
+        math = Subject.query.filter_by(name='Математика').one()
+        physics = Subject.query.filter_by(name='Физика').one()
+        ivanova, petrov = Teacher(name='Иванова А.А.'), Teacher(name='Петров Б.Б.')
+        room = Classroom(number='101')
+        class_a, class_b = SchoolClass(name='11-А'), SchoolClass(name='11-Б')
+        schedule = Schedule(name='Основное')
+        db.session.add_all([ivanova, petrov, room, class_a, class_b, schedule])
+        db.session.flush()
+
+        def lesson(subject, teacher, school_class, day, number, classroom=None, group=None):
+            return Lesson(schedule_id=schedule.id, subject_id=subject.id, teacher_id=teacher.id,
+                          class_id=school_class.id if school_class else None,
+                          classroom_id=classroom.id if classroom else None,
+                          day=day, lesson_number=number, group_name=group)
+
+        db.session.add_all([
+            lesson(math, ivanova, class_a, 0, 1, room),
+            lesson(math, ivanova, class_b, 0, 1),           # учитель занят дважды
+            lesson(physics, petrov, class_a, 0, 2, room),
+            lesson(physics, petrov, class_b, 1, 2, room),
+            lesson(math, ivanova, class_a, 1, 2, room),     # кабинет занят дважды
+            lesson(physics, petrov, None, 4, 7, group='ЕГЭ-Физика'),
+        ])
+        db.session.commit()
+
+    yield app
+
+
+def test_conflict_scan(app):
+    with app.app_context():
+        schedule_id = Schedule.query.one().id
+        conflicts = schedule_io.find_schedule_conflicts(schedule_id)
+
+    assert [(c['type'], c['day'], c['lesson_number'], len(c['lessons'])) for c in conflicts] == [
+        ('teacher', 0, 1, 2),
+        ('classroom', 1, 2, 2),
+    ]
+    assert {l['class_name'] for l in conflicts[0]['lessons']} == {'11-А', '11-Б'}
+
+
+def test_export_import_roundtrip(app):
+    with app.app_context():
+        source = Schedule.query.one().id
+        exported = json.loads(''.join(schedule_io.export_json_chunks(source)))
+        csv_text = ''.join(schedule_io.export_csv_chunks(source))
+
+        assert len(exported) == 6
+        rows = list(csv.reader(io.StringIO(csv_text.lstrip('\ufeff')), delimiter=';'))
+        assert rows[0][:6] == ['День', 'Урок', 'Предмет', 'Учитель', 'Класс', 'Кабинет']
+        assert len(rows) == 7
+
+        for filename, content in (('s.json', json.dumps(exported).encode()),
+                                  ('s.csv', csv_text.encode('utf-8'))):
+            target = Schedule(name=filename)
+            db.session.add(target)
+            db.session.commit()
+
+            lessons = schedule_io.parse_lessons_file(filename, content)
+            added, errors, conflicts = schedule_io.import_lessons(target.id, lessons)
+            assert (added, errors) == (0, [])
+            assert len(conflicts) == 2  # накладки исходного расписания
+
+            added, errors, conflicts = schedule_io.import_lessons(
+                target.id, lessons, allow_conflicts=True
+            )
+            assert (added, errors, len(conflicts)) == (6, [], 2)
+            assert json.loads(''.join(schedule_io.export_json_chunks(target.id))) == exported
+
+            # Повторный импорт пересекается с уже имеющимися уроками
+            assert schedule_io.import_lessons(target.id, lessons[2:3])[2]
+            assert schedule_io.import_lessons(target.id, lessons[2:3], replace=True)[0] == 1
+            assert Lesson.query.filter_by(schedule_id=target.id).count() == 1
+
+
+def test_import_reports_unknown_names(app):
+    with app.app_context():
+        schedule_id = Schedule.query.one().id
+        added, errors, _ = schedule_io.import_lessons(schedule_id, [
+            {'day': 'ЧТ', 'lesson_number': 3, 'subject': 'Математика', 'teacher': 'Иванова А.А.'},
+            {'day': 'Суббота', 'lesson_number': 9, 'subject': 'Астрономия', 'teacher': 'Иванова А.А.'},
+        ])
+        assert added == 0
+        assert len(errors) == 1 and errors[0].startswith('Урок 2:')
+        assert Lesson.query.count() == 6
+
+
+def test_import_rejects_malformed_payload(app):
+    with app.app_context():
+        schedule_id = Schedule.query.one().id
+        teacher_id = Teacher.query.filter_by(name='Иванова А.А.').one().id
+        lesson = {'day': 'ПТ', 'lesson_number': 3, 'subject': 'Математика'}
+
+        assert schedule_io.import_lessons(schedule_id, {'lessons': []})[1] == ['Ожидается список уроков']
+        added, errors, _ = schedule_io.import_lessons(schedule_id, [
+            dict(lesson, teacher_id=str(teacher_id)),
+            dict(lesson, teacher_id='abc'),
+            dict(lesson, teacher_id=9999),
+            'урок',
+        ])
+        assert added == 0
+        assert [error.split(':')[0] for error in errors] == ['Урок 2', 'Урок 3', 'Урок 4']
+        assert 'не найден учитель "abc"' in errors[0]
+
+        assert schedule_io.import_lessons(schedule_id, [dict(lesson, teacher_id=teacher_id)])[0] == 1
@@ -0,0 +1,123 @@
+"""
+Тесты ограничения состояния сессий (core.session_state).
+
+Проверяется истечение TTL, приведение к бюджету (временные ключи; истории
+результатов не трогаются), вынос крупных значений в БД и метрики по модулям.
+"""
+
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+from core import db, session_state
+from core.sqlite_persistence import SQLitePersistence
+
+
+@pytest_asyncio.fixture
+async def blob_db(monkeypatch):
+    """Временная БД для session_blobs."""
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    monkeypatch.setattr(db, 'DATABASE_FILE', db_path)
+    monkeypatch.setattr(db, '_db', None)
+    monkeypatch.setattr(session_state, '_blobs_table_ready', False)
+
+    yield db_path
+
+    await db.close_db()
+    os.unlink(db_path)
+
+
+def test_compact_expires_and_fits_budget():
+    now = time.time()
+    user_data = {
+        'task19_results': [
+            {'topic_id': i, 'score': 3, 'answer': f'ответ {i} ' * 20} for i in range(300)
+        ],
+        'document_text': 'текст ' * 2000,
+        'fe_answered': [1, 2, 3],
+    }
+    session_state.put(user_data, 'qc_condition', 'условие', ttl=-1)
+
+    result = session_state.compact(user_data, budget=40 * 1024, now=now)
+
+    # Истекший ключ удален сразу, временный — из-за бюджета; история
+    # результатов — прогресс пользователя, она остается целиком
+    assert result['dropped'] == ['qc_condition', 'document_text']
+    assert len(user_data['task19_results']) == 300
+    assert result['over_budget']
+    assert session_state.EXPIRES_KEY not in user_data
+
+    # Временный ключ в пределах бюджета живет до истечения TTL
+    user_data = {'document_text': 'коротко', 'fe_answered': [1, 2, 3]}
+    assert session_state.compact(user_data, now=now)['dropped'] == []
+    assert session_state.get(user_data, 'document_text') == 'коротко'
+    assert session_state.compact(user_data, now=now + 7200)['dropped'] == ['document_text']
+
+
+@pytest.mark.asyncio
+async def test_blob_offload_roundtrip(blob_db):
+    user_data = {}
+    variant = {'tasks': [{'num': i, 'text': f'задание {i} ' * 30} for i in range(25)]}
+
+    await session_state.put_blob(user_data, 'fe_variant_data', variant)
+    ref = user_data['fe_variant_data']
+    assert session_state.is_blob_ref(ref) and ref['size'] > session_state.BLOB_THRESHOLD_BYTES
+    assert session_state.value_size(user_data) < 200
+    assert await session_state.get_blob(user_data, 'fe_variant_data') == variant
+
+    # Мелкие значения остаются в user_data
+    await session_state.put_blob(user_data, 'fe_variant_data', {'tasks': []})
+    assert user_data['fe_variant_data'] == {'tasks': []}
+    conn = await db.get_db()
+    cursor = await conn.execute("SELECT COUNT(*) FROM session_blobs")
+    assert (await cursor.fetchone())[0] == 0
+
+    await session_state.put_blob(user_data, 'vc_batch_results', [variant], ttl=-1)
+    assert await session_state.get_blob(user_data, 'vc_batch_results', []) == []
+    assert await session_state.purge_expired_blobs() == 1
+
+
+@pytest.mark.asyncio
+async def test_sweep_collects_module_metrics(blob_db, tmp_path):
+    # Пользователь 4 с запуска не писал боту: его данные есть только в БД
+    persistence = SQLitePersistence(tmp_path / 'persistence.db')
+    await persistence.update_user_data(4, {'document_text': 'текст', 'task24_results': [1]})
+    await persistence.update_user_data(5, {'task24_results': [2]})
+    await persistence.flush()
+    persistence = SQLitePersistence(tmp_path / 'persistence.db')
+    await persistence.refresh_user_data(5, {'task24_results': [2]})
+
+    marked = []
+    application = SimpleNamespace(
+        persistence=persistence,
+        user_data={
+            1: {'task19_results': [1, 2], 'fe_scores': {1: 1}, 'mode': 'x'},
+            2: {'vc_student_answers': {'1': 'a'}, 'task19_practice_stats': {}},
+            3: {},
+        },
+        mark_data_for_update_persistence=lambda user_ids: marked.extend(user_ids),
+    )
+
+    context = SimpleNamespace(application=application)
+    metrics = await session_state.sweep_session_state(context)
+
+    assert metrics['totals']['users'] == 3
+    assert metrics['totals']['stored_users'] == 1
+    assert metrics['modules']['task19']['users'] == 2
+    assert set(metrics['modules']) == {'task19', 'full_exam', 'core', 'teacher_mode', 'task24'}
+    assert marked == []
+    assert 'task19' in session_state.format_session_metrics()
+
+    # Временный ключ получил TTL в сохраненных данных и удаляется по его истечении
+    stored = await persistence.read_user_data(4)
+    assert session_state.EXPIRES_KEY in stored
+    stored[session_state.EXPIRES_KEY]['document_text'] = time.time() - 1
+    await persistence.write_user_data(4, stored)
+    await session_state.sweep_session_state(context)
+    assert await persistence.read_user_data(4) == {'task24_results': [1]}
+    await persistence.flush()
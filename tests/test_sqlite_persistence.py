@@ -0,0 +1,148 @@
+"""
+Тесты SQLite-хранилища данных бота (core.sqlite_persistence).
+
+Проверяется построчная запись измененных пользователей одной пачкой,
+ленивая подгрузка в refresh_user_data и перенос из PicklePersistence.
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+from telegram.ext import ApplicationBuilder, PicklePersistence
+
+from core.sqlite_persistence import (
+    SQLitePersistence, delete_user_data, load_user_data, migrate_from_pickle
+)
+
+
+def _rows(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+@pytest.mark.asyncio
+async def test_dirty_rows_written_and_loaded_lazily(tmp_path):
+    db_path = tmp_path / 'persistence.db'
+    persistence = SQLitePersistence(db_path)
+    assert await persistence.get_user_data() == {}
+
+    # Так Application записывает измененных пользователей за один цикл
+    await asyncio.gather(*(
+        persistence.update_user_data(user_id, {'step': user_id, 'answers': list(range(500))})
+        for user_id in range(1, 51)
+    ))
+    await persistence.update_conversation('quiz', (7, 7), 3)
+    assert _rows(db_path, 'persistence_user_data') == 50
+
+    # Неизменные данные не перезаписываются
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE persistence_user_data SET updated_at = '2000-01-01' WHERE user_id = 5")
+    await persistence.update_user_data(5, {'step': 5, 'answers': list(range(500))})
+    await persistence.update_user_data(6, {'step': 60})
+    with sqlite3.connect(db_path) as conn:
+        updated = dict(conn.execute(
+            "SELECT user_id, updated_at FROM persistence_user_data WHERE user_id IN (5, 6)"
+        ).fetchall())
+    assert updated[5] == '2000-01-01' and updated[6] != '2000-01-01'
+
+    await persistence.drop_user_data(50)
+    await persistence.update_conversation('quiz', (8, 8), 1)
+    await persistence.update_conversation('quiz', (7, 7), None)
+    await persistence.flush()
+
+    reopened = SQLitePersistence(db_path)
+    assert await reopened.get_user_data() == {}
+    assert await reopened.get_conversations('quiz') == {(8, 8): 1}
+
+    # Значения из памяти новее сохраненных
+    user_data = {'step': 'new'}
+    await reopened.refresh_user_data(6, user_data)
+    assert user_data == {'step': 'new', 'answers': list(range(500))}
+    user_data = {'mode': 'exam'}
+    await reopened.refresh_user_data(7, user_data)
+    assert user_data == {'mode': 'exam', 'step': 7, 'answers': list(range(500))}
+    user_data = {}
+    await reopened.refresh_user_data(50, user_data)
+    assert user_data == {}
+
+    # Запись еще не подгруженного пользователя не теряет сохраненные ключи
+    await reopened.update_user_data(8, {'mode': 'train'})
+    await reopened.flush()
+    user_data = {}
+    await SQLitePersistence(db_path).refresh_user_data(8, user_data)
+    assert user_data == {'mode': 'train', 'step': 8, 'answers': list(range(500))}
+
+
+@pytest.mark.asyncio
+async def test_migrate_from_pickle(tmp_path):
+    pickle_path = tmp_path / 'bot_persistence.pickle'
+    source = PicklePersistence(filepath=pickle_path)
+    await source.get_user_data()
+    await source.get_conversations('payment')
+    await source.update_user_data(1, {'plan': 'pro'})
+    await source.update_user_data(2, {'plan': 'trial'})
+    await source.update_chat_data(-100, {'topic': 'x'})
+    await source.update_conversation('payment', (1, 1), 'WAITING')
+    await source.flush()
+
+    db_path = tmp_path / 'persistence.db'
+    counts = await migrate_from_pickle(pickle_path, db_path)
+    assert counts['user_data'] == 2 and counts['conversations'] == 1
+
+    target = SQLitePersistence(db_path)
+    user_data, chat_data = {}, {}
+    await target.refresh_user_data(2, user_data)
+    await target.refresh_chat_data(-100, chat_data)
+    assert user_data == {'plan': 'trial'} and chat_data == {'topic': 'x'}
+    assert await target.get_conversations('payment') == {(1, 1): 'WAITING'}
+    await target.flush()
+
+
+@pytest.mark.asyncio
+async def test_load_and_delete_user_not_loaded_since_start(tmp_path):
+    db_path = tmp_path / 'persistence.db'
+    persistence = SQLitePersistence(db_path)
+    await persistence.update_user_data(9, {'practiced_topics': {1, 2}})
+    await persistence.flush()
+
+    application = ApplicationBuilder().token('123:ABC').persistence(SQLitePersistence(db_path)).build()
+    assert 9 not in application.user_data
+    assert await load_user_data(application, 9) == {'practiced_topics': {1, 2}}
+    assert application.user_data[9] == {'practiced_topics': {1, 2}}
+
+    await delete_user_data(application, 9)
+    assert 9 not in application.user_data
+    assert _rows(db_path, 'persistence_user_data') == 0
+    assert await load_user_data(application, 9) == {}
+    await application.persistence.flush()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_taken_on_loop_and_failed_batch_requeued(tmp_path, monkeypatch):
+    db_path = tmp_path / 'persistence.db'
+    persistence = SQLitePersistence(db_path)
+    user_data = {'step': 1}
+    encode = SQLitePersistence._encode
+    calls = []
+
+    def encode_while_handler_runs(self, snapshot):
+        calls.append(1)
+        # Обработчик меняет данные, пока идет сжатие в другом потоке
+        user_data['step'] += 1
+        if len(calls) == 1:
+            raise RuntimeError('encode failed')
+        return encode(self, snapshot)
+
+    monkeypatch.setattr(SQLitePersistence, '_encode', encode_while_handler_runs)
+    with pytest.raises(RuntimeError):
+        await persistence.update_user_data(1, user_data)
+    assert _rows(db_path, 'persistence_user_data') == 0
+
+    # Пачка не потеряна: уходит со следующей записью, со снимком на момент записи
+    await persistence.update_user_data(2, {'step': 0})
+    await persistence.flush()
+    assert _rows(db_path, 'persistence_user_data') == 2
+    stored = {}
+    await SQLitePersistence(db_path).refresh_user_data(1, stored)
+    assert stored == {'step': 2} and user_data == {'step': 3}
@@ -0,0 +1,173 @@
+"""
+Тесты переходов состояний стриков и отбора напоминаний
+(core.streak_manager, core.streak_reminder_scheduler).
+
+Проверяется, что переходы считаются по местному времени пользователя
+(last_activity_date — местная дата), выполняются пачкой и что
+напоминания пишутся в лог одной вставкой.
+"""
+
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+from core import streak_migration
+from core.streak_manager import StreakManager, StreakState
+from core.streak_reminder_scheduler import StreakReminderScheduler
+
+
+@pytest_asyncio.fixture
+async def streak_db(monkeypatch):
+    """Временная БД с таблицами стриков и часовых поясов."""
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    monkeypatch.setattr(streak_migration, 'DATABASE_FILE', db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE users (
+                user_id INTEGER PRIMARY KEY,
+                current_daily_streak INTEGER,
+                max_daily_streak INTEGER,
+                current_correct_streak INTEGER,
+                max_correct_streak INTEGER,
+                last_activity_date TEXT
+            )
+        """)
+    await streak_migration.apply_streak_system_migration()
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE user_timezone_info (
+                user_id INTEGER PRIMARY KEY,
+                timezone TEXT DEFAULT 'Europe/Moscow',
+                utc_offset_hours INTEGER DEFAULT 3,
+                optimal_notification_hour INTEGER DEFAULT 18
+            )
+        """)
+
+    yield db_path
+
+    os.unlink(db_path)
+
+
+def _add_streak(conn, user_id, last_activity, state='active', offset=None, streak=5):
+    conn.execute("""
+        INSERT INTO user_streaks (user_id, current_daily_streak, last_activity_date, streak_state)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, streak, last_activity, state))
+    if offset is not None:
+        conn.execute(
+            "INSERT INTO user_timezone_info (user_id, utc_offset_hours) VALUES (?, ?)",
+            (user_id, offset)
+        )
+
+
+@pytest.mark.asyncio
+async def test_transitions_use_local_time(streak_db):
+    # Даты активности — местные даты пользователей; сейчас 16:00 UTC 10 марта
+    with sqlite3.connect(streak_db) as conn:
+        _add_streak(conn, 1, '2026-03-09')                 # МСК (по умолчанию): 19:00
+        _add_streak(conn, 2, '2026-03-09', offset=7)       # 23:00 — критично
+        _add_streak(conn, 3, '2026-03-09', offset=2)       # 18:00 — под угрозой
+        _add_streak(conn, 4, '2026-03-09', offset=12)      # 04:00 следующего дня — потерян
+        _add_streak(conn, 5, '2026-03-10', offset=3)       # сегодня уже занимался
+        _add_streak(conn, 6, '2026-03-09', state='at_risk', offset=3)
+        _add_streak(conn, 7, '2026-03-08', state='frozen')
+        _add_streak(conn, 8, '2026-03-08', streak=0)
+
+    manager = StreakManager(streak_db)
+    now = datetime(2026, 3, 10, 16, 0, tzinfo=timezone.utc)
+
+    changes = await manager.check_and_update_streak_states(now=now)
+    assert sorted(changes) == sorted([
+        (1, StreakState.AT_RISK),
+        (2, StreakState.CRITICAL),
+        (3, StreakState.AT_RISK),
+        (4, StreakState.LOST),
+    ])
+
+    # Повторный проход в тот же час ничего не меняет
+    assert await manager.check_and_update_streak_states(now=now) == []
+
+    with sqlite3.connect(streak_db) as conn:
+        rows = dict(conn.execute(
+            "SELECT user_id, streak_state || ':' || at_risk_notified || critical_notified FROM user_streaks"
+        ).fetchall())
+    assert rows[1] == 'at_risk:10' and rows[2] == 'critical:01'
+    assert rows[6] == 'at_risk:00' and rows[7] == 'frozen:00'
+
+
+@pytest.mark.asyncio
+async def test_activity_after_local_midnight_counts_for_local_day(streak_db):
+    with sqlite3.connect(streak_db) as conn:
+        _add_streak(conn, 1, '2026-03-09')                 # МСК по умолчанию
+        _add_streak(conn, 2, '2026-03-09', offset=10)
+        _add_streak(conn, 3, '2026-03-09', offset=-5)
+
+    manager = StreakManager(streak_db)
+    # 01:00 местного времени 10 марта — в UTC это еще 9 марта
+    await manager.update_daily_streak(1, now=datetime(2026, 3, 9, 22, 0, tzinfo=timezone.utc))
+    await manager.update_daily_streak(2, now=datetime(2026, 3, 9, 15, 0, tzinfo=timezone.utc))
+    # 23:00 местного времени 9 марта — в UTC уже 10 марта: тот же день, стрик не растет
+    current, _, _ = await manager.update_daily_streak(3, now=datetime(2026, 3, 10, 4, 0, tzinfo=timezone.utc))
+    assert current == 5
+
+    with sqlite3.connect(streak_db) as conn:
+        rows = dict(conn.execute("SELECT user_id, last_activity_date FROM user_streaks").fetchall())
+        streaks = dict(conn.execute("SELECT user_id, current_daily_streak FROM user_streaks").fetchall())
+    assert rows == {1: '2026-03-10', 2: '2026-03-10', 3: '2026-03-09'}
+    assert streaks[1] == streaks[2] == 6
+
+    # 18:00 и 23:30 местного времени 10 марта: занимались сегодня — не под угрозой
+    for now in (datetime(2026, 3, 10, 15, 0, tzinfo=timezone.utc),
+                datetime(2026, 3, 10, 20, 30, tzinfo=timezone.utc),
+                datetime(2026, 3, 10, 13, 30, tzinfo=timezone.utc)):
+        changes = await manager.check_and_update_streak_states(now=now)
+        assert not [change for change in changes if change[0] in (1, 2)]
+
+
+class _FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, **kwargs):
+        self.sent.append(chat_id)
+
+
+@pytest.mark.asyncio
+async def test_reminders_respect_preferences_and_daily_limit(streak_db):
+    with sqlite3.connect(streak_db) as conn:
+        for user_id in (1, 2, 3):
+            _add_streak(conn, user_id, '2026-03-09', offset=3)
+        conn.execute("INSERT INTO notification_preferences (user_id, enabled) VALUES (2, 0)")
+        conn.executemany("""
+            INSERT INTO streak_notifications_log (user_id, notification_type, sent_at)
+            VALUES (3, 'at_risk', datetime('now'))
+        """, [(), ()])
+
+    scheduler = StreakReminderScheduler(streak_db)
+    scheduler.streak_manager = StreakManager(streak_db)
+
+    candidates = await scheduler._get_reminder_candidates([1, 2, 3])
+    assert candidates == {1: {'streak': 5, 'utc_offset': 3}}
+
+    bot = _FakeBot()
+
+    async def critical_changes():
+        return [(1, StreakState.CRITICAL), (2, StreakState.CRITICAL), (3, StreakState.CRITICAL)]
+
+    scheduler.streak_manager.check_and_update_streak_states = critical_changes
+    await scheduler.check_and_send_reminders(SimpleNamespace(bot=bot))
+
+    assert bot.sent == [1]
+    with sqlite3.connect(streak_db) as conn:
+        logged = conn.execute(
+            "SELECT user_id, notification_type, streak_value FROM streak_notifications_log WHERE user_id = 1"
+        ).fetchall()
+    assert logged == [(1, 'critical', 5)]
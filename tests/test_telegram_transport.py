@@ -0,0 +1,81 @@
+"""
+Тесты транспорта Bot API (core.telegram_transport).
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from core import telegram_transport
+from core.latency_metrics import InstrumentedHTTPXRequest
+from core.telegram_transport import TelegramTransport
+
+EDIT_URL = 'https://api.telegram.org/bot123:ABC/editMessageText'
+SEND_URL = 'https://api.telegram.org/bot123:ABC/sendMessage'
+
+
+class FakeRequestData:
+    def __init__(self, **parameters):
+        self.parameters = parameters
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Подменяет сетевой запрос: записывает отправленное, отвечает ok."""
+    calls = []
+    responses = []
+
+    async def fake_do_request(self, url, method, request_data=None, **kwargs):
+        calls.append((url.rsplit('/', 1)[-1], dict(request_data.parameters)))
+        await asyncio.sleep(0.05)
+        if responses:
+            return responses.pop(0)
+        return 200, json.dumps({'ok': True, 'result': request_data.parameters.get('text')}).encode()
+
+    monkeypatch.setattr(InstrumentedHTTPXRequest, 'do_request', fake_do_request)
+    monkeypatch.setattr(telegram_transport, 'STATS', telegram_transport.TransportStats())
+    return calls, responses
+
+
+@pytest.mark.asyncio
+async def test_rapid_edits_of_one_message_are_coalesced(sent):
+    calls, _ = sent
+    transport = TelegramTransport(connection_pool_size=4, http2=False)
+
+    async def edit(text, message_id=1):
+        return await transport.do_request(
+            EDIT_URL, 'POST', FakeRequestData(chat_id=1, message_id=message_id, text=text)
+        )
+
+    first = asyncio.create_task(edit('1'))
+    await asyncio.sleep(0.01)
+    results = await asyncio.gather(first, *(edit(str(i)) for i in range(2, 6)), edit('other', message_id=2))
+
+    sent_texts = [params['text'] for method, params in calls]
+    assert sorted(sent_texts) == ['1', '5', 'other']
+    # Замененные правки получают результат последней
+    assert [json.loads(body)['result'] for _, body in results] == ['1', '5', '5', '5', '5', 'other']
+    assert telegram_transport.STATS.edits_coalesced == 3
+    assert not transport._edit_slots
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_requests_and_retries_once(sent):
+    calls, responses = sent
+    responses.append((429, json.dumps({
+        'ok': False, 'error_code': 429, 'parameters': {'retry_after': 1}
+    }).encode()))
+    transport = TelegramTransport(connection_pool_size=1, http2=False, max_retry_after=5)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    code, _ = await transport.do_request(SEND_URL, 'POST', FakeRequestData(chat_id=1, text='a'))
+    assert code == 200
+    assert loop.time() - started >= 1
+    assert len(calls) == 2
+
+    stats = telegram_transport.STATS
+    assert stats.retry_after == 1
+    assert stats.requests == 2
+    assert 'telegram_retry_after_total 1' in telegram_transport.render_prometheus()
@@ -0,0 +1,54 @@
+"""
+Тесты генератора вариантов ЕГЭ (full_exam.generator).
+
+Проверяется, что пакет вариантов из общих пулов содержит все 25 заданий,
+пара 24+25 подобрана по таблице сходства, а задания 19, 20 и 22 взяты
+из разных блоков.
+"""
+
+import random
+
+import pytest
+
+from full_exam import generator
+from full_exam.generator import _title_similarity
+
+
+@pytest.fixture(scope='module')
+def pools():
+    return generator.get_pools()
+
+
+def test_similarity_table_matches_direct_computation(pools):
+    assert pools.similarity_24_25
+    for block, block_table in pools.similarity_24_25.items():
+        # В таблице — все темы 24 блока, у которых есть план
+        assert set(block_table) == {name for name in pools.blocks_24[block] if pools.plans_24.get(name)}
+        task25_in_block = pools.t25_by_block[block]
+        for t24_name, top in block_table.items():
+            # Попарное сходство со всеми темами 25 блока, лучшие — по убыванию, при равенстве по порядку
+            scores = [_title_similarity(t24_name, topic.get('title', '')) for topic in task25_in_block]
+            ranked = sorted(range(len(scores)), key=lambda idx: (-scores[idx], idx))
+            assert top == [(scores[idx], idx) for idx in ranked[:generator.SIMILARITY_TOP_K]]
+
+
+def test_generated_variants_cover_all_tasks(pools):
+    random.seed(7)
+    variants = generator.generate_variants(50, id_prefix='test')
+
+    assert len({variant.variant_id for variant in variants}) == 50
+    for variant in variants:
+        assert sorted(variant.tasks) == list(range(1, 26))
+
+        task24, task25 = variant.get_task(24), variant.get_task(25)
+        topic_24 = task24.task_data['topic_name']
+        assert task24.block == task25.block
+        # Тема 25 — самая близкая к теме 24 в ее блоке
+        best = max(
+            _title_similarity(topic_24, topic.get('title', ''))
+            for topic in pools.t25_by_block[task24.block]
+        )
+        assert _title_similarity(topic_24, task25.title) == best
+
+        blocks = [variant.get_task(n).block for n in (19, 20, 22)]
+        assert len(set(blocks)) == 3 and task24.block not in blocks